@@ -1,13 +1,44 @@
-from flask import Flask, render_template
-from datetime import datetime, timedelta
+from flask import Flask, Response, abort, g, jsonify, render_template, request
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from datetime import date, datetime, timedelta
+from functools import lru_cache, partial
+import atexit
+import contextvars
+import hashlib
+import json
 import sqlite3
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
+import billing_reconciliation
+import calendar_dimension
+import card_swipes
+import change_counters
+import columnar
+from db_pool import ConnectionPool
+from metric_cache import MetricCache
+import customer_analytics
+import event_space
+import exports
+import fragment_cache
+from metric_filters import NO_FILTERS, FilterError, parse_filters
+import metric_queries
+import occupancy
+from precompute import Job, Scheduler, SnapshotStore
+from query_profiler import QueryProfiler, current_route, render_samples
+from result_schema import Column, ResultSchema
+import risk_scoring
+import rollups
+import room_availability
+
 load_dotenv()
 
 app = Flask(__name__)
 
+@lru_cache(maxsize=None)
 def get_db_path():
     try:
         import config
@@ -15,495 +46,1038 @@ def get_db_path():
     except (ImportError, AttributeError):
         return os.getenv('DB_PATH', 'last_resort_hotels.db')
 
-def get_db_connection():
-    db_path = get_db_path()
+def get_db_pool_size():
     try:
-        connection = sqlite3.connect(db_path)
-        connection.row_factory = sqlite3.Row
-        return connection
-    except sqlite3.Error as e:
-        print(f"Error connecting to SQLite: {e}")
-        return None
+        import config
+        return int(config.DB_POOL_SIZE)
+    except (ImportError, AttributeError):
+        return int(os.getenv('DB_POOL_SIZE', '8'))
 
-def get_total_revenue():
-    connection = get_db_connection()
-    if not connection:
-        return 0.0
-    
+query_profiling = os.getenv('QUERY_PROFILING', '1') != '0'
+query_profiler = QueryProfiler(capacity=int(os.getenv('QUERY_LOG_SIZE', '200')),
+                               slow_seconds=float(os.getenv('SLOW_QUERY_MS', '100')) / 1000,
+                               step_interval=int(os.getenv('QUERY_STEP_INTERVAL', '1000')))
+
+db_pool = None
+db_pool_lock = threading.Lock()
+
+def prepare_database(db_path):
+    """One-off setup on a writable connection, before the query_only pool opens.
+
+    The change logs of the risk index and the reconciler are a migration
+    step (`python risk_scoring.py install`, `python billing_reconciliation.py
+    install`), since their triggers add work to every write of a bill; this
+    only reports the ones missing, whose index then falls back to a full pass
+    when the database changes.
+    """
+    connection = sqlite3.connect(db_path)
     try:
         cursor = connection.cursor()
-        query = """
-            SELECT SUM(amount) AS total_revenue
-            FROM Charges
-            WHERE charge_status IN ('billed', 'paid')
+        if not calendar_dimension.calendar_installed(cursor):
+            calendar_dimension.install(connection)
+        change_counters.install(connection)
+        for module in (risk_scoring, billing_reconciliation):
+            if not module.change_log_installed(cursor):
+                print(f"{module.__name__} change log not installed, so any database change means a full pass; "
+                      f"run `python {module.__name__}.py install`")
+    except sqlite3.Error as e:
+        print(f"Error preparing database: {e}")
+    finally:
+        connection.close()
+
+def get_db_pool():
+    global db_pool
+    if db_pool is None:
+        with db_pool_lock:
+            if db_pool is None:
+                prepare_database(get_db_path())
+                factory = query_profiler.connection_factory() if query_profiling else sqlite3.Connection
+                db_pool = ConnectionPool(get_db_path(), size=get_db_pool_size(), connection_factory=factory)
+    return db_pool
+
+def db_cursor():
+    """Borrow a pooled connection for the current thread and yield a cursor on it."""
+    return get_db_pool().cursor()
+
+# Keyed on per-table change counters, so card swipes (LocationLogs) leave cached results alone.
+change_probe = change_counters.ChangeProbe(get_db_path())
+metric_cache = MetricCache(change_probe, max_entries=int(os.getenv('METRIC_CACHE_SIZE', '256')))
+metric_cache.enabled = os.getenv('METRIC_CACHE_ENABLED', '1') != '0'
+
+template_fragments = fragment_cache.create_fragment_cache(max_entries=int(os.getenv('FRAGMENT_CACHE_SIZE', '512')))
+template_fragments.enabled = os.getenv('FRAGMENT_CACHE_ENABLED', '1') != '0'
+fragment_cache.configure(app.jinja_env, template_fragments,
+                         ttl=int(os.getenv('FRAGMENT_CACHE_TTL', '3600')),
+                         bytecode_cache_dir=os.getenv('TEMPLATE_BYTECODE_CACHE_DIR'))
+fragment_cache.precompile(app.jinja_env)
+
+@atexit.register
+def close_db_pool():
+    if db_pool is not None:
+        db_pool.close()
+    metric_cache.version_probe.close()
+
+def fetch_total_revenue(cursor, filters=NO_FILTERS, use_rollups=None):
+    # The daily rollup answers date ranges too; property filters read Charges.
+    if use_rollups is None:
+        use_rollups = not filters.has_property and rollups.rollups_installed(cursor)
+    if use_rollups:
+        day_filter, params = filters.date_range('day')
+        query = rollups.TOTAL_REVENUE_QUERY.format(day_filter=f"day <> '' AND {day_filter}" if filters else '1')
+    else:
+        where, params = filters.charges('c')
+        query = f"""
+            SELECT SUM(c.amount) AS total_revenue
+            FROM Charges c
+            WHERE c.charge_status IN ('billed', 'paid') AND {where}
         """
-        cursor.execute(query)
-        result = cursor.fetchone()
-        return float(result[0]) if result and result[0] else 0.0
+    cursor.execute(query, params)
+    result = cursor.fetchone()
+    return float(result[0]) if result and result[0] else 0.0
+
+@metric_cache.cached(ttl=60)
+def get_total_revenue(filters=NO_FILTERS):
+    try:
+        with db_cursor() as cursor:
+            return fetch_total_revenue(cursor, filters)
     except sqlite3.Error as e:
         print(f"Error executing total revenue query: {e}")
         return 0.0
-    finally:
-        if connection:
-            cursor.close()
-            connection.close()
 
-def get_quarterly_revenue():
-    connection = get_db_connection()
-    if not connection:
-        return []
-    
+QUARTERLY_REVENUE_SCHEMA = ResultSchema(
+    Column('revenue_year', int),
+    Column('revenue_quarter', int),
+    Column('total_revenue', float),
+    derived={'quarter': lambda row: f"{row['revenue_year']}-Q{row['revenue_quarter']}"}
+)
+
+def fetch_quarterly_revenue(cursor, use_rollups=None, filters=NO_FILTERS, use_calendar=None):
+    # The rollup is keyed by quarter only, so filtered requests read Charges.
+    # Calendar buckets only pay off with the covering index; otherwise strftime.
+    if use_rollups is None:
+        use_rollups = not filters and rollups.rollups_installed(cursor)
+    if use_calendar is None:
+        use_calendar = (calendar_dimension.calendar_installed(cursor)
+                        and calendar_dimension.range_search(cursor, 'charges'))
+    params = []
+    if use_rollups:
+        query = rollups.QUARTERLY_REVENUE_QUERY
+    elif use_calendar:
+        calendar_filter, params = filters.date_range('d.date')
+        charge_filter, charge_params = filters.charge_property('c')
+        query = calendar_dimension.revenue_query('quarter', ('paid',), calendar_filter, charge_filter,
+                                                 range_search=calendar_dimension.range_search(cursor, 'charges'))
+        params = params + charge_params
+    else:
+        where, params = filters.charges('c')
+        query = metric_queries.quarterly_revenue_query(where)
+    cursor.execute(query, params)
+    return QUARTERLY_REVENUE_SCHEMA.fetchall(cursor)
+
+@metric_cache.cached(ttl=300)
+def get_quarterly_revenue(filters=NO_FILTERS):
     try:
-        cursor = connection.cursor()
-        query = """
-            SELECT 
-                CAST(strftime('%Y', c.charge_date) AS INTEGER) AS revenue_year,
-                CAST((CAST(strftime('%m', c.charge_date) AS INTEGER) - 1) / 3 + 1 AS INTEGER) AS revenue_quarter,
-                SUM(c.amount) AS total_revenue
-            FROM Charges c
-            WHERE c.charge_status = 'paid'
-            GROUP BY 
-                strftime('%Y', c.charge_date),
-                revenue_quarter
-            ORDER BY 
-                revenue_year,
-                revenue_quarter
-        """
-        cursor.execute(query)
-        results = cursor.fetchall()
-        
-        results = [dict(row) for row in results]
-        
-        for row in results:
-            row['revenue_year'] = int(row['revenue_year']) if row['revenue_year'] else 0
-            row['revenue_quarter'] = int(row['revenue_quarter']) if row['revenue_quarter'] else 0
-            row['total_revenue'] = float(row['total_revenue']) if row['total_revenue'] else 0.0
-            row['quarter'] = f"{row['revenue_year']}-Q{row['revenue_quarter']}"
-        
-        return results
+        with db_cursor() as cursor:
+            return fetch_quarterly_revenue(cursor, filters=filters)
     except sqlite3.Error as e:
         print(f"Error executing quarterly revenue query: {e}")
         return []
-    finally:
-        if connection:
-            cursor.close()
-            connection.close()
 
-def get_occupancy_rate_daily():
-    connection = get_db_connection()
-    if not connection:
+CALENDAR_REVENUE_COLUMNS = (
+    Column('total_revenue', float),
+    Column('days', int),
+    Column('avg_daily_revenue', float)
+)
+
+REVENUE_WEEKLY_SCHEMA = ResultSchema(
+    Column('week'),
+    Column('iso_year', int),
+    Column('iso_week', int),
+    *CALENDAR_REVENUE_COLUMNS
+)
+
+REVENUE_BY_DAY_OF_WEEK_SCHEMA = ResultSchema(
+    Column('day_of_week', int),
+    Column('day_name'),
+    *CALENDAR_REVENUE_COLUMNS
+)
+
+REVENUE_BY_DAY_TYPE_SCHEMA = ResultSchema(
+    Column('day_type'),
+    *CALENDAR_REVENUE_COLUMNS
+)
+
+def fetch_revenue_by_calendar(cursor, grouping, schema, filters=NO_FILTERS):
+    """Billed and paid revenue per calendar_dimension grouping, range-bucketed on charge_date."""
+    calendar_filter, params = filters.date_range('d.date')
+    charge_filter, charge_params = filters.charge_property('c')
+    query = calendar_dimension.revenue_query(grouping, ('billed', 'paid'), calendar_filter, charge_filter,
+                                             range_search=calendar_dimension.range_search(cursor, 'charges'))
+    cursor.execute(query, params + charge_params)
+    return schema.fetchall(cursor)
+
+def fetch_revenue_weekly(cursor, filters=NO_FILTERS):
+    return fetch_revenue_by_calendar(cursor, 'week', REVENUE_WEEKLY_SCHEMA, filters)
+
+@metric_cache.cached(ttl=300)
+def get_revenue_weekly(filters=NO_FILTERS):
+    try:
+        with db_cursor() as cursor:
+            return fetch_revenue_weekly(cursor, filters)
+    except sqlite3.Error as e:
+        print(f"Error executing weekly revenue query: {e}")
         return []
-    
+
+def fetch_revenue_by_day_of_week(cursor, filters=NO_FILTERS):
+    return fetch_revenue_by_calendar(cursor, 'day_of_week', REVENUE_BY_DAY_OF_WEEK_SCHEMA, filters)
+
+@metric_cache.cached(ttl=300)
+def get_revenue_by_day_of_week(filters=NO_FILTERS):
     try:
-        cursor = connection.cursor()
-        query = """
-            SELECT 
-                DATE(ra.check_in_time) AS date,
-                COUNT(DISTINCT ra.assignment_id) AS total_stays,
-                COUNT(DISTINCT ra.room_id) AS unique_rooms_occupied,
-                (SELECT COUNT(*) FROM Rooms WHERE room_status != 'renovation') AS total_available_rooms,
-                (COUNT(DISTINCT ra.room_id) * 100.0 / 
-                 MAX((SELECT COUNT(*) FROM Rooms WHERE room_status != 'renovation'), 1)) AS occupancy_rate
-            FROM RoomAssignments ra
-            WHERE ra.check_in_time IS NOT NULL
-            GROUP BY date(ra.check_in_time)
-            ORDER BY date DESC
-            LIMIT 90
-        """
-        cursor.execute(query)
-        results = cursor.fetchall()
-        
-        results = [dict(row) for row in results]
-        
-        for row in results:
-            row['total_stays'] = int(row['total_stays']) if row['total_stays'] else 0
-            row['unique_rooms_occupied'] = int(row['unique_rooms_occupied']) if row['unique_rooms_occupied'] else 0
-            row['total_available_rooms'] = int(row['total_available_rooms']) if row['total_available_rooms'] else 0
-            row['occupancy_rate'] = float(row['occupancy_rate']) if row['occupancy_rate'] else 0.0
-        
-        return results
+        with db_cursor() as cursor:
+            return fetch_revenue_by_day_of_week(cursor, filters)
+    except sqlite3.Error as e:
+        print(f"Error executing revenue by day of week query: {e}")
+        return []
+
+def fetch_revenue_by_day_type(cursor, filters=NO_FILTERS):
+    return fetch_revenue_by_calendar(cursor, 'day_type', REVENUE_BY_DAY_TYPE_SCHEMA, filters)
+
+@metric_cache.cached(ttl=300)
+def get_revenue_by_day_type(filters=NO_FILTERS):
+    try:
+        with db_cursor() as cursor:
+            return fetch_revenue_by_day_type(cursor, filters)
+    except sqlite3.Error as e:
+        print(f"Error executing revenue by day type query: {e}")
+        return []
+
+def compute_filtered_occupancy(cursor, filters, granularities):
+    rooms = filters.rooms_subquery() if filters.has_property else None
+    return occupancy.compute_occupancy(cursor, filters.start, filters.end, granularities, rooms=rooms)
+
+def latest_days(days, filters):
+    """Newest first; without a date range only the latest 90 days are kept."""
+    days = list(reversed(days))
+    return days if filters.start or filters.end else days[:90]
+
+def fetch_occupancy_rate_daily(cursor, filters=NO_FILTERS):
+    """Nightly occupancy for the selected range (default: latest 90 days), newest first."""
+    return latest_days(compute_filtered_occupancy(cursor, filters, ('day',))['day'], filters)
+
+@metric_cache.cached(ttl=300)
+def get_occupancy_rate_daily(filters=NO_FILTERS):
+    try:
+        with db_cursor() as cursor:
+            return fetch_occupancy_rate_daily(cursor, filters)
     except sqlite3.Error as e:
         print(f"Error executing daily occupancy query: {e}")
         return []
-    finally:
-        if connection:
-            cursor.close()
-            connection.close()
 
-def get_occupancy_rate_monthly():
-    connection = get_db_connection()
-    if not connection:
+def fetch_occupancy_rate_weekly(cursor, filters=NO_FILTERS):
+    return compute_filtered_occupancy(cursor, filters, ('week',))['week']
+
+@metric_cache.cached(ttl=300)
+def get_occupancy_rate_weekly(filters=NO_FILTERS):
+    try:
+        with db_cursor() as cursor:
+            return fetch_occupancy_rate_weekly(cursor, filters)
+    except sqlite3.Error as e:
+        print(f"Error executing weekly occupancy query: {e}")
         return []
-    
+
+def fetch_occupancy_rate_monthly(cursor, filters=NO_FILTERS):
+    return compute_filtered_occupancy(cursor, filters, ('month',))['month']
+
+@metric_cache.cached(ttl=300)
+def get_occupancy_rate_monthly(filters=NO_FILTERS):
     try:
-        cursor = connection.cursor()
-        query = """
-            SELECT 
-                strftime('%Y-%m', ra.check_in_time) AS month,
-                COUNT(DISTINCT ra.assignment_id) AS total_stays,
-                COUNT(DISTINCT ra.room_id) AS unique_rooms_occupied,
-                (SELECT COUNT(*) FROM Rooms WHERE room_status != 'renovation') AS total_available_rooms,
-                (COUNT(DISTINCT ra.room_id) * 100.0 / 
-                 MAX((SELECT COUNT(*) FROM Rooms WHERE room_status != 'renovation'), 1)) AS occupancy_rate
-            FROM RoomAssignments ra
-            WHERE ra.check_in_time IS NOT NULL
-            GROUP BY strftime('%Y-%m', ra.check_in_time)
-            ORDER BY month
-        """
-        cursor.execute(query)
-        results = cursor.fetchall()
-        
-        results = [dict(row) for row in results]
-        
-        for row in results:
-            row['total_stays'] = int(row['total_stays']) if row['total_stays'] else 0
-            row['unique_rooms_occupied'] = int(row['unique_rooms_occupied']) if row['unique_rooms_occupied'] else 0
-            row['total_available_rooms'] = int(row['total_available_rooms']) if row['total_available_rooms'] else 0
-            row['occupancy_rate'] = float(row['occupancy_rate']) if row['occupancy_rate'] else 0.0
-        
-        return results
+        with db_cursor() as cursor:
+            return fetch_occupancy_rate_monthly(cursor, filters)
     except sqlite3.Error as e:
         print(f"Error executing monthly occupancy query: {e}")
         return []
-    finally:
-        if connection:
-            cursor.close()
-            connection.close()
 
-def get_top_customers():
-    connection = get_db_connection()
-    if not connection:
+def fetch_occupancy_by_calendar(cursor, grouping, filters=NO_FILTERS):
+    """Nightly occupancy folded into a calendar_dimension grouping (day of week, day type)."""
+    daily = compute_filtered_occupancy(cursor, filters, ('day',))['day']
+    return calendar_dimension.group_daily_occupancy(cursor, daily, grouping)
+
+def fetch_occupancy_by_day_of_week(cursor, filters=NO_FILTERS):
+    return fetch_occupancy_by_calendar(cursor, 'day_of_week', filters)
+
+@metric_cache.cached(ttl=300)
+def get_occupancy_by_day_of_week(filters=NO_FILTERS):
+    try:
+        with db_cursor() as cursor:
+            return fetch_occupancy_by_day_of_week(cursor, filters)
+    except sqlite3.Error as e:
+        print(f"Error executing occupancy by day of week query: {e}")
         return []
-    
+
+def fetch_occupancy_by_day_type(cursor, filters=NO_FILTERS):
+    return fetch_occupancy_by_calendar(cursor, 'day_type', filters)
+
+@metric_cache.cached(ttl=300)
+def get_occupancy_by_day_type(filters=NO_FILTERS):
     try:
-        cursor = connection.cursor()
-        query = """
-            SELECT 
-                bp.billed_party_id,
-                COALESCE(bp.organization_name, bp.first_name || ' ' || bp.last_name) AS customer_name,
-                bp.party_type,
-                SUM(c.amount) AS total_revenue,
-                COUNT(DISTINCT res.reservation_id) AS total_reservations,
-                MAX(res.check_in_date) AS last_visit_date
-            FROM BilledParties bp
-            LEFT JOIN Charges c ON bp.billed_party_id = c.billed_party_id AND c.charge_status IN ('billed', 'paid')
-            LEFT JOIN Reservations res ON bp.billed_party_id = res.billed_party_id
-            GROUP BY bp.billed_party_id, customer_name, bp.party_type
-            HAVING total_revenue > 0
-            ORDER BY total_revenue DESC
-            LIMIT 20
-        """
-        cursor.execute(query)
-        results = cursor.fetchall()
-        
-        results = [dict(row) for row in results]
-        
-        for row in results:
-            row['total_revenue'] = float(row['total_revenue']) if row['total_revenue'] else 0.0
-            row['total_reservations'] = int(row['total_reservations']) if row['total_reservations'] else 0
-            if row['last_visit_date']:
-                row['last_visit_date'] = row['last_visit_date']
-            else:
-                row['last_visit_date'] = None
-        
-        return results
+        with db_cursor() as cursor:
+            return fetch_occupancy_by_day_type(cursor, filters)
     except sqlite3.Error as e:
-        print(f"Error executing top customers query: {e}")
+        print(f"Error executing occupancy by day type query: {e}")
         return []
-    finally:
-        if connection:
-            cursor.close()
-            connection.close()
 
-def get_high_risk_customers():
-    connection = get_db_connection()
-    if not connection:
+TOP_CUSTOMERS_SCHEMA = ResultSchema(
+    Column('billed_party_id'),
+    Column('customer_name'),
+    Column('party_type'),
+    Column('total_revenue', float),
+    Column('total_reservations', int),
+    Column('last_visit_date', str, default=None)
+)
+
+def fetch_top_customers(cursor, filters=NO_FILTERS):
+    charge_filter, charge_params = filters.charges('c')
+    reservation_filter, reservation_params = filters.reservations('res')
+    cursor.execute(customer_analytics.top_customers_query(charge_filter, reservation_filter),
+                   charge_params + reservation_params + [20])
+    return TOP_CUSTOMERS_SCHEMA.fetchall(cursor)
+
+@metric_cache.cached(ttl=300)
+def get_top_customers(filters=NO_FILTERS):
+    try:
+        with db_cursor() as cursor:
+            return fetch_top_customers(cursor, filters)
+    except sqlite3.Error as e:
+        print(f"Error executing top customers query: {e}")
         return []
-    
+
+HIGH_RISK_CUSTOMERS_SCHEMA = ResultSchema(
+    Column('billed_party_id'),
+    Column('customer_name'),
+    Column('party_type'),
+    Column('past_history_score', int),
+    Column('cooperativeness_score', int),
+    Column('flexibility_score', int),
+    Column('payment_promptness_score', int),
+    Column('overall_qualification_score', float),
+    Column('risk_score', float),
+    Column('total_reservations', int),
+    Column('overdue_amount', float),
+    Column('last_visit_date', str, default=None)
+)
+
+risk_weights = risk_scoring.configured_weights()
+
+def create_risk_index():
+    """RiskIndex for the unfiltered ranking, or None (RISK_INDEX_ENABLED=0 or no NumPy) to rank in SQL."""
+    if os.getenv('RISK_INDEX_ENABLED', '1') == '0' or risk_scoring.np is None:
+        return None
+    return risk_scoring.RiskIndex(risk_weights, capacity=int(os.getenv('RISK_TOP_K', '200')),
+                                  version=change_probe.watching(risk_scoring.TRACKED_TABLES))
+
+risk_index = create_risk_index()
+
+def fetch_high_risk_customers(cursor, filters=NO_FILTERS):
+    if risk_index is not None and not filters:
+        decode = HIGH_RISK_CUSTOMERS_SCHEMA.decoder(risk_scoring.COLUMNS)
+        return [decode(row) for row in risk_index.top(cursor, 50)]
+    reservation_filter, reservation_params = filters.reservations('res')
+    bill_filter, bill_params = filters.bills('b')
+    query = customer_analytics.high_risk_customers_query(reservation_filter, bill_filter, active_only=bool(filters),
+                                                         risk_score=risk_scoring.risk_expression(risk_weights))
+    cursor.execute(query, reservation_params + bill_params + [50])
+    return HIGH_RISK_CUSTOMERS_SCHEMA.fetchall(cursor)
+
+@metric_cache.cached(ttl=600)
+def get_high_risk_customers(filters=NO_FILTERS):
     try:
-        cursor = connection.cursor()
-        query = """
-            SELECT 
-                cq.billed_party_id,
-                COALESCE(bp.first_name || ' ' || bp.last_name, bp.organization_name) AS customer_name,
-                bp.party_type,
-                cq.past_history_score,
-                cq.cooperativeness_score,
-                cq.flexibility_score,
-                cq.payment_promptness_score,
-                cq.overall_qualification_score,
-                (0.4 * (100 - cq.payment_promptness_score) +
-                 0.3 * (100 - cq.past_history_score) +
-                 0.2 * (100 - cq.cooperativeness_score) +
-                 0.1 * (100 - cq.flexibility_score)) AS risk_score,
-                COUNT(DISTINCT res.reservation_id) AS total_reservations,
-                COALESCE(SUM(CASE WHEN b.bill_status = 'overdue' THEN b.total_amount ELSE 0 END), 0) AS overdue_amount,
-                MAX(res.check_in_date) AS last_visit_date
-            FROM CustomerQualifications cq
-            JOIN BilledParties bp ON cq.billed_party_id = bp.billed_party_id
-            LEFT JOIN Reservations res ON bp.billed_party_id = res.billed_party_id
-            LEFT JOIN Bills b ON bp.billed_party_id = b.billed_party_id
-            GROUP BY cq.billed_party_id, customer_name, bp.party_type,
-                     cq.past_history_score, cq.cooperativeness_score,
-                     cq.flexibility_score, cq.payment_promptness_score,
-                     cq.overall_qualification_score
-            ORDER BY risk_score DESC
-            LIMIT 50
-        """
-        cursor.execute(query)
-        results = cursor.fetchall()
-        
-        results = [dict(row) for row in results]
-        
-        for row in results:
-            row['past_history_score'] = int(row['past_history_score']) if row['past_history_score'] else 0
-            row['cooperativeness_score'] = int(row['cooperativeness_score']) if row['cooperativeness_score'] else 0
-            row['flexibility_score'] = int(row['flexibility_score']) if row['flexibility_score'] else 0
-            row['payment_promptness_score'] = int(row['payment_promptness_score']) if row['payment_promptness_score'] else 0
-            row['overall_qualification_score'] = float(row['overall_qualification_score']) if row['overall_qualification_score'] else 0.0
-            row['risk_score'] = float(row['risk_score']) if row['risk_score'] else 0.0
-            row['total_reservations'] = int(row['total_reservations']) if row['total_reservations'] else 0
-            row['overdue_amount'] = float(row['overdue_amount']) if row['overdue_amount'] else 0.0
-            if row['last_visit_date']:
-                row['last_visit_date'] = row['last_visit_date']
-            else:
-                row['last_visit_date'] = None
-        
-        return results
+        with db_cursor() as cursor:
+            return fetch_high_risk_customers(cursor, filters)
     except sqlite3.Error as e:
         print(f"Error executing high-risk customers query: {e}")
         return []
-    finally:
-        if connection:
-            cursor.close()
-            connection.close()
 
-def get_event_count_by_month():
-    connection = get_db_connection()
-    if not connection:
-        return []
-    
+# Every bill's reconciliation, rechecked bill by bill when billing_reconciliation's change log is installed.
+billing_reconciler = billing_reconciliation.Reconciler(
+    version=change_probe.watching(billing_reconciliation.TRACKED_TABLES))
+
+def fetch_billing_reconciliation(cursor, filters=NO_FILTERS, issue=None, bucket=None):
+    bills = None
+    if filters:
+        where, params = filters.bills('b')
+        cursor.execute(f"SELECT b.bill_id FROM Bills b WHERE {where}", params)
+        bills = {row[0] for row in cursor.fetchall()}
+    return billing_reconciler.report(cursor, date.today(), bills, issue, bucket)
+
+@metric_cache.cached(ttl=600)
+def get_billing_reconciliation(filters=NO_FILTERS, issue=None, bucket=None):
+    """Bills checked against their charges, deposits and payments, with aging (see billing_reconciliation)."""
     try:
-        cursor = connection.cursor()
-        query = """
-            SELECT 
-                strftime('%Y-%m', e.start_date) AS month,
-                COUNT(DISTINCT e.event_id) AS total_events,
-                SUM(e.estimated_attendance) AS total_estimated_attendance,
-                AVG(e.estimated_attendance) AS avg_attendance_per_event,
-                COUNT(DISTINCT e.host_id) AS unique_hosts
-            FROM Events e
-            WHERE e.start_date IS NOT NULL
-            GROUP BY strftime('%Y-%m', e.start_date)
-            ORDER BY month
-        """
-        cursor.execute(query)
-        results = cursor.fetchall()
-        
-        results = [dict(row) for row in results]
-        
-        for row in results:
-            row['total_events'] = int(row['total_events']) if row['total_events'] else 0
-            row['total_estimated_attendance'] = int(row['total_estimated_attendance']) if row['total_estimated_attendance'] else 0
-            row['avg_attendance_per_event'] = float(row['avg_attendance_per_event']) if row['avg_attendance_per_event'] else 0.0
-            row['unique_hosts'] = int(row['unique_hosts']) if row['unique_hosts'] else 0
-        
-        return results
+        with db_cursor() as cursor:
+            return fetch_billing_reconciliation(cursor, filters, issue, bucket)
+    except sqlite3.Error as e:
+        print(f"Error reconciling bills: {e}")
+        return {}
+
+EVENT_COUNT_BY_MONTH_SCHEMA = ResultSchema(
+    Column('month'),
+    Column('total_events', int),
+    Column('total_estimated_attendance', int),
+    Column('avg_attendance_per_event', float),
+    Column('unique_hosts', int)
+)
+
+def fetch_event_count_by_month(cursor, use_rollups=None, filters=NO_FILTERS, use_calendar=None):
+    if use_rollups is None:
+        use_rollups = not filters and rollups.rollups_installed(cursor)
+    if use_calendar is None:
+        use_calendar = (calendar_dimension.calendar_installed(cursor)
+                        and calendar_dimension.range_search(cursor, 'events'))
+    params = []
+    if use_rollups:
+        query = rollups.EVENTS_MONTHLY_QUERY
+    elif use_calendar:
+        calendar_filter, params = filters.date_range('d.date')
+        event_filter, event_params = filters.event_property('e.event_id')
+        query = calendar_dimension.event_count_query('month', calendar_filter, event_filter)
+        params = params + event_params
+    else:
+        where, params = filters.events('e')
+        query = metric_queries.event_count_by_month_query(where)
+    cursor.execute(query, params)
+    return EVENT_COUNT_BY_MONTH_SCHEMA.fetchall(cursor)
+
+@metric_cache.cached(ttl=3600)
+def get_event_count_by_month(filters=NO_FILTERS):
+    try:
+        with db_cursor() as cursor:
+            return fetch_event_count_by_month(cursor, filters=filters)
     except sqlite3.Error as e:
         print(f"Error executing event count by month query: {e}")
         return []
-    finally:
-        if connection:
-            cursor.close()
-            connection.close()
 
-def get_average_attendance():
-    connection = get_db_connection()
-    if not connection:
-        return {}
-    
-    try:
-        cursor = connection.cursor()
-        query = """
-            SELECT 
+AVERAGE_ATTENDANCE_SCHEMA = ResultSchema(
+    Column('total_events', int),
+    Column('avg_estimated_attendance', float),
+    Column('avg_actual_attendance', float),
+    Column('total_estimated_attendance', int),
+    Column('total_actual_attendance', int)
+)
+
+def fetch_average_attendance(cursor, filters=NO_FILTERS):
+    """Estimated attendance is averaged over events and actual attendance over their room usages.
+
+    The two are aggregated separately: joining EventRooms first would count an
+    event's estimate once per room and slot it was held in.
+    """
+    event_filter, event_params = filters.events('e')
+    room_filter, room_params = filters.room_condition('er.room_id')
+    query = f"""
+        WITH estimated AS (
+            SELECT
                 COUNT(DISTINCT e.event_id) AS total_events,
                 AVG(e.estimated_attendance) AS avg_estimated_attendance,
+                SUM(e.estimated_attendance) AS total_estimated_attendance
+            FROM Events e
+            WHERE {event_filter}
+        ), actual AS (
+            SELECT
                 AVG(er.actual_attendance) AS avg_actual_attendance,
-                SUM(e.estimated_attendance) AS total_estimated_attendance,
                 SUM(er.actual_attendance) AS total_actual_attendance
-            FROM Events e
-            LEFT JOIN EventRooms er ON e.event_id = er.event_id
-        """
-        cursor.execute(query)
-        result = cursor.fetchone()
-        
-        if result:
-            result = dict(result)
-            return {
-                'total_events': int(result['total_events']) if result['total_events'] else 0,
-                'avg_estimated_attendance': float(result['avg_estimated_attendance']) if result['avg_estimated_attendance'] else 0.0,
-                'avg_actual_attendance': float(result['avg_actual_attendance']) if result['avg_actual_attendance'] else 0.0,
-                'total_estimated_attendance': int(result['total_estimated_attendance']) if result['total_estimated_attendance'] else 0,
-                'total_actual_attendance': int(result['total_actual_attendance']) if result['total_actual_attendance'] else 0
-            }
-        return {}
+            FROM EventRooms er
+            WHERE er.event_id IN (SELECT e.event_id FROM Events e WHERE {event_filter}) AND {room_filter}
+        )
+        SELECT
+            estimated.total_events,
+            estimated.avg_estimated_attendance,
+            actual.avg_actual_attendance,
+            estimated.total_estimated_attendance,
+            actual.total_actual_attendance
+        FROM estimated, actual
+    """
+    cursor.execute(query, event_params + event_params + room_params)
+    return AVERAGE_ATTENDANCE_SCHEMA.fetchone(cursor) or {}
+
+@metric_cache.cached(ttl=3600)
+def get_average_attendance(filters=NO_FILTERS):
+    try:
+        with db_cursor() as cursor:
+            return fetch_average_attendance(cursor, filters)
     except sqlite3.Error as e:
         print(f"Error executing average attendance query: {e}")
         return {}
-    finally:
-        if connection:
-            cursor.close()
-            connection.close()
 
-def get_avg_fb_spend_per_guest():
-    connection = get_db_connection()
-    if not connection:
-        return {}
-    
+def fetch_event_space_utilization(cursor, filters=NO_FILTERS):
+    return event_space.compute(cursor, filters)
+
+@metric_cache.cached(ttl=3600)
+def get_event_space_utilization(filters=NO_FILTERS):
+    """Room x slot utilization, capacity fill and attendance accuracy (see event_space)."""
+    if columnar_engine is not None and not filters:
+        try:
+            return event_space.from_snapshot(columnar_engine.snapshot())
+        except (OSError, ValueError, sqlite3.Error) as e:
+            print(f"Error computing event space utilization from the columnar snapshot: {e}")
     try:
-        cursor = connection.cursor()
-        query = """
-            SELECT 
-                COUNT(DISTINCT c.billed_party_id) AS total_guests_with_fb,
-                COUNT(DISTINCT mc.meal_charge_id) AS total_meal_charges,
-                SUM(c.amount) AS total_fb_revenue,
-                AVG(c.amount) AS avg_fb_spend_per_charge,
-                SUM(c.amount) / COUNT(DISTINCT c.billed_party_id) AS avg_fb_spend_per_guest
-            FROM Charges c
-            JOIN MealCharges mc ON c.charge_id = mc.charge_id
-            WHERE c.charge_status IN ('billed', 'paid')
-        """
-        cursor.execute(query)
-        result = cursor.fetchone()
-        
-        if result:
-            result = dict(result)
-            return {
-                'total_guests_with_fb': int(result['total_guests_with_fb']) if result['total_guests_with_fb'] else 0,
-                'total_meal_charges': int(result['total_meal_charges']) if result['total_meal_charges'] else 0,
-                'total_fb_revenue': float(result['total_fb_revenue']) if result['total_fb_revenue'] else 0.0,
-                'avg_fb_spend_per_charge': float(result['avg_fb_spend_per_charge']) if result['avg_fb_spend_per_charge'] else 0.0,
-                'avg_fb_spend_per_guest': float(result['avg_fb_spend_per_guest']) if result['avg_fb_spend_per_guest'] else 0.0
-            }
+        with db_cursor() as cursor:
+            return fetch_event_space_utilization(cursor, filters)
+    except sqlite3.Error as e:
+        print(f"Error executing event space utilization queries: {e}")
         return {}
+
+AVG_FB_SPEND_SCHEMA = ResultSchema(
+    Column('total_guests_with_fb', int),
+    Column('total_meal_charges', int),
+    Column('total_fb_revenue', float),
+    Column('avg_fb_spend_per_charge', float),
+    Column('avg_fb_spend_per_guest', float)
+)
+
+def fetch_avg_fb_spend_per_guest(cursor, filters=NO_FILTERS):
+    where, params = filters.charges('c')
+    query = f"""
+        SELECT
+            COUNT(DISTINCT c.billed_party_id) AS total_guests_with_fb,
+            COUNT(DISTINCT mc.meal_charge_id) AS total_meal_charges,
+            SUM(c.amount) AS total_fb_revenue,
+            AVG(c.amount) AS avg_fb_spend_per_charge,
+            SUM(c.amount) / COUNT(DISTINCT c.billed_party_id) AS avg_fb_spend_per_guest
+        FROM Charges c
+        JOIN MealCharges mc ON c.charge_id = mc.charge_id
+        WHERE c.charge_status IN ('billed', 'paid') AND {where}
+    """
+    cursor.execute(query, params)
+    return AVG_FB_SPEND_SCHEMA.fetchone(cursor) or {}
+
+@metric_cache.cached(ttl=300)
+def get_avg_fb_spend_per_guest(filters=NO_FILTERS):
+    try:
+        with db_cursor() as cursor:
+            return fetch_avg_fb_spend_per_guest(cursor, filters)
     except sqlite3.Error as e:
         print(f"Error executing avg F&B spend query: {e}")
         return {}
-    finally:
-        if connection:
-            cursor.close()
-            connection.close()
 
-def get_fb_revenue_by_meal_type():
+FB_REVENUE_BY_MEAL_SCHEMA = ResultSchema(
+    Column('meal_type'),
+    Column('total_charges', int),
+    Column('total_revenue', float),
+    Column('avg_charge_amount', float),
+    Column('unique_customers', int),
+    Column('percentage_of_total_fb', float)
+)
+
+def fetch_fb_revenue_by_meal_type(cursor, filters=NO_FILTERS):
+    where, params = filters.charges('c')
+    total_where, total_params = filters.charges('c2')
+    cursor.execute(metric_queries.fb_revenue_by_meal_query(where, total_where), total_params + params)
+    return FB_REVENUE_BY_MEAL_SCHEMA.fetchall(cursor)
+
+@metric_cache.cached(ttl=300)
+def get_fb_revenue_by_meal_type(filters=NO_FILTERS):
     """Get F&B revenue by meal type"""
-    connection = get_db_connection()
-    if not connection:
-        return []
-    
     try:
-        cursor = connection.cursor()
-        query = """
-            SELECT 
-                mc.meal_type,
-                COUNT(mc.meal_charge_id) AS total_charges,
-                SUM(c.amount) AS total_revenue,
-                AVG(c.amount) AS avg_charge_amount,
-                COUNT(DISTINCT c.billed_party_id) AS unique_customers,
-                SUM(c.amount) * 100.0 / (
-                    SELECT SUM(amount) 
-                    FROM Charges c2
-                    JOIN MealCharges mc2 ON c2.charge_id = mc2.charge_id
-                    WHERE c2.charge_status IN ('billed', 'paid')
-                ) AS percentage_of_total_fb
-            FROM MealCharges mc
-            JOIN Charges c ON mc.charge_id = c.charge_id
-            WHERE c.charge_status IN ('billed', 'paid')
-            GROUP BY mc.meal_type
-            ORDER BY total_revenue DESC
-        """
-        cursor.execute(query)
-        results = cursor.fetchall()
-        
-        results = [dict(row) for row in results]
-        
-        for row in results:
-            row['total_charges'] = int(row['total_charges']) if row['total_charges'] else 0
-            row['total_revenue'] = float(row['total_revenue']) if row['total_revenue'] else 0.0
-            row['avg_charge_amount'] = float(row['avg_charge_amount']) if row['avg_charge_amount'] else 0.0
-            row['unique_customers'] = int(row['unique_customers']) if row['unique_customers'] else 0
-            row['percentage_of_total_fb'] = float(row['percentage_of_total_fb']) if row['percentage_of_total_fb'] else 0.0
-        
-        return results
+        with db_cursor() as cursor:
+            return fetch_fb_revenue_by_meal_type(cursor, filters)
     except sqlite3.Error as e:
         print(f"Error executing F&B revenue by meal type query: {e}")
         return []
-    finally:
-        if connection:
-            cursor.close()
-            connection.close()
-
-def get_summary_stats():
-    total_revenue = get_total_revenue()
-    quarterly_revenue = get_quarterly_revenue()
-    occupancy_daily = get_occupancy_rate_daily()
-    occupancy_monthly = get_occupancy_rate_monthly()
-    top_customers = get_top_customers()
-    high_risk_customers = get_high_risk_customers()
-    event_count_by_month = get_event_count_by_month()
-    average_attendance = get_average_attendance()
-    avg_fb_spend = get_avg_fb_spend_per_guest()
-    fb_revenue_by_meal = get_fb_revenue_by_meal_type()
-    
-    avg_occupancy_monthly = sum(row['occupancy_rate'] for row in occupancy_monthly) / len(occupancy_monthly) if occupancy_monthly else 0
-    
-    connection = get_db_connection()
-    unique_customers_count = 0
-    if connection:
+
+def fetch_unique_customers_count(cursor, filters=NO_FILTERS):
+    where, params = filters.reservations('res')
+    cursor.execute(f"""
+        SELECT COUNT(DISTINCT res.billed_party_id)
+        FROM Reservations res
+        WHERE res.reservation_status IN ('confirmed', 'checked_in', 'checked_out') AND {where}
+    """, params)
+    return cursor.fetchone()[0] or 0
+
+def fetch_charge_metrics(cursor, filters=NO_FILTERS):
+    """Compute total/quarterly revenue and both F&B metrics with one scan of Charges and one of MealCharges.
+
+    Billed and paid charges are summed per status and month (folded into
+    quarters here); the F&B figures come from MealCharges joined to its
+    charges, per meal type plus an overall row, since distinct customers and
+    meal charges do not add up across meal types.
+    """
+    where, params = filters.charges('c')
+    cursor.execute(f"""
+        SELECT
+            c.charge_status,
+            strftime('%Y-%m', c.charge_date) AS month,
+            SUM(c.amount) AS amount
+        FROM Charges c
+        WHERE c.charge_status IN ('billed', 'paid') AND {where}
+        GROUP BY c.charge_status, month
+    """, params)
+
+    total_revenue = 0.0
+    quarters = {}
+    for row in cursor.fetchall():
+        amount = row['amount'] or 0.0
+        total_revenue += amount
+        if row['charge_status'] == 'paid':
+            month = row['month']
+            key = (int(month[:4]), (int(month[5:7]) - 1) // 3 + 1) if month else (None, None)
+            quarters[key] = quarters.get(key, 0.0) + amount
+
+    fb_charges = f"""
+        FROM MealCharges mc
+        JOIN Charges c ON mc.charge_id = c.charge_id
+        WHERE c.charge_status IN ('billed', 'paid') AND {where}
+    """
+    cursor.execute(f"""
+        SELECT
+            0 AS is_total,
+            mc.meal_type,
+            COUNT(mc.meal_charge_id) AS meal_charges,
+            COUNT(c.amount) AS amounts,
+            SUM(c.amount) AS amount,
+            COUNT(DISTINCT c.billed_party_id) AS parties
+        {fb_charges}
+        GROUP BY mc.meal_type
+        UNION ALL
+        SELECT 1, NULL, COUNT(DISTINCT mc.meal_charge_id), COUNT(c.amount), 0.0, COUNT(DISTINCT c.billed_party_id)
+        {fb_charges}
+    """, params + params)
+
+    meals = {}
+    fb_parties = fb_meal_charges = fb_amounts = 0
+    for row in cursor.fetchall():
+        if row['is_total']:
+            fb_parties, fb_meal_charges, fb_amounts = row['parties'], row['meal_charges'], row['amounts']
+        else:
+            meals[row['meal_type']] = {'total_charges': row['meal_charges'], 'total_revenue': row['amount'] or 0.0,
+                                       'amounts': row['amounts'], 'parties': row['parties']}
+    fb_revenue = sum(meal['total_revenue'] for meal in meals.values())
+
+    decode_quarter = QUARTERLY_REVENUE_SCHEMA.decoder(('revenue_year', 'revenue_quarter', 'total_revenue'))
+    quarterly_revenue = [decode_quarter((year, quarter, quarters[(year, quarter)]))
+                         for year, quarter in sorted(quarters, key=lambda key: (key[0] is not None, key[0] or 0, key[1] or 0))]
+
+    fb_revenue_by_meal = [{
+        'meal_type': meal_type,
+        'total_charges': meal['total_charges'],
+        'total_revenue': meal['total_revenue'],
+        'avg_charge_amount': meal['total_revenue'] / meal['amounts'] if meal['amounts'] else 0.0,
+        'unique_customers': meal['parties'],
+        'percentage_of_total_fb': meal['total_revenue'] * 100.0 / fb_revenue if fb_revenue else 0.0
+    } for meal_type, meal in meals.items()]
+    fb_revenue_by_meal.sort(key=lambda row: row['total_revenue'], reverse=True)
+
+    avg_fb_spend = {
+        'total_guests_with_fb': fb_parties,
+        'total_meal_charges': fb_meal_charges,
+        'total_fb_revenue': fb_revenue,
+        'avg_fb_spend_per_charge': fb_revenue / fb_amounts if fb_amounts else 0.0,
+        'avg_fb_spend_per_guest': fb_revenue / fb_parties if fb_parties else 0.0
+    }
+
+    return total_revenue, quarterly_revenue, avg_fb_spend, fb_revenue_by_meal
+
+def fetch_occupancy_metrics(cursor, filters=NO_FILTERS):
+    """Compute daily and monthly occupancy from one sweep of RoomAssignments."""
+    series = compute_filtered_occupancy(cursor, filters, ('day', 'month'))
+    return latest_days(series['day'], filters), series['month']
+
+# Independent pieces of the dashboard summary: (task name, stats keys it fills,
+# fetch helper, timeout in seconds). Each task runs on its own pooled
+# connection so the page costs roughly the slowest query, not the sum.
+SUMMARY_TASKS = [
+    ('charges', ('total_revenue', 'quarterly_revenue', 'avg_fb_spend', 'fb_revenue_by_meal'), fetch_charge_metrics, 2.0),
+    ('occupancy', ('occupancy_daily', 'occupancy_monthly'), fetch_occupancy_metrics, 2.0),
+    ('top_customers', ('top_customers',), fetch_top_customers, 2.0),
+    ('high_risk_customers', ('high_risk_customers',), fetch_high_risk_customers, 2.0),
+    ('event_count_by_month', ('event_count_by_month',), fetch_event_count_by_month, 2.0),
+    ('average_attendance', ('average_attendance',), fetch_average_attendance, 3.0),
+    ('unique_customers_count', ('unique_customers_count',), fetch_unique_customers_count, 2.0),
+]
+
+SUMMARY_DEFAULTS = {
+    'total_revenue': 0.0,
+    'quarterly_revenue': [],
+    'occupancy_daily': [],
+    'occupancy_monthly': [],
+    'top_customers': [],
+    'high_risk_customers': [],
+    'event_count_by_month': [],
+    'average_attendance': {},
+    'avg_fb_spend': {},
+    'fb_revenue_by_meal': [],
+    'unique_customers_count': 0
+}
+
+summary_parallel = os.getenv('SUMMARY_PARALLEL', '1') != '0'
+summary_timeout_scale = float(os.getenv('SUMMARY_TIMEOUT_SCALE', '1.0'))
+summary_executor = ThreadPoolExecutor(max_workers=int(os.getenv('SUMMARY_WORKERS', str(len(SUMMARY_TASKS)))),
+                                      thread_name_prefix='summary')
+summary_queue_timeout = float(os.getenv('SUMMARY_QUEUE_TIMEOUT', '10'))  # seconds a task may wait for a worker
+summary_last_good = OrderedDict()  # filters -> {stats key: last value computed without error}, least recent first
+summary_last_good_size = int(os.getenv('SUMMARY_LAST_GOOD_SIZE', '32'))
+summary_last_good_lock = threading.Lock()
+
+def last_good_values(filters):
+    with summary_last_good_lock:
+        values = summary_last_good.get(filters)
+        if values is None:
+            return {}
+        summary_last_good.move_to_end(filters)
+        return dict(values)
+
+def remember_good_values(filters, values):
+    """Keep the values as the fallback for these filters, for the most recently used filter sets only."""
+    with summary_last_good_lock:
+        summary_last_good.setdefault(filters, {}).update(values)
+        summary_last_good.move_to_end(filters)
+        while len(summary_last_good) > summary_last_good_size:
+            summary_last_good.popitem(last=False)
+
+def columnar_rows(schema, result):
+    names, rows = result
+    return list(map(schema.decoder(names), rows))
+
+def columnar_charge_metrics(snapshot):
+    total_revenue, quarters, avg_fb_spend, fb_revenue_by_meal = columnar.charge_metrics(snapshot)
+    decode_quarter = QUARTERLY_REVENUE_SCHEMA.decoder(('revenue_year', 'revenue_quarter', 'total_revenue'))
+    return total_revenue, list(map(decode_quarter, quarters)), avg_fb_spend, fb_revenue_by_meal
+
+def columnar_occupancy_metrics(snapshot):
+    series = columnar.occupancy_series(snapshot, ('day', 'month'))
+    return latest_days(series['day'], NO_FILTERS), series['month']
+
+def columnar_top_customers(snapshot):
+    return (columnar_rows(TOP_CUSTOMERS_SCHEMA, columnar.top_customers(snapshot, 20)),)
+
+def columnar_high_risk_customers(snapshot):
+    return (columnar_rows(HIGH_RISK_CUSTOMERS_SCHEMA, columnar.high_risk_customers(snapshot, 50)),)
+
+def columnar_event_count_by_month(snapshot):
+    return (columnar_rows(EVENT_COUNT_BY_MONTH_SCHEMA, columnar.event_count_by_month(snapshot)),)
+
+def columnar_average_attendance(snapshot):
+    names, row = columnar.average_attendance(snapshot)
+    return (AVERAGE_ATTENDANCE_SCHEMA.decoder(names)(row),)
+
+def columnar_unique_customers_count(snapshot):
+    return (columnar.unique_customers_count(snapshot),)
+
+# SUMMARY_TASKS name -> the same values computed from a columnar snapshot (unfiltered only).
+COLUMNAR_TASKS = {
+    'charges': columnar_charge_metrics,
+    'occupancy': columnar_occupancy_metrics,
+    'top_customers': columnar_top_customers,
+    'high_risk_customers': columnar_high_risk_customers,
+    'event_count_by_month': columnar_event_count_by_month,
+    'average_attendance': columnar_average_attendance,
+    'unique_customers_count': columnar_unique_customers_count,
+}
+if risk_weights != risk_scoring.DEFAULT_WEIGHTS:
+    # The columnar engine only knows the default risk weights.
+    del COLUMNAR_TASKS['high_risk_customers']
+
+def create_columnar_engine():
+    """ColumnarEngine when ANALYTICS_ENGINE=columnar (and NumPy is installed), else None."""
+    if os.getenv('ANALYTICS_ENGINE', 'sql') != 'columnar':
+        return None
+    if columnar.np is None:
+        print("ANALYTICS_ENGINE=columnar needs NumPy; using SQL")
+        return None
+    directory = os.getenv('COLUMNAR_SNAPSHOT_DIR', 'columnar_snapshot')
+    os.makedirs(directory, exist_ok=True)
+    get_db_pool()  # prepares the database, so the first snapshot is already named by the change counters
+    return columnar.ColumnarEngine(get_db_path(), directory, version=change_probe.watching(columnar.SOURCE_TABLES),
+                                   on_rebuild=metric_cache.invalidate)
+
+columnar_engine = create_columnar_engine()
+
+def run_summary_task(name, fetch, running, filters=NO_FILTERS):
+    running['started_at'] = time.monotonic()
+    running['started'].set()
+    if columnar_engine is not None and not filters and name in COLUMNAR_TASKS:
         try:
-            cursor = connection.cursor()
-            cursor.execute("""
-                SELECT COUNT(DISTINCT billed_party_id) 
-                FROM Reservations 
-                WHERE reservation_status IN ('confirmed', 'checked_in', 'checked_out')
-            """)
-            unique_customers_count = cursor.fetchone()[0] or 0
-            cursor.close()
-        except:
-            unique_customers_count = len(top_customers) if top_customers else 0
+            return COLUMNAR_TASKS[name](columnar_engine.snapshot())
+        except (OSError, ValueError, sqlite3.Error) as e:
+            print(f"Error computing {name} from the columnar snapshot: {e}")
+    with db_cursor() as cursor:
+        with running['lock']:
+            running['connection'] = cursor.connection
+        try:
+            result = fetch(cursor, filters=filters)
         finally:
-            connection.close()
-    else:
-        unique_customers_count = len(top_customers) if top_customers else 0
-    
-    return {
-        'total_revenue': total_revenue,
-        'quarterly_revenue': quarterly_revenue,
-        'occupancy_daily': occupancy_daily,
-        'occupancy_monthly': occupancy_monthly,
-        'top_customers': top_customers,
-        'high_risk_customers': high_risk_customers,
-        'event_count_by_month': event_count_by_month,
-        'average_attendance': average_attendance,
-        'avg_fb_spend': avg_fb_spend,
-        'fb_revenue_by_meal': fb_revenue_by_meal,
-        'avg_occupancy_monthly': avg_occupancy_monthly,
-        'unique_customers_count': unique_customers_count
-    }
+            # Cleared before the connection goes back to the pool, so a late timeout cannot interrupt its next query.
+            with running['lock']:
+                running['connection'] = None
+    return result if isinstance(result, tuple) else (result,)
+
+def wait_for_task(future, running, timeout):
+    """future.result(), with the timeout counted from when the task started rather than from when it was queued.
+
+    A task still queued after SUMMARY_QUEUE_TIMEOUT seconds times out too.
+    """
+    if not running['started'].wait(summary_queue_timeout):
+        raise FuturesTimeoutError()
+    return future.result(timeout=max(running['started_at'] + timeout - time.monotonic(), 0))
+
+def collect_summary(filters, tasks):
+    """Run summary tasks concurrently; return ({stats key: value}, {stats key: 'stale' | 'unavailable'}).
+
+    A task that fails or misses its timeout is interrupted; its keys fall back
+    to the last good value (marked 'stale') or are left out (marked
+    'unavailable').
+    """
+    values, metric_status = {}, {}
+    submitted = []
+    for name, keys, fetch, timeout in tasks:
+        running = {'started': threading.Event(), 'lock': threading.Lock()}
+        if summary_parallel:
+            # Run in a copy of this context so the task's queries are attributed to the route.
+            future = summary_executor.submit(contextvars.copy_context().run, run_summary_task, name, fetch, running, filters)
+        else:
+            future = Future()
+            try:
+                future.set_result(run_summary_task(name, fetch, running, filters))
+            except sqlite3.Error as e:
+                future.set_exception(e)
+        submitted.append((name, keys, future, running, timeout * summary_timeout_scale))
+
+    last_good, good = None, {}
+    for name, keys, future, running, timeout in submitted:
+        try:
+            task_values = wait_for_task(future, running, timeout)
+        except (sqlite3.Error, FuturesTimeoutError) as e:
+            if isinstance(e, FuturesTimeoutError):
+                print(f"Summary metric {name} timed out")
+                if not future.cancel():
+                    with running['lock']:
+                        if running.get('connection') is not None:
+                            running['connection'].interrupt()
+            else:
+                print(f"Error executing {name} summary query: {e}")
+            if last_good is None:
+                last_good = last_good_values(filters)
+            for key in keys:
+                if key in last_good:
+                    values[key] = last_good[key]
+                    metric_status[key] = 'stale'
+                else:
+                    metric_status[key] = 'unavailable'
+            continue
+        for key, value in zip(keys, task_values):
+            values[key] = good[key] = value
+    if good:
+        remember_good_values(filters, good)
+    return values, metric_status
+
+def assemble_summary(filters, values, metric_status, versions=None):
+    """Fill defaults and derived stats around the task values; versions may supply known fingerprints."""
+    stats = dict(SUMMARY_DEFAULTS)
+    stats.update(values)
+    stats['metric_status'] = metric_status
+
+    if metric_status.get('unique_customers_count') == 'unavailable':
+        stats['unique_customers_count'] = len(stats['top_customers'])
+
+    occupancy_monthly = stats['occupancy_monthly']
+    stats['avg_occupancy_monthly'] = sum(row['occupancy_rate'] for row in occupancy_monthly) / len(occupancy_monthly) if occupancy_monthly else 0
+
+    # Template fragments are cached per version, so a card is re-rendered only when its data changes.
+    versions = versions or {}
+    stats['metric_versions'] = {key: versions.get(key) or fragment_cache.fingerprint(filters, value)
+                                for key, value in stats.items() if key != 'metric_status'}
+    return stats
+
+@metric_cache.cached(ttl=60)
+def get_summary_stats(filters=NO_FILTERS):
+    """Compute every dashboard metric, running the independent queries concurrently.
+
+    Cards whose task fails or times out are marked in stats['metric_status']
+    (see collect_summary()).
+    """
+    values, metric_status = collect_summary(filters, SUMMARY_TASKS)
+    return assemble_summary(filters, values, metric_status)
+
+# Seconds between background recomputes of each SUMMARY_TASKS entry.
+PRECOMPUTE_INTERVALS = {
+    'charges': 60,
+    'occupancy': 300,
+    'top_customers': 3600,
+    'high_risk_customers': 3600,
+    'unique_customers_count': 3600,
+    'event_count_by_month': 86400,
+    'average_attendance': 86400,
+}
+
+precompute_enabled = os.getenv('PRECOMPUTE_ENABLED', '1') != '0'
+summary_snapshots = SnapshotStore()
+
+def precompute_summary_task(name, keys, fetch):
+    current_route.set(f'<precompute {name}>')
+    values = run_summary_task(name, fetch, {'started': threading.Event(), 'lock': threading.Lock()}, NO_FILTERS)
+    for key, value in zip(keys, values):
+        summary_snapshots.put(key, value, fragment_cache.fingerprint(NO_FILTERS, value))
+
+precompute_scheduler = Scheduler(
+    [Job(name, partial(precompute_summary_task, name, keys, fetch), PRECOMPUTE_INTERVALS[name])
+     for name, keys, fetch, _ in SUMMARY_TASKS],
+    workers=int(os.getenv('PRECOMPUTE_WORKERS', '2')))
+atexit.register(precompute_scheduler.stop)
+snapshot_stats = (None, None)  # (snapshot identity, assembled stats) for the last snapshot read
+
+def get_snapshot_summary_stats():
+    """Unfiltered summary stats from the precomputed snapshots.
+
+    A task with no snapshot yet (just after startup) is computed on the
+    request path; a job that has missed two runs marks its cards 'stale'.
+    """
+    global snapshot_stats
+    values, versions, metric_status, identity = {}, {}, {}, []
+    missing = []
+    for task in SUMMARY_TASKS:
+        name, keys = task[0], task[1]
+        taken = [summary_snapshots.get(key) for key in keys]
+        if any(snapshot is None for snapshot in taken):
+            missing.append(task)
+            continue
+        overdue = precompute_scheduler.jobs[name].overdue()
+        for key, snapshot in zip(keys, taken):
+            values[key] = snapshot.value
+            versions[key] = snapshot.version
+            if overdue:
+                metric_status[key] = 'stale'
+            identity.append(snapshot.version)
+    if missing:
+        live_values, live_status = collect_summary(NO_FILTERS, missing)
+        values.update(live_values)
+        metric_status.update(live_status)
+        return assemble_summary(NO_FILTERS, values, metric_status, versions)
+
+    identity = (tuple(identity), tuple(sorted(metric_status.items())))
+    cached_identity, stats = snapshot_stats
+    if cached_identity != identity:
+        stats = assemble_summary(NO_FILTERS, values, metric_status, versions)
+        snapshot_stats = (identity, stats)
+    return stats
+
+def get_dashboard_stats(filters=NO_FILTERS):
+    """Summary stats for a page: precomputed snapshots when unfiltered, otherwise computed (and cached)."""
+    if not precompute_enabled or filters:
+        return get_summary_stats(filters)
+    precompute_scheduler.start()
+    return get_snapshot_summary_stats()
+
+get_dashboard_stats.ttl = get_summary_stats.ttl  # how long get_api_payload() may reuse a summary body
+
+def request_filters():
+    """MetricFilters for the current request's start/end/building_id/wing_id arguments."""
+    try:
+        return parse_filters(request.args)
+    except FilterError as e:
+        abort(400, description=str(e))
+
+@app.context_processor
+def inject_filter_args():
+    """Let templates carry the active filters over to the links they render."""
+    try:
+        return {'filter_args': parse_filters(request.args).query_args()}
+    except FilterError:
+        return {'filter_args': {}}
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    current_route.set(request.url_rule.rule if request.url_rule else '<unmatched>')
+
+@app.after_request
+def record_request_latency(response):
+    """Observe the request once the response is closed, so streamed exports count in full."""
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else '<unmatched>'
+        method, status = request.method, response.status_code
+        response.call_on_close(lambda: query_profiler.observe_request(route, method, status, time.perf_counter() - started))
+    return response
+
+def debug_queries():
+    """Most recent queries, newest first; ?slow=1 keeps only the slow ones, ?limit=N caps the list."""
+    limit = request.args.get('limit', type=int)
+    slow_only = request.args.get('slow') == '1'
+    return jsonify({
+        'profiling': query_profiling,
+        'slow_query_ms': query_profiler.slow_seconds * 1000,
+        'vm_step_interval': query_profiler.step_interval,
+        'queries': query_profiler.recent(limit, slow_only)
+    })
+
+def register_debug_routes():
+    """/debug/queries shows SQL text and bound parameters, so it is only served in debug mode or with DEBUG_QUERIES=1."""
+    if 'debug_queries' not in app.view_functions:
+        app.add_url_rule('/debug/queries', view_func=debug_queries)
+
+if app.debug or os.getenv('DEBUG_QUERIES', '0') != '0':
+    register_debug_routes()
+
+@app.route('/metrics')
+def prometheus_metrics():
+    lines = query_profiler.render()
+    cache_stats = metric_cache.stats()
+    lines += render_samples('hotel_metric_cache_events_total', 'Metric cache lookups by outcome', 'counter',
+                            ('metric', 'event'),
+                            [((name, event), counters[event]) for name, counters in sorted(cache_stats['metrics'].items())
+                             for event in ('hits', 'misses', 'stale', 'evictions')])
+    lines += render_samples('hotel_metric_cache_entries', 'Entries held by the metric cache', 'gauge',
+                            (), [((), cache_stats['entries'])])
+    pool_stats = get_db_pool().stats()
+    lines += render_samples('hotel_db_pool_connections', 'Pooled SQLite connections', 'gauge', ('state',),
+                            [(('opened',), pool_stats['opened']), (('idle',), pool_stats['idle'])])
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+@app.route('/precompute/status')
+def precompute_status():
+    jobs = precompute_scheduler.status()
+    for job, (name, keys, _, _) in zip(jobs, SUMMARY_TASKS):
+        job['snapshots'] = []
+        for key in keys:
+            snapshot = summary_snapshots.get(key)
+            job['snapshots'].append({
+                'key': key,
+                'computed_at': snapshot.computed_at.isoformat(timespec='seconds') if snapshot else None,
+                'age_seconds': round(snapshot.age(), 1) if snapshot else None
+            })
+    return render_template('precompute_status.html', enabled=precompute_enabled,
+                           started=precompute_scheduler.started, jobs=jobs)
+
+@app.route('/cache/stats')
+def cache_stats():
+    stats = dict(metric_cache.stats(), fragments=template_fragments.stats())
+    if columnar_engine is not None:
+        stats['columnar'] = columnar_engine.status()
+    if risk_index is not None:
+        stats['risk_index'] = risk_index.status()
+    stats['availability_index'] = availability_index.status()
+    stats['billing_reconciler'] = billing_reconciler.status()
+    stats['presence_index'] = presence_index.status()
+    if swipe_writer is not None:
+        stats['swipe_writer'] = swipe_writer.status()
+    return jsonify(stats)
 
 @app.route('/')
 def summary():
-    stats = get_summary_stats()
+    filters = request_filters()
+    stats = get_dashboard_stats(filters)
     return render_template('summary.html', **stats)
 
 @app.route('/dashboard')
 def dashboard():
-    stats = get_summary_stats()
+    filters = request_filters()
+    stats = get_dashboard_stats(filters)
     return render_template('index.html', **stats)
 
 @app.route('/revenue/total')
 def total_revenue_detail():
-    total_revenue = get_total_revenue()
-    quarterly_revenue = get_quarterly_revenue()
+    filters = request_filters()
+    total_revenue = get_total_revenue(filters)
+    quarterly_revenue = get_quarterly_revenue(filters)
     
     return render_template('metric_detail.html',
         metric_title='Total Revenue',
@@ -533,7 +1107,8 @@ def total_revenue_detail():
 
 @app.route('/revenue/quarterly')
 def quarterly_revenue_detail():
-    quarterly_revenue = get_quarterly_revenue()
+    filters = request_filters()
+    quarterly_revenue = get_quarterly_revenue(filters)
     total_revenue = sum(row['total_revenue'] for row in quarterly_revenue) if quarterly_revenue else 0
     
     return render_template('metric_detail.html',
@@ -562,9 +1137,105 @@ def quarterly_revenue_detail():
         table_headers=['Year', 'Quarter', 'Total Revenue']
     )
 
+@app.route('/revenue/weekly')
+def revenue_weekly_detail():
+    filters = request_filters()
+    revenue_weekly = get_revenue_weekly(filters)
+    total_revenue = sum(row['total_revenue'] for row in revenue_weekly)
+
+    return render_template('metric_detail.html',
+        metric_title='Weekly Revenue',
+        metric_icon='fas fa-calendar-week',
+        metric_description='Billed and paid revenue per ISO week (weeks start on Monday)',
+        summary_card={
+            'title': 'Average Weekly Revenue',
+            'value': f'${total_revenue / len(revenue_weekly) if revenue_weekly else 0:,.2f}',
+            'subtitle': f'{len(revenue_weekly)} weeks tracked',
+            'icon': 'fas fa-dollar-sign',
+            'color': 'bg-primary'
+        },
+        chart_data=[row['total_revenue'] for row in revenue_weekly],
+        chart_labels=[row['week'] for row in revenue_weekly],
+        chart_type='line',
+        chart_title='Weekly Revenue Trend',
+        chart_icon='fas fa-chart-line',
+        chart_dataset_label='Revenue ($)',
+        chart_border_color='rgba(54, 162, 235, 1)',
+        chart_bg_color='rgba(54, 162, 235, 0.2)',
+        chart_legend_position='top',
+        chart_y_format='currency',
+        table_data=revenue_weekly,
+        table_title='Weekly Revenue Data',
+        table_headers=['Week Of', 'Total Revenue', 'Days', 'Avg Daily Revenue']
+    )
+
+@app.route('/revenue/day-of-week')
+def revenue_by_day_of_week_detail():
+    filters = request_filters()
+    revenue_by_day = get_revenue_by_day_of_week(filters)
+    best_day = max(revenue_by_day, key=lambda row: row['avg_daily_revenue']) if revenue_by_day else None
+
+    return render_template('metric_detail.html',
+        metric_title='Revenue by Day of Week',
+        metric_icon='fas fa-calendar-day',
+        metric_description='Average billed and paid revenue per calendar day, by weekday',
+        summary_card={
+            'title': 'Strongest Day',
+            'value': best_day['day_name'] if best_day else 'N/A',
+            'subtitle': f"${best_day['avg_daily_revenue']:,.2f} per day on average" if best_day else '',
+            'icon': 'fas fa-calendar-day',
+            'color': 'bg-info'
+        },
+        chart_data=[row['avg_daily_revenue'] for row in revenue_by_day],
+        chart_labels=[row['day_name'] for row in revenue_by_day],
+        chart_type='bar',
+        chart_title='Average Daily Revenue by Weekday',
+        chart_icon='fas fa-chart-bar',
+        chart_dataset_label='Avg Daily Revenue ($)',
+        chart_bg_color='rgba(54, 162, 235, 0.8)',
+        chart_border_color='rgba(54, 162, 235, 1)',
+        chart_legend_position='top',
+        chart_y_format='currency',
+        table_data=revenue_by_day,
+        table_title='Revenue by Day of Week',
+        table_headers=['Day', 'Total Revenue', 'Days', 'Avg Daily Revenue']
+    )
+
+@app.route('/revenue/holidays')
+def revenue_by_day_type_detail():
+    filters = request_filters()
+    revenue_by_day_type = get_revenue_by_day_type(filters)
+
+    return render_template('metric_detail.html',
+        metric_title='Revenue by Day Type',
+        metric_icon='fas fa-gifts',
+        metric_description='Average daily revenue on holidays, in the holiday season (Thanksgiving to New Year), on weekends and on weekdays',
+        summary_card={
+            'title': 'Holiday Season Revenue',
+            'value': f"${sum(row['total_revenue'] for row in revenue_by_day_type if row['day_type'] in ('holiday', 'holiday_season')):,.2f}",
+            'subtitle': 'Holidays and holiday season combined',
+            'icon': 'fas fa-gifts',
+            'color': 'bg-danger'
+        },
+        chart_data=[row['avg_daily_revenue'] for row in revenue_by_day_type],
+        chart_labels=[row['day_type'].replace('_', ' ').title() for row in revenue_by_day_type],
+        chart_type='bar',
+        chart_title='Average Daily Revenue by Day Type',
+        chart_icon='fas fa-chart-bar',
+        chart_dataset_label='Avg Daily Revenue ($)',
+        chart_bg_color='rgba(220, 53, 69, 0.8)',
+        chart_border_color='rgba(220, 53, 69, 1)',
+        chart_legend_position='top',
+        chart_y_format='currency',
+        table_data=revenue_by_day_type,
+        table_title='Revenue by Day Type',
+        table_headers=['Day Type', 'Total Revenue', 'Days', 'Avg Daily Revenue']
+    )
+
 @app.route('/occupancy/daily')
 def occupancy_daily_detail():
-    occupancy_daily = get_occupancy_rate_daily()
+    filters = request_filters()
+    occupancy_daily = get_occupancy_rate_daily(filters)
     avg_occupancy = sum(row['occupancy_rate'] for row in occupancy_daily) / len(occupancy_daily) if occupancy_daily else 0
     
     return render_template('metric_detail.html',
@@ -591,12 +1262,46 @@ def occupancy_daily_detail():
         chart_max=100,
         table_data=occupancy_daily,
         table_title='Daily Occupancy Data',
-        table_headers=['Date', 'Occupancy Rate (%)', 'Total Stays', 'Rooms Occupied']
+        table_headers=['Date', 'Occupancy Rate (%)', 'Check-ins', 'Rooms Occupied', 'Room-Nights']
+    )
+
+@app.route('/occupancy/weekly')
+def occupancy_weekly_detail():
+    filters = request_filters()
+    occupancy_weekly = get_occupancy_rate_weekly(filters)
+    avg_occupancy = sum(row['occupancy_rate'] for row in occupancy_weekly) / len(occupancy_weekly) if occupancy_weekly else 0
+
+    return render_template('metric_detail.html',
+        metric_title='Weekly Occupancy Rate',
+        metric_icon='fas fa-calendar-week',
+        metric_description='Weekly room occupancy trends (weeks start on Monday)',
+        summary_card={
+            'title': 'Average Weekly Occupancy',
+            'value': f'{avg_occupancy:.1f}%',
+            'subtitle': f'{len(occupancy_weekly)} weeks tracked',
+            'icon': 'fas fa-bed',
+            'color': 'bg-success'
+        },
+        chart_data=[row['occupancy_rate'] for row in occupancy_weekly],
+        chart_labels=[row['week'] for row in occupancy_weekly],
+        chart_type='line',
+        chart_title='Weekly Occupancy Rate Trend',
+        chart_icon='fas fa-chart-line',
+        chart_dataset_label='Occupancy Rate (%)',
+        chart_border_color='rgb(75, 192, 192)',
+        chart_bg_color='rgba(75, 192, 192, 0.2)',
+        chart_legend_position='top',
+        chart_y_format='percentage',
+        chart_max=100,
+        table_data=occupancy_weekly,
+        table_title='Weekly Occupancy Data',
+        table_headers=['Week Of', 'Occupancy Rate (%)', 'Check-ins', 'Rooms Occupied', 'Room-Nights']
     )
 
 @app.route('/occupancy/monthly')
 def occupancy_monthly_detail():
-    occupancy_monthly = get_occupancy_rate_monthly()
+    filters = request_filters()
+    occupancy_monthly = get_occupancy_rate_monthly(filters)
     avg_occupancy = sum(row['occupancy_rate'] for row in occupancy_monthly) / len(occupancy_monthly) if occupancy_monthly else 0
     
     return render_template('metric_detail.html',
@@ -623,12 +1328,81 @@ def occupancy_monthly_detail():
         chart_max=100,
         table_data=occupancy_monthly,
         table_title='Monthly Occupancy Data',
-        table_headers=['Month', 'Occupancy Rate (%)', 'Total Stays', 'Rooms Occupied']
+        table_headers=['Month', 'Occupancy Rate (%)', 'Check-ins', 'Rooms Occupied', 'Room-Nights']
+    )
+
+@app.route('/occupancy/day-of-week')
+def occupancy_by_day_of_week_detail():
+    filters = request_filters()
+    occupancy_by_day = get_occupancy_by_day_of_week(filters)
+    busiest = max(occupancy_by_day, key=lambda row: row['occupancy_rate']) if occupancy_by_day else None
+
+    return render_template('metric_detail.html',
+        metric_title='Occupancy by Day of Week',
+        metric_icon='fas fa-calendar-day',
+        metric_description='Nightly room occupancy by weekday',
+        summary_card={
+            'title': 'Busiest Night',
+            'value': busiest['day_name'] if busiest else 'N/A',
+            'subtitle': f"{busiest['occupancy_rate']:.1f}% occupied" if busiest else '',
+            'icon': 'fas fa-bed',
+            'color': 'bg-success'
+        },
+        chart_data=[row['occupancy_rate'] for row in occupancy_by_day],
+        chart_labels=[row['day_name'] for row in occupancy_by_day],
+        chart_type='bar',
+        chart_title='Occupancy Rate by Weekday',
+        chart_icon='fas fa-chart-bar',
+        chart_dataset_label='Occupancy Rate (%)',
+        chart_bg_color='rgba(75, 192, 192, 0.8)',
+        chart_border_color='rgb(75, 192, 192)',
+        chart_legend_position='top',
+        chart_y_format='percentage',
+        chart_max=100,
+        table_data=occupancy_by_day,
+        table_title='Occupancy by Day of Week',
+        table_headers=['Day', 'Occupancy Rate (%)', 'Nights', 'Check-ins', 'Room-Nights']
+    )
+
+@app.route('/occupancy/holidays')
+def occupancy_by_day_type_detail():
+    filters = request_filters()
+    occupancy_by_day_type = get_occupancy_by_day_type(filters)
+    season = [row for row in occupancy_by_day_type if row['day_type'] in ('holiday', 'holiday_season')]
+    season_nights = sum(row['available_room_nights'] for row in season)
+    season_rate = sum(row['occupied_room_nights'] for row in season) * 100.0 / season_nights if season_nights else 0
+
+    return render_template('metric_detail.html',
+        metric_title='Occupancy by Day Type',
+        metric_icon='fas fa-gifts',
+        metric_description='Nightly room occupancy on holidays, in the holiday season (Thanksgiving to New Year), on weekends and on weekdays',
+        summary_card={
+            'title': 'Holiday Season Occupancy',
+            'value': f'{season_rate:.1f}%',
+            'subtitle': 'Holidays and holiday season combined',
+            'icon': 'fas fa-bed',
+            'color': 'bg-danger'
+        },
+        chart_data=[row['occupancy_rate'] for row in occupancy_by_day_type],
+        chart_labels=[row['day_type'].replace('_', ' ').title() for row in occupancy_by_day_type],
+        chart_type='bar',
+        chart_title='Occupancy Rate by Day Type',
+        chart_icon='fas fa-chart-bar',
+        chart_dataset_label='Occupancy Rate (%)',
+        chart_bg_color='rgba(220, 53, 69, 0.8)',
+        chart_border_color='rgba(220, 53, 69, 1)',
+        chart_legend_position='top',
+        chart_y_format='percentage',
+        chart_max=100,
+        table_data=occupancy_by_day_type,
+        table_title='Occupancy by Day Type',
+        table_headers=['Day Type', 'Occupancy Rate (%)', 'Nights', 'Check-ins', 'Room-Nights']
     )
 
 @app.route('/customers/top')
 def top_customers_detail():
-    top_customers = get_top_customers()
+    filters = request_filters()
+    top_customers = get_top_customers(filters)
     total_revenue = sum(row['total_revenue'] for row in top_customers) if top_customers else 0
     
     return render_template('metric_detail.html',
@@ -649,7 +1423,8 @@ def top_customers_detail():
 
 @app.route('/customers/high-risk')
 def high_risk_customers_detail():
-    high_risk_customers = get_high_risk_customers()
+    filters = request_filters()
+    high_risk_customers = get_high_risk_customers(filters)
     
     return render_template('metric_detail.html',
         metric_title='High-Risk Customer List',
@@ -667,9 +1442,22 @@ def high_risk_customers_detail():
         table_headers=['Customer Name', 'Type', 'Risk Score', 'Payment Score', 'Past History', 'Cooperativeness', 'Flexibility', 'Overall Score', 'Overdue Amount', 'Reservations']
     )
 
+@app.route('/billing/reconciliation')
+def billing_reconciliation_detail():
+    filters = request_filters()
+    issue = request.args.get('issue') or None
+    bucket = request.args.get('bucket') or None
+    if issue is not None and issue not in billing_reconciliation.ISSUE_NAMES:
+        abort(400, description=f"unknown issue {issue!r}")
+    if bucket is not None and bucket not in [name for name, _, _ in billing_reconciliation.AGING_BUCKETS]:
+        abort(400, description=f"unknown aging bucket {bucket!r}")
+    return render_template('billing_reconciliation.html',
+                           reconciliation=get_billing_reconciliation(filters, issue=issue, bucket=bucket))
+
 @app.route('/events/count')
 def event_count_by_month_detail():
-    event_count_by_month = get_event_count_by_month()
+    filters = request_filters()
+    event_count_by_month = get_event_count_by_month(filters)
     total_events = sum(row['total_events'] for row in event_count_by_month) if event_count_by_month else 0
     
     return render_template('metric_detail.html',
@@ -700,7 +1488,8 @@ def event_count_by_month_detail():
 
 @app.route('/events/attendance')
 def average_attendance_detail():
-    average_attendance = get_average_attendance()
+    filters = request_filters()
+    average_attendance = get_average_attendance(filters)
     
     return render_template('metric_detail.html',
         metric_title='Average Event Attendance',
@@ -718,9 +1507,15 @@ def average_attendance_detail():
         table_headers=['Total Events', 'Avg Estimated Attendance', 'Avg Actual Attendance', 'Total Estimated', 'Total Actual']
     )
 
+@app.route('/events/space')
+def event_space_detail():
+    filters = request_filters()
+    return render_template('event_space.html', space=get_event_space_utilization(filters))
+
 @app.route('/food/avg-spend')
 def avg_fb_spend_detail():
-    avg_fb_spend = get_avg_fb_spend_per_guest()
+    filters = request_filters()
+    avg_fb_spend = get_avg_fb_spend_per_guest(filters)
     
     return render_template('metric_detail.html',
         metric_title='Average F&B Spend per Guest',
@@ -740,7 +1535,8 @@ def avg_fb_spend_detail():
 
 @app.route('/food/meal-type')
 def fb_revenue_by_meal_type_detail():
-    fb_revenue_by_meal = get_fb_revenue_by_meal_type()
+    filters = request_filters()
+    fb_revenue_by_meal = get_fb_revenue_by_meal_type(filters)
     total_revenue = sum(row['total_revenue'] for row in fb_revenue_by_meal) if fb_revenue_by_meal else 0
     
     return render_template('metric_detail.html',
@@ -766,5 +1562,203 @@ def fb_revenue_by_meal_type_detail():
         table_headers=['Meal Type', 'Total Revenue', 'Total Charges', 'Avg Charge', 'Unique Customers', '% of Total F&B']
     )
 
+API_METRICS = {
+    'total_revenue': get_total_revenue,
+    'quarterly_revenue': get_quarterly_revenue,
+    'revenue_weekly': get_revenue_weekly,
+    'revenue_by_day_of_week': get_revenue_by_day_of_week,
+    'revenue_by_day_type': get_revenue_by_day_type,
+    'occupancy_daily': get_occupancy_rate_daily,
+    'occupancy_weekly': get_occupancy_rate_weekly,
+    'occupancy_monthly': get_occupancy_rate_monthly,
+    'occupancy_by_day_of_week': get_occupancy_by_day_of_week,
+    'occupancy_by_day_type': get_occupancy_by_day_type,
+    'top_customers': get_top_customers,
+    'high_risk_customers': get_high_risk_customers,
+    'billing_reconciliation': get_billing_reconciliation,
+    'event_count_by_month': get_event_count_by_month,
+    'average_attendance': get_average_attendance,
+    'event_space': get_event_space_utilization,
+    'avg_fb_spend': get_avg_fb_spend_per_guest,
+    'fb_revenue_by_meal': get_fb_revenue_by_meal_type,
+    'summary': get_dashboard_stats
+}
+
+api_max_age = int(os.getenv('API_MAX_AGE', '0'))
+
+def get_api_payload(name, filters=NO_FILTERS):
+    """Return (body, etag) for an API metric, reused until the data version or TTL changes.
+
+    The ETag is a hash of the serialized body, so it is identical across
+    workers and restarts for the same data, and the body is only rebuilt
+    after a write to the database.
+    """
+    metric = API_METRICS[name]
+
+    def build():
+        body = json.dumps({'metric': name, 'filters': filters.query_args(), 'data': metric(filters)},
+                          sort_keys=True, separators=(',', ':'), default=str)
+        return body, hashlib.sha256(body.encode('utf-8')).hexdigest()[:32]
+
+    return metric_cache.get_or_compute('api_payload', ('api_payload', name, filters), metric.ttl, build)
+
+def api_payload_response(body, etag):
+    """JSON response for an API payload, answered with 304 when the client's ETag matches."""
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'public, max-age={api_max_age}, must-revalidate'
+    return response.make_conditional(request)
+
+@app.route('/api/v1/metrics')
+def api_metrics_index():
+    return jsonify({'metrics': sorted(API_METRICS)})
+
+@app.route('/api/v1/metrics/<name>')
+def api_metric(name):
+    if name not in API_METRICS:
+        return jsonify({'error': f'unknown metric {name!r}', 'metrics': sorted(API_METRICS)}), 404
+    try:
+        filters = parse_filters(request.args)
+    except FilterError as e:
+        return jsonify({'error': str(e)}), 400
+    body, etag = get_api_payload(name, filters)
+    return api_payload_response(body, etag)
+
+# Bookings from today on, rebuilt after every write to the tables it is built from.
+availability_index = room_availability.AvailabilityIndex(
+    horizon=date.today, version=change_probe.watching(room_availability.SOURCE_TABLES))
+
+@app.route('/api/v1/availability')
+def api_availability():
+    """Best free rooms for check_in..check_out and a requirement (guests, bed_type, smoking, location, room_type)."""
+    try:
+        requirement = room_availability.requirement_from_args(request.args)
+        limit = int(request.args.get('limit', 10))
+        with db_cursor() as cursor:
+            rows = availability_index.search(cursor, requirement, request.args['check_in'],
+                                             request.args['check_out'], limit)
+    except KeyError as e:
+        return jsonify({'error': f'missing {e.args[0]}'}), 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except sqlite3.Error as e:
+        print(f"Error searching room availability: {e}")
+        return jsonify({'error': 'availability search failed'}), 503
+    return jsonify({'requirement': requirement._asdict(), 'check_in': request.args['check_in'],
+                    'check_out': request.args['check_out'],
+                    'rooms': [dict(zip(room_availability.COLUMNS, row)) for row in rows]})
+
+@app.route('/api/v1/availability/block')
+def api_availability_block():
+    """Proposed rooms for a group block, ?reservations=1,2,3; nothing is written."""
+    try:
+        reservation_ids = [int(value) for value in request.args.get('reservations', '').split(',') if value]
+        if not reservation_ids:
+            raise ValueError('reservations is required, e.g. ?reservations=101,102')
+        with db_cursor() as cursor:
+            requests = room_availability.block_requests(cursor, reservation_ids)
+            plan = availability_index.assign_block(cursor, requests)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except sqlite3.Error as e:
+        print(f"Error planning room block: {e}")
+        return jsonify({'error': 'block assignment failed'}), 503
+    return jsonify({'assignments': [
+        {'reservation_id': reservation_id, 'requirement_id': requirement_id,
+         'room': dict(zip(room_availability.COLUMNS, row)) if row else None}
+        for (reservation_id, requirement_id), row in plan
+    ]})
+
+# Who is inside each facility, caught up from LocationLogs after every write to the database.
+presence_index = card_swipes.PresenceIndex(version=change_probe.data_version)
+swipe_writer = None  # started by the first POST /api/v1/swipes; it is the app's only write connection
+swipe_writer_lock = threading.Lock()
+swipe_ack_timeout = float(os.getenv('SWIPE_ACK_TIMEOUT', '5'))
+
+def get_swipe_writer():
+    global swipe_writer
+    with swipe_writer_lock:
+        if swipe_writer is None:
+            swipe_writer = card_swipes.GroupCommitWriter(
+                get_db_path(),
+                max_batch=int(os.getenv('SWIPE_MAX_BATCH', str(card_swipes.MAX_BATCH))),
+                max_delay=int(os.getenv('SWIPE_MAX_DELAY_MS', str(int(card_swipes.MAX_DELAY * 1000)))) / 1000)
+            atexit.register(swipe_writer.close)
+        return swipe_writer
+
+@app.route('/api/v1/swipes', methods=['POST'])
+def api_swipes():
+    """Append NDJSON card swipes to LocationLogs; answers once they are committed."""
+    try:
+        with db_cursor() as cursor:
+            presence_index.refresh(cursor)
+    except sqlite3.Error as e:
+        print(f"Error loading card readers: {e}")
+        return jsonify({'error': 'card readers unavailable'}), 503
+    swipes, errors = card_swipes.parse_ndjson(request.get_data(as_text=True).splitlines(), presence_index.readers)
+    rejected = [{'line': number, 'error': error} for number, error in errors]
+    if not swipes:
+        return jsonify({'error': 'no valid swipes', 'rejected': rejected}), 400
+    try:
+        first, last = get_swipe_writer().submit(swipes).result(timeout=swipe_ack_timeout)
+    except card_swipes.IngestBusyError as e:
+        response = jsonify({'error': str(e)})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    except FuturesTimeoutError:
+        return jsonify({'accepted': len(swipes), 'committed': False, 'rejected': rejected}), 202
+    except sqlite3.Error as e:
+        print(f"Error writing card swipes: {e}")
+        return jsonify({'error': 'swipes could not be written'}), 503
+    return jsonify({'accepted': len(swipes), 'committed': True, 'first_log_id': first, 'last_log_id': last,
+                    'rejected': rejected})
+
+@app.route('/api/v1/presence')
+def api_presence():
+    """Current occupancy per facility (?location_type=, ?facility=, ?guests=1), or ?guest_id= for one guest."""
+    try:
+        with db_cursor() as cursor:
+            if 'guest_id' in request.args:
+                guest_id = int(request.args['guest_id'])
+                return jsonify({'guest_id': guest_id, 'inside': presence_index.locate(cursor, guest_id)})
+            facilities = presence_index.occupancy(cursor, request.args.get('location_type'),
+                                                  request.args.get('facility'), request.args.get('guests') == '1')
+    except ValueError:
+        return jsonify({'error': 'guest_id must be an integer'}), 400
+    except sqlite3.Error as e:
+        print(f"Error reading presence: {e}")
+        return jsonify({'error': 'presence unavailable'}), 503
+    return jsonify({'facilities': facilities, 'last_log_id': presence_index.last_log_id})
+
+@app.route('/export/<name>.<fmt>')
+def export_metric(name, fmt):
+    """Stream an export as CSV or NDJSON; see exports.py for names and filters."""
+    export = exports.EXPORTS.get(name)
+    if export is None or fmt not in exports.FORMATS:
+        return jsonify({'error': f'unknown export {name}.{fmt}', 'exports': sorted(exports.EXPORTS),
+                        'formats': sorted(exports.FORMATS)}), 404
+    try:
+        filters = exports.parse_filters(request.args)
+        exports.check_filters(export, filters)
+    except exports.ExportError as e:
+        return jsonify({'error': str(e)}), 400
+
+    mimetype, formatter, error_record = exports.FORMATS[fmt]
+
+    def generate():
+        try:
+            with db_cursor() as cursor:
+                columns, rows = export.rows(cursor, filters)
+                yield from formatter(columns, rows)
+        except sqlite3.Error as e:
+            print(f"Error streaming {name} export: {e}")
+            if error_record is None:
+                raise
+            yield error_record('export failed before all rows were sent')
+
+    return Response(generate(), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{name}.{fmt}"'})
+
 if __name__ == '__main__':
+    register_debug_routes()
     app.run(debug=True, host='0.0.0.0', port=5000)
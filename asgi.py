@@ -0,0 +1,197 @@
+"""ASGI entry point for serving the dashboard from an event loop.
+
+    uvicorn asgi:application --host 0.0.0.0 --port 8000
+
+The dashboard pages and the JSON metrics API are served natively: the
+request is routed with the Flask url_map, the metric data is awaited from
+AsyncDatabase (SQLite runs on its own executor, identical in-flight calls
+are shared), and only the template render or JSON response runs on the loop.
+A worker therefore holds no thread for a client while its aggregation runs,
+and hundreds of open dashboard requests cost coroutines, not threads.
+
+Every other route (detail pages, exports, debug and cache endpoints) goes
+through a WSGI bridge that runs the Flask app on a small thread pool and
+streams the response body back chunk by chunk.
+
+ASGI_WSGI_THREADS sizes the bridge pool; the database executor matches
+DB_POOL_SIZE.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import io
+import os
+import sys
+import time
+
+from flask import render_template, request
+from werkzeug.exceptions import HTTPException
+
+import app as dashboard
+from async_db import AsyncDatabase
+from metric_filters import FilterError, parse_filters
+from query_profiler import current_route
+
+flask_app = dashboard.app
+database = AsyncDatabase(dashboard.db_cursor, max_workers=dashboard.get_db_pool_size())
+wsgi_executor = ThreadPoolExecutor(max_workers=int(os.getenv('ASGI_WSGI_THREADS', '16')), thread_name_prefix='asgi-wsgi')
+END_OF_BODY = object()
+
+
+async def summary():
+    stats = await database.call(dashboard.get_dashboard_stats, dashboard.request_filters())
+    return render_template('summary.html', **stats)
+
+
+async def dashboard_page():
+    stats = await database.call(dashboard.get_dashboard_stats, dashboard.request_filters())
+    return render_template('index.html', **stats)
+
+
+async def api_metric(name):
+    try:
+        filters = parse_filters(request.args)
+    except FilterError:
+        filters = None
+    if name not in dashboard.API_METRICS or filters is None:
+        # Error responses need no database work.
+        return dashboard.api_metric(name)
+    body, etag = await database.call(dashboard.get_api_payload, name, filters)
+    return dashboard.api_payload_response(body, etag)
+
+
+# Flask endpoint -> coroutine serving it on the event loop; other endpoints use the WSGI bridge.
+ASYNC_VIEWS = {
+    'summary': summary,
+    'dashboard': dashboard_page,
+    'api_metric': api_metric,
+}
+
+
+def build_environ(scope, body):
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for raw_name, raw_value in scope['headers']:
+        name = raw_name.decode('latin-1').upper().replace('-', '_')
+        value = raw_value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name == 'CONTENT_LENGTH':
+            environ['CONTENT_LENGTH'] = value
+        else:
+            key = 'HTTP_' + name
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def encode_headers(headers):
+    # ASGI servers add their own Date header; werkzeug's make_conditional() would duplicate it.
+    return [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers
+            if name.lower() != 'date']
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+
+async def serve_async_view(view, environ, send):
+    """Run an ASYNC_VIEWS coroutine inside a Flask request context and send its response."""
+    started = time.perf_counter()
+    with flask_app.request_context(environ):
+        rule = request.url_rule.rule
+        current_route.set(rule)
+        try:
+            response = flask_app.make_response(await view(**request.view_args))
+        except HTTPException as e:
+            response = e.get_response(environ)
+        # The WSGI views of the response drop the body and Content-Length of 304s, as the bridge would.
+        headers = response.get_wsgi_headers(environ).to_wsgi_list()
+        body = b''.join(response.get_app_iter(environ))
+        await send({'type': 'http.response.start', 'status': response.status_code,
+                    'headers': encode_headers(headers)})
+        await send({'type': 'http.response.body', 'body': body})
+    dashboard.query_profiler.observe_request(rule, environ['REQUEST_METHOD'], response.status_code,
+                                             time.perf_counter() - started)
+
+
+async def serve_wsgi(environ, send):
+    """Run the Flask WSGI app on the bridge pool, sending body chunks as they are produced."""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    status = {}
+
+    def start_response(status_line, headers, exc_info=None):
+        status['code'] = int(status_line.split(' ', 1)[0])
+        status['headers'] = headers
+
+    result = await loop.run_in_executor(wsgi_executor, context.run, flask_app.wsgi_app, environ, start_response)
+    chunks = iter(result)
+    try:
+        await send({'type': 'http.response.start', 'status': status['code'],
+                    'headers': encode_headers(status['headers'])})
+        while True:
+            chunk = await loop.run_in_executor(wsgi_executor, context.run, next, chunks, END_OF_BODY)
+            if chunk is END_OF_BODY:
+                break
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        if hasattr(result, 'close'):
+            await loop.run_in_executor(wsgi_executor, context.run, result.close)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            database.close()
+            wsgi_executor.shutdown(wait=False, cancel_futures=True)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    environ = build_environ(scope, await read_body(receive))
+    view = None
+    if scope['method'] == 'GET':
+        # Route with Flask's own url_map; unmatched URLs fall through to the bridge for Flask's 404/405.
+        with flask_app.request_context(environ):
+            if request.url_rule is not None:
+                view = ASYNC_VIEWS.get(request.url_rule.endpoint)
+    if view is not None:
+        await serve_async_view(view, environ, send)
+    else:
+        await serve_wsgi(environ, send)
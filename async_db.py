@@ -0,0 +1,53 @@
+"""Awaitable access to the metric functions for the ASGI entry point.
+
+sqlite3 calls block, so AsyncDatabase runs them on a dedicated thread pool
+sized to the connection pool: the event loop never waits on SQLite, and no
+executor thread ever waits for a pooled connection. Concurrent calls with the
+same function and arguments share one execution (single flight), so a burst
+of clients asking for the same slow aggregation costs one query, and the
+rest of the burst is answered from the metric cache afterwards.
+
+Work is run in a copy of the caller's context, so the query profiler
+attributes queries to the route that asked for them.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+
+
+class AsyncDatabase:
+    def __init__(self, cursor_factory, max_workers=8):
+        self.cursor_factory = cursor_factory
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='async-db')
+        self._inflight = {}
+
+    def _submit(self, func, *args):
+        context = contextvars.copy_context()
+        return asyncio.get_running_loop().run_in_executor(self.executor, context.run, func, *args)
+
+    async def call(self, func, *args):
+        """Await func(*args) on the database executor, joining an identical call already in flight."""
+        key = (func, args)
+        try:
+            future = self._inflight.get(key)
+        except TypeError:
+            return await self._submit(func, *args)
+        if future is None:
+            future = self._submit(func, *args)
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shield the shared future so one client going away does not cancel the others' result.
+        return await asyncio.shield(future)
+
+    async def fetch(self, fetch, *args, **kwargs):
+        """Await fetch(cursor, *args, **kwargs) on a pooled cursor, bypassing the metric cache."""
+        def run():
+            with self.cursor_factory() as cursor:
+                return fetch(cursor, *args, **kwargs)
+        return await self._submit(run)
+
+    def inflight(self):
+        return len(self._inflight)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
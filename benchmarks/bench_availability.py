@@ -0,0 +1,120 @@
+"""Room availability search in SQL vs the bitset AvailabilityIndex.
+
+Copies the cached synthetic database used by bench_export.py and gives its
+sleeping rooms beds and capacities (the generator leaves Beds, RoomBeds and
+SleepingRooms empty). The index is built over the last year of bookings and
+timed for: the build, "best 10 rooms" searches for random requirements and
+stays, and placing a 20-reservation group block. The SQL baseline is the
+query that lists the rooms booked during the stay, which is all a search
+has to run per request without the index.
+
+Usage: python benchmarks/bench_availability.py [rows] [searches]     # default 2,000,000, 1000
+"""
+from datetime import date, timedelta
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_export import database_for
+from bench_filters import ensure_indexes
+import room_availability
+
+BEDS = [(1, 'regular', 'double'), (2, 'regular', 'queen'), (3, 'regular', 'king'), (4, 'extra_long', 'double'),
+        (5, 'extra_long', 'queen'), (6, 'extra_long', 'king'), (7, 'queen', 'queen'), (8, 'king', 'king')]
+
+
+def furnish(connection, rng):
+    """Give every sleeping room one or two beds, a capacity and a smoking preference."""
+    rooms = connection.execute("SELECT room_id FROM Rooms WHERE can_be_sleeping = 1").fetchall()
+    room_beds, sleeping_rooms = [], []
+    for (room_id,) in rooms:
+        quantity = rng.choice([1, 1, 2])
+        room_beds.append((len(room_beds) + 1, room_id, rng.choice(BEDS)[0], quantity))
+        sleeping_rooms.append((len(sleeping_rooms) + 1, room_id, 2 * quantity + rng.choice([0, 0, 1]),
+                               rng.choice(['smoking', 'nonsmoking', 'nonsmoking']), 0, None))
+    with connection:
+        connection.executemany("INSERT INTO Beds (bed_id, bed_type, bed_size) VALUES (?, ?, ?)", BEDS)
+        connection.executemany("INSERT INTO RoomBeds VALUES (?, ?, ?, ?)", room_beds)
+        connection.executemany("INSERT INTO SleepingRooms VALUES (?, ?, ?, ?, ?, ?)", sleeping_rooms)
+
+
+def random_stay(rng, first, days):
+    check_in = first + timedelta(days=rng.randrange(days))
+    return check_in, check_in + timedelta(days=rng.randint(1, 7))
+
+
+def random_requirement(rng):
+    return room_availability.Requirement(
+        rng.randint(1, 4), rng.choice([None, 'regular', 'queen', 'king']), rng.choice(['no_preference', 'nonsmoking']),
+        rng.choice([None, None, 'near the pool', 'parking please', 'wheelchair access']))
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+    searches = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    source = database_for(rows)
+    ensure_indexes(source)
+    rng = random.Random(7)
+    directory = tempfile.mkdtemp(prefix='bench-availability-')
+    try:
+        db_path = os.path.join(directory, 'availability.db')
+        shutil.copyfile(source, db_path)
+        connection = sqlite3.connect(db_path)
+        furnish(connection, rng)
+        cursor = connection.cursor()
+        last = date.fromisoformat(cursor.execute("SELECT MAX(DATE(check_in_time)) FROM RoomAssignments").fetchone()[0])
+        since = last - timedelta(days=365)
+
+        index = room_availability.AvailabilityIndex(horizon=lambda: since)
+        start = time.perf_counter()
+        index.refresh(cursor)
+        print(f"build ({len(index.rooms):,} rooms, {index.bookings:,} bookings since {since}): "
+              f"{(time.perf_counter() - start) * 1000:,.0f} ms")
+
+        stays = [random_stay(rng, since, 365) for _ in range(searches)]
+        requirements = [random_requirement(rng) for _ in range(searches)]
+        sql_ms = []
+        for check_in, check_out in stays[:min(searches, 10)]:
+            start = time.perf_counter()
+            cursor.execute(room_availability.BUSY_ROOMS_QUERY,
+                           {'start': check_in.isoformat(), 'end': check_out.isoformat()}).fetchall()
+            sql_ms.append((time.perf_counter() - start) * 1000)
+        print(f"SQL booked rooms per stay:    p50 {statistics.median(sql_ms):>8.2f} ms  "
+              f"p99 {percentile(sql_ms, 0.99):>8.2f} ms ({len(sql_ms)} stays)")
+
+        search_ms, found = [], 0
+        for requirement, (check_in, check_out) in zip(requirements, stays):
+            start = time.perf_counter()
+            found += len(index.search(cursor, requirement, check_in, check_out, 10)) == 10
+            search_ms.append((time.perf_counter() - start) * 1000)
+        print(f"index best 10 rooms:          p50 {statistics.median(search_ms):>8.2f} ms  "
+              f"p99 {percentile(search_ms, 0.99):>8.2f} ms ({searches} searches, {found} found 10)")
+
+        check_in, check_out = random_stay(rng, since, 358)
+        block = [((i, None), random_requirement(rng), check_in, check_out) for i in range(20)]
+        start = time.perf_counter()
+        plan = index.assign_block(cursor, block)
+        placed = [row for _, row in plan if row]
+        print(f"group block of {len(block)}:            {(time.perf_counter() - start) * 1000:>8.2f} ms "
+              f"({len(placed)} placed on {len({row[2] for row in placed})} floor(s), "
+              f"{len({row[0] for row in placed})} distinct rooms)")
+        connection.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
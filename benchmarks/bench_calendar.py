@@ -0,0 +1,120 @@
+"""Calendar-bucketed revenue and event queries against their strftime() versions.
+
+The strftime versions group by a function of every fact row; the calendar
+versions range-bucket dim_calendar days against the date indexes (see
+calendar_dimension.py). Both run on the cached synthetic database used by
+bench_export.py, and their results are checked against each other.
+
+Usage: python benchmarks/bench_calendar.py [rows] [iterations]     # default 2,000,000 charges, 3
+"""
+import os
+import sqlite3
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_export import database_for
+from bench_filters import ensure_indexes
+import calendar_dimension
+
+STRFTIME_QUERIES = {
+    'quarterly revenue (paid)': ('quarter', ('paid',), """
+        SELECT
+            CAST(strftime('%Y', charge_date) AS INTEGER) AS revenue_year,
+            (CAST(strftime('%m', charge_date) AS INTEGER) - 1) / 3 + 1 AS revenue_quarter,
+            SUM(amount) AS total_revenue
+        FROM Charges
+        WHERE charge_status = 'paid'
+        GROUP BY revenue_year, revenue_quarter
+        ORDER BY revenue_year, revenue_quarter
+    """),
+    'weekly revenue': ('week', ('billed', 'paid'), """
+        SELECT
+            DATE(charge_date, '-' || ((CAST(strftime('%w', charge_date) AS INTEGER) + 6) % 7) || ' days') AS week,
+            SUM(amount) AS total_revenue
+        FROM Charges
+        WHERE charge_status IN ('billed', 'paid')
+        GROUP BY week
+        ORDER BY week
+    """),
+    'revenue by day of week': ('day_of_week', ('billed', 'paid'), """
+        SELECT
+            (CAST(strftime('%w', charge_date) AS INTEGER) + 6) % 7 + 1 AS day_of_week,
+            SUM(amount) AS total_revenue
+        FROM Charges
+        WHERE charge_status IN ('billed', 'paid')
+        GROUP BY day_of_week
+        ORDER BY day_of_week
+    """),
+}
+
+STRFTIME_EVENTS = """
+    SELECT
+        strftime('%Y-%m', start_date) AS month,
+        COUNT(*) AS total_events,
+        SUM(estimated_attendance) AS total_estimated_attendance,
+        AVG(estimated_attendance) AS avg_attendance_per_event,
+        COUNT(DISTINCT host_id) AS unique_hosts
+    FROM Events
+    GROUP BY month
+    ORDER BY month
+"""
+
+
+def best_time(connection, query, iterations):
+    best, rows = float('inf'), None
+    for _ in range(iterations):
+        start = time.perf_counter()
+        rows = connection.execute(query).fetchall()
+        best = min(best, time.perf_counter() - start)
+    return best, rows
+
+
+def same_totals(expected, actual):
+    """Compare on the strftime query's columns; sums added per day may differ in the last bits."""
+    if len(expected) != len(actual):
+        return False
+    for a, b in zip(expected, actual):
+        for key in a.keys():
+            if key == 'total_revenue':
+                if abs(a[key] - b[key]) > 1e-6 * max(abs(a[key]), 1):
+                    return False
+            elif a[key] != b[key]:
+                return False
+    return True
+
+
+def report(label, strftime_seconds, calendar_seconds, matches):
+    print(f"{label:<28} {strftime_seconds * 1000:>10.1f} ms {calendar_seconds * 1000:>10.1f} ms "
+          f"{strftime_seconds / calendar_seconds:>7.1f}x  {'ok' if matches else 'MISMATCH'}")
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    db_path = database_for(rows)
+    ensure_indexes(db_path)
+    connection = sqlite3.connect(db_path)
+    connection.row_factory = sqlite3.Row
+    calendar_dimension.ensure_calendar(connection.cursor())
+
+    print(f"{'query':<28} {'strftime':>13} {'calendar':>13} {'speedup':>8}")
+    for label, (grouping, statuses, strftime_query) in STRFTIME_QUERIES.items():
+        strftime_seconds, expected = best_time(connection, strftime_query, iterations)
+        calendar_query = calendar_dimension.revenue_query(grouping, statuses)
+        calendar_seconds, actual = best_time(connection, calendar_query, iterations)
+        report(label, strftime_seconds, calendar_seconds, same_totals(expected, actual))
+
+    strftime_seconds, expected = best_time(connection, STRFTIME_EVENTS, iterations)
+    calendar_seconds, actual = best_time(connection, calendar_dimension.event_count_query('month'), iterations)
+    report('monthly events', strftime_seconds, calendar_seconds, list(map(tuple, expected)) == list(map(tuple, actual)))
+
+    calendar_seconds, _ = best_time(connection, calendar_dimension.revenue_query('day_type'), iterations)
+    print(f"{'revenue by day type':<28} {'n/a':>13} {calendar_seconds * 1000:>10.1f} ms")
+    connection.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Summary metrics from SQL vs the columnar engine.
+
+Builds a columnar snapshot of the cached synthetic database used by
+bench_export.py, times opening it (memory-mapped, as a freshly started worker
+would), and then times every SUMMARY_TASKS entry both through its SQL fetch
+helper and from the snapshot, checking that the two agree.
+
+Usage: python benchmarks/bench_columnar.py [rows] [repeats]     # default 2,000,000, 3
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_export import database_for
+from bench_filters import ensure_indexes
+
+
+def best_of(repeats, compute):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = compute()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    db_path = database_for(rows)
+    ensure_indexes(db_path)
+    os.environ['DB_PATH'] = db_path
+    import app
+    import columnar
+
+    directory = tempfile.mkdtemp(prefix='columnar-')
+    try:
+        engine = columnar.ColumnarEngine(db_path, directory)
+        start = time.perf_counter()
+        source = engine.snapshot().source
+        print(f"build snapshot: {(time.perf_counter() - start) * 1000:,.0f} ms")
+        open_ms, snapshot = best_of(repeats, lambda: columnar.ColumnarSnapshot.open(engine.snapshot_path(source)))
+        print(f"open snapshot:  {open_ms:,.1f} ms ({sum(snapshot.rows.values()):,} rows, "
+              f"{snapshot.nbytes() / 1e6:,.1f} MB mapped)")
+
+        connection = sqlite3.connect(db_path)
+        connection.row_factory = sqlite3.Row
+        cursor = connection.cursor()
+        print(f"\n{'task':<24} {'sql ms':>10} {'columnar ms':>12} {'speedup':>8}  match")
+        sql_total = columnar_total = 0.0
+        for name, keys, fetch, _ in app.SUMMARY_TASKS:
+            if name not in app.COLUMNAR_TASKS:
+                continue
+            sql_ms, expected = best_of(repeats, lambda: fetch(cursor))
+            columnar_ms, actual = best_of(repeats, lambda: app.COLUMNAR_TASKS[name](snapshot))
+            expected = expected if isinstance(expected, tuple) else (expected,)
+            match = all(columnar.values_match(a, b) for a, b in zip(expected, actual))
+            sql_total += sql_ms
+            columnar_total += columnar_ms
+            print(f"{name:<24} {sql_ms:>10.1f} {columnar_ms:>12.1f} {sql_ms / columnar_ms:>7.1f}x  {'yes' if match else 'NO'}")
+        print(f"{'total':<24} {sql_total:>10.1f} {columnar_total:>12.1f} {sql_total / columnar_total:>7.1f}x")
+        connection.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
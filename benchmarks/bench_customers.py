@@ -0,0 +1,154 @@
+"""Compare the fan-out customer queries with the pre-aggregated ones.
+
+Builds an in-memory database where every billed party has many charges,
+reservations and bills, checks the per-party totals from customer_analytics
+against totals computed directly in Python, and times both versions.
+
+Usage: python benchmarks/bench_customers.py [parties] [charges_per_party] [reservations_per_party]
+"""
+import os
+import random
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import customer_analytics
+
+# The queries app.py ran before customer_analytics, joined before grouping.
+LEGACY_TOP_CUSTOMERS_QUERY = """
+    SELECT
+        bp.billed_party_id,
+        COALESCE(bp.organization_name, bp.first_name || ' ' || bp.last_name) AS customer_name,
+        bp.party_type,
+        SUM(c.amount) AS total_revenue,
+        COUNT(DISTINCT res.reservation_id) AS total_reservations,
+        MAX(res.check_in_date) AS last_visit_date
+    FROM BilledParties bp
+    LEFT JOIN Charges c ON bp.billed_party_id = c.billed_party_id AND c.charge_status IN ('billed', 'paid')
+    LEFT JOIN Reservations res ON bp.billed_party_id = res.billed_party_id
+    GROUP BY bp.billed_party_id, customer_name, bp.party_type
+    HAVING total_revenue > 0
+    ORDER BY total_revenue DESC
+    LIMIT ?
+"""
+
+LEGACY_HIGH_RISK_CUSTOMERS_QUERY = """
+    SELECT
+        cq.billed_party_id,
+        (0.4 * (100 - cq.payment_promptness_score) +
+         0.3 * (100 - cq.past_history_score) +
+         0.2 * (100 - cq.cooperativeness_score) +
+         0.1 * (100 - cq.flexibility_score)) AS risk_score,
+        COUNT(DISTINCT res.reservation_id) AS total_reservations,
+        COALESCE(SUM(CASE WHEN b.bill_status = 'overdue' THEN b.total_amount ELSE 0 END), 0) AS overdue_amount,
+        MAX(res.check_in_date) AS last_visit_date
+    FROM CustomerQualifications cq
+    JOIN BilledParties bp ON cq.billed_party_id = bp.billed_party_id
+    LEFT JOIN Reservations res ON bp.billed_party_id = res.billed_party_id
+    LEFT JOIN Bills b ON bp.billed_party_id = b.billed_party_id
+    GROUP BY cq.billed_party_id
+    ORDER BY risk_score DESC
+    LIMIT ?
+"""
+
+SCHEMA = """
+    CREATE TABLE BilledParties (billed_party_id INTEGER PRIMARY KEY, party_type TEXT,
+                                first_name TEXT, last_name TEXT, organization_name TEXT);
+    CREATE TABLE Charges (charge_id INTEGER PRIMARY KEY, billed_party_id INTEGER,
+                          charge_status TEXT, amount REAL);
+    CREATE TABLE Reservations (reservation_id INTEGER PRIMARY KEY, billed_party_id INTEGER,
+                               check_in_date TEXT);
+    CREATE TABLE Bills (bill_id INTEGER PRIMARY KEY, billed_party_id INTEGER,
+                        bill_status TEXT, total_amount REAL);
+    CREATE TABLE CustomerQualifications (billed_party_id INTEGER PRIMARY KEY,
+                                         past_history_score INTEGER, cooperativeness_score INTEGER,
+                                         flexibility_score INTEGER, payment_promptness_score INTEGER,
+                                         overall_qualification_score REAL);
+    CREATE INDEX idx_charges_party_status_amount ON Charges (billed_party_id, charge_status, amount);
+    CREATE INDEX idx_reservations_party_checkin ON Reservations (billed_party_id, check_in_date);
+    CREATE INDEX idx_bills_party_status_amount ON Bills (billed_party_id, bill_status, total_amount);
+"""
+
+
+def build_database(parties, charges_per_party, reservations_per_party, seed=42):
+    """Return (connection, expected) where expected maps party -> (revenue, reservations, overdue)."""
+    rng = random.Random(seed)
+    connection = sqlite3.connect(':memory:')
+    connection.executescript(SCHEMA)
+    expected = {}
+    charges, reservations, bills, qualifications = [], [], [], []
+    for party in range(1, parties + 1):
+        revenue = overdue = 0.0
+        for _ in range(charges_per_party):
+            status = rng.choice(('billed', 'paid', 'paid', 'pending', 'voided'))
+            amount = round(rng.uniform(5, 500), 2)
+            if status in ('billed', 'paid'):
+                revenue += amount
+            charges.append((party, status, amount))
+        for _ in range(reservations_per_party):
+            reservations.append((party, f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"))
+        for _ in range(max(reservations_per_party // 4, 1)):
+            status = rng.choice(('paid', 'paid', 'issued', 'overdue'))
+            amount = round(rng.uniform(100, 5000), 2)
+            if status == 'overdue':
+                overdue += amount
+            bills.append((party, status, amount))
+        qualifications.append((party,) + tuple(rng.randint(0, 100) for _ in range(4)) + (rng.uniform(0, 100),))
+        expected[party] = (revenue, reservations_per_party, overdue)
+
+    with connection:
+        connection.executemany(
+            "INSERT INTO BilledParties VALUES (?, 'guest', ?, ?, NULL)",
+            [(party, f"First{party}", f"Last{party}") for party in range(1, parties + 1)]
+        )
+        connection.executemany("INSERT INTO Charges (billed_party_id, charge_status, amount) VALUES (?, ?, ?)", charges)
+        connection.executemany("INSERT INTO Reservations (billed_party_id, check_in_date) VALUES (?, ?)", reservations)
+        connection.executemany("INSERT INTO Bills (billed_party_id, bill_status, total_amount) VALUES (?, ?, ?)", bills)
+        connection.executemany("INSERT INTO CustomerQualifications VALUES (?, ?, ?, ?, ?, ?)", qualifications)
+    connection.execute("ANALYZE")
+    return connection, expected
+
+
+def timed(connection, query, limit):
+    start = time.perf_counter()
+    rows = connection.execute(query, (limit,)).fetchall()
+    return rows, time.perf_counter() - start
+
+
+def count_wrong(rows, expected, column, index):
+    return sum(1 for row in rows if abs(row[column] - expected[row['billed_party_id']][index]) > 1e-6)
+
+
+def main():
+    parties = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    charges_per_party = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    reservations_per_party = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+    connection, expected = build_database(parties, charges_per_party, reservations_per_party)
+    connection.row_factory = sqlite3.Row
+    print(f"{parties:,} parties x {charges_per_party} charges x {reservations_per_party} reservations")
+
+    # (label, legacy query, new query, column checked, index into expected)
+    checks = [
+        ('top customers', LEGACY_TOP_CUSTOMERS_QUERY, customer_analytics.top_customers_query(), 'total_revenue', 0),
+        ('high-risk customers', LEGACY_HIGH_RISK_CUSTOMERS_QUERY, customer_analytics.high_risk_customers_query(),
+         'overdue_amount', 2),
+    ]
+    failed = False
+    for label, legacy_query, query, column, index in checks:
+        legacy_rows, legacy_time = timed(connection, legacy_query, parties)
+        rows, elapsed = timed(connection, query, parties)
+        legacy_wrong = count_wrong(legacy_rows, expected, column, index)
+        wrong = count_wrong(rows, expected, column, index) + count_wrong(rows, expected, 'total_reservations', 1)
+        failed = failed or wrong > 0
+        print(f"{label:>20}: legacy {legacy_time:7.3f} s ({legacy_wrong} wrong), "
+              f"pre-aggregated {elapsed:7.3f} s ({wrong} wrong), {legacy_time / max(elapsed, 1e-9):6.1f}x")
+
+    connection.close()
+    print('pre-aggregated totals match ground truth' if not failed else 'TOTALS DIFFER FROM GROUND TRUTH')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""Event-space analytics in SQL vs NumPy arrays vs the columnar snapshot.
+
+Copies the cached synthetic database used by bench_export.py, gives the rooms
+its events use a MeetingRooms seating capacity (the generator leaves
+MeetingRooms empty) and, to reach a realistic booking history, repeats the
+EventRooms rows (each copy moved a further three years ahead) until there are
+at least the requested number. It then times, best of a few runs each:
+
+- the GROUP BY queries of event_space.sql_totals(), the reference path;
+- event_space.compute(), which reads EventRooms once into arrays;
+- event_space.from_snapshot() on an opened columnar snapshot;
+- fetch_average_attendance() before (Events LEFT JOIN EventRooms) and after
+  aggregating the two tables separately.
+
+Usage: python benchmarks/bench_event_space.py [rows] [event room rows] [repeats]     # default 2,000,000, 2,000,000, 3
+"""
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_export import database_for
+from bench_filters import ensure_indexes
+import columnar
+import event_space
+
+FANNED_OUT_ATTENDANCE = """
+    SELECT
+        COUNT(DISTINCT e.event_id) AS total_events,
+        AVG(e.estimated_attendance) AS avg_estimated_attendance,
+        AVG(er.actual_attendance) AS avg_actual_attendance,
+        SUM(e.estimated_attendance) AS total_estimated_attendance,
+        SUM(er.actual_attendance) AS total_actual_attendance
+    FROM Events e
+    LEFT JOIN EventRooms er ON e.event_id = er.event_id AND 1
+    WHERE 1
+"""
+
+
+def furnish(connection, rng, event_rooms):
+    """Give every room used by an event a seating capacity and grow EventRooms to event_rooms rows."""
+    rooms = connection.execute("SELECT DISTINCT room_id FROM EventRooms WHERE room_id IS NOT NULL").fetchall()
+    with connection:
+        connection.executemany("INSERT INTO MeetingRooms VALUES (?, ?, ?, 1, 0)",
+                               [(position + 1, room_id, rng.choice([20, 40, 60, 100, 200, 400]))
+                                for position, (room_id,) in enumerate(rooms)])
+        rows = connection.execute("SELECT COUNT(*) FROM EventRooms").fetchone()[0]
+        original, copies = rows, 0
+        while rows < event_rooms:
+            copies += 1
+            connection.execute("""
+                INSERT INTO EventRooms
+                SELECT event_room_id + ? * ?, event_id, room_id, usage_time_slot,
+                       DATE(usage_date, ? || ' years'), is_eating_usage, actual_attendance
+                FROM EventRooms WHERE event_room_id <= ?
+            """, (copies, original, f"+{3 * copies}", original))
+            rows += original
+    return rows
+
+
+def best_of(repeats, compute):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = compute()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+    event_rooms = int(sys.argv[2]) if len(sys.argv) > 2 else 2000000
+    repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+    source = database_for(rows)
+    ensure_indexes(source)
+    directory = tempfile.mkdtemp(prefix='bench-event-space-')
+    try:
+        db_path = os.path.join(directory, 'event_space.db')
+        shutil.copyfile(source, db_path)
+        connection = sqlite3.connect(db_path)
+        usages = furnish(connection, random.Random(7), event_rooms)
+        cursor = connection.cursor()
+        print(f"{usages:,} EventRooms rows")
+
+        sql_ms, expected = best_of(repeats, lambda: event_space.assemble(event_space.sql_totals(cursor)))
+        print(f"SQL GROUP BY queries:          {sql_ms:>10.1f} ms")
+        arrays_ms, actual = best_of(repeats, lambda: event_space.compute(cursor))
+        print(f"arrays (one scan + NumPy):     {arrays_ms:>10.1f} ms  {sql_ms / arrays_ms:.1f}x  "
+              f"match: {'yes' if actual == expected else 'NO'}")
+
+        engine = columnar.ColumnarEngine(db_path, os.path.join(directory, 'snapshot'))
+        os.makedirs(engine.directory)
+        snapshot = engine.snapshot()
+        snapshot_ms, actual = best_of(repeats, lambda: event_space.from_snapshot(snapshot))
+        print(f"columnar snapshot:             {snapshot_ms:>10.1f} ms  {sql_ms / snapshot_ms:.1f}x  "
+              f"match: {'yes' if actual == expected else 'NO'}")
+
+        os.environ['DB_PATH'] = db_path
+        import app
+        old_ms, old = best_of(repeats, lambda: cursor.execute(FANNED_OUT_ATTENDANCE).fetchone())
+        new_ms, new = best_of(repeats, lambda: app.fetch_average_attendance(cursor))
+        print(f"\naverage attendance, joined:    {old_ms:>10.1f} ms  total estimated {old[3]:,}")
+        print(f"average attendance, separate:  {new_ms:>10.1f} ms  total estimated {new['total_estimated_attendance']:,}")
+        connection.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
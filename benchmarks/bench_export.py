@@ -0,0 +1,78 @@
+"""Stream /export/charges.csv and .ndjson from a multi-million-row synthetic database.
+
+Each export is consumed chunk by chunk through the Flask test client while
+tracemalloc records the peak Python allocation. A one-month slice and the
+full table should peak at about the same size, because only one fetchmany
+batch is held at a time.
+
+Usage: python benchmarks/bench_export.py [rows]     # default 2,000,000 charges
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import synthetic_data
+
+
+def database_for(rows, years=3, seed=42):
+    data_dir = os.path.join(tempfile.gettempdir(), 'hotel_bench')
+    os.makedirs(data_dir, exist_ok=True)
+    db_path = os.path.join(data_dir, f"synthetic_{rows}_{years}y_seed{seed}.db")
+    if not os.path.exists(db_path):
+        print(f"generating {db_path} ...")
+        synthetic_data.generate(db_path, rows, years=years, seed=seed)
+    return db_path
+
+
+def consume(client, url, trace=False):
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    response = client.get(url, buffered=False)
+    total_bytes = lines = 0
+    for chunk in response.response:
+        total_bytes += len(chunk)
+        lines += chunk.count(b'\n')
+    response.close()
+    elapsed = time.perf_counter() - start
+    peak = None
+    if trace:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return response.status_code, lines, total_bytes, elapsed, peak
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+    os.environ['DB_PATH'] = database_for(rows)
+    os.environ['METRIC_CACHE_ENABLED'] = '0'
+    import app
+
+    client = app.app.test_client()
+    last_month = (synthetic_data.END_DATE.replace(day=1) - synthetic_data.timedelta(days=1)).replace(day=1)
+    urls = [
+        f"/export/charges.csv?start={last_month.isoformat()}&end={synthetic_data.END_DATE.isoformat()}",
+        '/export/charges.csv',
+        '/export/charges.ndjson',
+        '/export/customer_revenue.csv',
+        '/export/occupancy_daily.csv',
+    ]
+    for url in urls:
+        status, lines, total_bytes, elapsed, _ = consume(client, url)
+        print(f"{url:<60} {status} {lines:>10,} lines {total_bytes / 1e6:8.1f} MB "
+              f"{elapsed:7.2f} s {lines / max(elapsed, 1e-9):>10,.0f} rows/s")
+
+    # tracemalloc slows allocation-heavy code several times over, so memory is
+    # measured in a separate pass.
+    peaks = [consume(client, url, trace=True)[4] for url in urls[:2]]
+    print(f"peak traced memory: one month {peaks[0] / 1e6:.1f} MB, full table {peaks[1] / 1e6:.1f} MB "
+          f"({peaks[1] / max(peaks[0], 1):.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
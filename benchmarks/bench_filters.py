@@ -0,0 +1,80 @@
+"""Time the filtered metric functions over growing date windows.
+
+With the date range pushed into SQL as a plain range on the indexed date
+columns, a one-month request should cost a small fraction of the full-history
+one. Runs against the cached synthetic database used by bench_export.py and
+creates any dashboard index it is missing.
+
+Usage: python benchmarks/bench_filters.py [rows] [iterations]     # default 2,000,000 charges, 3
+"""
+from datetime import timedelta
+import os
+import sqlite3
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_export import database_for
+from metric_filters import MetricFilters
+from migrate_schema import DASHBOARD_INDEXES
+from mysql_dump import quote
+import synthetic_data
+
+METRICS = [
+    'get_total_revenue',
+    'get_quarterly_revenue',
+    'get_occupancy_rate_daily',
+    'get_top_customers',
+    'get_high_risk_customers',
+    'get_event_count_by_month',
+    'get_fb_revenue_by_meal_type',
+]
+
+
+def ensure_indexes(db_path):
+    conn = sqlite3.connect(db_path)
+    for name, table, columns in DASHBOARD_INDEXES:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {quote(name)} ON {quote(table)} "
+                     f"({', '.join(quote(column) for column in columns)})")
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+
+
+def best_time(func, filters, iterations):
+    best = float('inf')
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func(filters)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    db_path = database_for(rows)
+    ensure_indexes(db_path)
+    os.environ['DB_PATH'] = db_path
+    os.environ['METRIC_CACHE_ENABLED'] = '0'
+    import app
+
+    end = synthetic_data.END_DATE
+    windows = [
+        ('1 month', MetricFilters(start=end - timedelta(days=30), end=end)),
+        ('3 months', MetricFilters(start=end - timedelta(days=91), end=end)),
+        ('1 year', MetricFilters(start=end - timedelta(days=365), end=end)),
+        ('all history', MetricFilters()),
+        ('1 month, wing 1', MetricFilters(start=end - timedelta(days=30), end=end, wing_id=1)),
+    ]
+    print(f"{'metric':<30}" + ''.join(f"{label:>18}" for label, _ in windows))
+    for name in METRICS:
+        func = getattr(app, name).uncached
+        timings = [best_time(func, filters, iterations) for _, filters in windows]
+        print(f"{name:<30}" + ''.join(f"{seconds * 1000:>15.1f} ms" for seconds in timings))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""Import throughput of import_dump.py, and an interrupted import resumed.
+
+Writes the cached synthetic database used by bench_export.py out as a
+mysqldump file (the CREATE TABLE statements of the bundled dump, then
+extended INSERTs of about 1 MB each, as mysqldump writes them), imports it
+and reports rows per minute. It then starts the same import in a child
+process, kills it partway through, finishes it with --resume and checks
+that every table ends up with the row count of the source database.
+
+Usage: python benchmarks/bench_import.py [rows] [seconds before the kill]     # default 2,000,000, 10
+"""
+import os
+import shutil
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_export import database_for
+import import_dump
+from migrate_schema import DEFAULT_DUMP
+from mysql_dump import quote, read_tables
+
+STATEMENT_BYTES = 1 << 20  # mysqldump's default net_buffer_length
+ESCAPES = str.maketrans({'\\': '\\\\', "'": "\\'", '\n': '\\n', '\r': '\\r', '\0': '\\0', '\x1a': '\\Z'})
+
+
+def mysql_value(value):
+    if value is None:
+        return 'NULL'
+    if isinstance(value, str):
+        return "'" + value.translate(ESCAPES) + "'"
+    return repr(value)
+
+
+def schema_blocks(dump_path):
+    """{table: CREATE TABLE statement text} copied from a dump."""
+    blocks, block = {}, None
+    with open(dump_path, encoding='utf-8') as dump:
+        for line in dump:
+            if line.startswith('CREATE TABLE'):
+                block = [line]
+            elif block is not None:
+                block.append(line)
+                if line.startswith(')') and line.rstrip().endswith(';'):
+                    blocks[block[0].split('`')[1]] = ''.join(block)
+                    block = None
+    return blocks
+
+
+def write_dump(db_path, dump_path):
+    """Write the rows of db_path as a mysqldump file; return the number of rows written."""
+    tables = read_tables(os.path.join(ROOT, DEFAULT_DUMP))
+    blocks = schema_blocks(os.path.join(ROOT, DEFAULT_DUMP))
+    connection = sqlite3.connect(db_path)
+    written = 0
+    with open(dump_path, 'w', encoding='utf-8') as dump:
+        for name, table in tables.items():
+            dump.write(f"DROP TABLE IF EXISTS `{name}`;\n{blocks[name]}\n")
+            columns = ', '.join(quote(column.name) for column in table.columns)
+            values, size = [], 0
+            for row in connection.execute(f"SELECT {columns} FROM {quote(name)}"):
+                text = '(' + ','.join(map(mysql_value, row)) + ')'
+                values.append(text)
+                size += len(text) + 1
+                if size >= STATEMENT_BYTES:
+                    dump.write(f"INSERT INTO `{name}` VALUES {','.join(values)};\n")
+                    written += len(values)
+                    values, size = [], 0
+            if values:
+                dump.write(f"INSERT INTO `{name}` VALUES {','.join(values)};\n")
+                written += len(values)
+    connection.close()
+    return written
+
+
+def row_counts(db_path):
+    connection = sqlite3.connect(db_path)
+    try:
+        names = [name for (name,) in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+        return {name: connection.execute(f"SELECT COUNT(*) FROM {quote(name)}").fetchone()[0] for name in names}
+    finally:
+        connection.close()
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+    kill_after = float(sys.argv[2]) if len(sys.argv) > 2 else 10.0
+    source = database_for(rows)
+    directory = tempfile.mkdtemp(prefix='bench-import-')
+    try:
+        dump_path = os.path.join(directory, 'dump.sql')
+        start = time.perf_counter()
+        written = write_dump(source, dump_path)
+        print(f"wrote {written:,} rows ({os.path.getsize(dump_path) / 1e6:,.0f} MB) in "
+              f"{time.perf_counter() - start:.1f} s")
+        expected = {name: count for name, count in row_counts(source).items() if not name.startswith('sqlite_')}
+
+        output = os.path.join(directory, 'imported.db')
+        importer = import_dump.Importer(dump_path, output)
+        start = time.perf_counter()
+        importer.run()
+        elapsed = time.perf_counter() - start
+        print(f"import: {elapsed:.1f} s, {written / elapsed * 60:,.0f} rows/min overall "
+              f"(indexes, ANALYZE and the foreign key check included)")
+        print(f"matches source row counts: {'yes' if row_counts(output) == expected else 'NO'}")
+
+        resumed = os.path.join(directory, 'resumed.db')
+        command = [sys.executable, os.path.join(ROOT, 'import_dump.py'), '--dump', dump_path, '--output', resumed,
+                   '--quiet']
+        child = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL)
+        time.sleep(kill_after)
+        child.send_signal(signal.SIGKILL)
+        child.wait()
+        connection = sqlite3.connect(resumed)
+        offset = connection.execute(f"SELECT byte_offset FROM {import_dump.PROGRESS_TABLE} WHERE key = ''").fetchone()
+        connection.close()
+        print(f"killed after {kill_after:.0f} s at byte {offset[0]:,} of {os.path.getsize(dump_path):,}")
+        start = time.perf_counter()
+        subprocess.run(command + ['--resume'], cwd=ROOT, stdout=subprocess.DEVNULL, check=True)
+        print(f"resumed: {time.perf_counter() - start:.1f} s; matches source row counts: "
+              f"{'yes' if row_counts(resumed) == expected else 'NO'}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
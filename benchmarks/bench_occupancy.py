@@ -0,0 +1,49 @@
+"""Time the occupancy sweep on synthetic stays: years of history, thousands of rooms.
+
+Usage: python benchmarks/bench_occupancy.py [rooms] [years]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import occupancy
+
+
+def synthetic_spans(rooms, years, seed=42):
+    """Back-to-back stays of 1-7 nights with 0-3 night gaps, for every room."""
+    rng = random.Random(seed)
+    start_day = occupancy.to_day(occupancy.date(2020, 1, 1))
+    end_day = start_day + 365 * years
+    spans = []
+    for room_id in range(1, rooms + 1):
+        day = start_day + rng.randint(0, 3)
+        while day < end_day:
+            nights = rng.randint(1, 7)
+            spans.append((room_id, day, day + nights))
+            day += nights + rng.randint(0, 3)
+    return spans, start_day, end_day
+
+
+def main():
+    rooms = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    years = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    spans, start_day, end_day = synthetic_spans(rooms, years)
+    print(f"{len(spans):,} stays across {rooms:,} rooms over {years} years")
+
+    sweeps = [('python', occupancy.sweep_python)]
+    if occupancy.np is not None:
+        sweeps.insert(0, ('numpy', occupancy.sweep_numpy))
+    results = {}
+    for name, sweep in sweeps:
+        start = time.perf_counter()
+        results[name] = sweep(spans, start_day, end_day, rooms, occupancy.GRANULARITIES)
+        print(f"{name:>6}: {time.perf_counter() - start:7.2f} s for daily + weekly + monthly")
+    if len(results) == 2:
+        print('results match' if results['numpy'] == results['python'] else 'RESULTS DIFFER')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Summary page latency with metrics computed on request vs read from precomputed snapshots.
+
+The metric cache is disabled so every on-request page runs the summary
+queries, as it does whenever its cache entry has expired or the database has
+changed. In snapshot mode the scheduler has already run every job once and
+requests only read the snapshot store. Runs against the cached synthetic
+database used by bench_export.py.
+
+Usage: python benchmarks/bench_precompute.py [rows] [live requests] [snapshot requests]     # default 2,000,000, 10, 500
+"""
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_export import database_for
+from bench_filters import ensure_indexes
+
+
+def page_latencies(client, requests):
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.get('/')
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200
+    return sorted(latencies)
+
+
+def report(label, latencies):
+    p99 = latencies[max(int(len(latencies) * 0.99) - 1, 0)]
+    print(f"{label:<10} {len(latencies):>8} {statistics.median(latencies):>10.1f} {p99:>10.1f} {latencies[-1]:>10.1f}")
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+    live_requests = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    snapshot_requests = int(sys.argv[3]) if len(sys.argv) > 3 else 500
+    db_path = database_for(rows)
+    ensure_indexes(db_path)
+    os.environ['DB_PATH'] = db_path
+    os.environ['METRIC_CACHE_ENABLED'] = '0'
+    os.environ['SUMMARY_TIMEOUT_SCALE'] = '100'
+    import app
+
+    client = app.app.test_client()
+    print(f"{'mode':<10} {'requests':>8} {'p50 ms':>10} {'p99 ms':>10} {'max ms':>10}")
+    app.precompute_enabled = False
+    report('on request', page_latencies(client, live_requests))
+
+    app.precompute_enabled = True
+    app.precompute_scheduler.start()
+    while any(job['runs'] == 0 for job in app.precompute_scheduler.status()):
+        time.sleep(0.1)
+    report('snapshots', page_latencies(client, snapshot_requests))
+    for job in app.precompute_scheduler.status():
+        print(f"  {job['name']:<24} every {job['interval_seconds']:>6} s, last run {job['last_duration_ms']:>9.1f} ms")
+    app.precompute_scheduler.stop()
+
+
+if __name__ == '__main__':
+    main()
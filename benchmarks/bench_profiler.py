@@ -0,0 +1,62 @@
+"""Overhead of the query profiler on the uncached metric functions.
+
+Each metric runs on a plain pooled connection and on a ProfiledConnection
+(see query_profiler.py); the profiled cursor times execute/fetch calls and the
+progress handler counts VM steps. Runs against the cached synthetic database
+used by bench_export.py.
+
+Usage: python benchmarks/bench_profiler.py [rows] [iterations]     # default 2,000,000 charges, 3
+"""
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_export import database_for
+from bench_filters import METRICS, ensure_indexes
+from db_pool import ConnectionPool
+
+
+def best_time(func, iterations):
+    best = float('inf')
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    db_path = database_for(rows)
+    ensure_indexes(db_path)
+    os.environ['DB_PATH'] = db_path
+    os.environ['METRIC_CACHE_ENABLED'] = '0'
+    import app
+
+    pools = {
+        'plain': ConnectionPool(db_path, size=1),
+        'profiled': ConnectionPool(db_path, size=1, connection_factory=app.query_profiler.connection_factory()),
+    }
+    print(f"{'metric':<30} {'plain':>13} {'profiled':>13} {'overhead':>9}")
+    for name in METRICS:
+        func = getattr(app, name).uncached
+        timings = {}
+        for label, pool in pools.items():
+            app.db_pool = pool
+            timings[label] = best_time(func, iterations)
+        print(f"{name:<30} {timings['plain'] * 1000:>10.1f} ms {timings['profiled'] * 1000:>10.1f} ms "
+              f"{(timings['profiled'] / timings['plain'] - 1) * 100:>8.1f}%")
+    for pool in pools.values():
+        pool.close()
+    slow = app.query_profiler.recent(slow_only=True)
+    print(f"\n{len(slow)} slow queries recorded; slowest:")
+    for entry in sorted(slow, key=lambda entry: -entry['duration_ms'])[:3]:
+        print(f"  {entry['duration_ms']:>9.1f} ms {entry['vm_steps']:>11} steps  {entry['sql'][:70]}")
+
+
+if __name__ == '__main__':
+    main()
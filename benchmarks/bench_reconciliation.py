@@ -0,0 +1,174 @@
+"""Billing reconciliation: a full check over millions of billed charges, then incremental rechecks.
+
+Copies the cached synthetic database used by bench_export.py and bills its
+charges (the generator leaves BillCharges, Payments and Deposits empty and
+its Bills unrelated to the charges): one bill per party and month holding
+that month's charges, deposits for the reservations that required one,
+totals that reconcile, and payments for the paid and part-paid bills. About
+one bill in a hundred then gets a wrong total, a duplicate or foreign charge,
+an overpayment or a bad refund, so the report has something to find.
+
+Timed: the full check, the report, saving and loading the results, and an
+incremental refresh after a batch of bills, charges, payments and deposits
+change through the reconcile_changes triggers.
+
+Usage: python benchmarks/bench_reconciliation.py [rows] [changes]     # default 2,000,000, 200
+"""
+from datetime import date, timedelta
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_export import database_for
+import billing_reconciliation
+
+ERROR_RATE = 0.01
+METHODS = ('credit_card', 'debit_card', 'cash', 'check', 'wire_transfer')
+
+
+def bill_charges(connection, rng):
+    """Replace Bills with one bill per party and month of charges, and fill BillCharges, Deposits and Payments."""
+    last_day = date.fromisoformat(connection.execute("SELECT MAX(DATE(charge_date)) FROM Charges").fetchone()[0])
+    months = connection.execute("""
+        SELECT billed_party_id, strftime('%Y-%m', charge_date) AS month
+        FROM Charges WHERE charge_status IN ('billed', 'paid')
+        GROUP BY billed_party_id, month ORDER BY month, billed_party_id
+    """).fetchall()
+    bills, keys = [], {}
+    for bill_id, (party, month) in enumerate(months, 1):
+        bill_day = (date.fromisoformat(month + '-01') + timedelta(days=32)).replace(day=1)
+        due_day = bill_day + timedelta(days=30)
+        age = (last_day - due_day).days
+        roll = rng.random()
+        status = ('paid' if roll < 0.97 else 'overdue') if age > 60 else \
+                 ('paid' if roll < 0.6 else 'sent' if roll < 0.9 else 'overdue') if age > 0 else \
+                 ('pending' if roll < 0.3 else 'sent')
+        bills.append((bill_id, party, 0.0, bill_day.isoformat(), due_day.isoformat(), status, 'Net 30 days'))
+        keys[(party, month)] = bill_id
+    deposits = [(deposit_id, reservation_id, amount, reservation_date,
+                 rng.choices(('applied', 'refunded', 'forfeited', 'pending'), (85, 8, 5, 2))[0])
+                for deposit_id, (reservation_id, amount, reservation_date) in enumerate(connection.execute(
+                    "SELECT reservation_id, deposit_amount, reservation_date FROM Reservations "
+                    "WHERE advance_deposit_required = 1 AND deposit_amount > 0"), 1)]
+    with connection:
+        connection.execute("DELETE FROM Bills")
+        connection.executemany("INSERT INTO Bills VALUES (?, ?, ?, ?, ?, ?, ?)", bills)
+        connection.execute("CREATE TEMP TABLE bill_keys (billed_party_id INTEGER, month TEXT, bill_id INTEGER, "
+                           "PRIMARY KEY (billed_party_id, month))")
+        connection.executemany("INSERT INTO bill_keys VALUES (?, ?, ?)",
+                               [(party, month, bill_id) for (party, month), bill_id in keys.items()])
+        connection.execute("""
+            INSERT INTO BillCharges (bill_id, charge_id)
+            SELECT k.bill_id, c.charge_id
+            FROM Charges c
+            JOIN bill_keys k ON k.billed_party_id = c.billed_party_id AND k.month = strftime('%Y-%m', c.charge_date)
+            WHERE c.charge_status IN ('billed', 'paid')
+        """)
+        connection.executemany(
+            "INSERT INTO Deposits VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(deposit_id, reservation_id, amount, day, status,
+              day if status == 'refunded' else None,
+              round(amount * rng.choice((0.5, 1.0)), 2) if status == 'refunded' else None)
+             for deposit_id, reservation_id, amount, day, status in deposits])
+
+    # Totals that reconcile, from the engine itself, then payments that settle them as the status says.
+    reconciler = billing_reconciliation.Reconciler()
+    reconciler.recheck_all(connection.cursor())
+    totals, payments = [], []
+    for row in reconciler.rows.values():
+        total = round(row[billing_reconciliation.CHARGED] - row[billing_reconciliation.DEPOSIT_CREDIT], 2)
+        totals.append((total, row[0]))
+        status, due = row[billing_reconciliation.STATUS], row[billing_reconciliation.DUE_DATE]
+        if status == 'paid' or (status in ('sent', 'overdue') and rng.random() < 0.3):
+            amount = total if status == 'paid' else round(total * rng.uniform(0.2, 0.8), 2)
+            paid_on = date.fromisoformat(due) + timedelta(days=rng.randint(-25, 20))
+            payments.append((len(payments) + 1, row[0], amount, paid_on.isoformat(), rng.choice(METHODS),
+                             f"TXN{len(payments) + 1:08d}"))
+    with connection:
+        connection.executemany("UPDATE Bills SET total_amount = ? WHERE bill_id = ?", totals)
+        connection.executemany("INSERT INTO Payments VALUES (?, ?, ?, ?, ?, ?)", payments)
+    return len(bills), len(payments), len(deposits)
+
+
+def break_some(connection, rng, bills, count):
+    """Change `count` random bills, charges, payments and deposits, each in a way the report should flag."""
+    deposits = connection.execute("SELECT COALESCE(MAX(deposit_id), 1) FROM Deposits").fetchone()[0]
+    with connection:
+        for _ in range(count):
+            bill = rng.randint(1, bills)
+            kind = rng.randrange(5)
+            if kind == 0:
+                connection.execute("UPDATE Bills SET total_amount = total_amount + ? WHERE bill_id = ?",
+                                   (rng.choice((-1, 1)) * rng.randint(5, 200), bill))
+            elif kind == 1:
+                connection.execute("INSERT OR IGNORE INTO BillCharges (bill_id, charge_id) "
+                                   "SELECT ?, charge_id FROM BillCharges WHERE bill_id = ? LIMIT 1",
+                                   (rng.randint(1, bills), bill))
+            elif kind == 2:
+                connection.execute("UPDATE Charges SET amount = amount + 10 WHERE charge_id = "
+                                   "(SELECT charge_id FROM BillCharges WHERE bill_id = ? LIMIT 1)", (bill,))
+            elif kind == 3:
+                connection.execute("INSERT INTO Payments (bill_id, payment_amount, payment_date, payment_method) "
+                                   "SELECT bill_id, total_amount, due_date, 'cash' FROM Bills WHERE bill_id = ?",
+                                   (bill,))
+            else:
+                connection.execute("UPDATE Deposits SET refund_status = 'refunded', refund_amount = amount * 2 "
+                                   "WHERE deposit_id = ?", (rng.randint(1, deposits),))
+
+
+def timed(label, function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    print(f"{label:<34}{(time.perf_counter() - start) * 1000:>10,.0f} ms")
+    return result
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+    changes = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    source = database_for(rows)
+    rng = random.Random(5)
+    directory = tempfile.mkdtemp(prefix='bench-reconciliation-')
+    try:
+        db_path = os.path.join(directory, 'reconciliation.db')
+        shutil.copyfile(source, db_path)
+        connection = sqlite3.connect(db_path)
+        bills, payments, deposits = timed('bill the charges (setup)', bill_charges, connection, rng)
+        break_some(connection, rng, bills, int(bills * ERROR_RATE))
+        charges = connection.execute("SELECT COUNT(*) FROM BillCharges").fetchone()[0]
+        print(f"{bills:,} bills, {charges:,} billed charges, {payments:,} payments, {deposits:,} deposits")
+
+        billing_reconciliation.install(connection)
+        cursor = connection.cursor()
+        reconciler = billing_reconciliation.Reconciler()
+        timed('full check', reconciler.recheck_all, cursor)
+        report = timed('report (issues and aging)', billing_reconciliation.summarize, reconciler.rows.values(),
+                       date.today())
+        print(f"  {report['bills_with_issues']:,} bills with issues: " + ', '.join(
+            f"{entry['issue']} {entry['bills']:,}" for entry in report['issues'] if entry['bills']))
+        timed('save results', reconciler.save, connection, 'full')
+
+        break_some(connection, rng, bills, changes)
+        logged = connection.execute("SELECT COUNT(DISTINCT bill_id) FROM reconcile_changes "
+                                    "WHERE seq > ?", (reconciler.change_seq,)).fetchone()[0]
+        restarted = billing_reconciliation.Reconciler()
+        timed('load saved results', restarted.load, cursor)
+        timed(f"incremental refresh ({changes} changes)", restarted.refresh, cursor)
+        print(f"  rechecked {restarted.last_checked:,} of {len(restarted.rows):,} bills ({logged:,} logged)")
+        fresh = billing_reconciliation.Reconciler()
+        fresh.recheck_all(cursor)
+        print(f"incremental matches a full check: {'yes' if fresh.rows == restarted.rows else 'NO'}")
+        connection.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""High-risk ranking in SQL vs the incrementally maintained RiskIndex.
+
+Copies the cached synthetic database used by bench_export.py, installs the
+risk_changes triggers on the copy, and times: the SQL ranking run per
+request, a full batch rescore, a top-50 read with nothing changed, and a
+top-50 read right after a batch of qualification and bill updates. The
+index ranking is checked against SQL after the updates.
+
+Usage: python benchmarks/bench_risk.py [rows] [changed parties] [requests]     # default 2,000,000, 100, 1000
+"""
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_export import database_for
+from bench_filters import ensure_indexes
+import customer_analytics
+import risk_scoring
+from rollups import results_match
+
+
+def timed(compute):
+    start = time.perf_counter()
+    result = compute()
+    return (time.perf_counter() - start) * 1000, result
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+    changed = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    requests = int(sys.argv[3]) if len(sys.argv) > 3 else 1000
+    source = database_for(rows)
+    ensure_indexes(source)
+    directory = tempfile.mkdtemp(prefix='bench-risk-')
+    try:
+        db_path = os.path.join(directory, 'risk.db')
+        shutil.copyfile(source, db_path)
+        connection = sqlite3.connect(db_path)
+        risk_scoring.install(connection)
+        cursor = connection.cursor()
+
+        query = customer_analytics.high_risk_customers_query()
+        sql_ms, _ = timed(lambda: cursor.execute(query, [50]).fetchall())
+        print(f"SQL ranking per request:          {sql_ms:>10.1f} ms")
+
+        index = risk_scoring.RiskIndex()
+        full_ms, _ = timed(lambda: index.top(cursor, 50))
+        print(f"index full rescore ({len(index.keys):,} parties): {full_ms:>7.1f} ms")
+
+        latencies = [timed(lambda: index.top(cursor, 50))[0] for _ in range(requests)]
+        print(f"index top 50, nothing changed:    {statistics.median(latencies) * 1000:>10.1f} us (median of {requests})")
+
+        parties = random.Random(7).sample(sorted(index.keys), changed)
+        with connection:
+            for position, party in enumerate(parties):
+                connection.execute("UPDATE CustomerQualifications SET payment_promptness_score = ? "
+                                   "WHERE billed_party_id = ?", (position % 100, party))
+                connection.execute("UPDATE Bills SET bill_status = 'overdue' WHERE billed_party_id = ?", (party,))
+        refresh_ms, ranked = timed(lambda: index.top(cursor, 50))
+        print(f"index top 50 after {changed} changed parties: {refresh_ms:>6.1f} ms "
+              f"({index.incremental_rescores} incremental, {index.full_rescores} full rescores)")
+
+        expected = [dict(zip(risk_scoring.COLUMNS, row)) for row in cursor.execute(query, [50]).fetchall()]
+        match = results_match(expected, [dict(zip(risk_scoring.COLUMNS, row)) for row in ranked])
+        print(f"matches SQL after updates: {'yes' if match else 'NO'}")
+        connection.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
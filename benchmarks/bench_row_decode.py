@@ -0,0 +1,100 @@
+"""Per-row cost of decoding query results: coercion loops vs a compiled ResultSchema.
+
+Builds an in-memory table shaped like the high-risk customers result (ints,
+floats, text, and NULLs in every typed column) and decodes it three ways:
+
+  legacy   sqlite3.Row -> dict(row) -> a second loop of `int(x) if x else 0`
+  schema   ResultSchema.fetchall(): raw tuples through one compiled decoder
+  raw      cursor.fetchall() with no decoding, as a floor
+
+Usage: python benchmarks/bench_row_decode.py [rows]     # default 1,000,000
+"""
+import os
+import random
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+
+
+def build(rows, seed=42):
+    rng = random.Random(seed)
+    connection = sqlite3.connect(':memory:')
+    connection.row_factory = sqlite3.Row
+    connection.execute("""
+        CREATE TABLE results (
+            billed_party_id INTEGER, customer_name TEXT, party_type TEXT,
+            past_history_score INTEGER, cooperativeness_score INTEGER, flexibility_score INTEGER,
+            payment_promptness_score INTEGER, overall_qualification_score REAL, risk_score REAL,
+            total_reservations INTEGER, overdue_amount REAL, last_visit_date TEXT
+        )
+    """)
+
+    def maybe(value):
+        return None if rng.random() < 0.05 else value
+
+    connection.executemany("INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", (
+        (index, f"Customer {index}", 'guest', maybe(rng.randint(0, 100)), maybe(rng.randint(0, 100)),
+         maybe(rng.randint(0, 100)), maybe(rng.randint(0, 100)), maybe(rng.uniform(0, 100)),
+         maybe(rng.uniform(0, 100)), maybe(rng.randint(0, 50)), maybe(rng.uniform(0, 5000)),
+         maybe(f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"))
+        for index in range(rows)
+    ))
+    return connection
+
+
+def legacy(cursor):
+    results = [dict(row) for row in cursor.fetchall()]
+    for row in results:
+        row['past_history_score'] = int(row['past_history_score']) if row['past_history_score'] else 0
+        row['cooperativeness_score'] = int(row['cooperativeness_score']) if row['cooperativeness_score'] else 0
+        row['flexibility_score'] = int(row['flexibility_score']) if row['flexibility_score'] else 0
+        row['payment_promptness_score'] = int(row['payment_promptness_score']) if row['payment_promptness_score'] else 0
+        row['overall_qualification_score'] = float(row['overall_qualification_score']) if row['overall_qualification_score'] else 0.0
+        row['risk_score'] = float(row['risk_score']) if row['risk_score'] else 0.0
+        row['total_reservations'] = int(row['total_reservations']) if row['total_reservations'] else 0
+        row['overdue_amount'] = float(row['overdue_amount']) if row['overdue_amount'] else 0.0
+        if row['last_visit_date']:
+            row['last_visit_date'] = row['last_visit_date']
+        else:
+            row['last_visit_date'] = None
+    return results
+
+
+def raw(cursor):
+    cursor.row_factory = None
+    return cursor.fetchall()
+
+
+def timed(connection, decode):
+    cursor = connection.cursor()
+    start = time.perf_counter()
+    cursor.execute("SELECT * FROM results")
+    result = decode(cursor)
+    elapsed = time.perf_counter() - start
+    cursor.close()
+    return result, elapsed
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    connection = build(rows)
+    print(f"{rows:,} rows, 12 columns, ~5% NULLs")
+
+    results = {}
+    for name, decode in [('raw', raw), ('legacy', legacy), ('schema', app.HIGH_RISK_CUSTOMERS_SCHEMA.fetchall)]:
+        best = None
+        for _ in range(3):
+            result, elapsed = timed(connection, decode)
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = result
+        print(f"{name:>7}: {best:6.2f} s  {best / rows * 1e9:7.0f} ns/row")
+    print('results match' if results['legacy'] == results['schema'] else 'RESULTS DIFFER')
+    connection.close()
+
+
+if __name__ == '__main__':
+    main()
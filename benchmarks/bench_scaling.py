@@ -0,0 +1,154 @@
+"""Time every get_* metric and every dashboard route on synthetic databases of growing size.
+
+For each scale a database is generated with synthetic_data.py (reused if it
+already exists in --data-dir), then a fresh interpreter imports app against
+it with the metric cache disabled and times each get_* function (bypassing
+the cache) and each parameterless GET route through the Flask test client.
+
+Results are written as JSON (one object per run with machine and git
+metadata and a list of measurements) so runs can be diffed over time.
+
+Usage:
+    python benchmarks/bench_scaling.py                              # 1e5 and 1e6 charges
+    python benchmarks/bench_scaling.py --scales 100000 1000000 10000000 --output results.json
+"""
+import argparse
+from datetime import datetime, timezone
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def time_call(func, iterations):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {
+        'iterations': iterations,
+        'min_s': min(timings),
+        'median_s': statistics.median(timings),
+        'max_s': max(timings),
+    }
+
+
+def run_worker(iterations):
+    """Benchmark the app in this interpreter; DB_PATH must already point at the database."""
+    import app
+
+    app.metric_cache.enabled = False
+    results = []
+    metrics = sorted(name for name in dir(app)
+                     if name.startswith('get_') and hasattr(getattr(app, name), 'uncached'))
+    for name in metrics:
+        func = getattr(app, name).uncached
+        func()
+        results.append(dict(kind='function', name=name, **time_call(func, iterations)))
+
+    client = app.app.test_client()
+    routes = sorted(rule.rule for rule in app.app.url_map.iter_rules()
+                    if 'GET' in rule.methods and not rule.arguments and rule.endpoint != 'static')
+    for route in routes:
+        status = client.get(route).status_code
+        results.append(dict(kind='route', name=route, status=status,
+                            **time_call(lambda: client.get(route), iterations)))
+    return results
+
+
+def table_counts(db_path):
+    connection = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        tables = [row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        return {table: connection.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0] for table in sorted(tables)}
+    finally:
+        connection.close()
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_scale(scale, args):
+    import synthetic_data
+
+    db_path = os.path.join(args.data_dir, f"synthetic_{scale}_{args.years}y_seed{args.seed}.db")
+    generated_s = None
+    if not os.path.exists(db_path):
+        print(f"generating {db_path} ...", file=sys.stderr)
+        start = time.perf_counter()
+        synthetic_data.generate(db_path, scale, years=args.years, seed=args.seed)
+        generated_s = time.perf_counter() - start
+
+    env = dict(os.environ, DB_PATH=db_path, METRIC_CACHE_ENABLED='0')
+    worker = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--worker', '--iterations', str(args.iterations)],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if worker.returncode != 0:
+        raise RuntimeError(f"worker failed at scale {scale}:\n{worker.stderr}")
+    measurements = json.loads(worker.stdout.strip().splitlines()[-1])
+    for measurement in measurements:
+        print(f"{scale:>10,} {measurement['kind']:>8} {measurement['name']:<32} "
+              f"median {measurement['median_s'] * 1000:10.1f} ms", file=sys.stderr)
+    return {
+        'scale': scale,
+        'database': db_path,
+        'generated_s': generated_s,
+        'rows': table_counts(db_path),
+        'measurements': measurements,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--scales', type=int, nargs='+', default=[100000, 1000000], help='charges per database')
+    parser.add_argument('--iterations', type=int, default=3)
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'hotel_bench'),
+                        help='where generated databases are kept between runs')
+    parser.add_argument('--output', default=None, help='write JSON results here (default: stdout)')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(run_worker(args.iterations)))
+        return 0
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    report = {
+        'benchmark': 'scaling',
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'iterations': args.iterations,
+        'seed': args.seed,
+        'runs': [bench_scale(scale, args) for scale in args.scales],
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            handle.write(output + '\n')
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,255 @@
+"""Compare the single-pass get_summary_stats() against the legacy per-metric path.
+
+The legacy path runs the original dashboard queries, frozen here as they
+were before the single-pass rewrite, each on its own connection, exactly as
+get_summary_stats() used to. The result check compares the two for every
+metric whose definition has not changed since.
+
+Usage: python benchmarks/bench_summary.py [iterations]
+"""
+import math
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+
+# stats key -> (original query, {column: int | float}); NULL or zero columns read as 0 of that type, as they did.
+LEGACY_QUERIES = {
+    'total_revenue': ("""
+        SELECT SUM(amount) AS total_revenue
+        FROM Charges
+        WHERE charge_status IN ('billed', 'paid')
+    """, {'total_revenue': float}),
+    'quarterly_revenue': ("""
+        SELECT
+            CAST(strftime('%Y', c.charge_date) AS INTEGER) AS revenue_year,
+            CAST((CAST(strftime('%m', c.charge_date) AS INTEGER) - 1) / 3 + 1 AS INTEGER) AS revenue_quarter,
+            SUM(c.amount) AS total_revenue
+        FROM Charges c
+        WHERE c.charge_status = 'paid'
+        GROUP BY
+            strftime('%Y', c.charge_date),
+            revenue_quarter
+        ORDER BY
+            revenue_year,
+            revenue_quarter
+    """, {'revenue_year': int, 'revenue_quarter': int, 'total_revenue': float}),
+    'occupancy_daily': ("""
+        SELECT
+            DATE(ra.check_in_time) AS date,
+            COUNT(DISTINCT ra.assignment_id) AS total_stays,
+            COUNT(DISTINCT ra.room_id) AS unique_rooms_occupied,
+            (SELECT COUNT(*) FROM Rooms WHERE room_status != 'renovation') AS total_available_rooms,
+            (COUNT(DISTINCT ra.room_id) * 100.0 /
+             MAX((SELECT COUNT(*) FROM Rooms WHERE room_status != 'renovation'), 1)) AS occupancy_rate
+        FROM RoomAssignments ra
+        WHERE ra.check_in_time IS NOT NULL
+        GROUP BY date(ra.check_in_time)
+        ORDER BY date DESC
+        LIMIT 90
+    """, {'total_stays': int, 'unique_rooms_occupied': int, 'total_available_rooms': int, 'occupancy_rate': float}),
+    'occupancy_monthly': ("""
+        SELECT
+            strftime('%Y-%m', ra.check_in_time) AS month,
+            COUNT(DISTINCT ra.assignment_id) AS total_stays,
+            COUNT(DISTINCT ra.room_id) AS unique_rooms_occupied,
+            (SELECT COUNT(*) FROM Rooms WHERE room_status != 'renovation') AS total_available_rooms,
+            (COUNT(DISTINCT ra.room_id) * 100.0 /
+             MAX((SELECT COUNT(*) FROM Rooms WHERE room_status != 'renovation'), 1)) AS occupancy_rate
+        FROM RoomAssignments ra
+        WHERE ra.check_in_time IS NOT NULL
+        GROUP BY strftime('%Y-%m', ra.check_in_time)
+        ORDER BY month
+    """, {'total_stays': int, 'unique_rooms_occupied': int, 'total_available_rooms': int, 'occupancy_rate': float}),
+    'top_customers': ("""
+        SELECT
+            bp.billed_party_id,
+            COALESCE(bp.organization_name, bp.first_name || ' ' || bp.last_name) AS customer_name,
+            bp.party_type,
+            SUM(c.amount) AS total_revenue,
+            COUNT(DISTINCT res.reservation_id) AS total_reservations,
+            MAX(res.check_in_date) AS last_visit_date
+        FROM BilledParties bp
+        LEFT JOIN Charges c ON bp.billed_party_id = c.billed_party_id AND c.charge_status IN ('billed', 'paid')
+        LEFT JOIN Reservations res ON bp.billed_party_id = res.billed_party_id
+        GROUP BY bp.billed_party_id, customer_name, bp.party_type
+        HAVING total_revenue > 0
+        ORDER BY total_revenue DESC
+        LIMIT 20
+    """, {'total_revenue': float, 'total_reservations': int}),
+    'high_risk_customers': ("""
+        SELECT
+            cq.billed_party_id,
+            COALESCE(bp.first_name || ' ' || bp.last_name, bp.organization_name) AS customer_name,
+            bp.party_type,
+            cq.past_history_score,
+            cq.cooperativeness_score,
+            cq.flexibility_score,
+            cq.payment_promptness_score,
+            cq.overall_qualification_score,
+            (0.4 * (100 - cq.payment_promptness_score) +
+             0.3 * (100 - cq.past_history_score) +
+             0.2 * (100 - cq.cooperativeness_score) +
+             0.1 * (100 - cq.flexibility_score)) AS risk_score,
+            COUNT(DISTINCT res.reservation_id) AS total_reservations,
+            COALESCE(SUM(CASE WHEN b.bill_status = 'overdue' THEN b.total_amount ELSE 0 END), 0) AS overdue_amount,
+            MAX(res.check_in_date) AS last_visit_date
+        FROM CustomerQualifications cq
+        JOIN BilledParties bp ON cq.billed_party_id = bp.billed_party_id
+        LEFT JOIN Reservations res ON bp.billed_party_id = res.billed_party_id
+        LEFT JOIN Bills b ON bp.billed_party_id = b.billed_party_id
+        GROUP BY cq.billed_party_id, customer_name, bp.party_type,
+                 cq.past_history_score, cq.cooperativeness_score,
+                 cq.flexibility_score, cq.payment_promptness_score,
+                 cq.overall_qualification_score
+        ORDER BY risk_score DESC
+        LIMIT 50
+    """, {'past_history_score': int, 'cooperativeness_score': int, 'flexibility_score': int,
+          'payment_promptness_score': int, 'overall_qualification_score': float, 'risk_score': float,
+          'total_reservations': int, 'overdue_amount': float}),
+    'event_count_by_month': ("""
+        SELECT
+            strftime('%Y-%m', e.start_date) AS month,
+            COUNT(DISTINCT e.event_id) AS total_events,
+            SUM(e.estimated_attendance) AS total_estimated_attendance,
+            AVG(e.estimated_attendance) AS avg_attendance_per_event,
+            COUNT(DISTINCT e.host_id) AS unique_hosts
+        FROM Events e
+        WHERE e.start_date IS NOT NULL
+        GROUP BY strftime('%Y-%m', e.start_date)
+        ORDER BY month
+    """, {'total_events': int, 'total_estimated_attendance': int, 'avg_attendance_per_event': float,
+          'unique_hosts': int}),
+    'average_attendance': ("""
+        SELECT
+            COUNT(DISTINCT e.event_id) AS total_events,
+            AVG(e.estimated_attendance) AS avg_estimated_attendance,
+            AVG(er.actual_attendance) AS avg_actual_attendance,
+            SUM(e.estimated_attendance) AS total_estimated_attendance,
+            SUM(er.actual_attendance) AS total_actual_attendance
+        FROM Events e
+        LEFT JOIN EventRooms er ON e.event_id = er.event_id
+    """, {'total_events': int, 'avg_estimated_attendance': float, 'avg_actual_attendance': float,
+          'total_estimated_attendance': int, 'total_actual_attendance': int}),
+    'avg_fb_spend': ("""
+        SELECT
+            COUNT(DISTINCT c.billed_party_id) AS total_guests_with_fb,
+            COUNT(DISTINCT mc.meal_charge_id) AS total_meal_charges,
+            SUM(c.amount) AS total_fb_revenue,
+            AVG(c.amount) AS avg_fb_spend_per_charge,
+            SUM(c.amount) / COUNT(DISTINCT c.billed_party_id) AS avg_fb_spend_per_guest
+        FROM Charges c
+        JOIN MealCharges mc ON c.charge_id = mc.charge_id
+        WHERE c.charge_status IN ('billed', 'paid')
+    """, {'total_guests_with_fb': int, 'total_meal_charges': int, 'total_fb_revenue': float,
+          'avg_fb_spend_per_charge': float, 'avg_fb_spend_per_guest': float}),
+    'fb_revenue_by_meal': ("""
+        SELECT
+            mc.meal_type,
+            COUNT(mc.meal_charge_id) AS total_charges,
+            SUM(c.amount) AS total_revenue,
+            AVG(c.amount) AS avg_charge_amount,
+            COUNT(DISTINCT c.billed_party_id) AS unique_customers,
+            SUM(c.amount) * 100.0 / (
+                SELECT SUM(amount)
+                FROM Charges c2
+                JOIN MealCharges mc2 ON c2.charge_id = mc2.charge_id
+                WHERE c2.charge_status IN ('billed', 'paid')
+            ) AS percentage_of_total_fb
+        FROM MealCharges mc
+        JOIN Charges c ON mc.charge_id = c.charge_id
+        WHERE c.charge_status IN ('billed', 'paid')
+        GROUP BY mc.meal_type
+        ORDER BY total_revenue DESC
+    """, {'total_charges': int, 'total_revenue': float, 'avg_charge_amount': float, 'unique_customers': int,
+          'percentage_of_total_fb': float}),
+    'unique_customers_count': ("""
+        SELECT COUNT(DISTINCT billed_party_id) AS unique_customers_count
+        FROM Reservations
+        WHERE reservation_status IN ('confirmed', 'checked_in', 'checked_out')
+    """, {'unique_customers_count': int}),
+}
+SINGLE_ROW = ('total_revenue', 'average_attendance', 'avg_fb_spend', 'unique_customers_count')
+# Metrics given a new definition since the original queries, so the two paths differ on purpose:
+# occupancy counts room-nights over each stay rather than check-ins per day, and top customers and
+# average attendance no longer count a charge or an event once per reservation or event room joined.
+REDEFINED = ('occupancy_daily', 'occupancy_monthly', 'avg_occupancy_monthly', 'top_customers', 'average_attendance')
+
+
+def legacy_query(key):
+    """Run one original query on a fresh connection, converted the way the original get_* did."""
+    query, types = LEGACY_QUERIES[key]
+    connection = sqlite3.connect(app.get_db_path())
+    connection.row_factory = sqlite3.Row
+    try:
+        rows = [dict(row) for row in connection.execute(query).fetchall()]
+    finally:
+        connection.close()
+    for row in rows:
+        for column, convert in types.items():
+            row[column] = convert(row[column]) if row[column] else convert()
+    if key == 'quarterly_revenue':
+        for row in rows:
+            row['quarter'] = f"{row['revenue_year']}-Q{row['revenue_quarter']}"
+    if key in SINGLE_ROW:
+        row = rows[0] if rows else {}
+        return row.get(key, 0) if len(types) == 1 else row
+    return rows
+
+
+def legacy_summary_stats():
+    stats = {key: legacy_query(key) for key in LEGACY_QUERIES}
+    occupancy_monthly = stats['occupancy_monthly']
+    stats['avg_occupancy_monthly'] = (sum(row['occupancy_rate'] for row in occupancy_monthly) / len(occupancy_monthly)
+                                      if occupancy_monthly else 0)
+    return stats
+
+
+def same(left, right):
+    """Equality with floats compared to a tolerance: the two paths sum in a different order."""
+    if isinstance(left, float) or isinstance(right, float):
+        return left is not None and right is not None and math.isclose(left, right, rel_tol=1e-9, abs_tol=1e-6)
+    if isinstance(left, dict) and isinstance(right, dict):
+        return left.keys() == right.keys() and all(same(left[key], right[key]) for key in left)
+    if isinstance(left, (list, tuple)) and isinstance(right, (list, tuple)):
+        return len(left) == len(right) and all(same(a, b) for a, b in zip(left, right))
+    return left == right
+
+
+def time_it(func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def time_route(client, path, iterations):
+    return time_it(lambda: client.get(path), iterations)
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    app.metric_cache.enabled = False
+
+    legacy = legacy_summary_stats()
+    current = app.get_summary_stats()
+    mismatched = [key for key in legacy if key not in REDEFINED and not same(legacy[key], current[key])]
+    print(f"Result check: {'OK' if not mismatched else 'MISMATCH in ' + ', '.join(mismatched)}"
+          f" (not compared, redefined since: {', '.join(REDEFINED)})")
+
+    legacy_ms = time_it(legacy_summary_stats, iterations)
+    current_ms = time_it(app.get_summary_stats, iterations)
+    print(f"legacy get_summary_stats:      {legacy_ms:8.2f} ms")
+    print(f"current get_summary_stats:     {current_ms:8.2f} ms ({legacy_ms / current_ms:.1f}x)")
+
+    client = app.app.test_client()
+    for path in ('/', '/dashboard'):
+        print(f"GET {path:<11} {time_route(client, path, iterations):8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
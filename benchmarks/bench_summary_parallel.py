@@ -0,0 +1,53 @@
+"""Compare serial and concurrent get_summary_stats() wall time under load.
+
+Each simulated user calls get_summary_stats() back to back; the metric cache
+is disabled so every call runs the queries.
+
+Usage: python benchmarks/bench_summary_parallel.py [requests_per_user]
+"""
+from concurrent.futures import ThreadPoolExecutor
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+
+
+def run_user(requests_per_user):
+    latencies = []
+    for _ in range(requests_per_user):
+        start = time.perf_counter()
+        app.get_summary_stats()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def run_load(users, requests_per_user):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as executor:
+        results = list(executor.map(run_user, [requests_per_user] * users))
+    wall = time.perf_counter() - start
+    latencies = sorted(latency for user in results for latency in user)
+    return wall, statistics.median(latencies), latencies[int(len(latencies) * 0.95) - 1]
+
+
+def main():
+    requests_per_user = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    app.metric_cache.enabled = False
+    app.summary_timeout_scale = 1000.0
+    app.get_summary_stats()
+
+    print(f"{'users':>5} {'mode':>8} {'wall s':>8} {'p50 ms':>8} {'p95 ms':>8} {'req/s':>8}")
+    for users in (1, 4, 16):
+        for parallel in (False, True):
+            app.summary_parallel = parallel
+            wall, p50, p95 = run_load(users, requests_per_user)
+            mode = 'parallel' if parallel else 'serial'
+            print(f"{users:>5} {mode:>8} {wall:8.2f} {p50:8.1f} {p95:8.1f} {users * requests_per_user / wall:8.1f}")
+
+
+if __name__ == '__main__':
+    main()
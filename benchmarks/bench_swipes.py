@@ -0,0 +1,172 @@
+"""Card swipe ingestion through GroupCommitWriter, and presence queries from PresenceIndex vs SQL.
+
+Copies the cached synthetic database used by bench_export.py and gives it
+card readers (the generator leaves CardReaders and LocationLogs empty): an
+entry and an exit reader for the pool, the gym, the restaurant, ten meeting
+rooms and the first sleeping rooms. Swipes are then submitted by several
+threads, a few at a time as door controllers send them, and the throughput
+and acknowledgement latency (submit to durable) are reported next to the
+baseline of committing every swipe on its own with synchronous FULL.
+Finally the occupancy of every facility is read from the index and from
+the window-function query over the whole log.
+
+Usage: python benchmarks/bench_swipes.py [rows] [swipes] [threads]     # default 2,000,000, 200,000, 8
+"""
+from datetime import datetime, timedelta
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_export import database_for
+import card_swipes
+
+SWIPES_PER_SUBMIT = 4
+BASELINE_SWIPES = 500
+GUEST_ROOMS = 200
+
+
+def install_readers(connection):
+    """An entry/exit reader pair per facility; returns {facility: (entry reader, exit reader)}."""
+    facilities = [('other', None, 'Pool'), ('health_club', None, 'Gym'), ('restaurant', None, 'Main Restaurant')]
+    meeting = connection.execute("SELECT room_id FROM Rooms WHERE can_be_meeting = 1 LIMIT 10").fetchall()
+    sleeping = connection.execute(f"SELECT room_id FROM Rooms WHERE can_be_sleeping = 1 LIMIT {GUEST_ROOMS}").fetchall()
+    facilities += [('meeting_room', room_id, f"Meeting Room {room_id}") for (room_id,) in meeting]
+    facilities += [('room', room_id, f"Room {room_id}") for (room_id,) in sleeping]
+    readers, pairs = [], {}
+    for location_type, room_id, name in facilities:
+        pairs[name] = (len(readers) + 1, len(readers) + 2)
+        readers.append((len(readers) + 1, location_type, room_id, name, 'entry'))
+        readers.append((len(readers) + 1, location_type, room_id, name, 'exit'))
+    with connection:
+        connection.executemany("INSERT INTO CardReaders VALUES (?, ?, ?, ?, ?)", readers)
+    return pairs
+
+
+def generate_swipes(rng, pairs, guests, count):
+    """Guests wandering in and out of facilities, in time order."""
+    names = list(pairs)
+    clock = datetime(2025, 6, 1, 6, 0, 0)
+    inside = {}  # guest -> facility name
+    swipes = []
+    for _ in range(count):
+        clock += timedelta(milliseconds=rng.randint(1, 200))
+        guest = rng.randint(1, guests)
+        name = inside.pop(guest, None)
+        if name is None:
+            name = rng.choice(names)
+            inside[guest] = name
+            reader, direction = pairs[name][0], 'entering'
+        else:
+            reader, direction = pairs[name][1], 'leaving'
+        swipes.append(card_swipes.Swipe(guest, reader, clock.strftime(card_swipes.TIMESTAMP_FORMAT), direction))
+    return swipes
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def group_commit(db_path, swipes, threads):
+    """Submit swipes from threads through one writer; returns (seconds, ack latencies in ms, writer status)."""
+    writer = card_swipes.GroupCommitWriter(db_path)
+    chunks = [swipes[i:i + SWIPES_PER_SUBMIT] for i in range(0, len(swipes), SWIPES_PER_SUBMIT)]
+    latencies = [[] for _ in range(threads)]
+
+    def controller(number):
+        for chunk in chunks[number::threads]:
+            start = time.perf_counter()
+            writer.submit(chunk).result()
+            latencies[number].append((time.perf_counter() - start) * 1000)
+
+    workers = [threading.Thread(target=controller, args=(number,)) for number in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    writer.close()
+    return elapsed, [ms for per_thread in latencies for ms in per_thread], writer.status()
+
+
+def commit_each(db_path, swipes):
+    """The baseline: one transaction, and one fsync, per swipe."""
+    connection = sqlite3.connect(db_path, isolation_level=None)
+    for name, value in card_swipes.WRITER_PRAGMAS:
+        connection.execute(f"PRAGMA {name} = {value}")
+    latencies = []
+    start = time.perf_counter()
+    for swipe in swipes:
+        began = time.perf_counter()
+        connection.execute("BEGIN IMMEDIATE")
+        log_id = connection.execute(card_swipes.NEXT_LOG_ID).fetchone()[0]
+        connection.execute(card_swipes.INSERT_LOG, (log_id, *swipe))
+        connection.execute("COMMIT")
+        latencies.append((time.perf_counter() - began) * 1000)
+    elapsed = time.perf_counter() - start
+    connection.close()
+    return elapsed, latencies
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 200000
+    threads = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    source = database_for(rows)
+    rng = random.Random(11)
+    directory = tempfile.mkdtemp(prefix='bench-swipes-')
+    try:
+        db_path = os.path.join(directory, 'swipes.db')
+        shutil.copyfile(source, db_path)
+        connection = sqlite3.connect(db_path)
+        pairs = install_readers(connection)
+        guests = connection.execute("SELECT COUNT(*) FROM Guests").fetchone()[0]
+        connection.close()
+        swipes = generate_swipes(rng, pairs, guests, count)
+
+        elapsed, latencies = commit_each(db_path, swipes[:BASELINE_SWIPES])
+        print(f"commit per swipe:   {BASELINE_SWIPES / elapsed:>10,.0f} swipes/s  ack p50 "
+              f"{statistics.median(latencies):>7.2f} ms  p99 {percentile(latencies, 0.99):>7.2f} ms "
+              f"({BASELINE_SWIPES} swipes)")
+        elapsed, latencies, status = group_commit(db_path, swipes[BASELINE_SWIPES:], threads)
+        print(f"group commit:       {(count - BASELINE_SWIPES) / elapsed:>10,.0f} swipes/s  ack p50 "
+              f"{statistics.median(latencies):>7.2f} ms  p99 {percentile(latencies, 0.99):>7.2f} ms "
+              f"({threads} threads, {SWIPES_PER_SUBMIT} per submit, {status['commits']:,} commits of "
+              f"{status['avg_batch']} on average)")
+
+        connection = sqlite3.connect(db_path)
+        cursor = connection.cursor()
+        index = card_swipes.PresenceIndex()
+        start = time.perf_counter()
+        index.refresh(cursor)
+        print(f"index build:        {(time.perf_counter() - start) * 1000:>10,.0f} ms "
+              f"({index.swipes:,} swipes, {len(index.readers)} readers)")
+        start = time.perf_counter()
+        expected = card_swipes.sql_presence(cursor)
+        sql_ms = (time.perf_counter() - start) * 1000
+        print(f"SQL occupancy:      {sql_ms:>10,.1f} ms per query")
+        queries = 1000
+        start = time.perf_counter()
+        for _ in range(queries):
+            facilities = index.occupancy(cursor)
+        index_ms = (time.perf_counter() - start) * 1000 / queries
+        print(f"index occupancy:    {index_ms:>10,.3f} ms per query ({sql_ms / index_ms:,.0f}x; "
+              f"{sum(f['occupancy'] for f in facilities):,} guests inside; "
+              f"matches SQL: {'yes' if index.snapshot() == expected else 'NO'})")
+        connection.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
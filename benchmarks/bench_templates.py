@@ -0,0 +1,93 @@
+"""Dashboard template rendering with and without fragment and bytecode caching.
+
+Renders summary.html and index.html from one precomputed get_summary_stats()
+result, so only template work is timed:
+
+  * full render: fragment cache disabled, every card and chart re-rendered
+  * cached: every fragment served from the fragment cache
+  * one metric changed: only the fragments keyed on top_customers re-rendered
+
+and compares a cold template load (parse + compile) with loading the same
+template from the bytecode cache, as a fresh worker would. Runs against the
+cached synthetic database used by bench_export.py.
+
+Usage: python benchmarks/bench_templates.py [rows] [iterations]     # default 2,000,000 charges, 50
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_export import database_for
+from bench_filters import ensure_indexes
+import fragment_cache
+
+TEMPLATES = ('summary.html', 'index.html')
+
+
+def best_time(func, iterations):
+    best = float('inf')
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    db_path = database_for(rows)
+    ensure_indexes(db_path)
+    os.environ['DB_PATH'] = db_path
+    os.environ['METRIC_CACHE_ENABLED'] = '0'
+    os.environ['SUMMARY_TIMEOUT_SCALE'] = '100'
+    import app
+
+    stats = app.get_summary_stats()
+    changed = dict(stats, metric_versions=dict(stats['metric_versions']))
+
+    def render(name, context):
+        with app.app.test_request_context('/'):
+            return app.render_template(name, **context)
+
+    def render_changed(name):
+        # A new version for one metric: only its fragments miss the cache.
+        changed['metric_versions']['top_customers'] = fragment_cache.fingerprint(time.perf_counter_ns())
+        return render(name, changed)
+
+    print(f"{'template':<16} {'full render':>14} {'cached':>12} {'1 changed':>12}")
+    for name in TEMPLATES:
+        app.template_fragments.enabled = False
+        full = best_time(lambda: render(name, stats), iterations)
+        app.template_fragments.enabled = True
+        render(name, stats)
+        cached = best_time(lambda: render(name, stats), iterations)
+        one_changed = best_time(lambda: render_changed(name), iterations)
+        print(f"{name:<16} {full * 1000:>11.2f} ms {cached * 1000:>9.2f} ms {one_changed * 1000:>9.2f} ms")
+
+    bytecode_dir = tempfile.mkdtemp(prefix='bench-jinja-')
+    try:
+        print(f"\n{'template':<16} {'compile':>14} {'bytecode':>12}")
+        for name in TEMPLATES:
+            def cold_load(use_bytecode):
+                environment = app.app.create_jinja_environment()
+                fragment_cache.configure(environment, bytecode_cache_dir=bytecode_dir)
+                if not use_bytecode:
+                    environment.bytecode_cache = None
+                environment.get_template(name)
+
+            cold_load(True)  # write the bytecode once
+            compile_seconds = best_time(lambda: cold_load(False), 5)
+            bytecode_seconds = best_time(lambda: cold_load(True), 5)
+            print(f"{name:<16} {compile_seconds * 1000:>11.2f} ms {bytecode_seconds * 1000:>9.2f} ms")
+    finally:
+        shutil.rmtree(bytecode_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""Load-test the Flask debug server against the ASGI entry point.
+
+Starts each server on the cached synthetic database used by bench_export.py,
+warms the dashboard, then runs concurrent clients for a fixed time:
+
+  * fast clients load /dashboard and the cached quarterly revenue API back to back
+  * slow clients request daily occupancy for random date windows, so every
+    request misses the metric cache and runs a real aggregation
+
+and reports throughput and latency per client class. The debug server is
+started the way app.py runs it (debug=True, threaded, no reloader); the ASGI
+app runs in a single uvicorn worker.
+
+Usage: python benchmarks/load_test.py [--clients 200] [--slow-clients 8] [--duration 20] [--rows 2000000]
+       python benchmarks/load_test.py --url http://host:port    # test a server that is already running
+"""
+import argparse
+import asyncio
+from datetime import timedelta
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_export import database_for
+from bench_filters import ensure_indexes
+import synthetic_data
+
+FAST_PATHS = ['/dashboard', '/api/v1/metrics/quarterly_revenue']
+
+SERVERS = {
+    'flask debug': [sys.executable, '-c',
+                    "import sys, app; app.app.run(debug=True, use_reloader=False, port=int(sys.argv[1]))"],
+    'asgi (uvicorn)': [sys.executable, '-m', 'uvicorn', 'asgi:application', '--log-level', 'warning', '--port'],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def slow_path():
+    start = synthetic_data.END_DATE - timedelta(days=random.randint(30, 900))
+    end = start + timedelta(days=random.randint(14, 180))
+    return f"/api/v1/metrics/occupancy_daily?start={start.isoformat()}&end={end.isoformat()}"
+
+
+async def get(host, port, path):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nConnection: close\r\n\r\n".encode('latin-1'))
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    return int(response.split(b' ', 2)[1])
+
+
+async def client(host, port, deadline, paths, results):
+    while time.perf_counter() < deadline:
+        path = paths()
+        start = time.perf_counter()
+        try:
+            status = await get(host, port, path)
+        except OSError:
+            status = None
+        results.append((time.perf_counter() - start, status))
+
+
+async def run_load(host, port, clients, slow_clients, duration):
+    deadline = time.perf_counter() + duration
+    fast, slow = [], []
+    tasks = [client(host, port, deadline, lambda: random.choice(FAST_PATHS), fast) for _ in range(clients)]
+    tasks += [client(host, port, deadline, slow_path, slow) for _ in range(slow_clients)]
+    await asyncio.gather(*tasks)
+    return fast, slow
+
+
+def summarize(label, results, duration):
+    latencies = sorted(seconds * 1000 for seconds, status in results if status == 200)
+    errors = sum(1 for _, status in results if status != 200)
+    if not latencies:
+        print(f"  {label:<6} no successful requests ({errors} errors)")
+        return
+    p95 = latencies[max(int(len(latencies) * 0.95) - 1, 0)]
+    print(f"  {label:<6} {len(latencies):>7} ok {errors:>5} err {len(latencies) / duration:>8.1f} req/s "
+          f"p50 {statistics.median(latencies):>8.1f} ms  p95 {p95:>8.1f} ms  max {latencies[-1]:>8.1f} ms")
+
+
+async def wait_until_ready(host, port, timeout=120):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if await get(host, port, '/api/v1/metrics') == 200:
+                return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+async def test_server(label, host, port, args):
+    await wait_until_ready(host, port)
+    for path in FAST_PATHS:
+        await get(host, port, path)
+    fast, slow = await run_load(host, port, args.clients, args.slow_clients, args.duration)
+    print(f"{label}: {args.clients} fast + {args.slow_clients} slow clients for {args.duration}s")
+    summarize('fast', fast, args.duration)
+    summarize('slow', slow, args.duration)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--slow-clients', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--rows', type=int, default=2000000)
+    parser.add_argument('--url', help='test an already running server instead of starting both')
+    args = parser.parse_args()
+
+    if args.url:
+        url = urlsplit(args.url)
+        asyncio.run(test_server(args.url, url.hostname, url.port or 80, args))
+        return
+
+    db_path = database_for(args.rows)
+    ensure_indexes(db_path)
+    env = dict(os.environ, DB_PATH=db_path, SUMMARY_TIMEOUT_SCALE='100')
+    for label, command in SERVERS.items():
+        port = free_port()
+        server = subprocess.Popen(command + [str(port)], cwd=ROOT, env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            asyncio.run(test_server(label, '127.0.0.1', port, args))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
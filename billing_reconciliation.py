@@ -0,0 +1,664 @@
+"""Reconcile bills against their charges, deposits and payments.
+
+Each bill is checked against:
+
+    charged         its BillCharges rows' charge amounts (cancelled charges excluded)
+    deposit_credit  the deposits of the reservations those charges were made for: an
+                    applied deposit in full, a refunded one less what was refunded
+    paid            its payments
+
+so that total_amount should equal charged - deposit_credit, and the balance
+due is total_amount - paid. A reservation whose charges are spread over
+several bills has its deposits credited to the lowest bill_id of them.
+
+One query does the checking, set-based: BillCharges joined to Charges is
+read once in bill order and summed per bill, next to per-bill sums of
+Payments and of the Deposits credited to each bill, and the three are
+joined to Bills in one pass. The problems found are a bitmask over ISSUES. Aging is left to report time, since it depends on
+the date: a bill with a balance due falls in the AGING_BUCKETS bucket for
+the days since its due_date, and a bill whose overdue flag disagrees with
+that gets one of DATED_ISSUES.
+
+Reconciler keeps the result of every bill in memory. Triggers created by
+`python billing_reconciliation.py install` log the bills affected by every
+changed bill, bill charge, charge, payment, deposit or room assignment in
+reconcile_changes, and refresh() rechecks just those. Installing them is a
+migration step, run once against the database; the app only checks for them
+at start-up. Without them every bill is rechecked when the database changes. `run` saves the results to bill_reconciliation, so the
+next run (and the app, on start-up) only rechecks the bills touched since.
+
+Usage:
+    python billing_reconciliation.py install    # create the change log, its triggers and the result tables, then run
+    python billing_reconciliation.py run        # recheck the bills touched since the last run and print a report
+    python billing_reconciliation.py run --full # recheck every bill
+    python billing_reconciliation.py check      # compare incremental, saved and per-bill results with a full run
+    python billing_reconciliation.py drop       # remove the change log, its triggers and the result tables
+"""
+import argparse
+from datetime import date, datetime
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+TOLERANCE = 0.005           # amounts are compared to the cent
+CHANGE_LOG_RETAIN = 100000  # reconcile_changes rows kept; a reconciler further behind rechecks everything
+REFRESH_FRACTION = 0.1      # recheck everything when more than this share of bills changed
+DETAIL_LIMIT = 200
+
+# (name, description, condition over the per-bill sums); bit i of `issues` is ISSUES[i].
+ISSUES = (
+    ('total_mismatch', 'Total is not its charges less deposit credit',
+     "charge_count > 0 AND ABS(total_amount - (charged - deposit_credit)) > {tolerance}"),
+    ('no_charges', 'No charges linked', "charge_count = 0"),
+    ('cancelled_charges', 'Cancelled charges linked', "cancelled_charges > 0"),
+    ('foreign_charges', "Charges of another billed party", "foreign_charges > 0"),
+    ('duplicate_charges', 'Charges billed more than once', "duplicate_charges > 0"),
+    ('overpaid', 'Payments exceed the total', "paid - total_amount > {tolerance}"),
+    ('paid_with_balance', 'Marked paid with a balance due', "bill_status = 'paid' AND total_amount - paid > {tolerance}"),
+    ('settled_not_paid', 'Paid in full but not marked paid',
+     "bill_status IN ('pending', 'sent', 'overdue') AND payment_count > 0 AND total_amount - paid <= {tolerance}"),
+    ('cancelled_with_payments', 'Cancelled with payments received', "bill_status = 'cancelled' AND payment_count > 0"),
+    ('refund_issues', 'Deposit refund inconsistent', "refund_issues > 0"),
+)
+# Checked at report time, against the as-of date.
+DATED_ISSUES = (
+    ('overdue_not_flagged', 'Past due with a balance but not marked overdue'),
+    ('overdue_flag_stale', 'Marked overdue with nothing past due'),
+)
+ISSUE_NAMES = tuple(name for name, _, _ in ISSUES) + tuple(name for name, _ in DATED_ISSUES)
+ISSUE_DESCRIPTIONS = dict([(name, description) for name, description, _ in ISSUES] + list(DATED_ISSUES))
+# (bucket, first day past due, last day); bills not yet due are 'current'.
+AGING_BUCKETS = (('current', None, -1), ('0-30', 0, 30), ('31-60', 31, 60), ('61-90', 61, 90), ('90+', 91, None))
+
+BILL_SET = "IN (SELECT value FROM json_each(:bills))"
+
+# Columns of a checked bill, as stored in bill_reconciliation.
+COLUMNS = ('bill_id', 'billed_party_id', 'bill_status', 'bill_date', 'due_date', 'total_amount', 'charged',
+           'deposit_credit', 'refunded', 'paid', 'charge_count', 'payment_count', 'last_payment_date', 'issues')
+BILL, PARTY, STATUS, BILL_DATE, DUE_DATE, TOTAL, CHARGED, DEPOSIT_CREDIT, REFUNDED, PAID = range(10)
+ISSUE_BITS = COLUMNS.index('issues')
+
+# Conditions narrowing the query to the bills being checked. A partial check also needs the charges on those
+# bills (a charge billed twice may be on another bill) and their reservations (for deposit credit).
+ALL_BILLS = {'bill_filter': "IS NOT NULL", 'charge_filter': "IS NOT NULL", 'reservation_filter': "IS NOT NULL"}
+SOME_BILLS = {
+    'bill_filter': BILL_SET,
+    'charge_filter': f"IN (SELECT charge_id FROM BillCharges WHERE bill_id {BILL_SET})",
+    'reservation_filter': ("IN (SELECT ra.reservation_id FROM BillCharges bc "
+                           "JOIN Charges c ON c.charge_id = bc.charge_id "
+                           f"JOIN RoomAssignments ra ON ra.assignment_id = c.room_assignment_id WHERE bc.bill_id {BILL_SET})"),
+}
+
+# One row per bill (COLUMNS). Charges, credited deposits and payments are each summed per bill, and the three
+# are folded together by one more GROUP BY before the single join to Bills.
+RECONCILE_QUERY = """
+    WITH billed_twice AS MATERIALIZED (
+        SELECT charge_id
+        FROM BillCharges
+        WHERE charge_id {charge_filter}
+        GROUP BY charge_id
+        HAVING COUNT(*) > 1
+    ),
+    charge_parts AS (
+        SELECT
+            bc.bill_id,
+            SUM(CASE WHEN c.charge_status = 'cancelled' THEN 0 ELSE c.amount END) AS charged,
+            COUNT(*) AS charge_count,
+            SUM(c.charge_status = 'cancelled') AS cancelled_charges,
+            SUM(c.billed_party_id IS NOT b.billed_party_id) AS foreign_charges,
+            COUNT(t.charge_id) AS duplicate_charges,
+            0 AS deposit_credit, 0 AS refunded, 0 AS refund_issues,
+            0 AS paid, 0 AS payment_count, NULL AS last_payment_date
+        FROM BillCharges bc
+        JOIN Charges c ON c.charge_id = bc.charge_id
+        JOIN Bills b ON b.bill_id = bc.bill_id
+        LEFT JOIN billed_twice t ON t.charge_id = bc.charge_id
+        WHERE bc.bill_id {bill_filter}
+        GROUP BY bc.bill_id
+    ),
+    -- Each deposit with the lowest bill holding a charge of its reservation.
+    credited_deposits AS MATERIALIZED (
+        SELECT
+            d.amount, d.refund_status, d.refund_amount, d.refund_date, d.deposit_date,
+            (SELECT MIN(bc.bill_id)
+             FROM RoomAssignments ra
+             JOIN Charges c ON c.room_assignment_id = ra.assignment_id
+             JOIN BillCharges bc ON bc.charge_id = c.charge_id
+             WHERE ra.reservation_id = d.reservation_id) AS bill_id
+        FROM Deposits d
+        WHERE d.reservation_id {reservation_filter}
+    ),
+    deposit_parts AS (
+        SELECT
+            bill_id, 0, 0, 0, 0, 0,
+            SUM(CASE refund_status
+                    WHEN 'applied' THEN amount
+                    WHEN 'refunded' THEN amount - COALESCE(refund_amount, amount)
+                    ELSE 0 END),
+            SUM(CASE WHEN refund_status = 'refunded' THEN COALESCE(refund_amount, 0) ELSE 0 END),
+            SUM(CASE WHEN refund_status = 'refunded'
+                     THEN refund_amount IS NULL OR refund_date IS NULL OR refund_amount <= 0
+                          OR refund_amount > amount OR COALESCE(refund_date < deposit_date, 0)
+                     ELSE COALESCE(refund_amount, 0) <> 0 END),
+            0, 0, NULL
+        FROM credited_deposits
+        WHERE bill_id {bill_filter}
+        GROUP BY bill_id
+    ),
+    payment_parts AS (
+        SELECT bill_id, 0, 0, 0, 0, 0, 0, 0, 0, SUM(payment_amount), COUNT(*), MAX(payment_date)
+        FROM Payments
+        WHERE bill_id {bill_filter}
+        GROUP BY bill_id
+    ),
+    totals AS (
+        SELECT
+            bill_id,
+            SUM(charged) AS charged,
+            SUM(charge_count) AS charge_count,
+            SUM(cancelled_charges) AS cancelled_charges,
+            SUM(foreign_charges) AS foreign_charges,
+            SUM(duplicate_charges) AS duplicate_charges,
+            SUM(deposit_credit) AS deposit_credit,
+            SUM(refunded) AS refunded,
+            SUM(refund_issues) AS refund_issues,
+            SUM(paid) AS paid,
+            SUM(payment_count) AS payment_count,
+            MAX(last_payment_date) AS last_payment_date
+        FROM (
+            SELECT * FROM charge_parts
+            UNION ALL SELECT * FROM deposit_parts
+            UNION ALL SELECT * FROM payment_parts
+        )
+        GROUP BY bill_id
+    )
+    SELECT
+        bill_id, billed_party_id, bill_status, bill_date, due_date, total_amount, charged, deposit_credit, refunded,
+        paid, charge_count, payment_count, last_payment_date,
+        {issues} AS issues
+    FROM (
+        SELECT
+            b.bill_id,
+            b.billed_party_id,
+            b.bill_status,
+            b.bill_date,
+            b.due_date,
+            ROUND(b.total_amount, 2) AS total_amount,
+            ROUND(COALESCE(t.charged, 0), 2) AS charged,
+            ROUND(COALESCE(t.deposit_credit, 0), 2) AS deposit_credit,
+            ROUND(COALESCE(t.refunded, 0), 2) AS refunded,
+            ROUND(COALESCE(t.paid, 0), 2) AS paid,
+            COALESCE(t.charge_count, 0) AS charge_count,
+            COALESCE(t.payment_count, 0) AS payment_count,
+            t.last_payment_date,
+            COALESCE(t.cancelled_charges, 0) AS cancelled_charges,
+            COALESCE(t.foreign_charges, 0) AS foreign_charges,
+            COALESCE(t.duplicate_charges, 0) AS duplicate_charges,
+            COALESCE(t.refund_issues, 0) AS refund_issues
+        FROM Bills b
+        LEFT JOIN totals t ON t.bill_id = b.bill_id
+        WHERE b.bill_id {bill_filter}
+    )
+"""
+
+# The bills whose check depends on reservation {reservation}: every bill holding one of its charges.
+RESERVATION_BILLS = """
+            SELECT bc.bill_id FROM RoomAssignments ra
+            JOIN Charges c ON c.room_assignment_id = ra.assignment_id
+            JOIN BillCharges bc ON bc.charge_id = c.charge_id
+            WHERE ra.reservation_id = {reservation}"""
+CHARGE_RESERVATION = ("(SELECT ra.reservation_id FROM Charges c JOIN RoomAssignments ra "
+                      "ON ra.assignment_id = c.room_assignment_id WHERE c.charge_id = {r}.charge_id)")
+ASSIGNMENT_RESERVATION = "(SELECT reservation_id FROM RoomAssignments WHERE assignment_id = {r}.room_assignment_id)"
+
+# Tables whose rows feed a bill's check -> SELECT of the bill_ids a change to row {r} affects.
+TRACKED_TABLES = {
+    'Bills': "SELECT {r}.bill_id",
+    'Payments': "SELECT {r}.bill_id",
+    # The bill itself, other bills holding the charge (duplicate_charges) and those of its reservation (deposit credit).
+    'BillCharges': ("SELECT {r}.bill_id UNION SELECT bill_id FROM BillCharges WHERE charge_id = {r}.charge_id UNION"
+                    + RESERVATION_BILLS.format(reservation=CHARGE_RESERVATION)),
+    'Charges': ("SELECT bill_id FROM BillCharges WHERE charge_id = {r}.charge_id UNION"
+                + RESERVATION_BILLS.format(reservation=ASSIGNMENT_RESERVATION)),
+    'Deposits': RESERVATION_BILLS.format(reservation='{r}.reservation_id'),
+    'RoomAssignments': RESERVATION_BILLS.format(reservation='{r}.reservation_id'),
+}
+
+RESULTS_TABLE = 'bill_reconciliation'
+RUNS_TABLE = 'reconcile_runs'
+
+
+def issues_expression():
+    return ' | '.join(f"(COALESCE({condition.format(tolerance=TOLERANCE)}, 0) << {bit})"
+                      for bit, (_, _, condition) in enumerate(ISSUES))
+
+
+def reconcile_query(partial):
+    return RECONCILE_QUERY.format(issues=issues_expression(), **(SOME_BILLS if partial else ALL_BILLS))
+
+
+def issue_names(bits):
+    return [name for bit, name in enumerate(ISSUE_NAMES) if bits >> bit & 1]
+
+
+def parse_day(value):
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except (TypeError, ValueError):
+        return None
+
+
+def aging_bucket(days_past_due):
+    for bucket, first, last in AGING_BUCKETS:
+        if (first is None or days_past_due >= first) and (last is None or days_past_due <= last):
+            return bucket
+    return None
+
+
+def age(row, as_of):
+    """(days past due or None, aging bucket or None, issue bits including DATED_ISSUES) for one checked bill."""
+    bits = row[ISSUE_BITS]
+    balance = (row[TOTAL] or 0) - (row[PAID] or 0)
+    due = parse_day(row[DUE_DATE])
+    if row[STATUS] == 'cancelled' or balance <= TOLERANCE or due is None:
+        days = bucket = None
+    else:
+        days = (as_of - due).days
+        bucket = aging_bucket(days)
+    if days is not None and days > 0 and row[STATUS] in ('pending', 'sent'):
+        bits |= 1 << ISSUE_NAMES.index('overdue_not_flagged')
+    if row[STATUS] == 'overdue' and not (days is not None and days > 0):
+        bits |= 1 << ISSUE_NAMES.index('overdue_flag_stale')
+    return days, bucket, bits
+
+
+def summarize(rows, as_of, bills=None, issue=None, bucket=None, limit=DETAIL_LIMIT):
+    """Totals, issue counts and aging for checked bills (COLUMNS tuples), plus the flagged bills matching issue/bucket."""
+    totals = dict.fromkeys(('billed', 'charged', 'deposit_credit', 'refunded', 'paid', 'outstanding', 'discrepancy'), 0.0)
+    issue_counts = dict.fromkeys(ISSUE_NAMES, 0)
+    issue_amounts = dict.fromkeys(ISSUE_NAMES, 0.0)
+    aging = {name: {'bucket': name, 'bills': 0, 'outstanding': 0.0} for name, _, _ in AGING_BUCKETS}
+    flagged, checked, with_issues = [], 0, 0
+    issue_bit = 1 << ISSUE_NAMES.index(issue) if issue in ISSUE_NAMES else None
+    for row in rows:
+        if bills is not None and row[BILL] not in bills:
+            continue
+        checked += 1
+        total, charged, credit, paid = row[TOTAL] or 0, row[CHARGED], row[DEPOSIT_CREDIT], row[PAID]
+        discrepancy = total - (charged - credit) if row[COLUMNS.index('charge_count')] else 0.0
+        balance = total - paid
+        days, bill_bucket, bits = age(row, as_of)
+        totals['billed'] += total
+        totals['charged'] += charged
+        totals['deposit_credit'] += credit
+        totals['refunded'] += row[REFUNDED]
+        totals['paid'] += paid
+        totals['discrepancy'] += abs(discrepancy)
+        if bill_bucket is not None:
+            totals['outstanding'] += balance
+            aging[bill_bucket]['bills'] += 1
+            aging[bill_bucket]['outstanding'] += balance
+        if not bits:
+            continue
+        with_issues += 1
+        for bit, name in enumerate(ISSUE_NAMES):
+            if bits >> bit & 1:
+                issue_counts[name] += 1
+                issue_amounts[name] += abs(discrepancy) if name == 'total_mismatch' else abs(balance)
+        if (issue_bit is None or bits & issue_bit) and (bucket is None or bill_bucket == bucket):
+            flagged.append((abs(discrepancy), days if days is not None else -1, row, discrepancy, balance, days,
+                            bill_bucket, bits))
+    flagged.sort(key=lambda item: (-item[0], -item[1], item[2][BILL]))
+    return {
+        'as_of': as_of.isoformat(),
+        'bills': checked,
+        'bills_with_issues': with_issues,
+        'totals': {name: round(value, 2) for name, value in totals.items()},
+        'issues': [{'issue': name, 'description': ISSUE_DESCRIPTIONS[name], 'bills': issue_counts[name],
+                    'amount': round(issue_amounts[name], 2)} for name in ISSUE_NAMES],
+        'aging': [dict(entry, outstanding=round(entry['outstanding'], 2)) for entry in aging.values()],
+        'issue': issue if issue_bit is not None else None,
+        'bucket': bucket,
+        'flagged': len(flagged),
+        'detail': [dict(zip(COLUMNS[:ISSUE_BITS], row[:ISSUE_BITS]), expected=round(row[CHARGED] - row[DEPOSIT_CREDIT], 2),
+                        discrepancy=round(discrepancy, 2), balance=round(balance, 2), days_past_due=days,
+                        aging_bucket=bill_bucket, issues=issue_names(bits))
+                   for _, _, row, discrepancy, balance, days, bill_bucket, bits in flagged[:limit]],
+    }
+
+
+class Reconciler:
+    """The checked result of every bill, refreshed from the database on demand."""
+
+    def __init__(self, version=None):
+        self.version = version  # callable returning a value that changes with the database
+        self.rows = {}          # bill_id -> COLUMNS tuple
+        self.built = False
+        self.seen_version = None
+        self.change_seq = None  # last reconcile_changes seq applied; None without the change log
+        self.touched = set()    # bills rechecked since the last save(); None after a full recheck
+        self.full_runs = 0
+        self.incremental_runs = 0
+        self.last_run_ms = None
+        self.last_checked = 0
+        self._generation = 0
+        self._reports = {}
+        self._lock = threading.Lock()
+
+    def _check(self, cursor, bills=None):
+        if bills is None:
+            cursor.execute(reconcile_query(partial=False))
+        else:
+            cursor.execute(reconcile_query(partial=True), {'bills': json.dumps(sorted(bills))})
+        previous = cursor.row_factory
+        cursor.row_factory = None
+        try:
+            return cursor.fetchall()
+        finally:
+            cursor.row_factory = previous
+
+    def _changed(self):
+        self._generation += 1
+        self._reports = {}
+
+    def recheck_all(self, cursor):
+        # Read everything before touching the results, so an interrupted query leaves them as they were.
+        start = time.perf_counter()
+        change_seq = latest_change(cursor)
+        seen_version = self.version() if self.version else None
+        rows = self._check(cursor)
+        self.rows = {row[BILL]: row for row in rows}
+        self.change_seq, self.seen_version, self.built = change_seq, seen_version, True
+        self.touched = None
+        self.full_runs += 1
+        self.last_checked = len(rows)
+        self.last_run_ms = (time.perf_counter() - start) * 1000
+        self._changed()
+
+    def recheck(self, cursor, bills):
+        """Recheck some bills; those no longer in Bills are dropped."""
+        start = time.perf_counter()
+        checked = {row[BILL]: row for row in self._check(cursor, bills)}
+        for bill in bills:
+            if bill in checked:
+                self.rows[bill] = checked[bill]
+            else:
+                self.rows.pop(bill, None)
+        if self.touched is not None:
+            self.touched |= set(bills)
+        self.incremental_runs += 1
+        self.last_checked = len(bills)
+        self.last_run_ms = (time.perf_counter() - start) * 1000
+        self._changed()
+
+    def refresh(self, cursor):
+        """Bring the results up to date: recheck logged bills, or every bill if that is not possible."""
+        if not self.built:
+            if not self.load(cursor):
+                self.recheck_all(cursor)
+                return
+        if self.change_seq is None:
+            if self.version is None or self.version() != self.seen_version:
+                self.recheck_all(cursor)
+            return
+        changes = read_changes(cursor, self.change_seq)
+        if changes is None or len(changes[1]) > max(len(self.rows) * REFRESH_FRACTION, 1000):
+            self.recheck_all(cursor)
+            return
+        seq, bills = changes
+        if bills:
+            self.recheck(cursor, bills)
+        self.change_seq = seq
+
+    def report(self, cursor, as_of=None, bills=None, issue=None, bucket=None, limit=DETAIL_LIMIT):
+        """summarize() over the current results; unfiltered reports are kept until the results change."""
+        as_of = as_of or date.today()
+        with self._lock:
+            self.refresh(cursor)
+            key = (as_of, issue, bucket, limit)
+            if bills is not None:
+                return summarize(self.rows.values(), as_of, bills, issue, bucket, limit)
+            if key not in self._reports:
+                self._reports[key] = summarize(self.rows.values(), as_of, None, issue, bucket, limit)
+            return self._reports[key]
+
+    def load(self, cursor):
+        """Start from the results the last `run` saved, if the change log can bring them up to date."""
+        if not results_saved(cursor) or latest_change(cursor) is None:
+            return False
+        cursor.execute(f"SELECT change_seq FROM {RUNS_TABLE} ORDER BY run_id DESC LIMIT 1")
+        run = cursor.fetchone()
+        if run is None or read_changes(cursor, run[0]) is None:
+            return False
+        previous = cursor.row_factory
+        cursor.row_factory = None
+        try:
+            rows = cursor.execute(f"SELECT {', '.join(COLUMNS)} FROM {RESULTS_TABLE}").fetchall()
+        finally:
+            cursor.row_factory = previous
+        self.rows = {row[BILL]: row for row in rows}
+        self.change_seq, self.built, self.touched = run[0], True, set()
+        self._changed()
+        return True
+
+    def save(self, connection, mode):
+        """Write the bills rechecked since the last save (all of them after a full recheck) to bill_reconciliation."""
+        placeholders = ', '.join('?' for _ in COLUMNS)
+        with connection:
+            if self.touched is None:
+                connection.execute(f"DELETE FROM {RESULTS_TABLE}")
+                connection.executemany(f"INSERT INTO {RESULTS_TABLE} VALUES ({placeholders})", self.rows.values())
+            elif self.touched:
+                connection.executemany(f"DELETE FROM {RESULTS_TABLE} WHERE bill_id = ?",
+                                       [(bill,) for bill in self.touched])
+                connection.executemany(f"INSERT INTO {RESULTS_TABLE} VALUES ({placeholders})",
+                                       [self.rows[bill] for bill in self.touched if bill in self.rows])
+            connection.execute(f"INSERT INTO {RUNS_TABLE} (ran_at, mode, change_seq, bills_checked, elapsed_ms) "
+                               "VALUES (?, ?, ?, ?, ?)",
+                               (datetime.now().isoformat(timespec='seconds'), mode, self.change_seq,
+                                self.last_checked, round(self.last_run_ms or 0, 1)))
+        self.touched = set()
+
+    def status(self):
+        return {
+            'bills': len(self.rows),
+            'change_log': self.change_seq is not None,
+            'full_runs': self.full_runs,
+            'incremental_runs': self.incremental_runs,
+            'last_checked': self.last_checked,
+            'last_run_ms': round(self.last_run_ms, 1) if self.last_run_ms is not None else None,
+        }
+
+
+def table_exists(cursor, name):
+    cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = ?", (name,))
+    return cursor.fetchone()[0] > 0
+
+
+def change_log_installed(cursor):
+    return table_exists(cursor, 'reconcile_changes')
+
+
+def results_saved(cursor):
+    return table_exists(cursor, RESULTS_TABLE) and table_exists(cursor, RUNS_TABLE)
+
+
+def latest_change(cursor):
+    """Highest reconcile_changes seq (0 when empty), or None without the change log."""
+    if not change_log_installed(cursor):
+        return None
+    cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM reconcile_changes")
+    return cursor.fetchone()[0]
+
+
+def read_changes(cursor, after):
+    """(latest seq, {bills changed after seq `after`}), or None if entries after it were pruned."""
+    cursor.execute("SELECT COALESCE(MIN(seq), 0), COALESCE(MAX(seq), 0) FROM reconcile_changes")
+    first, last = cursor.fetchone()
+    if last <= after:
+        return after, set()
+    if first > after + 1:
+        return None
+    cursor.execute("SELECT DISTINCT bill_id FROM reconcile_changes WHERE seq > ? AND seq <= ?", (after, last))
+    return last, {row[0] for row in cursor.fetchall() if row[0] is not None}
+
+
+def create_triggers_sql(table, bills):
+    name = f"reconcile_changes_{table.lower()}"
+    log = "INSERT INTO reconcile_changes (bill_id) {0};"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {name}_ai AFTER INSERT ON {table} BEGIN\n"
+        f"    {log.format(bills.format(r='NEW'))}\nEND",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_ad AFTER DELETE ON {table} BEGIN\n"
+        f"    {log.format(bills.format(r='OLD'))}\nEND",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_au AFTER UPDATE ON {table} BEGIN\n"
+        f"    {log.format(bills.format(r='OLD'))}\n    {log.format(bills.format(r='NEW'))}\nEND",
+    ]
+
+
+def install(connection):
+    columns = ', '.join(COLUMNS[1:])
+    with connection:
+        connection.execute("CREATE TABLE IF NOT EXISTS reconcile_changes ("
+                           "seq INTEGER PRIMARY KEY AUTOINCREMENT, bill_id INTEGER)")
+        connection.execute(
+            "CREATE TRIGGER IF NOT EXISTS reconcile_changes_prune AFTER INSERT ON reconcile_changes BEGIN\n"
+            f"    DELETE FROM reconcile_changes WHERE seq <= NEW.seq - {CHANGE_LOG_RETAIN};\nEND")
+        for table, bills in TRACKED_TABLES.items():
+            for statement in create_triggers_sql(table, bills):
+                connection.execute(statement)
+        connection.execute(f"CREATE TABLE IF NOT EXISTS {RESULTS_TABLE} (bill_id INTEGER PRIMARY KEY, {columns})")
+        connection.execute(f"CREATE TABLE IF NOT EXISTS {RUNS_TABLE} (run_id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                           "ran_at TEXT, mode TEXT, change_seq INTEGER, bills_checked INTEGER, elapsed_ms REAL)")
+
+
+def drop(connection):
+    with connection:
+        for table in TRACKED_TABLES:
+            for suffix in ('ai', 'ad', 'au'):
+                connection.execute(f"DROP TRIGGER IF EXISTS reconcile_changes_{table.lower()}_{suffix}")
+        connection.execute("DROP TRIGGER IF EXISTS reconcile_changes_prune")
+        for table in ('reconcile_changes', RESULTS_TABLE, RUNS_TABLE):
+            connection.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+def run(connection, full=False):
+    """Recheck the bills touched since the last saved run (every bill with full=True) and save the results."""
+    cursor = connection.cursor()
+    reconciler = Reconciler()
+    if full or not reconciler.load(cursor):
+        reconciler.recheck_all(cursor)
+        mode = 'full'
+    else:
+        reconciler.refresh(cursor)
+        mode = 'full' if reconciler.touched is None else 'incremental'
+    if results_saved(cursor):
+        reconciler.save(connection, mode)
+    cursor.close()
+    return reconciler, mode
+
+
+# The reference for `check`: each bill's sums from correlated subqueries, deposits by the same attribution rule.
+REFERENCE_QUERY = """
+    SELECT
+        b.bill_id,
+        ROUND(COALESCE((SELECT SUM(c.amount) FROM BillCharges bc JOIN Charges c ON c.charge_id = bc.charge_id
+                        WHERE bc.bill_id = b.bill_id AND c.charge_status IS NOT 'cancelled'), 0), 2),
+        ROUND(COALESCE((SELECT SUM(CASE d.refund_status WHEN 'applied' THEN d.amount
+                                       WHEN 'refunded' THEN d.amount - COALESCE(d.refund_amount, d.amount) ELSE 0 END)
+                        FROM Deposits d
+                        WHERE d.reservation_id IN (SELECT ra.reservation_id FROM BillCharges bc
+                                                   JOIN Charges c ON c.charge_id = bc.charge_id
+                                                   JOIN RoomAssignments ra ON ra.assignment_id = c.room_assignment_id
+                                                   WHERE bc.bill_id = b.bill_id)
+                          AND (SELECT MIN(bc.bill_id) FROM RoomAssignments ra
+                               JOIN Charges c ON c.room_assignment_id = ra.assignment_id
+                               JOIN BillCharges bc ON bc.charge_id = c.charge_id
+                               WHERE ra.reservation_id = d.reservation_id) = b.bill_id), 0), 2),
+        ROUND(COALESCE((SELECT SUM(p.payment_amount) FROM Payments p WHERE p.bill_id = b.bill_id), 0), 2)
+    FROM Bills b
+    WHERE b.bill_id IS NOT NULL
+"""
+
+
+def check(connection, chunk=5000):
+    """Return a list of (what, problem) pairs; an empty list means consistent.
+
+    A full check is compared with every bill rechecked in chunks, with the
+    saved results (when `run` has brought them up to date) and, for the
+    charged, deposit and paid sums, with REFERENCE_QUERY.
+    """
+    cursor = connection.cursor()
+    problems = []
+    full = Reconciler()
+    full.recheck_all(cursor)
+
+    partial = Reconciler()
+    bills = sorted(full.rows)
+    for start in range(0, len(bills), chunk):
+        partial.recheck(cursor, set(bills[start:start + chunk]))
+    if partial.rows != full.rows:
+        differing = sum(partial.rows.get(bill) != row for bill, row in full.rows.items())
+        problems.append(('incremental', f"{differing} bill(s) differ between chunked and full checks"))
+
+    saved = Reconciler()
+    if saved.load(cursor) and read_changes(cursor, saved.change_seq)[1] == set() and saved.rows != full.rows:
+        problems.append((RESULTS_TABLE, 'saved results differ from a full check; run the reconciliation'))
+
+    cursor.execute(REFERENCE_QUERY)
+    expected = {row[0]: row[1:] for row in cursor.fetchall()}
+    mismatched = [bill for bill, row in full.rows.items()
+                  if any(abs(a - b) > TOLERANCE for a, b in zip((row[CHARGED], row[DEPOSIT_CREDIT], row[PAID]),
+                                                                  expected.get(bill, (None, None, None))))]
+    if mismatched or set(expected) != set(full.rows):
+        problems.append(('sums', f"{len(mismatched)} bill(s) differ from the per-bill subqueries"))
+    cursor.close()
+    return problems
+
+
+def print_report(report):
+    print(f"{report['bills']:,} bills as of {report['as_of']}, {report['bills_with_issues']:,} with issues")
+    for entry in report['issues']:
+        if entry['bills']:
+            print(f"  {entry['issue']:>24}: {entry['bills']:>8,} bills  {entry['amount']:>14,.2f}")
+    print('Aging of balances due:')
+    for entry in report['aging']:
+        print(f"  {entry['bucket']:>24}: {entry['bills']:>8,} bills  {entry['outstanding']:>14,.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('command', choices=['install', 'run', 'check', 'drop'])
+    parser.add_argument('--db', default=None, help='SQLite database (default: DB_PATH)')
+    parser.add_argument('--full', action='store_true', help='run: recheck every bill')
+    parser.add_argument('--as-of', type=date.fromisoformat, default=None, help='run: date to age balances at')
+    args = parser.parse_args(argv)
+
+    connection = sqlite3.connect(args.db or os.getenv('DB_PATH', 'last_resort_hotels.db'))
+    try:
+        if args.command == 'install':
+            install(connection)
+            args.command, args.full = 'run', True
+        if args.command == 'run':
+            reconciler, mode = run(connection, args.full)
+            print(f"Checked {reconciler.last_checked:,} bill(s) ({mode}) in {reconciler.last_run_ms or 0:,.0f} ms")
+            print_report(summarize(reconciler.rows.values(), args.as_of or date.today()))
+        elif args.command == 'drop':
+            drop(connection)
+            print("Dropped reconcile_changes and the saved results")
+        elif args.command == 'check':
+            problems = check(connection)
+            for name, problem in problems:
+                print(f"{name}: {problem}")
+            print('Reconciliation consistent' if not problems else f"{len(problems)} problem(s) found")
+            return 1 if problems else 0
+    finally:
+        connection.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,494 @@
+"""Calendar dimension table and the date-bucketed queries built on it.
+
+dim_calendar has one row per date with its reporting attributes: year,
+quarter, month, ISO week, day of week, holiday and holiday season. Queries
+bucket facts by joining against it instead of grouping by strftime() on the
+fact column, which costs a function call per row and a sort of the whole
+table:
+
+- every bucket is turned into [range_start, range_end) date ranges, one per
+  bucket for contiguous groupings (quarter, month, week, day) and one per
+  day for the others (day of week, day type);
+- each range is summed with an index range search on the fact's date column
+  (charges: the status/date covering index), so the work is one seek per
+  range plus the rows in the window, and nothing is sorted.
+
+Without that index every range would be a full scan, so range_search()
+checks the query plan first; revenue_query() then falls back to a single
+pass over Charges joined to the calendar by date, and the app keeps the
+strftime() queries for the buckets they can express (quarter, month).
+
+Holidays are the US federal holidays plus Christmas Eve and New Year's Eve
+(actual dates, not the observed weekdays). The holiday season runs from
+Thanksgiving through New Year's Day.
+
+The app installs the table at startup (prepare_database() in app.py), on a
+writable connection, since the pooled ones are query_only. ensure_calendar()
+builds a TEMP copy instead on a writable connection that must leave the
+database untouched (check, benchmarks).
+
+Usage:
+    python calendar_dimension.py install    # create and fill dim_calendar
+    python calendar_dimension.py check      # coverage and strftime comparison
+    python calendar_dimension.py drop
+"""
+import argparse
+from dataclasses import dataclass
+from datetime import date, timedelta
+import math
+import os
+import sqlite3
+import sys
+
+TABLE = 'dim_calendar'
+YEARS_AHEAD = 5
+
+COLUMNS = [
+    ('date', 'TEXT NOT NULL PRIMARY KEY'),
+    ('next_date', 'TEXT NOT NULL'),
+    ('year', 'INTEGER NOT NULL'),
+    ('quarter', 'INTEGER NOT NULL'),
+    ('month', 'INTEGER NOT NULL'),
+    ('month_key', 'TEXT NOT NULL'),
+    ('iso_year', 'INTEGER NOT NULL'),
+    ('iso_week', 'INTEGER NOT NULL'),
+    ('week_start', 'TEXT NOT NULL'),
+    ('day_of_week', 'INTEGER NOT NULL'),
+    ('day_name', 'TEXT NOT NULL'),
+    ('is_weekend', 'INTEGER NOT NULL'),
+    ('is_holiday', 'INTEGER NOT NULL'),
+    ('holiday_name', 'TEXT'),
+    ('is_holiday_season', 'INTEGER NOT NULL'),
+    ('day_type', 'TEXT NOT NULL'),
+]
+
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+DAY_TYPES = ['holiday', 'holiday_season', 'weekend', 'weekday']
+
+# (name, month, day) for fixed-date holidays; (name, month, weekday, n) for
+# the n-th weekday of the month (n = -1 for the last one).
+FIXED_HOLIDAYS = [
+    ("New Year's Day", 1, 1),
+    ('Juneteenth', 6, 19),
+    ('Independence Day', 7, 4),
+    ('Veterans Day', 11, 11),
+    ('Christmas Eve', 12, 24),
+    ('Christmas Day', 12, 25),
+    ("New Year's Eve", 12, 31),
+]
+FLOATING_HOLIDAYS = [
+    ('Martin Luther King Jr. Day', 1, 0, 3),
+    ("Presidents' Day", 2, 0, 3),
+    ('Memorial Day', 5, 0, -1),
+    ('Labor Day', 9, 0, 1),
+    ('Columbus Day', 10, 0, 2),
+    ('Thanksgiving', 11, 3, 4),
+]
+
+
+def nth_weekday(year, month, weekday, n):
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def holidays(year):
+    """Return {date: holiday name} for one year."""
+    days = {date(year, month, day): name for name, month, day in FIXED_HOLIDAYS}
+    for name, month, weekday, n in FLOATING_HOLIDAYS:
+        days[nth_weekday(year, month, weekday, n)] = name
+    return days
+
+
+def in_holiday_season(day):
+    if day.month == 1 and day.day == 1:
+        return True
+    return day >= nth_weekday(day.year, 11, 3, 4)
+
+
+def calendar_rows(start, end):
+    """Yield one dim_calendar row tuple (in COLUMNS order) per date in [start, end)."""
+    holiday_names = {}
+    day = start
+    while day < end:
+        if day.year not in holiday_names:
+            holiday_names[day.year] = holidays(day.year)
+        iso_year, iso_week, iso_weekday = day.isocalendar()
+        holiday_name = holiday_names[day.year].get(day)
+        season = in_holiday_season(day)
+        weekend = iso_weekday >= 6
+        if holiday_name:
+            day_type = 'holiday'
+        elif season:
+            day_type = 'holiday_season'
+        elif weekend:
+            day_type = 'weekend'
+        else:
+            day_type = 'weekday'
+        yield (
+            day.isoformat(),
+            (day + timedelta(days=1)).isoformat(),
+            day.year,
+            (day.month - 1) // 3 + 1,
+            day.month,
+            day.strftime('%Y-%m'),
+            iso_year,
+            iso_week,
+            (day - timedelta(days=iso_weekday - 1)).isoformat(),
+            iso_weekday,
+            DAY_NAMES[iso_weekday - 1],
+            int(weekend),
+            int(holiday_name is not None),
+            holiday_name,
+            int(season),
+            day_type,
+        )
+        day += timedelta(days=1)
+
+
+# Fact date columns the calendar has to cover.
+FACT_DATES = [
+    ('charges', 'charge_date'),
+    ('events', 'start_date'),
+    ('roomassignments', 'check_in_time'),
+    ('reservations', 'check_in_date'),
+    ('bills', 'bill_date'),
+]
+
+
+def data_range(connection):
+    """(first, last) date found in the fact tables, or (None, None) if they are empty."""
+    first = last = None
+    for table, column in FACT_DATES:
+        low, high = connection.execute(f"SELECT MIN({column}), MAX({column}) FROM {table}").fetchone()
+        if low is None:
+            continue
+        low, high = date.fromisoformat(low[:10]), date.fromisoformat(high[:10])
+        first = low if first is None else min(first, low)
+        last = high if last is None else max(last, high)
+    return first, last
+
+
+def default_range(connection):
+    """Whole years from the first fact date to YEARS_AHEAD years past the last one (or today)."""
+    first, last = data_range(connection)
+    today = date.today()
+    first = first or today
+    last = max(last or today, today)
+    return date(first.year, 1, 1), date(last.year + YEARS_AHEAD + 1, 1, 1)
+
+
+def create_table_sql(schema='main'):
+    columns = ',\n    '.join(f"{name} {sql_type}" for name, sql_type in COLUMNS)
+    return f"CREATE TABLE IF NOT EXISTS {schema}.{TABLE} (\n    {columns}\n) WITHOUT ROWID"
+
+
+def fill(connection, start, end, schema='main'):
+    placeholders = ', '.join('?' for _ in COLUMNS)
+    connection.execute(f"DELETE FROM {schema}.{TABLE}")
+    connection.executemany(f"INSERT INTO {schema}.{TABLE} VALUES ({placeholders})", calendar_rows(start, end))
+
+
+def install(connection, start=None, end=None):
+    if start is None or end is None:
+        default_start, default_end = default_range(connection)
+        start, end = start or default_start, end or default_end
+    with connection:
+        connection.execute(create_table_sql())
+        fill(connection, start, end)
+    return start, end
+
+
+def drop(connection):
+    with connection:
+        connection.execute(f"DROP TABLE IF EXISTS main.{TABLE}")
+
+
+def calendar_installed(cursor):
+    cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = ?", (TABLE,))
+    return cursor.fetchone()[0] > 0
+
+
+def ensure_calendar(cursor):
+    """Make dim_calendar resolvable on this writable connection, building a TEMP copy if needed."""
+    if calendar_installed(cursor):
+        return
+    cursor.execute("SELECT COUNT(*) FROM sqlite_temp_master WHERE type = 'table' AND name = ?", (TABLE,))
+    if cursor.fetchone()[0]:
+        return
+    start, end = default_range(cursor.connection)
+    cursor.execute(create_table_sql('temp'))
+    fill(cursor, start, end, 'temp')
+    cursor.connection.commit()
+
+
+# Range probe per fact, and the plan text showing it is answered by an index
+# search: charges need the covering index, events only the start_date one.
+RANGE_PROBES = {
+    'charges': ("SELECT SUM(c.amount) FROM Charges c "
+                "WHERE c.charge_status IN ('billed', 'paid') AND c.charge_date >= ? AND c.charge_date < ?",
+                ('COVERING INDEX', 'charge_date>')),
+    'events': ("SELECT COUNT(*), SUM(e.estimated_attendance) FROM Events e "
+               "WHERE e.start_date >= ? AND e.start_date < ?",
+               ('INDEX', 'start_date>')),
+}
+
+
+def range_search(cursor, fact):
+    """True when a date range on fact ('charges' or 'events') is an index search, not a scan."""
+    query, markers = RANGE_PROBES[fact]
+    cursor.execute(f"EXPLAIN QUERY PLAN {query}", ('', ''))
+    return any(detail.startswith('SEARCH') and all(marker in detail for marker in markers)
+               for *_, detail in cursor.fetchall())
+
+
+@dataclass(frozen=True)
+class Grouping:
+    columns: tuple       # (output name, dim_calendar column) pairs
+    contiguous: bool     # every bucket is one unbroken run of days
+
+    def select_list(self, alias):
+        return ', '.join(f"{alias}.{column} AS {name}" for name, column in self.columns)
+
+    def names(self, alias=None):
+        prefix = f"{alias}." if alias else ''
+        return ', '.join(f"{prefix}{name}" for name, _ in self.columns)
+
+
+GROUPINGS = {
+    'quarter': Grouping((('revenue_year', 'year'), ('revenue_quarter', 'quarter')), True),
+    'month': Grouping((('month', 'month_key'),), True),
+    'week': Grouping((('week', 'week_start'), ('iso_year', 'iso_year'), ('iso_week', 'iso_week')), True),
+    'day': Grouping((('date', 'date'),), True),
+    'day_of_week': Grouping((('day_of_week', 'day_of_week'), ('day_name', 'day_name')), False),
+    'day_type': Grouping((('day_type', 'day_type'),), False),
+}
+
+
+def ranges_sql(grouping, window):
+    """SELECT the grouping keys with [range_start, range_end) and the number of days per range."""
+    keys = grouping.select_list('d')
+    if grouping.contiguous:
+        group_by = ', '.join(f"d.{column}" for _, column in grouping.columns)
+        return (f"SELECT {keys}, MIN(d.date) AS range_start, MAX(d.next_date) AS range_end, COUNT(*) AS days "
+                f"FROM {TABLE} d WHERE {window} GROUP BY {group_by}")
+    return f"SELECT {keys}, d.date AS range_start, d.next_date AS range_end, 1 AS days FROM {TABLE} d WHERE {window}"
+
+
+def fact_window(table, column, alias):
+    """Calendar predicate limiting d.date to the days spanned by table.column."""
+    return (f"d.date >= (SELECT DATE(MIN({alias}.{column})) FROM {table} {alias}) "
+            f"AND d.date <= (SELECT MAX({alias}.{column}) FROM {table} {alias})")
+
+
+def revenue_query(grouping_name, statuses=('billed', 'paid'), calendar_filter='1', charge_filter='1',
+                  range_search=True):
+    """Revenue per calendar bucket: the grouping's columns, total_revenue, days and avg_daily_revenue.
+
+    calendar_filter restricts d.date (e.g. a requested date range) and
+    charge_filter is applied to Charges c; the statement's parameters are the
+    calendar_filter ones followed by the charge_filter ones. Buckets without
+    any matching charge are left out. range_search sums each range with an
+    index seek; without it Charges is read once and joined to the calendar
+    by date, which is the cheaper plan when there is no covering index.
+    """
+    grouping = GROUPINGS[grouping_name]
+    status_list = ', '.join(f"'{status}'" for status in statuses)
+    window = f"{fact_window('Charges', 'charge_date', 'c')} AND {calendar_filter}"
+    if not range_search:
+        return f"""
+            WITH calendar AS MATERIALIZED (
+                SELECT d.date AS calendar_date, {grouping.select_list('d')}
+                FROM {TABLE} d
+                WHERE {window}
+            ),
+            days AS (
+                SELECT {grouping.names()}, COUNT(*) AS days
+                FROM calendar
+                GROUP BY {grouping.names()}
+            ),
+            totals AS (
+                SELECT {grouping.names('k')}, SUM(c.amount) AS total_revenue
+                FROM Charges c
+                JOIN calendar k ON k.calendar_date = DATE(c.charge_date)
+                WHERE c.charge_status IN ({status_list}) AND {charge_filter}
+                GROUP BY {grouping.names('k')}
+            )
+            SELECT
+                {grouping.names('t')},
+                t.total_revenue,
+                days.days,
+                t.total_revenue / days.days AS avg_daily_revenue
+            FROM totals t
+            JOIN days USING ({grouping.names()})
+            WHERE t.total_revenue IS NOT NULL
+            ORDER BY {grouping.names('t')}
+        """
+    return f"""
+        WITH ranges AS ({ranges_sql(grouping, window)}),
+        totals AS MATERIALIZED (
+            SELECT
+                r.*,
+                (SELECT SUM(c.amount)
+                 FROM Charges c
+                 WHERE c.charge_status IN ({status_list})
+                   AND c.charge_date >= r.range_start
+                   AND c.charge_date < r.range_end
+                   AND {charge_filter}) AS total_revenue
+            FROM ranges r
+        )
+        SELECT
+            {grouping.names()},
+            SUM(total_revenue) AS total_revenue,
+            SUM(days) AS days,
+            SUM(total_revenue) / SUM(days) AS avg_daily_revenue
+        FROM totals
+        GROUP BY {grouping.names()}
+        HAVING SUM(total_revenue) IS NOT NULL
+        ORDER BY {grouping.names()}
+    """
+
+
+def event_count_query(grouping_name, calendar_filter='1', event_filter='1'):
+    """Event counts per calendar bucket (events is small, so this is a plain range join)."""
+    grouping = GROUPINGS[grouping_name]
+    window = f"{fact_window('Events', 'start_date', 'e')} AND {calendar_filter}"
+    return f"""
+        WITH ranges AS ({ranges_sql(grouping, window)})
+        SELECT
+            {grouping.names('r')},
+            COUNT(*) AS total_events,
+            SUM(e.estimated_attendance) AS total_estimated_attendance,
+            AVG(e.estimated_attendance) AS avg_attendance_per_event,
+            COUNT(DISTINCT e.host_id) AS unique_hosts
+        FROM ranges r
+        JOIN Events e ON e.start_date >= r.range_start AND e.start_date < r.range_end AND {event_filter}
+        GROUP BY {grouping.names('r')}
+        ORDER BY {grouping.names('r')}
+    """
+
+
+def day_attributes(cursor, start_date, end_date):
+    """{date string: row} of dim_calendar for [start_date, end_date) (ISO strings)."""
+    cursor.execute(f"SELECT * FROM {TABLE} WHERE date >= ? AND date < ?", (start_date, end_date))
+    columns = [description[0] for description in cursor.description]
+    return {row[0]: dict(zip(columns, row)) for row in cursor.fetchall()}
+
+
+def group_daily_occupancy(cursor, daily, grouping_name):
+    """Fold a daily occupancy series (compute_occupancy()['day']) into calendar buckets.
+
+    Unique-room counts are not additive across non-contiguous days, so each
+    bucket reports days, total_stays, room nights and occupancy_rate.
+    """
+    grouping = GROUPINGS[grouping_name]
+    if not daily:
+        return []
+    dates = sorted(row['date'] for row in daily)
+    end = (date.fromisoformat(dates[-1]) + timedelta(days=1)).isoformat()
+    attributes = day_attributes(cursor, dates[0], end)
+    buckets = {}
+    for row in daily:
+        day = attributes.get(row['date'])
+        if day is None:
+            continue
+        key = tuple(day[column] for _, column in grouping.columns)
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = dict(zip((name for name, _ in grouping.columns), key))
+            bucket.update(days=0, total_stays=0, occupied_room_nights=0, available_room_nights=0)
+        bucket['days'] += 1
+        bucket['total_stays'] += row['total_stays']
+        bucket['occupied_room_nights'] += row['occupied_room_nights']
+        bucket['available_room_nights'] += row['available_room_nights']
+    rows = [buckets[key] for key in sorted(buckets)]
+    for bucket in rows:
+        bucket['occupancy_rate'] = bucket['occupied_room_nights'] * 100.0 / max(bucket['available_room_nights'], 1)
+    return rows
+
+
+def same_buckets(left, right):
+    """Compare bucket rows; revenue summed in a different order differs in the last bits."""
+    if len(left) != len(right):
+        return False
+    for a, b in zip(left, right):
+        if a.keys() != b.keys():
+            return False
+        for key in a:
+            if isinstance(a[key], float):
+                if not math.isclose(a[key], b[key], rel_tol=1e-9, abs_tol=1e-6):
+                    return False
+            elif a[key] != b[key]:
+                return False
+    return True
+
+
+def check(connection):
+    """Return a list of (name, problem) pairs; an empty list means consistent.
+
+    Reports fact dates the calendar does not cover, compares the
+    calendar-backed app queries against the strftime ones, and (when the
+    covering index is there) the range-search buckets against the single
+    pass.
+    """
+    problems = []
+    cursor = connection.cursor()
+    ensure_calendar(cursor)
+    for table, column in FACT_DATES:
+        cursor.execute(f"SELECT COUNT(*) FROM {table} f WHERE NOT EXISTS "
+                       f"(SELECT 1 FROM {TABLE} d WHERE d.date = DATE(f.{column}))")
+        missing = cursor.fetchone()[0]
+        if missing:
+            problems.append((TABLE, f"{missing} {table}.{column} value(s) outside the calendar"))
+
+    import app
+
+    connection.row_factory = sqlite3.Row
+    cursor = connection.cursor()
+    for name in ('fetch_quarterly_revenue', 'fetch_event_count_by_month'):
+        fetch = getattr(app, name)
+        raw = fetch(cursor, use_rollups=False, use_calendar=False)
+        bucketed = fetch(cursor, use_rollups=False, use_calendar=True)
+        if not same_buckets(raw, bucketed):
+            problems.append((name, 'calendar result differs from strftime query'))
+    if range_search(cursor, 'charges'):
+        for grouping in ('week', 'day_type'):
+            searched = [dict(row) for row in cursor.execute(revenue_query(grouping))]
+            scanned = [dict(row) for row in cursor.execute(revenue_query(grouping, range_search=False))]
+            if not same_buckets(searched, scanned):
+                problems.append((f"revenue_query({grouping!r})", 'range search and single pass differ'))
+    cursor.close()
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('command', choices=['install', 'check', 'drop'])
+    parser.add_argument('--db', default=None, help='SQLite database (default: DB_PATH)')
+    parser.add_argument('--start', type=date.fromisoformat, help='first date (default: start of the first data year)')
+    parser.add_argument('--end', type=date.fromisoformat, help=f'end date, exclusive (default: {YEARS_AHEAD} years past the data)')
+    args = parser.parse_args(argv)
+
+    connection = sqlite3.connect(args.db or os.getenv('DB_PATH', 'last_resort_hotels.db'))
+    try:
+        if args.command == 'install':
+            start, end = install(connection, args.start, args.end)
+            print(f"Installed {TABLE} for {start} to {end}")
+        elif args.command == 'drop':
+            drop(connection)
+            print(f"Dropped {TABLE}")
+        else:
+            problems = check(connection)
+            for name, problem in problems:
+                print(f"{name}: {problem}")
+            print('Calendar consistent' if not problems else f"{len(problems)} problem(s) found")
+            return 1 if problems else 0
+    finally:
+        connection.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,485 @@
+"""Card-reader swipe ingestion into LocationLogs, and a live presence index.
+
+Swipes arrive as NDJSON, one object per line:
+
+    {"guest_id": 17, "reader_id": 5, "timestamp": "2025-06-01 14:03:22", "direction": "entering"}
+
+card_reader_id is accepted for reader_id. direction may be left out, in
+which case the reader's reader_direction decides it: an entry reader logs
+'entering', an exit reader 'leaving'. Timestamps are local hotel time.
+
+GroupCommitWriter appends swipes from any number of callers through one
+writer thread and one WAL-mode connection. Whatever is queued when the
+writer comes free goes into the next transaction (up to max_batch swipes),
+so the swipes that arrive while one commit is syncing share the next
+commit and its fsync, and no swipe waits for more than the commit in
+progress plus its own. max_delay (0 by default) additionally holds a batch
+back until it fills or its oldest swipe has waited that long, for disks
+where an fsync costs more than the wait. Each caller gets a Future that
+resolves to the log_ids of its swipes once they are durable. The writer
+numbers swipes itself, reading MAX(log_id) only for its first commit and
+after another connection has written (PRAGMA data_version moved), since
+log_id is not indexed in every schema.
+
+PresenceIndex folds LocationLogs into who is currently inside each facility
+(readers sharing location_type, facility_name and room_id). It reads the
+whole log once, then only rows with a log_id above the last one it has seen
+whenever the database changes, so occupancy queries never scan the log.
+For each guest and facility, the swipe with the latest timestamp wins,
+whatever order the swipes arrived in.
+
+Usage:
+    python card_swipes.py ingest swipes.ndjson [...]   # or no file to read stdin
+    python card_swipes.py presence [--location-type health_club] [--guests]
+    python card_swipes.py check                        # index vs SQL, and a shuffled replay
+"""
+import argparse
+from collections import deque, namedtuple
+from concurrent.futures import Future
+from datetime import datetime
+import json
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+
+DIRECTIONS = ('entering', 'leaving')
+READER_DIRECTIONS = {'entry': 'entering', 'exit': 'leaving'}
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+MAX_BATCH = 5000
+MAX_DELAY = 0.0       # seconds a batch may linger for more swipes before it is committed
+MAX_PENDING = 100000  # swipes queued before submit() turns callers away
+WRITER_PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'FULL'),  # one fsync per group commit, so an acknowledged swipe is on disk
+    ('busy_timeout', 5000),
+)
+
+READERS_QUERY = """
+    SELECT reader_id, location_type, CAST(room_id AS INTEGER), facility_name, reader_direction
+    FROM CardReaders
+    WHERE reader_id IS NOT NULL
+"""
+LOG_QUERY = """
+    SELECT log_id, guest_id, card_reader_id, timestamp, direction
+    FROM LocationLogs
+    WHERE log_id > ?
+    ORDER BY log_id
+"""
+NEXT_LOG_ID = "SELECT COALESCE(MAX(log_id), 0) + 1 FROM LocationLogs"
+INSERT_LOG = ("INSERT INTO LocationLogs (log_id, guest_id, card_reader_id, timestamp, direction) "
+              "VALUES (?, ?, ?, ?, ?)")
+# The reference for `check`: the latest swipe per guest and facility, kept when it is an entry.
+PRESENCE_QUERY = """
+    SELECT location_type, facility_name, room_id, guest_id
+    FROM (
+        SELECT l.guest_id, l.direction, r.location_type, r.facility_name, CAST(r.room_id AS INTEGER) AS room_id,
+               ROW_NUMBER() OVER (PARTITION BY l.guest_id, r.location_type, r.facility_name, r.room_id
+                                  ORDER BY l.timestamp DESC, l.log_id DESC) AS latest
+        FROM LocationLogs l
+        JOIN CardReaders r ON r.reader_id = l.card_reader_id
+        WHERE l.log_id IS NOT NULL AND l.guest_id IS NOT NULL AND l.timestamp IS NOT NULL
+    )
+    WHERE latest = 1 AND direction = 'entering'
+"""
+
+Swipe = namedtuple('Swipe', 'guest_id reader_id timestamp direction')
+Reader = namedtuple('Reader', 'facility reader_direction')  # facility: (location_type, facility_name, room_id)
+
+
+class IngestBusyError(RuntimeError):
+    pass
+
+
+def load_readers(cursor):
+    return {reader_id: Reader((location_type, facility_name, room_id), reader_direction)
+            for reader_id, location_type, room_id, facility_name, reader_direction
+            in cursor.execute(READERS_QUERY).fetchall()}
+
+
+def positive_int(record, *names):
+    for name in names:
+        if name in record:
+            value = record[name]
+            if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+                raise ValueError(f"{name} must be a positive integer")
+            return value
+    raise ValueError(f"{names[0]} is required")
+
+
+def parse_swipe(record, readers):
+    """Swipe from one decoded NDJSON object; ValueError says what is wrong with it."""
+    if not isinstance(record, dict):
+        raise ValueError("expected a JSON object")
+    guest_id = positive_int(record, 'guest_id')
+    reader_id = positive_int(record, 'reader_id', 'card_reader_id')
+    reader = readers.get(reader_id)
+    if reader is None:
+        raise ValueError(f"unknown reader_id {reader_id}")
+    if not isinstance(record.get('timestamp'), str):
+        raise ValueError("timestamp is required, e.g. 2025-06-01 14:03:22")
+    timestamp = datetime.fromisoformat(record['timestamp'])
+    if timestamp.tzinfo is not None:
+        raise ValueError("timestamp must be local hotel time, without a UTC offset")
+    direction = record.get('direction') or READER_DIRECTIONS.get(reader.reader_direction)
+    if direction not in DIRECTIONS:
+        raise ValueError(f"direction must be one of {', '.join(DIRECTIONS)}")
+    return Swipe(guest_id, reader_id, timestamp.strftime(TIMESTAMP_FORMAT), direction)
+
+
+def parse_ndjson(lines, readers):
+    """([Swipe], [(line number, error)]) for an iterable of NDJSON lines; blank lines are skipped."""
+    swipes, errors = [], []
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            swipes.append(parse_swipe(json.loads(line), readers))
+        except ValueError as e:  # json.JSONDecodeError included
+            errors.append((number, str(e)))
+    return swipes, errors
+
+
+class GroupCommitWriter:
+    """Append swipes to LocationLogs from one thread, committing what arrives together in one transaction."""
+
+    def __init__(self, db_path, max_batch=MAX_BATCH, max_delay=MAX_DELAY, max_pending=MAX_PENDING):
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.commits = 0
+        self.committed = 0
+        self.failures = 0
+        self.last_commit_ms = None
+        self._next_log_id = None   # log_id for the next swipe, None until read from the table
+        self._seen_version = None  # data_version when _next_log_id was last right
+        self._queue = deque()  # (swipes, future, enqueued at)
+        self._queued = 0       # swipes in _queue
+        self._pending = 0      # swipes submitted and not yet committed or failed
+        self._closed = False
+        self._wakeup = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='swipe-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, swipes):
+        """Queue swipes for the next group commit; the Future resolves to their (first, last) log_id."""
+        future = Future()
+        if not swipes:
+            future.set_result((None, None))
+            return future
+        with self._wakeup:
+            if self._closed:
+                raise RuntimeError("the swipe writer is closed")
+            if self._pending + len(swipes) > self.max_pending:
+                raise IngestBusyError(f"{self._pending} swipes are waiting to be written; try again shortly")
+            self._queue.append((list(swipes), future, time.monotonic()))
+            self._queued += len(swipes)
+            self._pending += len(swipes)
+            self._wakeup.notify()
+        return future
+
+    def close(self, timeout=None):
+        """Commit what is queued, then stop the writer thread."""
+        with self._wakeup:
+            self._closed = True
+            self._wakeup.notify()
+        self._thread.join(timeout)
+
+    def _connect(self):
+        connection = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        for name, value in WRITER_PRAGMAS:
+            connection.execute(f"PRAGMA {name} = {value}")
+        return connection
+
+    def _next_batch(self):
+        """Take what is queued (waiting up to max_delay for a full batch); None once closed and drained."""
+        with self._wakeup:
+            while not self._queue:
+                if self._closed:
+                    return None
+                self._wakeup.wait()
+            deadline = self._queue[0][2] + self.max_delay
+            while self._queued < self.max_batch and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._wakeup.wait(remaining)
+            batch, size = [], 0
+            while self._queue and (not batch or size + len(self._queue[0][0]) <= self.max_batch):
+                swipes, future, _ = self._queue.popleft()
+                batch.append((swipes, future))
+                size += len(swipes)
+            self._queued -= size
+            return batch
+
+    def _run(self):
+        connection = self._connect()
+        try:
+            while True:
+                batch = self._next_batch()
+                if batch is None:
+                    return
+                self._commit(connection, batch)
+        finally:
+            connection.close()
+
+    def _commit(self, connection, batch):
+        size = sum(len(swipes) for swipes, _ in batch)
+        start = time.perf_counter()
+        try:
+            # log_ids are assigned here rather than left to SQLite, so tables without a rowid key
+            # (the bundled pandas export) still get one; BEGIN IMMEDIATE keeps other writers out meanwhile.
+            connection.execute("BEGIN IMMEDIATE")
+            version = connection.execute("PRAGMA data_version").fetchone()[0]
+            if self._next_log_id is None or version != self._seen_version:
+                self._next_log_id = connection.execute(NEXT_LOG_ID).fetchone()[0]
+            first = self._next_log_id
+            connection.executemany(INSERT_LOG, [(first + offset, *swipe) for offset, swipe
+                                                in enumerate(swipe for swipes, _ in batch for swipe in swipes)])
+            connection.execute("COMMIT")
+        except sqlite3.Error as e:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            self.failures += 1
+            for _, future in batch:
+                future.set_exception(e)
+        else:
+            # Our own commits leave data_version as it is, so it still matches next time.
+            self._next_log_id, self._seen_version = first + size, version
+            self.commits += 1
+            self.committed += size
+            for swipes, future in batch:
+                future.set_result((first, first + len(swipes) - 1))
+                first += len(swipes)
+        finally:
+            self.last_commit_ms = (time.perf_counter() - start) * 1000
+            with self._wakeup:
+                self._pending -= size
+
+    def status(self):
+        return {
+            'commits': self.commits,
+            'committed': self.committed,
+            'failures': self.failures,
+            'pending': self._pending,
+            'avg_batch': round(self.committed / self.commits, 1) if self.commits else None,
+            'last_commit_ms': round(self.last_commit_ms, 2) if self.last_commit_ms is not None else None,
+        }
+
+
+class PresenceIndex:
+    """Guests currently inside each facility, folded from LocationLogs and caught up by log_id."""
+
+    def __init__(self, version=None):
+        self.version = version  # callable returning a value that changes with the database
+        self.seen_version = None
+        self.built = False
+        self.rebuilds = 0
+        self.readers = {}       # reader_id -> Reader
+        self.last_log_id = 0
+        self.swipes = 0
+        self.latest = {}        # (guest_id, facility) -> (timestamp, log_id, inside)
+        self.present = {}       # facility -> {guest_id: since}
+        self._lock = threading.Lock()
+
+    def refresh(self, cursor):
+        """Read the swipes logged since the last refresh (everything, the first time) if the database changed."""
+        with self._lock:
+            if self.built and self.version is not None and self.version() == self.seen_version:
+                return
+            seen_version = self.version() if self.version else None
+            previous = cursor.row_factory
+            cursor.row_factory = None
+            try:
+                readers = load_readers(cursor)
+                rows = cursor.execute(LOG_QUERY, (self.last_log_id if self.built else -1,)).fetchall()
+            finally:
+                cursor.row_factory = previous
+            if not self.built:
+                self.rebuilds += 1
+            self.readers = readers
+            self.apply(rows)
+            self.seen_version, self.built = seen_version, True
+
+    def apply(self, rows):
+        """Fold (log_id, guest_id, card_reader_id, timestamp, direction) rows into the index, in any order."""
+        readers, latest, present = self.readers, self.latest, self.present
+        for log_id, guest_id, reader_id, timestamp, direction in rows:
+            if log_id is None or guest_id is None or timestamp is None:
+                continue
+            self.last_log_id = max(self.last_log_id, log_id)
+            reader = readers.get(reader_id)
+            if reader is None:
+                continue
+            self.swipes += 1
+            key = (guest_id, reader.facility)
+            previous = latest.get(key)
+            if previous is not None and (previous[0], previous[1]) > (timestamp, log_id):
+                continue
+            inside = direction == 'entering'
+            latest[key] = (timestamp, log_id, inside)
+            guests = present.setdefault(reader.facility, {})
+            if inside:
+                guests[guest_id] = timestamp
+            else:
+                guests.pop(guest_id, None)
+
+    def occupancy(self, cursor, location_type=None, facility_name=None, guests=False):
+        """One dict per facility with its current occupancy (and who, with guests=True)."""
+        self.refresh(cursor)
+        with self._lock:
+            facilities = {reader.facility for reader in self.readers.values()} | set(self.present)
+            result = []
+            for facility in sorted(facilities, key=lambda key: tuple('' if part is None else str(part)
+                                                                    for part in key)):
+                kind, name, room_id = facility
+                if location_type not in (None, kind) or facility_name not in (None, name):
+                    continue
+                inside = self.present.get(facility, {})
+                row = {'location_type': kind, 'facility_name': name, 'room_id': room_id, 'occupancy': len(inside)}
+                if guests:
+                    row['guests'] = [{'guest_id': guest_id, 'since': since} for guest_id, since in sorted(inside.items())]
+                result.append(row)
+            return result
+
+    def locate(self, cursor, guest_id):
+        """The facilities a guest is inside now, with the time of the swipe that took them in."""
+        self.refresh(cursor)
+        with self._lock:
+            return [{'location_type': facility[0], 'facility_name': facility[1], 'room_id': facility[2],
+                     'since': guests[guest_id]}
+                    for facility, guests in sorted(self.present.items(), key=lambda item: item[1].get(guest_id) or '')
+                    if guest_id in guests]
+
+    def snapshot(self):
+        with self._lock:
+            return {facility: set(guests) for facility, guests in self.present.items() if guests}
+
+    def status(self):
+        return {
+            'readers': len(self.readers),
+            'swipes': self.swipes,
+            'last_log_id': self.last_log_id,
+            'present': sum(len(guests) for guests in self.present.values()),
+            'rebuilds': self.rebuilds,
+        }
+
+
+def sql_presence(cursor):
+    present = {}
+    for location_type, facility_name, room_id, guest_id in cursor.execute(PRESENCE_QUERY).fetchall():
+        present.setdefault((location_type, facility_name, room_id), set()).add(guest_id)
+    return present
+
+
+def check(connection, seed=7):
+    """Compare the index with the SQL reference, built in log order and from the log shuffled."""
+    problems = []
+    cursor = connection.cursor()
+    expected = sql_presence(cursor)
+    index = PresenceIndex()
+    index.refresh(cursor)
+    if index.snapshot() != expected:
+        problems.append(('presence', 'index built from the log differs from SQL'))
+    rows = cursor.execute(LOG_QUERY, (-1,)).fetchall()
+    random.Random(seed).shuffle(rows)
+    replay = PresenceIndex()
+    replay.readers = load_readers(cursor)
+    for start in range(0, len(rows), 1000):
+        replay.apply(rows[start:start + 1000])
+    if replay.snapshot() != expected:
+        problems.append(('presence', 'index fed the log out of order differs from SQL'))
+    return problems
+
+
+def read_lines(paths):
+    if not paths:
+        yield from sys.stdin
+        return
+    for path in paths:
+        with open(path, encoding='utf-8') as handle:
+            yield from handle
+
+
+def ingest(db_path, paths, chunk=MAX_BATCH):
+    """Load NDJSON files (or stdin) through a GroupCommitWriter; return (swipes written, [(line, error)])."""
+    connection = sqlite3.connect(db_path)
+    try:
+        readers = load_readers(connection.cursor())
+    finally:
+        connection.close()
+    writer = GroupCommitWriter(db_path)
+    written, errors, futures, lines, seen = 0, [], [], [], 0
+
+    def submit():
+        nonlocal written, seen
+        swipes, bad = parse_ndjson(lines, readers)
+        errors.extend((seen + number, error) for number, error in bad)
+        while True:
+            try:
+                futures.append(writer.submit(swipes))
+                break
+            except IngestBusyError:
+                futures.pop(0).result()  # let the writer catch up
+        written += len(swipes)
+        seen += len(lines)
+        lines.clear()
+
+    try:
+        for line in read_lines(paths):
+            lines.append(line)
+            if len(lines) == chunk:
+                submit()
+        submit()
+        for future in futures:
+            future.result()
+    finally:
+        writer.close()
+    return written, errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--db', default=os.getenv('DB_PATH', 'last_resort_hotels.db'))
+    commands = parser.add_subparsers(dest='command', required=True)
+    ingest_parser = commands.add_parser('ingest', help='append NDJSON swipes to LocationLogs')
+    ingest_parser.add_argument('paths', nargs='*', help='NDJSON files (default: stdin)')
+    presence = commands.add_parser('presence', help='current occupancy per facility')
+    presence.add_argument('--location-type')
+    presence.add_argument('--guests', action='store_true', help='list who is inside')
+    commands.add_parser('check', help='compare the presence index with SQL')
+    args = parser.parse_args(argv)
+
+    if args.command == 'ingest':
+        started = time.perf_counter()
+        written, errors = ingest(args.db, args.paths)
+        for number, error in errors[:20]:
+            print(f"line {number}: {error}", file=sys.stderr)
+        elapsed = time.perf_counter() - started
+        print(f"Wrote {written:,} swipes in {elapsed:.1f} s ({written / elapsed if elapsed else 0:,.0f}/s); "
+              f"{len(errors)} rejected")
+        return 1 if errors else 0
+
+    connection = sqlite3.connect(args.db)
+    try:
+        if args.command == 'presence':
+            for row in PresenceIndex().occupancy(connection.cursor(), args.location_type, guests=args.guests):
+                room = f" (room {row['room_id']})" if row['room_id'] is not None else ''
+                print(f"{row['location_type']:>13}  {row['facility_name']}{room}: {row['occupancy']}")
+                for guest in row.get('guests', []):
+                    print(f"{'':>15}guest {guest['guest_id']} since {guest['since']}")
+            return 0
+        problems = check(connection)
+    finally:
+        connection.close()
+    for what, problem in problems:
+        print(f"{what}: {problem}")
+    print(f"{len(problems)} problem(s) found" if problems else "Presence index matches SQL")
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
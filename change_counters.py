@@ -0,0 +1,201 @@
+"""Per-table change counters, so a cache only goes stale when a table it reads changes.
+
+PRAGMA data_version moves whenever another connection commits, whatever it
+wrote, so a cache keyed on it is thrown away by every card swipe appended
+to LocationLogs just as by a new charge. install() creates table_changes,
+one row per tracked table, and AFTER INSERT / UPDATE / DELETE triggers that
+bump the table's counter in the same transaction as the write.
+
+ChangeProbe is a drop-in for metric_cache.DataVersionProbe: it checks
+data_version on its own connection and re-reads table_changes only when
+that moved, and returns the counters of the tables it watches. watching()
+gives a probe for a subset of them (the tables an index reads), sharing
+the connection. Until the counters are installed, every probe falls back to
+data_version.
+
+LocationLogs is not tracked: swipes arrive continuously, no metric reads
+them, and the presence index catches up on them by log_id. Neither are the
+tables the other modules maintain (rollups, change logs, saved results,
+dim_calendar), which only change along with the tables they are built from.
+
+Usage:
+    python change_counters.py install    # create table_changes and its triggers
+    python change_counters.py check      # every tracked table has its counter and triggers
+    python change_counters.py drop       # remove table_changes and its triggers
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+
+TABLE = 'table_changes'
+TRACKED_TABLES = (
+    'Beds', 'BillCharges', 'BilledParties', 'Bills', 'Buildings', 'BusinessServiceCharges', 'CardReaders',
+    'Charges', 'CustomerQualifications', 'Deposits', 'EventRooms', 'Events', 'Floors', 'GuestOrganizations',
+    'GuestRoomAssignments', 'Guests', 'Hosts', 'MaintenanceLogs', 'MealCharges', 'MeetingRooms', 'MovableWalls',
+    'Payments', 'PhoneCharges', 'ReservationRequirements', 'Reservations', 'RoomAdjacency', 'RoomAssignments',
+    'RoomBeds', 'Rooms', 'RoomStatusHistory', 'RoomTypes', 'ServiceTypes', 'SleepingRooms', 'Suites', 'Wings',
+)
+SUFFIXES = ('ai', 'ad', 'au')
+
+
+def existing_tables(connection):
+    """The TRACKED_TABLES present in the database."""
+    names = {row[0].lower() for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    return [table for table in TRACKED_TABLES if table.lower() in names]
+
+
+def counters_installed(cursor):
+    cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = ?", (TABLE,))
+    return cursor.fetchone()[0] > 0
+
+
+def trigger_name(table, suffix):
+    return f"{TABLE}_{table.lower()}_{suffix}"
+
+
+def create_triggers_sql(table):
+    bump = f"UPDATE {TABLE} SET changes = changes + 1 WHERE table_name = '{table.lower()}';"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {trigger_name(table, suffix)} AFTER {event} ON {table} BEGIN\n"
+        f"    {bump}\nEND"
+        for suffix, event in zip(SUFFIXES, ('INSERT', 'DELETE', 'UPDATE'))
+    ]
+
+
+def install(connection):
+    with connection:
+        connection.execute(f"CREATE TABLE IF NOT EXISTS {TABLE} ("
+                           "table_name TEXT PRIMARY KEY, changes INTEGER NOT NULL DEFAULT 0) WITHOUT ROWID")
+        for table in existing_tables(connection):
+            connection.execute(f"INSERT OR IGNORE INTO {TABLE} (table_name) VALUES (?)", (table.lower(),))
+            for statement in create_triggers_sql(table):
+                connection.execute(statement)
+
+
+def drop(connection):
+    with connection:
+        for table in TRACKED_TABLES:
+            for suffix in SUFFIXES:
+                connection.execute(f"DROP TRIGGER IF EXISTS {trigger_name(table, suffix)}")
+        connection.execute(f"DROP TABLE IF EXISTS {TABLE}")
+
+
+class ChangeProbe:
+    """Callable returning the change counters of the watched tables, or data_version without them."""
+
+    def __init__(self, db_path, tables=TRACKED_TABLES):
+        self.db_path = db_path
+        self.tables = tuple(table.lower() for table in tables)
+        self._connection = None
+        self._seen_version = None
+        self._counters = None  # table_name -> changes, None when table_changes is missing
+        self._lock = threading.Lock()
+
+    def _read(self):
+        """(data_version, counters or None); (None, None) when the database cannot be read."""
+        with self._lock:
+            try:
+                if self._connection is None:
+                    self._connection = sqlite3.connect(self.db_path, check_same_thread=False)
+                version = self._connection.execute("PRAGMA data_version").fetchone()[0]
+                if version != self._seen_version:
+                    cursor = self._connection.cursor()
+                    self._counters = (dict(cursor.execute(f"SELECT table_name, changes FROM {TABLE}").fetchall())
+                                      if counters_installed(cursor) else None)
+                    self._seen_version = version
+                return version, self._counters
+            except sqlite3.Error:
+                if self._connection is not None:
+                    self._connection.close()
+                self._connection, self._seen_version, self._counters = None, None, None
+                return None, None
+
+    def version(self, tables):
+        version, counters = self._read()
+        if counters is None:
+            return version
+        return tuple(counters.get(table) for table in tables)
+
+    def __call__(self):
+        return self.version(self.tables)
+
+    def data_version(self):
+        """PRAGMA data_version: moves on any commit by another connection, to any table."""
+        return self._read()[0]
+
+    def watching(self, tables):
+        """A version callable for just these tables, sharing this probe's connection."""
+        tables = tuple(table.lower() for table in tables)
+        return lambda: self.version(tables)
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+            self._seen_version = None
+
+
+def check(connection):
+    """Return a list of (table, problem) pairs; an empty list means consistent.
+
+    Every tracked table present needs its counter row and triggers, and a
+    write (rolled back) must move its counter and no other.
+    """
+    cursor = connection.cursor()
+    if not counters_installed(cursor):
+        return [(TABLE, 'not installed')]
+    problems = []
+    triggers = {row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+    counters = dict(cursor.execute(f"SELECT table_name, changes FROM {TABLE}").fetchall())
+    for table in existing_tables(connection):
+        if table.lower() not in counters:
+            problems.append((table, 'no counter row'))
+        missing = [suffix for suffix in SUFFIXES if trigger_name(table, suffix) not in triggers]
+        if missing:
+            problems.append((table, f"missing trigger(s) {', '.join(missing)}"))
+    if problems:
+        return problems
+    for table in existing_tables(connection):
+        cursor.execute("BEGIN")
+        try:
+            cursor.execute(f"UPDATE {table} SET rowid = rowid WHERE rowid = (SELECT MIN(rowid) FROM {table})")
+            updated = cursor.rowcount
+            after = dict(cursor.execute(f"SELECT table_name, changes FROM {TABLE}").fetchall())
+        finally:
+            cursor.execute("ROLLBACK")
+        moved = sorted(name for name in after if after[name] != counters.get(name))
+        if updated and moved != [table.lower()]:
+            problems.append((table, f"an update moved the counters of {', '.join(moved) or 'no table'}"))
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('command', choices=['install', 'check', 'drop'])
+    parser.add_argument('--db', default=None, help='SQLite database (default: DB_PATH)')
+    args = parser.parse_args(argv)
+
+    connection = sqlite3.connect(args.db or os.getenv('DB_PATH', 'last_resort_hotels.db'))
+    try:
+        if args.command == 'install':
+            install(connection)
+            print(f"Installed {TABLE} for {len(existing_tables(connection))} tables")
+        elif args.command == 'drop':
+            drop(connection)
+            print(f"Dropped {TABLE}")
+        else:
+            problems = check(connection)
+            for table, problem in problems:
+                print(f"{table}: {problem}")
+            print('Change counters consistent' if not problems else f"{len(problems)} problem(s) found")
+            return 1 if problems else 0
+    finally:
+        connection.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
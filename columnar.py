@@ -0,0 +1,745 @@
+"""Columnar in-memory analytics engine for the dashboard summary.
+
+    python columnar.py build [--db PATH] [--dir DIR]   # write a snapshot of the database
+    python columnar.py check [--db PATH]               # compare every summary metric with the SQL path
+
+A ColumnarSnapshot holds the tables the summary reads (charges, meal charges,
+room assignments, events, event rooms and the small party, reservation, bill
+and room tables) as one NumPy array per column. Dates are stored as day
+numbers, SQL NULL as NULL in integer columns and NaN in REAL ones, and text
+columns are dictionary-encoded: int32 codes (-1 for NULL) into a sorted
+vocabulary, so a code comparison is a string comparison and MIN/MAX work on
+codes. The metric functions below reproduce the summary queries in app.py
+with sort-merge joins, np.unique and np.bincount group-bys instead of SQL,
+NULL handling and join fan-out included.
+
+A snapshot is saved as one .npy file per column plus a manifest, and opened
+with mmap_mode='r': a worker starts by mapping the files, not by loading
+rows, and every process using the same snapshot shares its pages.
+ColumnarEngine keeps the snapshot matching the current database: the change
+counters of its source tables when it is given a probe for them (see
+change_counters.py), so appending card swipes does not make it stale, or
+else the size and mtime of the file and its WAL. After a write it keeps
+serving the snapshot it has while the new one is built on a background
+thread, then calls on_rebuild (the app drops its cached metrics, which may
+have been computed from the old one).
+
+The engine needs NumPy; without it app.py keeps using the SQL path.
+"""
+import argparse
+from datetime import datetime
+import hashlib
+import json
+import math
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+
+import occupancy
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+FORMAT_VERSION = 2
+MANIFEST = 'manifest.json'
+NULL = -(2 ** 63)  # SQL NULL in integer columns
+DAY = "CAST(julianday(DATE({0})) - 2440587.5 AS INTEGER)"
+
+# Snapshot tables: name -> (source table, [(column, SQL expression, kind)]).
+# kind is 'int' (int64, NULL -> NULL), 'float' (float64, NULL -> NaN) or
+# 'text' (dictionary-encoded).
+TABLES = {
+    'charges': ('Charges', [
+        ('charge_id', 'charge_id', 'int'),
+        ('billed_party_id', 'billed_party_id', 'int'),
+        ('charge_day', DAY.format('charge_date'), 'int'),
+        ('amount', 'amount', 'float'),
+        ('charge_status', 'charge_status', 'text'),
+    ]),
+    'mealcharges': ('MealCharges', [
+        ('meal_charge_id', 'meal_charge_id', 'int'),
+        ('charge_id', 'charge_id', 'int'),
+        ('meal_type', 'meal_type', 'text'),
+    ]),
+    'roomassignments': ('RoomAssignments', [
+        ('room_id', 'room_id', 'int'),
+        ('start_day', DAY.format('check_in_time'), 'int'),
+        ('end_day', DAY.format('check_out_time'), 'int'),
+    ]),
+    'events': ('Events', [
+        ('event_id', 'event_id', 'int'),
+        ('host_id', 'host_id', 'int'),
+        ('start_day', DAY.format('start_date'), 'int'),
+        ('estimated_attendance', 'estimated_attendance', 'int'),
+        ('event_type', 'event_type', 'text'),
+    ]),
+    'eventrooms': ('EventRooms', [
+        ('event_id', 'event_id', 'int'),
+        ('room_id', 'room_id', 'int'),
+        ('usage_time_slot', 'usage_time_slot', 'text'),
+        ('usage_day', DAY.format('usage_date'), 'int'),
+        ('actual_attendance', 'actual_attendance', 'int'),
+    ]),
+    'rooms': ('Rooms', [
+        ('room_id', 'room_id', 'int'),
+        ('room_number', 'room_number', 'text'),
+        ('room_status', 'room_status', 'text'),
+        ('can_be_meeting', 'can_be_meeting', 'int'),
+    ]),
+    'meetingrooms': ('MeetingRooms', [
+        ('room_id', 'room_id', 'int'),
+        ('seating_capacity', 'seating_capacity', 'int'),
+    ]),
+    'billedparties': ('BilledParties', [
+        ('billed_party_id', 'billed_party_id', 'int'),
+        ('party_type', 'party_type', 'text'),
+        ('first_name', 'first_name', 'text'),
+        ('last_name', 'last_name', 'text'),
+        ('organization_name', 'organization_name', 'text'),
+    ]),
+    'reservations': ('Reservations', [
+        ('reservation_id', 'reservation_id', 'int'),
+        ('billed_party_id', 'billed_party_id', 'int'),
+        ('check_in_date', 'check_in_date', 'text'),
+        ('reservation_status', 'reservation_status', 'text'),
+    ]),
+    'bills': ('Bills', [
+        ('billed_party_id', 'billed_party_id', 'int'),
+        ('total_amount', 'total_amount', 'float'),
+        ('bill_status', 'bill_status', 'text'),
+    ]),
+    'customerqualifications': ('CustomerQualifications', [
+        ('billed_party_id', 'billed_party_id', 'int'),
+        ('past_history_score', 'past_history_score', 'int'),
+        ('cooperativeness_score', 'cooperativeness_score', 'int'),
+        ('flexibility_score', 'flexibility_score', 'int'),
+        ('payment_promptness_score', 'payment_promptness_score', 'int'),
+        ('overall_qualification_score', 'overall_qualification_score', 'float'),
+    ]),
+}
+
+SOURCE_TABLES = tuple(source_table for source_table, _ in TABLES.values())
+
+BILLABLE = ('billed', 'paid')
+ACTIVE_RESERVATIONS = ('confirmed', 'checked_in', 'checked_out')
+
+
+def encode_int(values):
+    return np.fromiter((NULL if value is None else value for value in values), dtype=np.int64, count=len(values))
+
+
+def encode_text(values):
+    vocabulary = sorted({value for value in values if value is not None})
+    codes = {value: code for code, value in enumerate(vocabulary)}
+    encoded = np.fromiter((codes.get(value, -1) for value in values), dtype=np.int32, count=len(values))
+    return encoded, np.array(vocabulary, dtype=str) if vocabulary else np.zeros(0, dtype='U1')
+
+
+class ColumnarSnapshot:
+    def __init__(self, columns, dictionaries, rows, source=None):
+        self.columns = columns            # 'table.column' -> array (codes for text columns)
+        self.dictionaries = dictionaries  # 'table.column' -> sorted vocabulary of a text column
+        self.rows = rows                  # table -> row count
+        self.source = source
+
+    @classmethod
+    def load(cls, connection, source=None):
+        """Read every TABLES column from a SQLite connection in one read transaction."""
+        columns, dictionaries, rows = {}, {}, {}
+        in_transaction = connection.in_transaction
+        if not in_transaction:
+            connection.execute("BEGIN")
+        try:
+            for table, (source_table, specs) in TABLES.items():
+                cursor = connection.execute(
+                    f"SELECT {', '.join(expression for _, expression, _ in specs)} FROM {source_table}")
+                cursor.row_factory = None
+                fetched = cursor.fetchall()
+                rows[table] = len(fetched)
+                values_by_column = list(zip(*fetched)) or [()] * len(specs)
+                for (name, _, kind), values in zip(specs, values_by_column):
+                    key = f"{table}.{name}"
+                    if kind == 'int':
+                        columns[key] = encode_int(values)
+                    elif kind == 'float':
+                        columns[key] = np.array(values, dtype=np.float64)
+                    else:
+                        columns[key], dictionaries[key] = encode_text(values)
+        finally:
+            if not in_transaction:
+                connection.rollback()
+        return cls(columns, dictionaries, rows, source)
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for key, values in self.columns.items():
+            np.save(os.path.join(directory, f"{key}.npy"), values)
+        for key, vocabulary in self.dictionaries.items():
+            np.save(os.path.join(directory, f"{key}.dict.npy"), vocabulary)
+        manifest = {
+            'format': FORMAT_VERSION,
+            'source': self.source,
+            'built_at': datetime.now().isoformat(timespec='seconds'),
+            'rows': self.rows,
+            'columns': sorted(self.columns),
+            'dictionaries': sorted(self.dictionaries),
+        }
+        with open(os.path.join(directory, MANIFEST), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+    @classmethod
+    def open(cls, directory):
+        """Memory-map a snapshot written by save()."""
+        with open(os.path.join(directory, MANIFEST)) as f:
+            manifest = json.load(f)
+        if manifest.get('format') != FORMAT_VERSION:
+            raise ValueError(f"{directory} has snapshot format {manifest.get('format')}, expected {FORMAT_VERSION}")
+        columns = {key: np.load(os.path.join(directory, f"{key}.npy"), mmap_mode='r')
+                   for key in manifest['columns']}
+        dictionaries = {key: np.load(os.path.join(directory, f"{key}.dict.npy"), mmap_mode='r')
+                        for key in manifest['dictionaries']}
+        return cls(columns, dictionaries, manifest['rows'], manifest['source'])
+
+    def column(self, table, name):
+        return self.columns[f"{table}.{name}"]
+
+    def codes(self, table, name, values):
+        """Codes of the given strings in a text column; strings not present are skipped."""
+        vocabulary = self.dictionaries[f"{table}.{name}"]
+        positions = np.searchsorted(vocabulary, values)
+        return np.array([position for position, value in zip(positions, values)
+                         if position < len(vocabulary) and vocabulary[position] == value], dtype=np.int32)
+
+    def decode(self, table, name, code):
+        return str(self.dictionaries[f"{table}.{name}"][code]) if code >= 0 else None
+
+    def nbytes(self):
+        return sum(values.nbytes for values in self.columns.values()) + \
+            sum(vocabulary.nbytes for vocabulary in self.dictionaries.values())
+
+
+def join_indices(left, right, outer=False):
+    """Sort-merge equi-join of two key arrays: (left rows, right rows) of every matching pair.
+
+    NULL keys never match. Pairs come in left-row order. With outer, a left
+    row without matches is kept once with right row -1 (LEFT JOIN).
+    """
+    if len(right) > 1 and (right[1:] >= right[:-1]).all():
+        order, sorted_right = np.arange(len(right)), right
+    else:
+        order = np.argsort(right, kind='stable')
+        sorted_right = right[order]
+    low = np.searchsorted(sorted_right, left, 'left')
+    if len(sorted_right) < 2 or (sorted_right[1:] != sorted_right[:-1]).all():
+        # Unique keys (the usual case): one search instead of two.
+        high = low + (sorted_right[np.minimum(low, len(sorted_right) - 1)] == left) if len(sorted_right) else low
+    else:
+        high = np.searchsorted(sorted_right, left, 'right')
+    matches = np.where(left == NULL, 0, high - low)
+    counts = np.maximum(matches, 1) if outer else matches
+    left_rows = np.repeat(np.arange(len(left)), counts)
+    first = np.cumsum(counts) - counts
+    offsets = np.arange(len(left_rows)) - np.repeat(first, counts)
+    positions = np.repeat(low, counts) + offsets
+    right_rows = order[np.minimum(positions, max(len(order) - 1, 0))] if len(order) else np.full(len(left_rows), -1)
+    if outer:
+        right_rows = np.where(np.repeat(matches, counts) > 0, right_rows, -1)
+    return left_rows, right_rows
+
+
+def take(values, rows, missing):
+    """values[rows] with `missing` where rows is -1."""
+    if not len(values):
+        return np.full(len(rows), missing, dtype=values.dtype)
+    return np.where(rows >= 0, values[np.maximum(rows, 0)], missing)
+
+
+def group_by(keys):
+    """(distinct keys, group index of every key), like np.unique(keys, return_inverse=True).
+
+    Compact integer keys (ids, codes) are grouped with a bincount instead of a sort.
+    """
+    if len(keys):
+        low = int(keys.min())
+        span = int(keys.max()) - low + 1
+        if span <= 4 * len(keys) + 1024:
+            offsets = keys - low
+            present = np.bincount(offsets, minlength=span) > 0
+            return np.flatnonzero(present) + low, (np.cumsum(present) - 1)[offsets]
+    return np.unique(keys, return_inverse=True)
+
+
+def count_distinct(keys, groups=None):
+    """COUNT(DISTINCT key) ignoring NULL, overall or per group index."""
+    present = keys != NULL
+    if groups is None:
+        return len(np.unique(keys[present]))
+    group_count = int(groups.max()) + 1 if len(groups) else 0
+    keys, groups = keys[present], groups[present]
+    if not len(keys):
+        return np.zeros(group_count, dtype=np.int64)
+    low = int(keys.min())
+    span = int(keys.max()) - low + 1
+    if span * group_count < 2 ** 62:
+        # Fold (group, key) into one int64 so a 1-d unique does the work.
+        pairs = np.unique(groups * span + (keys - low))
+        return np.bincount(pairs // span, minlength=group_count)
+    pairs = np.unique(np.stack([groups, keys]), axis=1)
+    return np.bincount(pairs[0], minlength=group_count)
+
+
+def sql_sum(values):
+    """SUM() of an int column: None when every value is NULL."""
+    present = values[values != NULL]
+    return int(present.sum()) if len(present) else None
+
+
+def sql_avg(values):
+    present = values[values != NULL]
+    return int(present.sum()) / len(present) if len(present) else None
+
+
+def charge_metrics(snapshot):
+    """fetch_charge_metrics(): (total_revenue, quarterly rows, avg_fb_spend, fb_revenue_by_meal).
+
+    Quarterly rows are raw (revenue_year, revenue_quarter, total_revenue) tuples.
+    """
+    charge_rows, meal_rows = join_indices(snapshot.column('charges', 'charge_id'),
+                                          snapshot.column('mealcharges', 'charge_id'), outer=True)
+    raw_amount = snapshot.column('charges', 'amount')[charge_rows]
+    amount = np.nan_to_num(raw_amount)  # SUM skips NULL
+    has_amount = ~np.isnan(raw_amount)  # and so do COUNT and AVG
+    status = snapshot.column('charges', 'charge_status')[charge_rows]
+    party = snapshot.column('charges', 'billed_party_id')[charge_rows]
+    day = snapshot.column('charges', 'charge_day')[charge_rows]
+    is_meal = meal_rows >= 0
+    meal_type = take(snapshot.column('mealcharges', 'meal_type'), meal_rows, -1)
+    meal_charge_id = take(snapshot.column('mealcharges', 'meal_charge_id'), meal_rows, NULL)
+    counted = is_meal & (meal_charge_id != NULL)
+
+    billable = np.isin(status, snapshot.codes('charges', 'charge_status', BILLABLE))
+    total_revenue = float(amount[billable].sum())
+
+    paid = status == next(iter(snapshot.codes('charges', 'charge_status', ('paid',))), -2)
+    paid_days = day[paid]
+    dated = paid_days != NULL
+    quarterly = []
+    if not dated.all():
+        quarterly.append((None, None, float(amount[paid][~dated].sum())))
+    if dated.any():
+        months = paid_days[dated].astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+        quarters = months // 3  # quarters since 1970-Q1
+        first = int(quarters.min())
+        totals = np.bincount(quarters - first, weights=amount[paid][dated])
+        present = np.bincount(quarters - first)
+        quarterly.extend(((first + offset) // 4 + 1970, (first + offset) % 4 + 1, float(totals[offset]))
+                         for offset in np.flatnonzero(present))
+
+    fb = billable & is_meal
+    fb_amount = amount[fb]
+    fb_party = party[fb]
+    fb_revenue = float(fb_amount.sum())
+    fb_rows = int(fb.sum())
+    fb_amounts = int(has_amount[fb].sum())
+    fb_guests = count_distinct(fb_party)
+
+    fb_revenue_by_meal = []
+    if fb_rows:
+        types, inverse = group_by(meal_type[fb])
+        revenue = np.bincount(inverse, weights=fb_amount)
+        amounts = np.bincount(inverse, weights=has_amount[fb])
+        charges = np.bincount(inverse, weights=counted[fb])
+        customers = count_distinct(fb_party, inverse)
+        for index, code in enumerate(types):
+            fb_revenue_by_meal.append({
+                'meal_type': snapshot.decode('mealcharges', 'meal_type', code),
+                'total_charges': int(charges[index]),
+                'total_revenue': float(revenue[index]),
+                'avg_charge_amount': float(revenue[index]) / int(amounts[index]) if amounts[index] else 0.0,
+                'unique_customers': int(customers[index]),
+                'percentage_of_total_fb': float(revenue[index]) * 100.0 / fb_revenue if fb_revenue else 0.0
+            })
+        fb_revenue_by_meal.sort(key=lambda row: row['total_revenue'], reverse=True)
+
+    avg_fb_spend = {
+        'total_guests_with_fb': fb_guests,
+        'total_meal_charges': count_distinct(meal_charge_id[fb]),
+        'total_fb_revenue': fb_revenue,
+        'avg_fb_spend_per_charge': fb_revenue / fb_amounts if fb_amounts else 0.0,
+        'avg_fb_spend_per_guest': fb_revenue / fb_guests if fb_guests else 0.0
+    }
+    return total_revenue, quarterly, avg_fb_spend, fb_revenue_by_meal
+
+
+def occupancy_series(snapshot, granularities=('day', 'month')):
+    """occupancy.compute_occupancy() over the whole stay history."""
+    starts = snapshot.column('roomassignments', 'start_day')
+    dated = starts != NULL
+    starts = starts[dated]
+    if not len(starts):
+        return {granularity: [] for granularity in granularities}
+    ends = snapshot.column('roomassignments', 'end_day')[dated]
+    room_ids = snapshot.column('roomassignments', 'room_id')[dated]
+    open_ended = ends == NULL
+    start_day = int(starts.min())
+    end_day = occupancy.open_end_day(int(np.maximum(np.where(open_ended, starts + 1, ends), starts + 1).max()))
+    if end_day <= start_day:
+        return {granularity: [] for granularity in granularities}
+    ends = np.where(open_ended, end_day, np.maximum(ends, starts + 1))
+
+    status = snapshot.column('rooms', 'room_status')
+    renovation = snapshot.codes('rooms', 'room_status', ('renovation',))
+    available_rooms = int(((status >= 0) & ~np.isin(status, renovation)).sum())  # NULL != 'renovation' is not true
+    return occupancy.sweep_arrays(np.where(room_ids == NULL, -1, room_ids), starts, ends,
+                                  start_day, end_day, available_rooms, granularities)
+
+
+def reservation_totals(snapshot, parties):
+    """{party: (total_reservations, last_visit_date)} over all reservations of the given parties."""
+    reservation_party = snapshot.column('reservations', 'billed_party_id')
+    selected = np.isin(reservation_party, parties) & (reservation_party != NULL)
+    party = reservation_party[selected]
+    reservation = snapshot.column('reservations', 'reservation_id')[selected]
+    check_in = snapshot.column('reservations', 'check_in_date')[selected]
+    totals = {}
+    for value in np.unique(party):
+        mine = party == value
+        visits = check_in[mine]
+        last_visit = snapshot.decode('reservations', 'check_in_date', visits.max()) if (visits >= 0).any() else None
+        totals[int(value)] = (count_distinct(reservation[mine]), last_visit)
+    return totals
+
+
+def party_names(snapshot, rows, organization_first):
+    """COALESCE of organization_name and first_name || ' ' || last_name, in either order."""
+    names = []
+    for row in rows:
+        first = snapshot.decode('billedparties', 'first_name', snapshot.column('billedparties', 'first_name')[row])
+        last = snapshot.decode('billedparties', 'last_name', snapshot.column('billedparties', 'last_name')[row])
+        organization = snapshot.decode('billedparties', 'organization_name',
+                                       snapshot.column('billedparties', 'organization_name')[row])
+        person = f"{first} {last}" if first is not None and last is not None else None
+        names.append((organization if organization is not None else person) if organization_first else
+                     (person if person is not None else organization))
+    return names
+
+
+TOP_CUSTOMERS_COLUMNS = ('billed_party_id', 'customer_name', 'party_type', 'total_revenue',
+                         'total_reservations', 'last_visit_date')
+
+
+def top_customers(snapshot, limit=20):
+    """TOP_CUSTOMERS_QUERY: (column names, raw rows)."""
+    status = snapshot.column('charges', 'charge_status')
+    party = snapshot.column('charges', 'billed_party_id')
+    # A NULL party never joins BilledParties, so it is dropped before grouping.
+    billable = np.isin(status, snapshot.codes('charges', 'charge_status', BILLABLE)) & (party != NULL)
+    parties, inverse = group_by(party[billable])
+    revenue = np.bincount(inverse, weights=np.nan_to_num(snapshot.column('charges', 'amount')[billable]),
+                          minlength=len(parties))
+    positive = revenue > 0
+    parties, revenue = parties[positive], revenue[positive]
+
+    party_rows, totals_rows = join_indices(snapshot.column('billedparties', 'billed_party_id'), parties)
+    ids = parties[totals_rows]
+    order = np.lexsort((ids, -revenue[totals_rows]))[:limit]
+    reservations = reservation_totals(snapshot, ids[order])
+    names = party_names(snapshot, party_rows[order], organization_first=True)
+    party_type = snapshot.column('billedparties', 'party_type')
+    rows = []
+    for position, name in zip(order, names):
+        party_id = int(ids[position])
+        total_reservations, last_visit = reservations.get(party_id, (0, None))
+        rows.append((party_id, name, snapshot.decode('billedparties', 'party_type', party_type[party_rows[position]]),
+                     float(revenue[totals_rows[position]]), total_reservations, last_visit))
+    return TOP_CUSTOMERS_COLUMNS, rows
+
+
+HIGH_RISK_CUSTOMERS_COLUMNS = ('billed_party_id', 'customer_name', 'party_type', 'past_history_score',
+                               'cooperativeness_score', 'flexibility_score', 'payment_promptness_score',
+                               'overall_qualification_score', 'risk_score', 'total_reservations',
+                               'overdue_amount', 'last_visit_date')
+SCORES = ('past_history_score', 'cooperativeness_score', 'flexibility_score', 'payment_promptness_score')
+
+
+def high_risk_customers(snapshot, limit=50):
+    """HIGH_RISK_CUSTOMERS_QUERY (unfiltered): (column names, raw rows)."""
+    qualification_rows, party_rows = join_indices(snapshot.column('customerqualifications', 'billed_party_id'),
+                                                  snapshot.column('billedparties', 'billed_party_id'))
+    scores = {name: snapshot.column('customerqualifications', name)[qualification_rows] for name in SCORES}
+    missing = np.zeros(len(qualification_rows), dtype=bool)
+    for values in scores.values():
+        missing |= values == NULL
+
+    def shortfall(name):
+        return (100 - scores[name]).astype(np.float64)
+
+    # Same operand order as the SQL expression, so the floats agree bit for bit.
+    risk = (0.4 * shortfall('payment_promptness_score') + 0.3 * shortfall('past_history_score') +
+            0.2 * shortfall('cooperativeness_score') + 0.1 * shortfall('flexibility_score'))
+    risk[missing] = np.nan
+    ids = snapshot.column('customerqualifications', 'billed_party_id')[qualification_rows]
+    order = np.lexsort((ids, np.where(missing, np.inf, -risk)))[:limit]  # NULL risk sorts last
+
+    selected = ids[order]
+    reservations = reservation_totals(snapshot, selected)
+    bill_status = snapshot.column('bills', 'bill_status')
+    overdue = (bill_status == next(iter(snapshot.codes('bills', 'bill_status', ('overdue',))), -2)) & \
+        np.isin(snapshot.column('bills', 'billed_party_id'), selected)
+    bill_party = snapshot.column('bills', 'billed_party_id')[overdue]
+    bill_amount = snapshot.column('bills', 'total_amount')[overdue]
+    names = party_names(snapshot, party_rows[order], organization_first=False)
+    party_type = snapshot.column('billedparties', 'party_type')
+    overall = snapshot.column('customerqualifications', 'overall_qualification_score')
+
+    def score(name, position):
+        value = scores[name][position]
+        return int(value) if value != NULL else None
+
+    rows = []
+    for position, name in zip(order, names):
+        party_id = int(ids[position])
+        total_reservations, last_visit = reservations.get(party_id, (0, None))
+        amounts = bill_amount[bill_party == party_id]
+        amounts = amounts[~np.isnan(amounts)]
+        overall_score = overall[qualification_rows[position]]
+        rows.append((party_id, name,
+                     snapshot.decode('billedparties', 'party_type', party_type[party_rows[position]]),
+                     *(score(score_name, position) for score_name in SCORES),
+                     None if np.isnan(overall_score) else float(overall_score),
+                     None if missing[position] else float(risk[position]),
+                     total_reservations,
+                     float(amounts.sum()) if len(amounts) else 0,
+                     last_visit))
+    return HIGH_RISK_CUSTOMERS_COLUMNS, rows
+
+
+EVENT_COUNT_BY_MONTH_COLUMNS = ('month', 'total_events', 'total_estimated_attendance',
+                                'avg_attendance_per_event', 'unique_hosts')
+
+
+def event_count_by_month(snapshot):
+    """Events per start month: (column names, raw rows) in month order."""
+    days = snapshot.column('events', 'start_day')
+    dated = days != NULL
+    if not dated.any():
+        return EVENT_COUNT_BY_MONTH_COLUMNS, []
+    months, inverse = np.unique(days[dated].astype('datetime64[D]').astype('datetime64[M]'), return_inverse=True)
+    attendance = snapshot.column('events', 'estimated_attendance')[dated]
+    known = attendance != NULL
+    totals = np.bincount(inverse[known], weights=attendance[known], minlength=len(months))
+    known_counts = np.bincount(inverse[known], minlength=len(months))
+    counts = np.bincount(inverse, minlength=len(months))
+    hosts = count_distinct(snapshot.column('events', 'host_id')[dated], inverse)
+    rows = []
+    for index, month in enumerate(months):
+        total = int(totals[index]) if known_counts[index] else None
+        rows.append((np.datetime_as_string(month, unit='M'), int(counts[index]), total,
+                     total / int(known_counts[index]) if known_counts[index] else None, int(hosts[index])))
+    return EVENT_COUNT_BY_MONTH_COLUMNS, rows
+
+
+AVERAGE_ATTENDANCE_COLUMNS = ('total_events', 'avg_estimated_attendance', 'avg_actual_attendance',
+                              'total_estimated_attendance', 'total_actual_attendance')
+
+
+def average_attendance(snapshot):
+    """Events and their EventRooms aggregated separately, as fetch_average_attendance() does: (names, raw row)."""
+    event_ids = snapshot.column('events', 'event_id')
+    estimated = snapshot.column('events', 'estimated_attendance')
+    held = np.isin(snapshot.column('eventrooms', 'event_id'), event_ids)
+    actual = snapshot.column('eventrooms', 'actual_attendance')[held]
+    row = (count_distinct(event_ids), sql_avg(estimated), sql_avg(actual), sql_sum(estimated), sql_sum(actual))
+    return AVERAGE_ATTENDANCE_COLUMNS, row
+
+
+def unique_customers_count(snapshot):
+    status = snapshot.column('reservations', 'reservation_status')
+    active = np.isin(status, snapshot.codes('reservations', 'reservation_status', ACTIVE_RESERVATIONS))
+    return count_distinct(snapshot.column('reservations', 'billed_party_id')[active])
+
+
+def source_fingerprint(db_path, counters=None):
+    """Short hash naming the database contents a snapshot is built from.
+
+    With counters (the change counters of SOURCE_TABLES) it moves only when
+    a source table is written; without, it hashes the size and mtime of the
+    database file and its WAL, which change with every commit.
+    """
+    if counters is not None:
+        return hashlib.blake2b(f"{os.path.abspath(db_path)}|{counters!r}".encode(), digest_size=8).hexdigest()
+    parts = []
+    for path in (db_path, db_path + '-wal'):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        parts.append(f"{stat.st_size}:{stat.st_mtime_ns}")
+    return hashlib.blake2b('|'.join(parts).encode(), digest_size=8).hexdigest()
+
+
+class ColumnarEngine:
+    """The snapshot of one database, opened from directory and rebuilt in the background when it changes."""
+
+    def __init__(self, db_path, directory, version=None, on_rebuild=None):
+        if np is None:
+            raise RuntimeError("the columnar engine needs NumPy")
+        self.db_path = db_path
+        self.directory = directory
+        self.version = version        # callable returning the change counters of SOURCE_TABLES, or None
+        self.on_rebuild = on_rebuild  # called after a background rebuild replaced the snapshot
+        self._snapshot = None
+        self._building = None         # the rebuild thread, while one runs
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def source(self):
+        counters = self.version() if self.version else None
+        # A probe without the counters installed answers data_version, which is per connection.
+        return source_fingerprint(self.db_path, counters if isinstance(counters, tuple) else None)
+
+    def snapshot(self):
+        """The current snapshot; after a write, the previous one until its replacement is built."""
+        source = self.source()
+        with self._lock:
+            if self._snapshot is None:
+                self._snapshot, built = self._open_or_build(source)
+                self.builds += built
+            elif self._snapshot.source != source and self._building is None:
+                self._building = threading.Thread(target=self._rebuild, args=(source,), name='columnar-rebuild',
+                                                  daemon=True)
+                self._building.start()
+            return self._snapshot
+
+    def _rebuild(self, source):
+        try:
+            snapshot, built = self._open_or_build(source)
+        except (OSError, ValueError, sqlite3.Error) as e:
+            print(f"Error rebuilding the columnar snapshot: {e}")
+            snapshot, built = None, False
+        with self._lock:
+            if snapshot is not None:
+                self._snapshot = snapshot
+            self.builds += built
+            self._building = None
+        if snapshot is not None and self.on_rebuild is not None:
+            self.on_rebuild()
+
+    def snapshot_path(self, source):
+        # The format is part of the name so an upgraded worker rebuilds instead of mapping an older layout.
+        return os.path.join(self.directory, f"snapshot-v{FORMAT_VERSION}-{source}")
+
+    def _open_or_build(self, source):
+        """(snapshot, whether it had to be built); the caller counts builds under the lock."""
+        path = self.snapshot_path(source)
+        built = not os.path.exists(os.path.join(path, MANIFEST))
+        if built:
+            connection = sqlite3.connect(self.db_path)
+            try:
+                snapshot = ColumnarSnapshot.load(connection, source)
+            finally:
+                connection.close()
+            # Write under a private name and rename, so other workers never map a half-written snapshot.
+            staging = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            snapshot.save(staging)
+            try:
+                os.rename(staging, path)
+            except OSError:
+                shutil.rmtree(staging, ignore_errors=True)  # another worker built it first
+            self._remove_stale(path)
+        return ColumnarSnapshot.open(path), built
+
+    def _remove_stale(self, current):
+        # Workers still mapping an old snapshot keep their pages; unlinking only drops the names.
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith('snapshot-') and not name.endswith('.tmp') and path != current:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def status(self):
+        with self._lock:
+            snapshot, builds, rebuilding = self._snapshot, self.builds, self._building is not None
+        return {
+            'directory': self.directory,
+            'source': snapshot.source if snapshot else None,
+            'rows': dict(snapshot.rows) if snapshot else {},
+            'bytes': snapshot.nbytes() if snapshot else 0,
+            'builds': builds,
+            'rebuilding': rebuilding
+        }
+
+
+def values_match(left, right):
+    """Equality for metric values, with floats compared to a relative tolerance (summation order differs)."""
+    if isinstance(left, float) or isinstance(right, float):
+        if left is None or right is None:
+            return left is right
+        return math.isclose(left, right, rel_tol=1e-9, abs_tol=1e-6)
+    if isinstance(left, dict) and isinstance(right, dict):
+        return left.keys() == right.keys() and all(values_match(left[key], right[key]) for key in left)
+    if isinstance(left, (list, tuple)) and isinstance(right, (list, tuple)):
+        return len(left) == len(right) and all(values_match(a, b) for a, b in zip(left, right))
+    return left == right
+
+
+def check(connection):
+    """Return a list of (summary key, problem) pairs; an empty list means the engine matches SQL.
+
+    Every SUMMARY_TASKS entry is computed both ways: by its SQL fetch helper
+    and from a snapshot loaded from the same connection.
+    """
+    import app
+
+    snapshot = ColumnarSnapshot.load(connection)
+    connection.row_factory = sqlite3.Row
+    cursor = connection.cursor()
+    problems = []
+    for name, keys, fetch, _ in app.SUMMARY_TASKS:
+        if name not in app.COLUMNAR_TASKS:
+            continue
+        expected = fetch(cursor)
+        expected = expected if isinstance(expected, tuple) else (expected,)
+        actual = app.COLUMNAR_TASKS[name](snapshot)
+        for key, sql_value, columnar_value in zip(keys, expected, actual):
+            if not values_match(sql_value, columnar_value):
+                problems.append((key, 'columnar result differs from SQL'))
+    cursor.close()
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('command', choices=['build', 'check'])
+    parser.add_argument('--db', default=None, help='SQLite database (default: DB_PATH)')
+    parser.add_argument('--dir', default=None, help='snapshot directory (default: COLUMNAR_SNAPSHOT_DIR)')
+    args = parser.parse_args(argv)
+    if np is None:
+        print("The columnar engine needs NumPy")
+        return 1
+
+    db_path = args.db or os.getenv('DB_PATH', 'last_resort_hotels.db')
+    if args.command == 'build':
+        engine = ColumnarEngine(db_path, args.dir or os.getenv('COLUMNAR_SNAPSHOT_DIR', 'columnar_snapshot'))
+        os.makedirs(engine.directory, exist_ok=True)
+        snapshot = engine.snapshot()
+        print(f"Snapshot {snapshot.source} in {engine.directory}: "
+              f"{sum(snapshot.rows.values()):,} rows, {snapshot.nbytes() / 1e6:,.1f} MB")
+        return 0
+
+    connection = sqlite3.connect(db_path)
+    try:
+        problems = check(connection)
+    finally:
+        connection.close()
+    for name, problem in problems:
+        print(f"{name}: {problem}")
+    print('Columnar engine matches SQL' if not problems else f"{len(problems)} problem(s) found")
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
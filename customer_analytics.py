@@ -0,0 +1,103 @@
+"""Customer revenue and risk queries without join fan-out.
+
+Joining Charges and Reservations (or Reservations and Bills) onto
+BilledParties before aggregating yields one row per charge x reservation
+pair for every party, which multiplies SUM(amount) and grows the intermediate
+result quadratically. Each fact table is aggregated per billed_party_id once
+here, and only the compact per-party aggregates are joined.
+"""
+
+TOP_CUSTOMERS_QUERY = """
+    WITH charge_totals AS (
+        SELECT c.billed_party_id, SUM(c.amount) AS total_revenue
+        FROM Charges c
+        WHERE c.charge_status IN ('billed', 'paid') AND {charge_filter}
+        GROUP BY c.billed_party_id
+    ),
+    reservation_totals AS (
+        SELECT
+            billed_party_id,
+            COUNT(DISTINCT reservation_id) AS total_reservations,
+            MAX(check_in_date) AS last_visit_date
+        FROM Reservations res
+        WHERE {reservation_filter}
+        GROUP BY billed_party_id
+    )
+    SELECT
+        bp.billed_party_id,
+        COALESCE(bp.organization_name, bp.first_name || ' ' || bp.last_name) AS customer_name,
+        bp.party_type,
+        ct.total_revenue,
+        COALESCE(rt.total_reservations, 0) AS total_reservations,
+        rt.last_visit_date
+    FROM charge_totals ct
+    JOIN BilledParties bp ON bp.billed_party_id = ct.billed_party_id
+    LEFT JOIN reservation_totals rt ON rt.billed_party_id = ct.billed_party_id
+    WHERE ct.total_revenue > 0
+    ORDER BY ct.total_revenue DESC, bp.billed_party_id
+    LIMIT ?
+"""
+
+# Qualification-based risk score; risk_scoring.risk_expression() builds it for other weights.
+RISK_SCORE = """0.4 * (100 - cq.payment_promptness_score) +
+         0.3 * (100 - cq.past_history_score) +
+         0.2 * (100 - cq.cooperativeness_score) +
+         0.1 * (100 - cq.flexibility_score)"""
+
+HIGH_RISK_CUSTOMERS_QUERY = """
+    WITH reservation_totals AS (
+        SELECT
+            billed_party_id,
+            COUNT(DISTINCT reservation_id) AS total_reservations,
+            MAX(check_in_date) AS last_visit_date
+        FROM Reservations res
+        WHERE {reservation_filter}
+        GROUP BY billed_party_id
+    ),
+    overdue_totals AS (
+        SELECT billed_party_id, SUM(total_amount) AS overdue_amount
+        FROM Bills b
+        WHERE b.bill_status = 'overdue' AND {bill_filter}
+        GROUP BY billed_party_id
+    )
+    SELECT
+        cq.billed_party_id,
+        COALESCE(bp.first_name || ' ' || bp.last_name, bp.organization_name) AS customer_name,
+        bp.party_type,
+        cq.past_history_score,
+        cq.cooperativeness_score,
+        cq.flexibility_score,
+        cq.payment_promptness_score,
+        cq.overall_qualification_score,
+        ({risk_score}) AS risk_score,
+        COALESCE(rt.total_reservations, 0) AS total_reservations,
+        COALESCE(ot.overdue_amount, 0) AS overdue_amount,
+        rt.last_visit_date
+    FROM CustomerQualifications cq
+    JOIN BilledParties bp ON cq.billed_party_id = bp.billed_party_id
+    LEFT JOIN reservation_totals rt ON rt.billed_party_id = cq.billed_party_id
+    LEFT JOIN overdue_totals ot ON ot.billed_party_id = cq.billed_party_id
+    WHERE {party_filter}
+    ORDER BY risk_score DESC, cq.billed_party_id
+    LIMIT ?
+"""
+
+
+def top_customers_query(charge_filter='1', reservation_filter='1'):
+    """TOP_CUSTOMERS_QUERY with extra SQL conditions on the Charges (alias c) and
+    Reservations (alias res) scans; parameters go charges first, then
+    reservations, then the LIMIT."""
+    return TOP_CUSTOMERS_QUERY.format(charge_filter=charge_filter, reservation_filter=reservation_filter)
+
+
+def high_risk_customers_query(reservation_filter='1', bill_filter='1', active_only=False, risk_score=RISK_SCORE):
+    """HIGH_RISK_CUSTOMERS_QUERY with extra conditions on Reservations (alias res)
+    and Bills (alias b). With active_only, customers without a reservation
+    matching the filter are left out. risk_score is the SQL expression ranked
+    by. Parameters go reservations, bills, LIMIT."""
+    return HIGH_RISK_CUSTOMERS_QUERY.format(
+        reservation_filter=reservation_filter,
+        bill_filter=bill_filter,
+        risk_score=risk_score,
+        party_filter='rt.billed_party_id IS NOT NULL' if active_only else '1'
+    )
@@ -0,0 +1,149 @@
+"""Thread-safe SQLite connection pool.
+
+Connections are opened lazily up to a fixed size, configured once with the
+connection-level PRAGMAs, and handed out through the connection() context
+manager. A thread that already holds a connection gets the same one back on
+nested checkouts, so helpers called from inside a checkout share it.
+"""
+from contextlib import contextmanager
+import queue
+import sqlite3
+import threading
+
+DEFAULT_PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('mmap_size', 268435456),
+    ('cache_size', -65536),
+    ('temp_store', 'MEMORY'),
+)
+
+
+class PoolClosedError(sqlite3.Error):
+    pass
+
+
+class PoolTimeoutError(sqlite3.Error):
+    pass
+
+
+class ConnectionPool:
+    def __init__(self, db_path, size=8, timeout=5.0, pragmas=DEFAULT_PRAGMAS, read_only=True,
+                 connection_factory=sqlite3.Connection):
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self.pragmas = tuple(pragmas)
+        self.read_only = read_only
+        self.connection_factory = connection_factory
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._closed = False
+        self._local = threading.local()
+
+    def _open(self):
+        connection = sqlite3.connect(self.db_path, check_same_thread=False, factory=self.connection_factory)
+        connection.row_factory = sqlite3.Row
+        for name, value in self.pragmas:
+            connection.execute(f"PRAGMA {name} = {value}")
+        if self.read_only:
+            connection.execute("PRAGMA query_only = ON")
+        return connection
+
+    def _is_healthy(self, connection):
+        try:
+            connection.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._opened -= 1
+
+    def acquire(self):
+        if self._closed:
+            raise PoolClosedError("Connection pool is closed")
+
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if self._is_healthy(connection):
+                return connection
+            self._discard(connection)
+
+        with self._lock:
+            can_open = self._opened < self.size
+            if can_open:
+                self._opened += 1
+        if can_open:
+            try:
+                return self._open()
+            except sqlite3.Error:
+                with self._lock:
+                    self._opened -= 1
+                raise
+
+        try:
+            connection = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise PoolTimeoutError(f"No connection available within {self.timeout}s")
+        if self._is_healthy(connection):
+            return connection
+        self._discard(connection)
+        return self.acquire()
+
+    def release(self, connection):
+        if connection.in_transaction:
+            connection.rollback()
+        if self._closed:
+            self._discard(connection)
+        else:
+            self._idle.put(connection)
+
+    @contextmanager
+    def connection(self):
+        held = getattr(self._local, 'connection', None)
+        if held is not None:
+            yield held
+            return
+
+        connection = self.acquire()
+        self._local.connection = connection
+        try:
+            yield connection
+        finally:
+            self._local.connection = None
+            self.release(connection)
+
+    @contextmanager
+    def cursor(self):
+        with self.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+
+    def stats(self):
+        return {
+            'size': self.size,
+            'opened': self._opened,
+            'idle': self._idle.qsize(),
+            'closed': self._closed
+        }
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(connection)
@@ -0,0 +1,431 @@
+"""Event-space analytics over EventRooms: utilization, capacity fill and attendance accuracy.
+
+Every EventRooms row is one room used by one event in one time slot of one
+day. From those rows this module computes:
+
+- a room x time-slot utilization heatmap: the share of days in the range on
+  which the room was in use in that slot (a slot two events share counts
+  once; the extra rows are reported as conflicts), and the same over
+  weekday x time slot for all listed rooms together;
+- capacity fill: actual_attendance against MeetingRooms.seating_capacity,
+  averaged per room, with the number of uses over capacity;
+- estimate accuracy: each event's actual attendance is its peak over
+  (day, slot) of the attendance summed across its rooms, compared with
+  Events.estimated_attendance as bias, mean absolute error, mean absolute
+  percentage error and the share within ACCURACY_TOLERANCE percent, per
+  event type and overall.
+
+Rows without a usage date or with an unknown time slot are left out. The
+range is the filter's start/end, or the first to last usage day. The listed
+rooms are the meeting rooms (can_be_meeting or a MeetingRooms row) of the
+selected property plus any room with usage in the range.
+
+Each table is read once. compute() loads the EventRooms columns as compact
+integer arrays (slot codes, day numbers, room and event ids) and buckets
+them with NumPy. from_snapshot() takes the same arrays from a columnar
+snapshot. Both produce the totals that sql_totals() computes with GROUP BY
+queries, which is the fallback without NumPy and the reference for
+`python event_space.py check`.
+
+Usage:
+    python event_space.py check [--db PATH]    # compare the array and SQL paths
+"""
+import argparse
+from collections import namedtuple
+import os
+import sqlite3
+import sys
+
+import columnar
+from columnar import NULL, encode_int, encode_text, join_indices
+from metric_filters import NO_FILTERS
+from occupancy import from_day, to_day
+
+np = columnar.np
+
+SLOTS = ('breakfast', 'morning', 'lunch', 'afternoon', 'supper', 'evening', 'night')
+WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+ACCURACY_TOLERANCE = 10  # percent
+
+SLOT_CODE = ("CASE er.usage_time_slot "
+             + ' '.join(f"WHEN '{slot}' THEN {code}" for code, slot in enumerate(SLOTS)) + " ELSE -1 END")
+USAGE_DAY = "CAST(julianday(DATE(er.usage_date)) - 2440587.5 AS INTEGER)"
+USAGE = f"DATE(er.usage_date) IS NOT NULL AND er.room_id IS NOT NULL AND ({SLOT_CODE}) >= 0"
+CAPACITY = ("SELECT room_id, MAX(seating_capacity) AS seating_capacity FROM MeetingRooms "
+            "WHERE seating_capacity > 0 GROUP BY room_id")
+
+ROOMS_QUERY = f"""
+    SELECT r.room_id, r.room_number, r.can_be_meeting, m.seating_capacity
+    FROM Rooms r
+    LEFT JOIN ({CAPACITY}) m ON m.room_id = r.room_id
+    WHERE r.room_id IS NOT NULL AND {{room_filter}}
+"""
+EVENTS_QUERY = "SELECT event_id, estimated_attendance, event_type FROM Events"
+# NULLs come back as columnar.NULL so the rows convert to one int64 array in C.
+USAGE_QUERY = f"""
+    SELECT COALESCE(er.event_id, {NULL}), er.room_id, {SLOT_CODE}, {USAGE_DAY}, COALESCE(er.actual_attendance, {NULL})
+    FROM EventRooms er
+    WHERE {USAGE} AND {{where}}
+"""
+
+# The SQL reference path: the same totals from GROUP BY queries.
+RANGE_QUERY = f"SELECT MIN({USAGE_DAY}), MAX({USAGE_DAY}) FROM EventRooms er WHERE {USAGE} AND {{where}}"
+CELLS_QUERY = f"""
+    SELECT er.room_id, {SLOT_CODE} AS slot, COUNT(DISTINCT DATE(er.usage_date)), COUNT(*)
+    FROM EventRooms er
+    WHERE {USAGE} AND {{where}}
+    GROUP BY er.room_id, slot
+"""
+WEEKDAY_QUERY = f"""
+    SELECT ((day % 7) + 10) % 7 AS weekday, slot, COUNT(*)
+    FROM (SELECT DISTINCT er.room_id, {USAGE_DAY} AS day, {SLOT_CODE} AS slot
+          FROM EventRooms er WHERE {USAGE} AND {{where}})
+    GROUP BY weekday, slot
+"""
+FILL_QUERY = f"""
+    SELECT er.room_id, SUM(CAST(er.actual_attendance AS REAL) / m.seating_capacity), COUNT(*),
+           SUM(er.actual_attendance > m.seating_capacity)
+    FROM EventRooms er
+    JOIN ({CAPACITY}) m ON m.room_id = er.room_id
+    WHERE {USAGE} AND er.actual_attendance IS NOT NULL AND {{where}}
+    GROUP BY er.room_id
+"""
+ACCURACY_QUERY = f"""
+    WITH peaks AS (
+        SELECT event_id, MAX(attendance) AS actual
+        FROM (SELECT er.event_id, SUM(er.actual_attendance) AS attendance
+              FROM EventRooms er
+              WHERE {USAGE} AND er.actual_attendance IS NOT NULL AND er.event_id IS NOT NULL AND {{where}}
+              GROUP BY er.event_id, DATE(er.usage_date), {SLOT_CODE})
+        GROUP BY event_id
+    )
+    SELECT e.event_type, COUNT(*), SUM(e.estimated_attendance), SUM(p.actual),
+           SUM(p.actual - e.estimated_attendance), SUM(ABS(p.actual - e.estimated_attendance)),
+           SUM(CASE WHEN e.estimated_attendance > 0
+                    THEN ABS(p.actual - e.estimated_attendance) * 1.0 / e.estimated_attendance END),
+           SUM(e.estimated_attendance > 0),
+           SUM(e.estimated_attendance > 0
+               AND ABS(p.actual - e.estimated_attendance) * 100 <= {ACCURACY_TOLERANCE} * e.estimated_attendance)
+    FROM peaks p
+    JOIN Events e ON e.event_id = p.event_id
+    WHERE e.estimated_attendance IS NOT NULL
+    GROUP BY e.event_type
+"""
+
+# Compact columns: one row per usage, per event and per room.
+UsageArrays = namedtuple('UsageArrays', 'event room slot day attendance '
+                                        'event_ids estimated event_types type_names '
+                                        'room_ids room_numbers meeting capacity')
+
+
+def usage_filter(filters):
+    """(sql, params) restricting EventRooms er to the filter's dates and rooms."""
+    date_sql, date_params = filters.date_range('er.usage_date')
+    room_sql, room_params = filters.room_condition('er.room_id')
+    return f"{date_sql} AND {room_sql}", date_params + room_params
+
+
+def load_rooms(cursor, filters):
+    room_sql, room_params = filters.room_condition('r.room_id')
+    cursor.execute(ROOMS_QUERY.format(room_filter=room_sql), room_params)
+    return cursor.fetchall()
+
+
+def load_arrays(cursor, filters=NO_FILTERS):
+    """UsageArrays for the filtered EventRooms rows, reading each table once."""
+    where, params = usage_filter(filters)
+    previous = cursor.row_factory
+    cursor.row_factory = None
+    try:
+        usage = cursor.execute(USAGE_QUERY.format(where=where), params).fetchall()
+        events = cursor.execute(EVENTS_QUERY).fetchall()
+        rooms = load_rooms(cursor, filters)
+    finally:
+        cursor.row_factory = previous
+    event, room, slot, day, attendance = np.array(usage, dtype=np.int64).reshape(-1, 5).T.copy()
+    event_ids, estimated, types = (list(zip(*events)) or [()] * 3)
+    event_types, type_names = encode_text(types)
+    room_ids, room_numbers, meeting, capacity = (list(zip(*rooms)) or [()] * 4)
+    return UsageArrays(event, room, slot, day, attendance,
+                       encode_int(event_ids), encode_int(estimated), event_types, [str(name) for name in type_names],
+                       encode_int(room_ids), list(room_numbers), np.array([bool(flag) for flag in meeting], dtype=bool),
+                       encode_int(capacity))
+
+
+def snapshot_arrays(snapshot):
+    """UsageArrays for every EventRooms row of a columnar snapshot."""
+    slot_names = snapshot.dictionaries['eventrooms.usage_time_slot']
+    slot_codes = np.array([SLOTS.index(str(name)) if str(name) in SLOTS else -1 for name in slot_names] + [-1],
+                          dtype=np.int64)
+    slot = slot_codes[snapshot.column('eventrooms', 'usage_time_slot')]  # code -1 (NULL) picks the trailing -1
+    room_ids = snapshot.column('rooms', 'room_id')
+    capacity = np.full(len(room_ids), NULL, dtype=np.int64)
+    seating = snapshot.column('meetingrooms', 'seating_capacity')
+    valid = (seating != NULL) & (seating > 0)
+    room_rows, meeting_rows = join_indices(room_ids, snapshot.column('meetingrooms', 'room_id')[valid])
+    if len(room_rows):
+        np.maximum.at(capacity, room_rows, seating[valid][meeting_rows])
+    numbers = snapshot.column('rooms', 'room_number')
+    return UsageArrays(
+        snapshot.column('eventrooms', 'event_id'), snapshot.column('eventrooms', 'room_id'), slot,
+        snapshot.column('eventrooms', 'usage_day'), snapshot.column('eventrooms', 'actual_attendance'),
+        snapshot.column('events', 'event_id'), snapshot.column('events', 'estimated_attendance'),
+        snapshot.column('events', 'event_type'), [str(name) for name in snapshot.dictionaries['events.event_type']],
+        room_ids, [snapshot.decode('rooms', 'room_number', code) for code in numbers],
+        snapshot.column('rooms', 'can_be_meeting') > 0, capacity)
+
+
+def distinct(keys):
+    """Sorted distinct values of an int64 array (a plain sort beats np.unique's hashing here)."""
+    keys = np.sort(keys)
+    return keys[np.r_[True, keys[1:] != keys[:-1]]] if len(keys) else keys
+
+
+def array_totals(data, start_day=None, end_day=None):
+    """The totals assemble() reads, bucketed on compact arrays."""
+    keep = (data.day != NULL) & (data.room != NULL) & (data.slot >= 0)
+    room, slot, day = data.room[keep], data.slot[keep], data.day[keep]
+    event, attendance = data.event[keep], data.attendance[keep]
+    if start_day is None:
+        start_day = int(day.min()) if len(day) else None
+    if end_day is None:
+        end_day = int(day.max()) + 1 if len(day) else None
+
+    listed = data.meeting | (data.capacity != NULL)
+    rooms, room_index = np.unique(np.concatenate([data.room_ids[listed], room]), return_inverse=True)
+    room_index = room_index[listed.sum():]
+    totals = new_totals(start_day, end_day)
+    table_rows, matched = join_indices(rooms, data.room_ids)
+    numbers, capacities = {}, {}
+    for position, row in zip(table_rows.tolist(), matched.tolist()):
+        numbers.setdefault(position, data.room_numbers[row])
+        if data.capacity[row] != NULL:
+            capacities[position] = max(capacities.get(position, 0), int(data.capacity[row]))
+    totals['rooms'] = [(int(room_id), numbers.get(position), capacities.get(position))
+                       for position, room_id in enumerate(rooms.tolist())]
+    if not len(room):
+        return totals
+
+    # Distinct (room, day, slot) cells: one folded int64 key each.
+    span = int(day.max()) - int(day.min()) + 1
+    first_day = int(day.min())
+    cells = distinct((room_index * span + (day - first_day)) * len(SLOTS) + slot)
+    cell_room_slot = (cells // (span * len(SLOTS))) * len(SLOTS) + cells % len(SLOTS)
+    used = np.bincount(cell_room_slot, minlength=len(rooms) * len(SLOTS))
+    usages = np.bincount(room_index * len(SLOTS) + slot, minlength=len(rooms) * len(SLOTS))
+    for key in np.flatnonzero(usages).tolist():
+        totals['cells'][(int(rooms[key // len(SLOTS)]), key % len(SLOTS))] = (int(used[key]), int(usages[key]))
+    cell_days = (cells // len(SLOTS)) % span + first_day
+    weekday_slot = ((cell_days + 3) % 7) * len(SLOTS) + cells % len(SLOTS)
+    by_weekday = np.bincount(weekday_slot, minlength=7 * len(SLOTS))
+    for key in np.flatnonzero(by_weekday).tolist():
+        totals['weekday_cells'][(key // len(SLOTS), key % len(SLOTS))] = int(by_weekday[key])
+
+    # Capacity fill per room.
+    room_capacity = np.array([capacities.get(position, 0) for position in range(len(rooms))], dtype=np.int64)
+    capacity = room_capacity[room_index]
+    filled = (attendance != NULL) & (capacity > 0)
+    fill_room = room_index[filled]
+    ratio = attendance[filled] / capacity[filled]
+    fill_sum = np.bincount(fill_room, weights=ratio, minlength=len(rooms))
+    fill_count = np.bincount(fill_room, minlength=len(rooms))
+    over = np.bincount(fill_room, weights=attendance[filled] > capacity[filled], minlength=len(rooms))
+    for position in np.flatnonzero(fill_count).tolist():
+        totals['fill'][int(rooms[position])] = (float(fill_sum[position]), int(fill_count[position]), int(over[position]))
+
+    # Peak attendance per event: sum over rooms per (event, day, slot), then the maximum per event.
+    counted = (attendance != NULL) & (event != NULL)
+    if counted.any():
+        events, event_index = np.unique(event[counted], return_inverse=True)
+        keys, key_index = np.unique((event_index * span + (day[counted] - first_day)) * len(SLOTS) + slot[counted],
+                                    return_inverse=True)
+        sums = np.bincount(key_index, weights=attendance[counted]).astype(np.int64)
+        key_event = keys // (span * len(SLOTS))
+        starts = np.flatnonzero(np.r_[True, key_event[1:] != key_event[:-1]])
+        peaks = np.maximum.reduceat(sums, starts)
+        peak_rows, event_rows = join_indices(events[key_event[starts]], data.event_ids)
+        estimated = data.estimated[event_rows]
+        known = estimated != NULL
+        actual, estimated = peaks[peak_rows][known], estimated[known]
+        types = data.event_types[event_rows][known]
+        error = actual - estimated
+        positive = estimated > 0
+        percentage = np.where(positive, np.abs(error) / np.where(positive, estimated, 1), 0.0)
+        within = positive & (np.abs(error) * 100 <= ACCURACY_TOLERANCE * estimated)
+        for code in np.unique(types).tolist():
+            of_type = types == code
+            name = data.type_names[code] if code >= 0 else None
+            totals['accuracy'][name] = (
+                int(of_type.sum()), int(estimated[of_type].sum()), int(actual[of_type].sum()),
+                int(error[of_type].sum()), int(np.abs(error[of_type]).sum()),
+                float(percentage[of_type & positive].sum()) if (of_type & positive).any() else None,
+                int((of_type & positive).sum()), int(within[of_type].sum()))
+    return totals
+
+
+def new_totals(start_day, end_day):
+    return {
+        'start_day': start_day,
+        'end_day': end_day,
+        'rooms': [],          # (room_id, room_number, seating_capacity) of every listed room
+        'cells': {},          # (room_id, slot) -> (days used, usage rows)
+        'weekday_cells': {},  # (weekday, slot) -> (room, day) cells used
+        'fill': {},           # room_id -> (sum of attendance / capacity, usages with both, usages over capacity)
+        'accuracy': {},       # event_type -> (events, estimated, actual, error, absolute error,
+                              #                sum of absolute percentage error, events with an estimate > 0,
+                              #                events within ACCURACY_TOLERANCE)
+    }
+
+
+def sql_totals(cursor, filters=NO_FILTERS):
+    """The totals assemble() reads, from GROUP BY queries (no NumPy needed)."""
+    where, params = usage_filter(filters)
+    previous = cursor.row_factory
+    cursor.row_factory = None
+    try:
+        first, last = cursor.execute(RANGE_QUERY.format(where=where), params).fetchone()
+        start_day = to_day(filters.start) if filters.start is not None else first
+        end_day = to_day(filters.end) if filters.end is not None else (last + 1 if last is not None else None)
+        totals = new_totals(start_day, end_day)
+        for room_id, slot, used, usages in cursor.execute(CELLS_QUERY.format(where=where), params):
+            totals['cells'][(room_id, slot)] = (used, usages)
+        for weekday, slot, used in cursor.execute(WEEKDAY_QUERY.format(where=where), params):
+            totals['weekday_cells'][(weekday, slot)] = used
+        for room_id, fill_sum, count, over in cursor.execute(FILL_QUERY.format(where=where), params):
+            totals['fill'][room_id] = (fill_sum, count, over)
+        for event_type, *sums in cursor.execute(ACCURACY_QUERY.format(where=where), params):
+            totals['accuracy'][event_type] = tuple(sums)
+        rooms = {}
+        for room_id, room_number, can_be_meeting, capacity in load_rooms(cursor, filters):
+            number, _, listed = rooms.get(room_id, (room_number, None, False))
+            rooms[room_id] = (number, capacity, listed or bool(can_be_meeting) or capacity is not None)
+    finally:
+        cursor.row_factory = previous
+    used_rooms = {room_id for room_id, _ in totals['cells']}
+    totals['rooms'] = [(room_id, *rooms.get(room_id, (None, None, False))[:2])
+                       for room_id in sorted(used_rooms | {room_id for room_id, room in rooms.items() if room[2]})]
+    return totals
+
+
+def percent(part, whole):
+    return round(100.0 * part / whole, 2) if whole else None
+
+
+def assemble(totals):
+    """Display form of the totals: room and weekday heatmaps, fill ratios and estimate accuracy."""
+    start_day, end_day = totals['start_day'], totals['end_day']
+    days = end_day - start_day if start_day is not None and end_day is not None else 0
+    weekday_days = [0] * 7
+    for offset in range(min(days, 7)):
+        weekday_days[(start_day + offset + 3) % 7] = (days - offset + 6) // 7
+    rooms = []
+    for room_id, room_number, capacity in totals['rooms']:
+        cells = [totals['cells'].get((room_id, slot), (0, 0)) for slot in range(len(SLOTS))]
+        fill_sum, fill_count, over = totals['fill'].get(room_id, (0.0, 0, 0))
+        rooms.append({
+            'room_id': room_id,
+            'room_number': room_number,
+            'seating_capacity': capacity,
+            'slots': [percent(used, days) for used, _ in cells],
+            'utilization': percent(sum(used for used, _ in cells), days * len(SLOTS)),
+            'usages': sum(usages for _, usages in cells),
+            'conflicts': sum(usages - used for used, usages in cells),
+            'avg_fill': percent(fill_sum, fill_count),
+            'over_capacity': over,
+        })
+    weekdays = []
+    for weekday, name in enumerate(WEEKDAYS):
+        available = weekday_days[weekday] * len(rooms)
+        used = [totals['weekday_cells'].get((weekday, slot), 0) for slot in range(len(SLOTS))]
+        weekdays.append({'weekday': name, 'slots': [percent(cell, available) for cell in used],
+                         'utilization': percent(sum(used), available * len(SLOTS))})
+
+    def accuracy_row(event_type, sums):
+        events, estimated, actual, error, absolute, percentage, with_estimate, within = sums
+        return {
+            'event_type': event_type,
+            'events': events,
+            'avg_estimated': round(estimated / events, 2) if events else None,
+            'avg_actual': round(actual / events, 2) if events else None,
+            'bias': round(error / events, 2) if events else None,
+            'mean_absolute_error': round(absolute / events, 2) if events else None,
+            'mean_absolute_percentage_error': percent(percentage or 0.0, with_estimate),
+            'within_tolerance': percent(within, with_estimate),
+        }
+
+    accuracy = [accuracy_row(event_type, sums)
+                for event_type, sums in sorted(totals['accuracy'].items(), key=lambda item: (item[0] is None, item[0] or ''))]
+    overall = [sum(sums[i] or 0 for sums in totals['accuracy'].values()) for i in range(8)]
+    fill_sum = sum(values[0] for values in totals['fill'].values())
+    fill_count = sum(values[1] for values in totals['fill'].values())
+    return {
+        'start': from_day(start_day).isoformat() if start_day is not None else None,
+        'end': from_day(end_day).isoformat() if end_day is not None else None,
+        'days': days,
+        'slots': list(SLOTS),
+        'rooms': rooms,
+        'weekdays': weekdays,
+        'utilization': percent(sum(used for used, _ in totals['cells'].values()), days * len(SLOTS) * len(rooms)),
+        'avg_fill': percent(fill_sum, fill_count),
+        'over_capacity': sum(values[2] for values in totals['fill'].values()),
+        'conflicts': sum(usages - used for used, usages in totals['cells'].values()),
+        'accuracy': accuracy,
+        'accuracy_overall': accuracy_row('All events', overall),
+        'accuracy_tolerance': ACCURACY_TOLERANCE,
+    }
+
+
+def compute(cursor, filters=NO_FILTERS):
+    """Event-space analytics for the filters: arrays with NumPy, GROUP BY queries without."""
+    if np is None:
+        return assemble(sql_totals(cursor, filters))
+    start_day = to_day(filters.start) if filters.start is not None else None
+    end_day = to_day(filters.end) if filters.end is not None else None
+    return assemble(array_totals(load_arrays(cursor, filters), start_day, end_day))
+
+
+def from_snapshot(snapshot):
+    """Unfiltered event-space analytics from a columnar snapshot."""
+    return assemble(array_totals(snapshot_arrays(snapshot)))
+
+
+def check(connection, filters=NO_FILTERS):
+    """Return a list of (what, problem) pairs; an empty list means the array and SQL paths agree."""
+    cursor = connection.cursor()
+    expected = sql_totals(cursor, filters)
+    problems = []
+    sources = [('arrays', array_totals(load_arrays(cursor, filters),
+                                       to_day(filters.start) if filters.start is not None else None,
+                                       to_day(filters.end) if filters.end is not None else None))]
+    if not filters:
+        sources.append(('snapshot', array_totals(snapshot_arrays(columnar.ColumnarSnapshot.load(connection)))))
+    for source, actual in sources:
+        for key in expected:
+            if not columnar.values_match(expected[key], actual[key]):
+                problems.append((f"{source} {key}", 'differs from the SQL totals'))
+    cursor.close()
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('command', choices=['check'])
+    parser.add_argument('--db', default=None, help='SQLite database (default: DB_PATH)')
+    args = parser.parse_args(argv)
+    if np is None:
+        print("The array path needs NumPy; nothing to compare")
+        return 1
+
+    connection = sqlite3.connect(args.db or os.getenv('DB_PATH', 'last_resort_hotels.db'))
+    try:
+        problems = check(connection)
+    finally:
+        connection.close()
+    for name, problem in problems:
+        print(f"{name}: {problem}")
+    print('Event-space analytics match SQL' if not problems else f"{len(problems)} problem(s) found")
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,266 @@
+"""Streaming CSV / NDJSON exports of the dashboard tables.
+
+Each export pulls rows from a SQLite cursor with fetchmany() and hands them
+to a formatter that yields encoded chunks, so a Flask response built on
+these generators holds one batch in memory no matter how many rows the
+export covers. The exception is high_risk_customers, which is ranked in
+memory (one row per scored party) so it scores with RISK_WEIGHTS exactly as
+the dashboard's risk index does.
+
+The response has started by the time a database error can interrupt it, so
+the status stays 200: an NDJSON export then ends with an
+{"error": ..., "truncated": true} record, and a CSV export (which has no
+place for one) is aborted, leaving the client with an incomplete transfer
+rather than a short file that looks whole.
+
+Filters (all optional) are the dashboard's: start and end are ISO dates,
+start inclusive and end exclusive, and building_id / wing_id restrict to that
+part of the property, parsed and applied through metric_filters. party is a
+billed_party_id. Exports declare which filters they support, and anything
+else is rejected with ExportError.
+"""
+import csv
+from dataclasses import dataclass
+import io
+import json
+
+import customer_analytics
+import metric_filters
+from metric_filters import NO_FILTERS, FilterError, MetricFilters
+import metric_queries
+import occupancy
+import risk_scoring
+
+EXPORT_BATCH_SIZE = 2000
+RISK_WEIGHTS = risk_scoring.configured_weights()
+FILTERS = metric_filters.FILTER_ARGS + ('party',)
+
+
+class ExportError(ValueError):
+    pass
+
+
+@dataclass
+class Export:
+    name: str
+    rows: object
+    filters: tuple = FILTERS
+
+
+@dataclass(frozen=True)
+class ExportFilters:
+    metric: MetricFilters = NO_FILTERS
+    party: int = None
+
+    def names(self):
+        """The filters that were supplied, by request argument name."""
+        names = list(self.metric.query_args())
+        if self.party is not None:
+            names.append('party')
+        return names
+
+
+def parse_filters(args):
+    """Turn request arguments into ExportFilters; raises ExportError on bad input."""
+    try:
+        metric = metric_filters.parse_filters(args)
+    except FilterError as e:
+        raise ExportError(str(e))
+    party = None
+    if args.get('party'):
+        try:
+            party = int(args['party'])
+        except ValueError:
+            raise ExportError("party must be an integer billed_party_id")
+    return ExportFilters(metric, party)
+
+
+def where_clause(filters, clause=('1', []), party_column=None):
+    """AND a MetricFilters (sql, params) clause with the party condition on party_column."""
+    party = ('1', [])
+    if party_column and filters.party is not None:
+        party = (f"{party_column} = ?", [filters.party])
+    return metric_filters.combine(clause, party)
+
+
+def stream_query(cursor, query, params=(), batch_size=EXPORT_BATCH_SIZE):
+    """Execute query and return (columns, iterator of row tuples fetched in batches)."""
+    cursor.execute(query, params)
+    columns = [description[0] for description in cursor.description]
+
+    def rows():
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                return
+            for row in batch:
+                yield tuple(row)
+
+    return columns, rows()
+
+
+def charges_rows(cursor, filters):
+    where, params = where_clause(filters, filters.metric.charges('c'), 'c.billed_party_id')
+    return stream_query(cursor, f"""
+        SELECT
+            c.charge_id,
+            c.billed_party_id,
+            st.service_name,
+            c.room_assignment_id,
+            c.event_id,
+            c.charge_date,
+            c.amount,
+            c.charge_status,
+            (SELECT mc.meal_type FROM MealCharges mc WHERE mc.charge_id = c.charge_id
+             ORDER BY mc.meal_charge_id LIMIT 1) AS meal_type,
+            c.description
+        FROM Charges c
+        LEFT JOIN ServiceTypes st ON c.service_type_id = st.service_type_id
+        WHERE {where}
+        ORDER BY c.charge_id
+    """, params)
+
+
+def reservations_rows(cursor, filters):
+    where, params = where_clause(filters, filters.metric.reservations('res'), 'res.billed_party_id')
+    return stream_query(cursor, f"""
+        SELECT
+            res.reservation_id,
+            res.reservation_date,
+            res.check_in_date,
+            res.check_out_date,
+            res.reservation_status,
+            res.guest_id,
+            res.host_id,
+            res.billed_party_id,
+            res.deposit_amount
+        FROM Reservations res
+        WHERE {where}
+        ORDER BY res.reservation_id
+    """, params)
+
+
+def events_rows(cursor, filters):
+    where, params = where_clause(filters, filters.metric.events('e'), 'e.billed_party_id')
+    return stream_query(cursor, f"""
+        SELECT
+            e.event_id,
+            e.event_name,
+            e.event_type,
+            e.host_id,
+            e.billed_party_id,
+            e.start_date,
+            e.end_date,
+            e.estimated_attendance,
+            e.estimated_guests_staying
+        FROM Events e
+        WHERE {where}
+        ORDER BY e.event_id
+    """, params)
+
+
+def quarterly_revenue_rows(cursor, filters):
+    where, params = where_clause(filters, filters.metric.charges('c'), 'c.billed_party_id')
+    return stream_query(cursor, metric_queries.quarterly_revenue_query(where), params)
+
+
+def customer_revenue_rows(cursor, filters):
+    where, params = where_clause(filters, filters.metric.charges('c'), 'c.billed_party_id')
+    return stream_query(cursor, customer_analytics.top_customers_query(where), params + [-1])
+
+
+def high_risk_customers_rows(cursor, filters):
+    # Without NumPy the dashboard ranks in SQL on the qualification weights, and so does the export.
+    parties = None if filters.party is None else [filters.party]
+    if risk_scoring.np is not None:
+        return list(risk_scoring.COLUMNS), iter(risk_scoring.ranked_rows(cursor, RISK_WEIGHTS, parties))
+    where, params = where_clause(filters, party_column='billed_party_id')
+    query = customer_analytics.high_risk_customers_query(risk_score=risk_scoring.risk_expression(RISK_WEIGHTS))
+    return stream_query(cursor, f"""
+        SELECT * FROM ({query})
+        WHERE {where}
+        ORDER BY risk_score DESC, billed_party_id
+    """, [-1] + params)
+
+
+def event_count_by_month_rows(cursor, filters):
+    where, params = where_clause(filters, filters.metric.events('e'), 'e.billed_party_id')
+    return stream_query(cursor, metric_queries.event_count_by_month_query(where), params)
+
+
+def fb_revenue_by_meal_rows(cursor, filters):
+    where, params = where_clause(filters, filters.metric.charges('c'), 'c.billed_party_id')
+    total_where, total_params = where_clause(filters, filters.metric.charges('c2'), 'c2.billed_party_id')
+    return stream_query(cursor, metric_queries.fb_revenue_by_meal_query(where, total_where), total_params + params)
+
+
+def occupancy_rows(granularity):
+    def rows(cursor, filters):
+        metric = filters.metric
+        rooms = metric.rooms_subquery() if metric.has_property else None
+        series = occupancy.compute_occupancy(cursor, metric.start, metric.end, granularities=(granularity,),
+                                             rooms=rooms)[granularity]
+        columns = [occupancy.LABEL_KEYS[granularity], 'total_stays', 'unique_rooms_occupied',
+                   'total_available_rooms', 'occupied_room_nights', 'available_room_nights', 'occupancy_rate']
+        return columns, (tuple(row[column] for column in columns) for row in series)
+    return rows
+
+
+EXPORTS = {export.name: export for export in [
+    Export('charges', charges_rows),
+    Export('reservations', reservations_rows),
+    Export('events', events_rows),
+    Export('quarterly_revenue', quarterly_revenue_rows),
+    Export('customer_revenue', customer_revenue_rows),
+    Export('high_risk_customers', high_risk_customers_rows, filters=('party',)),
+    Export('event_count_by_month', event_count_by_month_rows),
+    Export('fb_revenue_by_meal', fb_revenue_by_meal_rows),
+    Export('occupancy_daily', occupancy_rows('day'), filters=metric_filters.FILTER_ARGS),
+    Export('occupancy_weekly', occupancy_rows('week'), filters=metric_filters.FILTER_ARGS),
+    Export('occupancy_monthly', occupancy_rows('month'), filters=metric_filters.FILTER_ARGS),
+]}
+
+
+def check_filters(export, filters):
+    unsupported = sorted(set(filters.names()) - set(export.filters))
+    if unsupported:
+        raise ExportError(f"{export.name} does not support filtering by {', '.join(unsupported)}")
+
+
+def csv_chunks(columns, rows, batch_size=EXPORT_BATCH_SIZE):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= batch_size:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue().encode('utf-8')
+
+
+def ndjson_chunks(columns, rows, batch_size=EXPORT_BATCH_SIZE):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(columns, row)), default=str))
+        if len(lines) >= batch_size:
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+            lines = []
+    if lines:
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def ndjson_error(message):
+    """The last line of an NDJSON export that stopped early."""
+    return (json.dumps({'error': message, 'truncated': True}) + '\n').encode('utf-8')
+
+
+# format -> (mimetype, formatter, error record or None to abort the response instead)
+FORMATS = {
+    'csv': ('text/csv', csv_chunks, None),
+    'ndjson': ('application/x-ndjson', ndjson_chunks, ndjson_error),
+}
@@ -0,0 +1,76 @@
+"""Fragment and bytecode caching for the Jinja templates.
+
+A template block wrapped in
+
+    {% cache 'name', key, ... %} ... {% endcache %}
+
+is rendered once per distinct (name, key, ...) tuple and its markup reused
+afterwards. The dashboard keys each card and chart on the metric_versions
+of the stats it shows (fingerprints of the metric values and filters, see
+fingerprint()), so a page render only re-renders the fragments whose data
+changed and reassembles the rest from the cache.
+
+Fragments are stored in a MetricCache. Their keys already carry the data
+versions, so the cache needs no database probe; TTL and LRU size bound it.
+
+Compiled templates are written to a FileSystemBytecodeCache, and
+precompile() loads every template at startup, so a fresh worker reads
+bytecode from disk instead of parsing and compiling on its first request.
+"""
+from hashlib import blake2b
+import os
+
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+
+from metric_cache import MetricCache
+
+
+def fingerprint(*parts):
+    """Stable short hash of a metric value (and whatever else shaped it)."""
+    return blake2b(repr(parts).encode('utf-8'), digest_size=8).hexdigest()
+
+
+class FragmentCacheExtension(Extension):
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None, fragment_cache_ttl=3600)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            key.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_cached_fragment', [nodes.List(key)]), [], [], body).set_lineno(lineno)
+
+    def _cached_fragment(self, key, caller):
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return caller()
+        return cache.get_or_compute(key[0], tuple(key), self.environment.fragment_cache_ttl, caller)
+
+
+def create_fragment_cache(max_entries=512):
+    return MetricCache(lambda: 0, max_entries=max_entries)
+
+
+def configure(environment, fragment_cache=None, ttl=3600, bytecode_cache_dir=None):
+    """Install the {% cache %} tag and a filesystem bytecode cache on a Jinja environment.
+
+    bytecode_cache_dir=None uses Jinja's per-user directory under the system temp dir.
+    """
+    environment.add_extension(FragmentCacheExtension)
+    environment.fragment_cache = fragment_cache
+    environment.fragment_cache_ttl = ttl
+    if bytecode_cache_dir is not None:
+        os.makedirs(bytecode_cache_dir, exist_ok=True)
+    environment.bytecode_cache = FileSystemBytecodeCache(bytecode_cache_dir)
+
+
+def precompile(environment):
+    """Load every template so compiling (or reading bytecode) happens at startup."""
+    for name in environment.list_templates():
+        environment.get_template(name)
@@ -0,0 +1,255 @@
+"""Load a mysqldump file into a typed, indexed SQLite database.
+
+The dump is streamed one statement at a time (mysql_dump.iter_statements),
+so memory use does not grow with its size. Each CREATE TABLE becomes the
+SQLite table migrate_schema.py would create (INTEGER/REAL/TEXT affinity,
+enum CHECKs, primary and foreign keys), and the rows of every INSERT are
+bulk-loaded in transactions of --transaction-rows rows: an INSERT without
+backslash escapes is handed to SQLite as it stands (its VALUES syntax is
+then SQLite's), any other is parsed by mysql_dump.parse_values() and loaded
+with executemany.
+
+While loading, synchronous is OFF, foreign keys are not enforced and the
+secondary indexes (UNIQUE and plain KEYs from the dump, plus
+migrate_schema.DASHBOARD_INDEXES) do not exist yet: they are built once all
+rows are in, which is much cheaper than maintaining them row by row. The
+unique indexes then reject any duplicate the dump carried (so INSERT IGNORE
+and REPLACE statements resolve conflicts on the primary key only). Finally
+the tables are ANALYZEd and the foreign keys checked.
+
+Every transaction also records the dump offset it reached in the
+_import_progress table. If an import is interrupted, --resume reopens the
+output and continues from the last committed offset; the dump must not have
+changed in between. With synchronous OFF this survives the importer being
+killed, not the machine losing power.
+
+Usage:
+    python import_dump.py                                   # writes last_resort_hotels.imported.db
+    python import_dump.py --dump prod.sql --output prod.db  # a fresh import
+    python import_dump.py --dump prod.sql --output prod.db --resume
+    python import_dump.py --in-place                        # replaces DB_PATH, keeping a .bak copy
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import time
+
+from migrate_schema import DASHBOARD_INDEXES, DEFAULT_DUMP
+from mysql_dump import Insert, create_index_sql, create_table_sql, create_unique_index_sql, iter_statements, quote
+
+PROGRESS_TABLE = '_import_progress'
+LOAD_PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'OFF'),
+    ('foreign_keys', 'OFF'),
+    ('cache_size', -262144),
+    ('temp_store', 'MEMORY'),
+    ('threads', 4),  # helper threads for the sorts behind the deferred CREATE INDEXes
+)
+TRANSACTION_ROWS = 500000
+BATCH_ROWS = 20000
+PROGRESS_SECONDS = 2.0
+
+
+def dump_fingerprint(dump_path):
+    stat = os.stat(dump_path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class Importer:
+    """Stream one dump into one SQLite file; run() returns {table: rows loaded}."""
+
+    def __init__(self, dump_path, output_path, transaction_rows=TRANSACTION_ROWS, batch_rows=BATCH_ROWS,
+                 report=None):
+        self.dump_path = dump_path
+        self.output_path = output_path
+        self.transaction_rows = transaction_rows
+        self.batch_rows = batch_rows
+        self.report = report  # called with the importer every PROGRESS_SECONDS
+        self.tables = {}
+        self.counts = {}
+        self.offset = 0
+        self.size = os.path.getsize(dump_path)
+        self.rows = 0           # rows loaded by this run
+        self.current = None     # table being loaded
+        self.started = None
+        self.violations = []
+        self._statements = {}
+
+    def open(self, resume):
+        """Connect to the output; on resume, restore the offset and counts of the last committed transaction."""
+        if not resume and os.path.exists(self.output_path):
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(self.output_path + suffix):
+                    os.remove(self.output_path + suffix)
+        connection = sqlite3.connect(self.output_path, isolation_level=None)
+        for name, value in LOAD_PRAGMAS:
+            connection.execute(f"PRAGMA {name} = {value}")
+        connection.execute(f"CREATE TABLE IF NOT EXISTS {PROGRESS_TABLE} "
+                           "(key TEXT PRIMARY KEY, dump TEXT, byte_offset INTEGER, rows INTEGER)")
+        state = dict((key, (dump, byte_offset, rows)) for key, dump, byte_offset, rows
+                     in connection.execute(f"SELECT key, dump, byte_offset, rows FROM {PROGRESS_TABLE}"))
+        if resume and state:
+            dump, self.offset, _ = state.pop('')
+            if dump != dump_fingerprint(self.dump_path):
+                connection.close()
+                raise ValueError(f"{self.dump_path} changed since {self.output_path} was started; import it afresh")
+            self.counts = {table: rows for table, (_, _, rows) in state.items()}
+        elif state:
+            connection.close()
+            raise ValueError(f"{self.output_path} holds an unfinished import; pass --resume or remove it")
+        return connection
+
+    def run(self, resume=False):
+        connection = self.open(resume)
+        self.started = time.perf_counter()
+        last_report = self.started
+        try:
+            with open(self.dump_path, 'rb') as dump:
+                # The CREATE TABLEs before the resume point were committed already; read them back from the dump.
+                if self.offset:
+                    for statement, end in iter_statements(dump):
+                        if end > self.offset:
+                            break
+                        if not isinstance(statement, Insert):
+                            self.tables[statement.name] = statement
+                pending = 0
+                connection.execute("BEGIN")
+                for statement, end in iter_statements(dump, self.offset):
+                    if isinstance(statement, Insert):
+                        pending += self.load(connection, statement)
+                    else:
+                        self.create(connection, statement)
+                    self.offset = end
+                    if pending >= self.transaction_rows:
+                        self.commit(connection)
+                        connection.execute("BEGIN")
+                        pending = 0
+                    now = time.perf_counter()
+                    if self.report and now - last_report >= PROGRESS_SECONDS:
+                        self.report(self)
+                        last_report = now
+                self.offset = self.size
+                self.commit(connection)
+            self.current = 'indexes'
+            if self.report:
+                self.report(self)
+            self.finish(connection)
+        finally:
+            connection.close()
+        return self.counts
+
+    def create(self, connection, table):
+        self.tables[table.name] = table
+        connection.execute(f"DROP TABLE IF EXISTS {quote(table.name)}")
+        connection.execute(create_table_sql(table, with_unique_keys=False))
+        self.counts[table.name] = 0
+
+    def load(self, connection, statement):
+        table = self.tables.get(statement.table)
+        if table is None:
+            raise ValueError(f"INSERT INTO {statement.table} before its CREATE TABLE")
+        key = (statement.table, statement.columns, statement.verb)
+        if key not in self._statements:
+            columns = statement.columns or tuple(column.name for column in table.columns)
+            self._statements[key] = (f"INSERT{statement.conflict_clause} INTO {quote(table.name)} "
+                                     f"({', '.join(quote(c) for c in columns)}) VALUES ", len(columns))
+        prefix, width = self._statements[key]
+        self.current = table.name
+        values = statement.values
+        if '\\' not in values:
+            # Without backslash escapes a mysqldump VALUES list is valid SQLite, and SQLite parses it much faster than
+            # Python can; anything else it rejects (b'..' literals, say) goes through parse_values().
+            try:
+                loaded = connection.execute(prefix + values).rowcount
+            except sqlite3.OperationalError:
+                pass
+            else:
+                self.counts[table.name] += loaded
+                self.rows += loaded
+                return loaded
+        sql = prefix + '(' + ', '.join('?' for _ in range(width)) + ')'
+        loaded = 0
+        batch = []
+        for row in statement.rows():
+            batch.append(row)
+            if len(batch) >= self.batch_rows:
+                connection.executemany(sql, batch)
+                loaded += len(batch)
+                batch = []
+        if batch:
+            connection.executemany(sql, batch)
+            loaded += len(batch)
+        self.counts[table.name] += loaded
+        self.rows += loaded
+        return loaded
+
+    def commit(self, connection):
+        fingerprint = dump_fingerprint(self.dump_path)
+        connection.executemany(f"INSERT OR REPLACE INTO {PROGRESS_TABLE} VALUES (?, ?, ?, ?)",
+                               [('', fingerprint, self.offset, None)]
+                               + [(table, fingerprint, None, rows) for table, rows in self.counts.items()])
+        connection.execute("COMMIT")
+
+    def finish(self, connection):
+        """Build the deferred indexes, ANALYZE, and leave a single-file database without the progress table."""
+        connection.execute("BEGIN")
+        for table in self.tables.values():
+            for statement in create_unique_index_sql(table) + create_index_sql(table):
+                connection.execute(statement)
+        for name, table, columns in DASHBOARD_INDEXES:
+            if table in self.tables:
+                connection.execute(f"CREATE INDEX IF NOT EXISTS {quote(name)} ON {quote(table)} "
+                                   f"({', '.join(quote(c) for c in columns)})")
+        connection.execute(f"DROP TABLE {PROGRESS_TABLE}")
+        connection.execute("COMMIT")
+        connection.execute("ANALYZE")
+        self.violations = connection.execute("PRAGMA foreign_key_check").fetchall()
+        connection.execute("PRAGMA journal_mode = DELETE")
+
+
+def rows_per_minute(importer):
+    elapsed = time.perf_counter() - importer.started
+    return importer.rows / elapsed * 60 if elapsed else 0
+
+
+def print_progress(importer):
+    print(f"{100.0 * importer.offset / importer.size:5.1f}%  {importer.rows:>12,} rows  "
+          f"{rows_per_minute(importer):>12,.0f} rows/min  {importer.current or ''}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--dump', default=DEFAULT_DUMP, help='mysqldump file to load')
+    parser.add_argument('--output', default=None, help='database to write (default: DB_PATH with .imported.db)')
+    parser.add_argument('--resume', action='store_true', help='continue an interrupted import into --output')
+    parser.add_argument('--in-place', action='store_true', help='replace DB_PATH with the import, keeping a .bak copy')
+    parser.add_argument('--transaction-rows', type=int, default=TRANSACTION_ROWS, help='rows per committed transaction')
+    parser.add_argument('--quiet', action='store_true', help='no progress lines, only the summary')
+    args = parser.parse_args(argv)
+
+    db_path = os.getenv('DB_PATH', 'last_resort_hotels.db')
+    output_path = args.output or os.path.splitext(db_path)[0] + '.imported.db'
+    importer = Importer(args.dump, output_path, args.transaction_rows, report=None if args.quiet else print_progress)
+    try:
+        counts = importer.run(resume=args.resume)
+    except ValueError as e:
+        parser.error(str(e))
+    for table, count in sorted(counts.items()):
+        print(f"{table:>24}: {count:,}")
+    print(f"Loaded {importer.rows:,} rows in {time.perf_counter() - importer.started:.1f} s "
+          f"({rows_per_minute(importer):,.0f} rows/min); {len(importer.violations)} foreign key violation(s)")
+
+    if args.in_place:
+        shutil.copy2(db_path, db_path + '.bak')
+        os.replace(output_path, db_path)
+        print(f"Replaced {db_path} (backup at {db_path}.bak)")
+    else:
+        print(f"Imported database written to {output_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""TTL + LRU result cache for metric functions, invalidated on database writes.
+
+Every entry records the database version it was computed against. The version
+comes from PRAGMA data_version on a dedicated probe connection: SQLite bumps it
+whenever any other connection (in this or another process) commits, so a
+cached result is never served after a write even if its TTL has not expired.
+Any callable returning such a value will do; the app uses
+change_counters.ChangeProbe, which only moves when a table metrics read is
+written.
+"""
+from collections import OrderedDict
+from functools import wraps
+import sqlite3
+import threading
+import time
+
+
+class DataVersionProbe:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            try:
+                if self._connection is None:
+                    self._connection = sqlite3.connect(self.db_path, check_same_thread=False)
+                return self._connection.execute("PRAGMA data_version").fetchone()[0]
+            except sqlite3.Error:
+                self._connection = None
+                return None
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+class MetricCache:
+    def __init__(self, version_probe, max_entries=256, default_ttl=60):
+        self.version_probe = version_probe
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.enabled = True
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def _count(self, name, event):
+        counters = self._counters.setdefault(name, {'hits': 0, 'misses': 0, 'stale': 0, 'evictions': 0})
+        counters[event] += 1
+
+    def get_or_compute(self, name, key, ttl, compute):
+        if not self.enabled:
+            return compute()
+
+        version = self.version_probe()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, entry_version, expires_at = entry
+                if version is not None and entry_version == version and now < expires_at:
+                    self._entries.move_to_end(key)
+                    self._count(name, 'hits')
+                    return value
+                del self._entries[key]
+                self._count(name, 'stale')
+            self._count(name, 'misses')
+
+        value = compute()
+
+        if version is not None:
+            with self._lock:
+                self._entries[key] = (value, version, now + ttl)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    evicted_key, _ = self._entries.popitem(last=False)
+                    self._count(evicted_key[0], 'evictions')
+        return value
+
+    def cached(self, ttl=None):
+        """Decorate a metric function so its results are cached per argument tuple."""
+        def decorator(func):
+            name = func.__name__
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                key = (name, args, tuple(sorted(kwargs.items())))
+                return self.get_or_compute(name, key, ttl if ttl is not None else self.default_ttl,
+                                           lambda: func(*args, **kwargs))
+
+            wrapper.uncached = func
+            wrapper.ttl = ttl if ttl is not None else self.default_ttl
+            return wrapper
+        return decorator
+
+    def invalidate(self, name=None):
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key[0] == name]:
+                    del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            metrics = {}
+            for name, counters in self._counters.items():
+                lookups = counters['hits'] + counters['misses']
+                metrics[name] = dict(counters, hit_rate=counters['hits'] / lookups if lookups else 0.0)
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'metrics': metrics
+            }
@@ -0,0 +1,159 @@
+"""Date-range and property filters shared by every metric.
+
+MetricFilters is a frozen (hashable) value, so it can be passed straight to
+the cached get_* functions and becomes part of the cache key. Its helpers
+return (sql, params) pairs that the queries splice into their WHERE
+clauses:
+
+- dates are half-open ranges, column >= start AND column < end, compared
+  against the raw column so an index on it can be used (never
+  strftime(column) in the predicate);
+- building_id / wing_id resolve to the set of rooms in that part of the
+  property (Rooms -> Floors -> Wings), and facts are tied to rooms through
+  RoomAssignments (stays, room charges), EventRooms (events, event
+  charges) and BillCharges (bills).
+
+A predicate that does not apply comes back as ('1', []).
+"""
+from dataclasses import dataclass
+from datetime import date
+
+FILTER_ARGS = ('start', 'end', 'building_id', 'wing_id')
+
+
+class FilterError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class MetricFilters:
+    start: date = None
+    end: date = None
+    building_id: int = None
+    wing_id: int = None
+
+    def __bool__(self):
+        return any(value is not None for value in (self.start, self.end, self.building_id, self.wing_id))
+
+    @property
+    def has_property(self):
+        return self.building_id is not None or self.wing_id is not None
+
+    def query_args(self):
+        """The filters as URL query arguments, e.g. for url_for()."""
+        args = {}
+        for key in FILTER_ARGS:
+            value = getattr(self, key)
+            if value is not None:
+                args[key] = value.isoformat() if isinstance(value, date) else value
+        return args
+
+    def date_range(self, column):
+        conditions, params = [], []
+        if self.start is not None:
+            conditions.append(f"{column} >= ?")
+            params.append(self.start.isoformat())
+        if self.end is not None:
+            conditions.append(f"{column} < ?")
+            params.append(self.end.isoformat())
+        return ' AND '.join(conditions) or '1', params
+
+    def rooms_subquery(self):
+        conditions, params = [], []
+        if self.building_id is not None:
+            conditions.append("w.building_id = ?")
+            params.append(self.building_id)
+        if self.wing_id is not None:
+            conditions.append("w.wing_id = ?")
+            params.append(self.wing_id)
+        return (f"SELECT r.room_id FROM Rooms r "
+                f"JOIN Floors f ON r.floor_id = f.floor_id "
+                f"JOIN Wings w ON f.wing_id = w.wing_id "
+                f"WHERE {' AND '.join(conditions)}"), params
+
+    def room_condition(self, column):
+        if not self.has_property:
+            return '1', []
+        rooms, params = self.rooms_subquery()
+        return f"{column} IN ({rooms})", params
+
+    def reservation_property(self, column):
+        if not self.has_property:
+            return '1', []
+        rooms, params = self.rooms_subquery()
+        return f"{column} IN (SELECT reservation_id FROM RoomAssignments WHERE room_id IN ({rooms}))", params
+
+    def event_property(self, column):
+        if not self.has_property:
+            return '1', []
+        rooms, params = self.rooms_subquery()
+        return f"{column} IN (SELECT event_id FROM EventRooms WHERE room_id IN ({rooms}))", params
+
+    def charge_property(self, alias):
+        """Charges for stays in, or events held in, the selected rooms."""
+        if not self.has_property:
+            return '1', []
+        rooms, params = self.rooms_subquery()
+        return (f"({alias}.room_assignment_id IN (SELECT assignment_id FROM RoomAssignments WHERE room_id IN ({rooms})) "
+                f"OR {alias}.event_id IN (SELECT event_id FROM EventRooms WHERE room_id IN ({rooms})))"), params + params
+
+    def charges(self, alias):
+        return combine(self.date_range(f"{alias}.charge_date"), self.charge_property(alias))
+
+    def reservations(self, alias):
+        return combine(self.date_range(f"{alias}.check_in_date"), self.reservation_property(f"{alias}.reservation_id"))
+
+    def events(self, alias):
+        return combine(self.date_range(f"{alias}.start_date"), self.event_property(f"{alias}.event_id"))
+
+    def bills(self, alias):
+        date_sql, date_params = self.date_range(f"{alias}.bill_date")
+        if not self.has_property:
+            return date_sql, date_params
+        charge_sql, charge_params = self.charge_property('c')
+        return combine(
+            (date_sql, date_params),
+            (f"{alias}.bill_id IN (SELECT bc.bill_id FROM BillCharges bc "
+             f"JOIN Charges c ON bc.charge_id = c.charge_id WHERE {charge_sql})", charge_params)
+        )
+
+
+NO_FILTERS = MetricFilters()
+
+
+def combine(*clauses):
+    """AND together (sql, params) pairs, dropping the no-op ones."""
+    parts = [sql for sql, _ in clauses if sql != '1']
+    params = [param for _, clause_params in clauses for param in clause_params]
+    return ' AND '.join(parts) or '1', params
+
+
+def parse_date(args, key):
+    if not args.get(key):
+        return None
+    try:
+        return date.fromisoformat(args[key])
+    except ValueError:
+        raise FilterError(f"{key} must be an ISO date (YYYY-MM-DD)")
+
+
+def parse_id(args, key):
+    if not args.get(key):
+        return None
+    try:
+        return int(args[key])
+    except ValueError:
+        raise FilterError(f"{key} must be an integer")
+
+
+def parse_filters(args):
+    """Build MetricFilters from request arguments; raises FilterError on bad input."""
+    filters = MetricFilters(
+        start=parse_date(args, 'start'),
+        end=parse_date(args, 'end'),
+        building_id=parse_id(args, 'building_id'),
+        wing_id=parse_id(args, 'wing_id')
+    )
+    if filters.start and filters.end and filters.end <= filters.start:
+        raise FilterError("end must be after start")
+    return filters
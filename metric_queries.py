@@ -0,0 +1,72 @@
+"""SQL for the dashboard metrics that the exports stream as well.
+
+The dashboard's fetch_* helpers and the /export tables build their
+statements from these templates, so an export is the same aggregation as
+the card it backs, with the caller's conditions spliced in.
+"""
+
+# Paid revenue per calendar quarter, grouped with strftime() on charge_date.
+QUARTERLY_REVENUE_QUERY = """
+    SELECT
+        CAST(strftime('%Y', c.charge_date) AS INTEGER) AS revenue_year,
+        CAST((CAST(strftime('%m', c.charge_date) AS INTEGER) - 1) / 3 + 1 AS INTEGER) AS revenue_quarter,
+        SUM(c.amount) AS total_revenue
+    FROM Charges c
+    WHERE c.charge_status = 'paid' AND {charge_filter}
+    GROUP BY
+        strftime('%Y', c.charge_date),
+        revenue_quarter
+    ORDER BY
+        revenue_year,
+        revenue_quarter
+"""
+
+EVENT_COUNT_BY_MONTH_QUERY = """
+    SELECT
+        strftime('%Y-%m', e.start_date) AS month,
+        COUNT(DISTINCT e.event_id) AS total_events,
+        SUM(e.estimated_attendance) AS total_estimated_attendance,
+        AVG(e.estimated_attendance) AS avg_attendance_per_event,
+        COUNT(DISTINCT e.host_id) AS unique_hosts
+    FROM Events e
+    WHERE e.start_date IS NOT NULL AND {event_filter}
+    GROUP BY strftime('%Y-%m', e.start_date)
+    ORDER BY month
+"""
+
+FB_REVENUE_BY_MEAL_QUERY = """
+    SELECT
+        mc.meal_type,
+        COUNT(mc.meal_charge_id) AS total_charges,
+        SUM(c.amount) AS total_revenue,
+        AVG(c.amount) AS avg_charge_amount,
+        COUNT(DISTINCT c.billed_party_id) AS unique_customers,
+        SUM(c.amount) * 100.0 / (
+            SELECT SUM(amount)
+            FROM Charges c2
+            JOIN MealCharges mc2 ON c2.charge_id = mc2.charge_id
+            WHERE c2.charge_status IN ('billed', 'paid') AND {total_filter}
+        ) AS percentage_of_total_fb
+    FROM MealCharges mc
+    JOIN Charges c ON mc.charge_id = c.charge_id
+    WHERE c.charge_status IN ('billed', 'paid') AND {charge_filter}
+    GROUP BY mc.meal_type
+    ORDER BY total_revenue DESC
+"""
+
+
+def quarterly_revenue_query(charge_filter='1'):
+    """QUARTERLY_REVENUE_QUERY with an extra condition on Charges (alias c)."""
+    return QUARTERLY_REVENUE_QUERY.format(charge_filter=charge_filter)
+
+
+def event_count_by_month_query(event_filter='1'):
+    """EVENT_COUNT_BY_MONTH_QUERY with an extra condition on Events (alias e)."""
+    return EVENT_COUNT_BY_MONTH_QUERY.format(event_filter=event_filter)
+
+
+def fb_revenue_by_meal_query(charge_filter='1', total_filter='1'):
+    """FB_REVENUE_BY_MEAL_QUERY with conditions on the grouped Charges (alias c) and
+    on the Charges summed for the F&B total (alias c2); parameters go total
+    first, then the grouped scan."""
+    return FB_REVENUE_BY_MEAL_QUERY.format(charge_filter=charge_filter, total_filter=total_filter)
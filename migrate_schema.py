@@ -0,0 +1,213 @@
+"""Rebuild last_resort_hotels.db with the keys and types from the MySQL dump.
+
+The bundled database came from a pandas-style export: no primary keys, no
+indexes, and several join keys typed TEXT. This tool recreates every table
+from the CREATE TABLE statements in the dump, copies the rows across with
+their values cast to the proper affinity, adds the covering indexes the
+dashboard queries need, verifies the row counts and writes an EXPLAIN QUERY
+PLAN report for the dashboard queries before and after.
+
+Usage:
+    python migrate_schema.py                      # writes last_resort_hotels.migrated.db
+    python migrate_schema.py --in-place           # replaces the database, keeping a .bak copy
+    python migrate_schema.py --report plan.md     # also writes the report to a file
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+
+from mysql_dump import create_index_sql, create_table_sql, quote, read_tables
+
+DEFAULT_DUMP = 'Dump20251210 (1).sql'
+
+# Covering indexes for the dashboard queries in app.py.
+DASHBOARD_INDEXES = [
+    ('idx_charges_party_status_amount', 'charges', ('billed_party_id', 'charge_status', 'amount')),
+    ('idx_charges_status_date_party_amount', 'charges', ('charge_status', 'charge_date', 'billed_party_id', 'amount')),
+    ('idx_charges_date_status_party_amount', 'charges', ('charge_date', 'charge_status', 'billed_party_id', 'amount')),
+    ('idx_mealcharges_charge_meal', 'mealcharges', ('charge_id', 'meal_type')),
+    ('idx_roomassignments_checkin_room', 'roomassignments', ('check_in_time', 'room_id')),
+    ('idx_roomassignments_checkout_checkin_room', 'roomassignments', ('check_out_time', 'check_in_time', 'room_id')),
+    ('idx_reservations_party_checkin', 'reservations', ('billed_party_id', 'check_in_date')),
+    ('idx_reservations_status_party', 'reservations', ('reservation_status', 'billed_party_id')),
+    ('idx_reservations_checkin_party', 'reservations', ('check_in_date', 'billed_party_id')),
+    ('idx_bills_party_status_amount', 'bills', ('billed_party_id', 'bill_status', 'total_amount')),
+    ('idx_bills_date_status', 'bills', ('bill_date', 'bill_status')),
+    ('idx_events_start_date', 'events', ('start_date', 'host_id', 'estimated_attendance')),
+    ('idx_eventrooms_event_attendance', 'eventrooms', ('event_id', 'actual_attendance')),
+    ('idx_rooms_status', 'rooms', ('room_status',)),
+]
+
+# app.py fetch_* helpers whose SQL is captured for the query plan report.
+DASHBOARD_QUERY_FUNCTIONS = [
+    'fetch_total_revenue',
+    'fetch_quarterly_revenue',
+    'fetch_occupancy_rate_daily',
+    'fetch_occupancy_rate_monthly',
+    'fetch_top_customers',
+    'fetch_high_risk_customers',
+    'fetch_event_count_by_month',
+    'fetch_average_attendance',
+    'fetch_avg_fb_spend_per_guest',
+    'fetch_fb_revenue_by_meal_type',
+    'fetch_unique_customers_count',
+    'fetch_charge_metrics',
+    'fetch_occupancy_metrics',
+]
+
+
+def capture_dashboard_queries(db_path):
+    """Run the dashboard fetch_* helpers once and record every statement they issue."""
+    import app
+
+    statements = []
+    connection = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    connection.row_factory = sqlite3.Row
+    connection.set_trace_callback(statements.append)
+    try:
+        for name in DASHBOARD_QUERY_FUNCTIONS:
+            cursor = connection.cursor()
+            before = len(statements)
+            getattr(app, name)(cursor)
+            cursor.close()
+            for sql in statements[before:]:
+                yield name, sql
+    finally:
+        connection.close()
+
+
+def explain(connection, sql):
+    rows = connection.execute('EXPLAIN QUERY PLAN ' + sql).fetchall()
+    depth = {0: 0}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, 0) + 1
+        lines.append('  ' * (depth[node_id] - 1) + detail)
+    return lines
+
+
+def source_columns(connection, table):
+    return [row[1] for row in connection.execute(f"PRAGMA src.table_info({quote(table)})")]
+
+
+def copy_table(connection, table):
+    available = set(source_columns(connection, table.name))
+    if not available:
+        return 0
+    columns = [column for column in table.columns if column.name in available]
+    select = []
+    for column in columns:
+        name = quote(column.name)
+        if column.affinity == 'TEXT':
+            select.append(name)
+        else:
+            select.append(f"CASE WHEN {name} IS NULL OR {name} = '' THEN NULL ELSE CAST({name} AS {column.affinity}) END")
+    connection.execute(
+        f"INSERT INTO main.{quote(table.name)} ({', '.join(quote(c.name) for c in columns)}) "
+        f"SELECT {', '.join(select)} FROM src.{quote(table.name)}"
+    )
+    return len(columns)
+
+
+def migrate(dump_path, source_path, output_path):
+    tables = read_tables(dump_path)
+    if os.path.exists(output_path):
+        os.remove(output_path)
+
+    connection = sqlite3.connect(output_path, uri=True)
+    try:
+        connection.execute("PRAGMA foreign_keys = OFF")
+        connection.execute("ATTACH DATABASE ? AS src", (f"file:{source_path}?mode=ro",))
+        with connection:
+            for table in tables.values():
+                connection.execute(create_table_sql(table))
+            for table in tables.values():
+                copy_table(connection, table)
+            for table in tables.values():
+                for statement in create_index_sql(table):
+                    connection.execute(statement)
+            for name, table, columns in DASHBOARD_INDEXES:
+                connection.execute(
+                    f"CREATE INDEX IF NOT EXISTS {quote(name)} ON {quote(table)} "
+                    f"({', '.join(quote(c) for c in columns)})"
+                )
+        connection.execute("ANALYZE main")
+
+        counts = []
+        for table in tables:
+            migrated = connection.execute(f"SELECT COUNT(*) FROM main.{quote(table)}").fetchone()[0]
+            try:
+                original = connection.execute(f"SELECT COUNT(*) FROM src.{quote(table)}").fetchone()[0]
+            except sqlite3.OperationalError:
+                original = None
+            counts.append((table, original, migrated))
+        violations = connection.execute("PRAGMA main.foreign_key_check").fetchall()
+        connection.execute("DETACH DATABASE src")
+    finally:
+        connection.close()
+    return counts, violations
+
+
+def build_report(counts, violations, source_path, output_path):
+    lines = ['# Schema migration report', '', '## Row counts', '',
+             '| Table | Before | After | Status |', '|---|---|---|---|']
+    for table, original, migrated in counts:
+        status = 'OK' if original in (None, migrated) else 'MISMATCH'
+        lines.append(f"| {table} | {original if original is not None else '-'} | {migrated} | {status} |")
+
+    lines += ['', f"Foreign key violations: {len(violations)}"]
+    for table, rowid, parent, _ in violations[:20]:
+        lines.append(f"- {table} row {rowid} -> missing {parent}")
+
+    lines += ['', '## Query plans']
+    before = sqlite3.connect(f"file:{source_path}?mode=ro", uri=True)
+    after = sqlite3.connect(f"file:{output_path}?mode=ro", uri=True)
+    try:
+        for name, sql in capture_dashboard_queries(source_path):
+            lines += ['', f"### {name}", '', '```sql', ' '.join(sql.split()), '```', '', 'Before:', '```']
+            lines += explain(before, sql)
+            lines += ['```', 'After:', '```']
+            lines += explain(after, sql)
+            lines.append('```')
+    finally:
+        before.close()
+        after.close()
+    return '\n'.join(lines) + '\n'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--dump', default=DEFAULT_DUMP, help='mysqldump file with the reference schema')
+    parser.add_argument('--source', default=None, help='SQLite database to migrate (default: DB_PATH)')
+    parser.add_argument('--output', default=None, help='where to write the migrated database')
+    parser.add_argument('--in-place', action='store_true', help='replace the source database, keeping a .bak copy')
+    parser.add_argument('--report', default=None, help='also write the report to this file')
+    args = parser.parse_args(argv)
+
+    source_path = args.source or os.getenv('DB_PATH', 'last_resort_hotels.db')
+    output_path = args.output or os.path.splitext(source_path)[0] + '.migrated.db'
+
+    counts, violations = migrate(args.dump, source_path, output_path)
+    report = build_report(counts, violations, source_path, output_path)
+    print(report)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as handle:
+            handle.write(report)
+
+    if any(original not in (None, migrated) for _, original, migrated in counts):
+        print("Row counts do not match; leaving the source database untouched.", file=sys.stderr)
+        return 1
+
+    if args.in_place:
+        shutil.copy2(source_path, source_path + '.bak')
+        os.replace(output_path, source_path)
+        print(f"Replaced {source_path} (backup at {source_path}.bak)")
+    else:
+        print(f"Migrated database written to {output_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
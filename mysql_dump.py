@@ -0,0 +1,290 @@
+"""Read table definitions and rows out of a mysqldump file and translate them to SQLite.
+
+The dump is read line by line, so only one statement (a CREATE TABLE block
+or one extended INSERT) is held in memory at a time. MySQL column types are
+mapped to the SQLite affinity that matches the data (int -> INTEGER,
+decimal -> REAL, everything else -> TEXT), enums become TEXT with a CHECK
+constraint, and PRIMARY/UNIQUE/KEY/FOREIGN KEY clauses are carried over.
+INSERT statements are parsed into rows with MySQL string escapes decoded.
+"""
+from dataclasses import dataclass, field
+import re
+
+COLUMN_RE = re.compile(r"^`(?P<name>\w+)` (?P<type>\w+)(?:\((?P<args>(?:'[^']*'|[^)])*)\))?(?P<rest>.*)$")
+KEY_COLUMNS_RE = re.compile(r"`(\w+)`")
+PRIMARY_KEY_RE = re.compile(r"^PRIMARY KEY \((?P<columns>[^)]*)\)")
+UNIQUE_KEY_RE = re.compile(r"^UNIQUE KEY `(?P<name>\w+)` \((?P<columns>[^)]*)\)")
+KEY_RE = re.compile(r"^KEY `(?P<name>\w+)` \((?P<columns>[^)]*)\)")
+FOREIGN_KEY_RE = re.compile(
+    r"^CONSTRAINT `\w+` FOREIGN KEY \((?P<columns>[^)]*)\) REFERENCES `(?P<table>\w+)` \((?P<ref_columns>[^)]*)\)"
+    r"(?: ON DELETE (?P<on_delete>CASCADE|SET NULL|RESTRICT|NO ACTION))?"
+)
+DEFAULT_RE = re.compile(r"DEFAULT ('(?:[^']|'')*'|\S+)")
+INSERT_RE = re.compile(r"(?P<verb>INSERT(?: IGNORE)?|REPLACE) INTO `(?P<table>\w+)`(?: \((?P<columns>[^)]*)\))? VALUES ")
+# One item of a VALUES list: a quoted string, a bare token (a number or NULL), or the ')' that closes a row.
+VALUE_RE = re.compile(r"'([^'\\]*(?:(?:\\.|'')[^'\\]*)*)'|([^,()'\s;]+)|(\))", re.S)
+ESCAPE_RE = re.compile(r"\\(.)|''", re.S)
+ESCAPES = {'0': '\0', 'b': '\b', 'n': '\n', 'r': '\r', 't': '\t', 'Z': '\x1a', '%': '\\%', '_': '\\_'}
+CONFLICT_CLAUSES = {'INSERT': '', 'INSERT IGNORE': ' OR IGNORE', 'REPLACE': ' OR REPLACE'}
+
+INTEGER_TYPES = {'int', 'integer', 'tinyint', 'smallint', 'mediumint', 'bigint', 'bit', 'year'}
+REAL_TYPES = {'decimal', 'numeric', 'float', 'double', 'real'}
+
+
+@dataclass
+class Column:
+    name: str
+    mysql_type: str
+    not_null: bool = False
+    default: str = None
+    auto_increment: bool = False
+    enum_values: tuple = ()
+
+    @property
+    def affinity(self):
+        if self.mysql_type in INTEGER_TYPES:
+            return 'INTEGER'
+        if self.mysql_type in REAL_TYPES:
+            return 'REAL'
+        return 'TEXT'
+
+
+@dataclass
+class Table:
+    name: str
+    columns: list = field(default_factory=list)
+    primary_key: tuple = ()
+    unique_keys: list = field(default_factory=list)
+    keys: list = field(default_factory=list)
+    foreign_keys: list = field(default_factory=list)
+
+    def column(self, name):
+        for column in self.columns:
+            if column.name == name:
+                return column
+        return None
+
+
+@dataclass
+class Insert:
+    """One INSERT statement; rows() parses its VALUES list on demand."""
+    table: str
+    columns: tuple
+    verb: str
+    text: str
+    values_start: int
+
+    @property
+    def conflict_clause(self):
+        return CONFLICT_CLAUSES[self.verb]
+
+    @property
+    def values(self):
+        """The VALUES list as written, without the closing ';'."""
+        return self.text[self.values_start:].rstrip().removesuffix(';')
+
+    def rows(self):
+        return parse_values(self.text, self.values_start)
+
+
+def split_columns(columns):
+    return tuple(KEY_COLUMNS_RE.findall(columns))
+
+
+def parse_enum_values(args):
+    return tuple(value.replace("''", "'") for value in re.findall(r"'((?:[^']|'')*)'", args or ''))
+
+
+def parse_create_table(lines):
+    """Parse the lines of one CREATE TABLE statement into a Table."""
+    table = Table(KEY_COLUMNS_RE.search(lines[0]).group(1))
+    for line in lines[1:-1]:
+        line = line.strip().rstrip(',')
+        match = PRIMARY_KEY_RE.match(line)
+        if match:
+            table.primary_key = split_columns(match.group('columns'))
+            continue
+        match = UNIQUE_KEY_RE.match(line)
+        if match:
+            table.unique_keys.append((match.group('name'), split_columns(match.group('columns'))))
+            continue
+        match = KEY_RE.match(line)
+        if match:
+            table.keys.append((match.group('name'), split_columns(match.group('columns'))))
+            continue
+        match = FOREIGN_KEY_RE.match(line)
+        if match:
+            table.foreign_keys.append((
+                split_columns(match.group('columns')),
+                match.group('table'),
+                split_columns(match.group('ref_columns')),
+                match.group('on_delete')
+            ))
+            continue
+        match = COLUMN_RE.match(line)
+        if match:
+            rest = match.group('rest')
+            default = DEFAULT_RE.search(rest)
+            mysql_type = match.group('type').lower()
+            table.columns.append(Column(
+                name=match.group('name'),
+                mysql_type=mysql_type,
+                not_null='NOT NULL' in rest,
+                default=default.group(1) if default and default.group(1) != 'NULL' else None,
+                auto_increment='AUTO_INCREMENT' in rest,
+                enum_values=parse_enum_values(match.group('args')) if mysql_type in ('enum', 'set') else ()
+            ))
+    return table
+
+
+def unescape(text):
+    return ESCAPE_RE.sub(lambda match: "'" if match.group(1) is None else ESCAPES.get(match.group(1), match.group(1)),
+                         text)
+
+
+def parse_values(text, start=0):
+    """Yield each row of the VALUES list in text[start:] as a list.
+
+    Quoted values come back as str with their escapes decoded, NULL as None
+    and other bare tokens (numbers) as str; the column affinity of the
+    SQLite table they are inserted into turns those into numbers.
+    """
+    row = []
+    for quoted, bare, close in VALUE_RE.findall(text, start):
+        if close:
+            yield row
+            row = []
+        elif bare:
+            row.append(None if bare == 'NULL' else bare)
+        elif '\\' in quoted or "''" in quoted:
+            row.append(unescape(quoted))
+        else:
+            row.append(quoted)
+
+
+def parse_insert(text):
+    match = INSERT_RE.match(text)
+    if match is None:
+        return None
+    columns = split_columns(match.group('columns')) if match.group('columns') else ()
+    return Insert(match.group('table'), columns, match.group('verb'), text, match.end())
+
+
+def iter_statements(dump, offset=0):
+    """Yield (Table or Insert, end offset) for each CREATE TABLE and INSERT of a dump opened in binary mode.
+
+    Reading starts at byte offset, which must be 0 or an end offset yielded
+    earlier, so an interrupted reader can pick up where it stopped.
+    mysqldump writes each INSERT on a single line (newlines inside strings
+    are escaped); an INSERT line that does not end in ';' is joined with the
+    lines that follow until one does.
+    """
+    dump.seek(offset)
+    block = None
+    while True:
+        line = dump.readline()
+        if not line:
+            return
+        offset += len(line)
+        if block is not None:
+            block.append(line.decode('utf-8'))
+            if line.startswith(b')') and line.rstrip().endswith(b';'):
+                yield parse_create_table(block), offset
+                block = None
+        elif line.startswith(b'CREATE TABLE'):
+            block = [line.decode('utf-8')]
+        elif line.startswith((b'INSERT', b'REPLACE')):
+            while not line.rstrip().endswith(b';'):
+                more = dump.readline()
+                if not more:
+                    raise ValueError(f"INSERT statement at byte {offset - len(line)} is not terminated")
+                line += more
+                offset += len(more)
+            statement = parse_insert(line.decode('utf-8'))
+            if statement is not None:
+                yield statement, offset
+
+
+def iter_create_tables(dump_path):
+    """Yield a Table for every CREATE TABLE statement in the dump, in file order."""
+    with open(dump_path, 'rb') as dump:
+        for statement, _ in iter_statements(dump):
+            if isinstance(statement, Table):
+                yield statement
+
+
+def read_tables(dump_path):
+    return {table.name: table for table in iter_create_tables(dump_path)}
+
+
+def quote(identifier):
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def sqlite_literal(value, affinity):
+    if value.startswith("'"):
+        inner = value[1:-1]
+        if affinity in ('INTEGER', 'REAL'):
+            return inner
+        return value
+    return value
+
+
+def create_table_sql(table, with_foreign_keys=True, with_unique_keys=True):
+    """Return the SQLite CREATE TABLE statement for a parsed MySQL table.
+
+    Without unique keys, the table is left for create_unique_index_sql() to
+    constrain once it has been loaded.
+    """
+    rowid_alias = (len(table.primary_key) == 1
+                   and table.column(table.primary_key[0]).affinity == 'INTEGER')
+    definitions = []
+    for column in table.columns:
+        parts = [quote(column.name), column.affinity]
+        if rowid_alias and column.name == table.primary_key[0]:
+            parts.append('PRIMARY KEY')
+        if column.not_null:
+            parts.append('NOT NULL')
+        if column.default is not None:
+            parts.append('DEFAULT ' + sqlite_literal(column.default, column.affinity))
+        if column.enum_values:
+            values = ', '.join("'" + value.replace("'", "''") + "'" for value in column.enum_values)
+            parts.append(f"CHECK ({quote(column.name)} IN ({values}))")
+        definitions.append(' '.join(parts))
+    if table.primary_key and not rowid_alias:
+        definitions.append('PRIMARY KEY (' + ', '.join(quote(c) for c in table.primary_key) + ')')
+    for _, columns in table.unique_keys if with_unique_keys else ():
+        definitions.append('UNIQUE (' + ', '.join(quote(c) for c in columns) + ')')
+    if with_foreign_keys:
+        for columns, ref_table, ref_columns, on_delete in table.foreign_keys:
+            clause = (f"FOREIGN KEY ({', '.join(quote(c) for c in columns)}) "
+                      f"REFERENCES {quote(ref_table)} ({', '.join(quote(c) for c in ref_columns)})")
+            if on_delete:
+                clause += f" ON DELETE {on_delete}"
+            definitions.append(clause)
+    return f"CREATE TABLE {quote(table.name)} (\n    " + ',\n    '.join(definitions) + "\n)"
+
+
+def create_index_sql(table):
+    """Return CREATE INDEX statements for the plain KEYs declared on a table.
+
+    Keys that are already the leading columns of the primary key or of a unique
+    constraint are skipped, since SQLite indexes those automatically.
+    """
+    covered = [table.primary_key] + [columns for _, columns in table.unique_keys]
+    statements = []
+    for name, columns in table.keys:
+        if any(existing[:len(columns)] == columns for existing in covered):
+            continue
+        statements.append(
+            f"CREATE INDEX IF NOT EXISTS {quote(f'idx_{table.name}_{name}')} "
+            f"ON {quote(table.name)} ({', '.join(quote(c) for c in columns)})"
+        )
+    return statements
+
+
+def create_unique_index_sql(table):
+    """Return CREATE UNIQUE INDEX statements for the UNIQUE KEYs of a table made without them."""
+    return [f"CREATE UNIQUE INDEX IF NOT EXISTS {quote(f'idx_{table.name}_{name}')} "
+            f"ON {quote(table.name)} ({', '.join(quote(c) for c in columns)})"
+            for name, columns in table.unique_keys]
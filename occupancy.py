@@ -0,0 +1,259 @@
+"""Interval-sweep occupancy engine.
+
+A room counts as occupied on every night from its check-in date up to (but
+not including) its check-out date, so a three-night stay contributes three
+room-nights. Stays without a check-out are treated as running to the end of
+the requested range. A range without an end stops at the latest check-out,
+or FUTURE_NIGHTS past today if that is later, so one far-future check-out
+cannot stretch the series.
+
+All assignments overlapping the range are read in one query, merged per room
+and swept into a nightly count, from which daily, weekly (ISO, Monday start)
+and monthly series are reduced in a single pass. NumPy is used when it is
+installed; otherwise a pure-Python sweep over merged per-room intervals gives
+the same numbers.
+"""
+from bisect import bisect_right
+from datetime import date, timedelta
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+EPOCH = date(1970, 1, 1)
+GRANULARITIES = ('day', 'week', 'month')
+LABEL_KEYS = {'day': 'date', 'week': 'week', 'month': 'month'}
+FUTURE_NIGHTS = 3 * 366  # how far past today a range without an end runs at most
+
+
+def to_day(value):
+    return (value - EPOCH).days
+
+
+def from_day(day):
+    return EPOCH + timedelta(days=day)
+
+
+def period_starts(start_day, end_day, granularity):
+    """Return (offset from start_day, label) for each period that begins in the range."""
+    first = from_day(start_day)
+    last = from_day(end_day - 1)
+    starts = []
+    if granularity == 'day':
+        for offset in range(end_day - start_day):
+            starts.append((offset, from_day(start_day + offset).isoformat()))
+    elif granularity == 'week':
+        monday = first - timedelta(days=first.weekday())
+        while monday <= last:
+            starts.append((max(to_day(monday) - start_day, 0), monday.isoformat()))
+            monday += timedelta(days=7)
+    else:
+        month = date(first.year, first.month, 1)
+        while month <= last:
+            starts.append((max(to_day(month) - start_day, 0), month.strftime('%Y-%m')))
+            month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+    return starts
+
+
+def open_end_day(latest):
+    """The end of a range without one: the latest check-out, but no further than FUTURE_NIGHTS past today."""
+    return min(latest, to_day(date.today()) + FUTURE_NIGHTS)
+
+
+def fetch_intervals(cursor, start=None, end=None, rooms=None):
+    """Read (room_id, start_day, end_day) for every assignment overlapping [start, end).
+
+    rooms, if given, is a (subquery, params) pair selecting the room_ids to include.
+    """
+    query = """
+        SELECT
+            ra.room_id,
+            CAST(julianday(DATE(ra.check_in_time)) - 2440587.5 AS INTEGER) AS start_day,
+            CAST(julianday(DATE(ra.check_out_time)) - 2440587.5 AS INTEGER) AS end_day
+        FROM RoomAssignments ra
+        WHERE ra.check_in_time IS NOT NULL
+    """
+    params = []
+    if end is not None:
+        query += " AND ra.check_in_time < ?"
+        params.append(end.isoformat())
+    if start is not None:
+        query += " AND (ra.check_out_time IS NULL OR ra.check_out_time > ?)"
+        params.append(start.isoformat())
+    if rooms is not None:
+        query += f" AND ra.room_id IN ({rooms[0]})"
+        params.extend(rooms[1])
+    cursor.execute(query, params)
+    return [(row[0], row[1], row[2]) for row in cursor.fetchall() if row[1] is not None]
+
+
+def fetch_available_rooms(cursor, rooms=None):
+    query = "SELECT COUNT(*) FROM Rooms WHERE room_status != 'renovation'"
+    params = []
+    if rooms is not None:
+        query += f" AND room_id IN ({rooms[0]})"
+        params.extend(rooms[1])
+    cursor.execute(query, params)
+    return cursor.fetchone()[0] or 0
+
+
+def compute_occupancy(cursor, start=None, end=None, granularities=GRANULARITIES, rooms=None):
+    """Compute occupancy series for [start, end) (dates; end exclusive).
+
+    Returns {granularity: [row, ...]} in chronological order. Each row has the
+    period label ('date', 'week' or 'month'), total_stays (check-ins in the
+    period), unique_rooms_occupied, total_available_rooms,
+    occupied_room_nights, available_room_nights and occupancy_rate (%).
+    rooms restricts the calculation to a (subquery, params) set of room_ids.
+    """
+    intervals = fetch_intervals(cursor, start, end, rooms)
+    available_rooms = fetch_available_rooms(cursor, rooms)
+
+    if start is None or end is None:
+        if not intervals:
+            return {granularity: [] for granularity in granularities}
+        known_ends = [max(e if e is not None else s + 1, s + 1) for _, s, e in intervals]
+        start_day = to_day(start) if start is not None else min(s for _, s, _ in intervals)
+        end_day = to_day(end) if end is not None else open_end_day(max(known_ends))
+    else:
+        start_day, end_day = to_day(start), to_day(end)
+    if end_day <= start_day:
+        return {granularity: [] for granularity in granularities}
+
+    spans = []
+    for room_id, s, e in intervals:
+        e = end_day if e is None else max(e, s + 1)
+        spans.append((room_id, s, e))
+
+    sweep = sweep_numpy if np is not None else sweep_python
+    return sweep(spans, start_day, end_day, available_rooms, granularities)
+
+
+def build_rows(granularity, starts, days, room_nights, stays, unique_rooms, available_rooms):
+    label_key = LABEL_KEYS[granularity]
+    rows = []
+    for index, (_, label) in enumerate(starts):
+        available_nights = available_rooms * int(days[index])
+        rows.append({
+            label_key: label,
+            'total_stays': int(stays[index]),
+            'unique_rooms_occupied': int(unique_rooms[index]),
+            'total_available_rooms': available_rooms,
+            'occupied_room_nights': int(room_nights[index]),
+            'available_room_nights': available_nights,
+            'occupancy_rate': float(room_nights[index]) * 100.0 / max(available_nights, 1)
+        })
+    return rows
+
+
+def sweep_numpy(spans, start_day, end_day, available_rooms, granularities):
+    if spans:
+        room_ids = np.array([room_id if room_id is not None else -1 for room_id, _, _ in spans])
+        starts = np.array([s for _, s, _ in spans], dtype=np.int64)
+        ends = np.array([e for _, _, e in spans], dtype=np.int64)
+    else:
+        room_ids = starts = ends = np.zeros(0, dtype=np.int64)
+    return sweep_arrays(room_ids, starts, ends, start_day, end_day, available_rooms, granularities)
+
+
+def sweep_arrays(room_ids, starts, ends, start_day, end_day, available_rooms, granularities):
+    """sweep_numpy() over spans given as arrays of room ids (-1 for none), start days and end days."""
+    days_total = end_day - start_day
+    starts_raw = starts - start_day
+
+    begin = np.clip(starts_raw, 0, days_total)
+    finish = np.clip(ends - start_day, 0, days_total)
+    keep = begin < finish
+    _, room_index = np.unique(room_ids[keep], return_inverse=True)
+    room_index = room_index.reshape(-1).astype(np.int64)
+
+    # Merge each room's overlapping stays. Sorted by room then check-in, with each room's days shifted
+    # past the previous room's, a merged stay ends wherever the next check-in is beyond every check-out so far.
+    order = np.lexsort((begin[keep], room_index))
+    shift = room_index[order] * (days_total + 1)
+    lo = begin[keep][order] + shift
+    hi = np.maximum.accumulate(finish[keep][order] + shift) if len(lo) else lo
+    first = np.ones(len(lo), dtype=bool)
+    first[1:] = lo[1:] > hi[:-1]
+    last = np.append(first[1:], True) if len(lo) else first
+    merged_room = room_index[order][first]
+    merged_begin = lo[first] - shift[first]
+    merged_end = hi[last] - shift[first]
+
+    # Per-night counts from one diff over the range, so memory grows with stays and days, not rooms x days.
+    nightly = np.cumsum(np.bincount(merged_begin, minlength=days_total + 1)
+                        - np.bincount(merged_end, minlength=days_total + 1))[:days_total]
+    in_range = (starts_raw >= 0) & (starts_raw < days_total)
+    checkins = np.bincount(starts_raw[in_range], minlength=days_total)
+    same_room = merged_room[1:] == merged_room[:-1]
+
+    series = {}
+    for granularity in granularities:
+        starts = period_starts(start_day, end_day, granularity)
+        offsets = np.array([offset for offset, _ in starts], dtype=np.int64)
+        days = np.diff(np.append(offsets, days_total))
+        room_nights = np.add.reduceat(nightly, offsets)
+        stays = np.add.reduceat(checkins, offsets)
+        # A merged stay touches periods first_period..last_period; a room's next stay starting in the
+        # period its previous one ended in is the same room again.
+        first_period = np.searchsorted(offsets, merged_begin, side='right') - 1
+        last_period = np.searchsorted(offsets, merged_end - 1, side='right') - 1
+        repeats = first_period[1:][same_room & (first_period[1:] == last_period[:-1])]
+        unique_rooms = np.cumsum(np.bincount(first_period, minlength=len(offsets) + 1)
+                                 - np.bincount(last_period + 1, minlength=len(offsets) + 1))[:len(offsets)]
+        unique_rooms -= np.bincount(repeats, minlength=len(offsets))
+        series[granularity] = build_rows(granularity, starts, days, room_nights, stays, unique_rooms, available_rooms)
+    return series
+
+
+def sweep_python(spans, start_day, end_day, available_rooms, granularities):
+    days_total = end_day - start_day
+
+    by_room = {}
+    checkins = [0] * days_total
+    for room_id, s, e in spans:
+        if 0 <= s - start_day < days_total:
+            checkins[s - start_day] += 1
+        s, e = max(s, start_day) - start_day, min(e, end_day) - start_day
+        if s < e:
+            by_room.setdefault(room_id, []).append((s, e))
+
+    # Merge overlapping stays per room, then sweep the merged intervals.
+    merged = []
+    for room_id, intervals in by_room.items():
+        intervals.sort()
+        current_start, current_end = intervals[0]
+        for s, e in intervals[1:]:
+            if s <= current_end:
+                current_end = max(current_end, e)
+            else:
+                merged.append((room_id, current_start, current_end))
+                current_start, current_end = s, e
+        merged.append((room_id, current_start, current_end))
+
+    diff = [0] * (days_total + 1)
+    for _, s, e in merged:
+        diff[s] += 1
+        diff[e] -= 1
+    nightly = []
+    running = 0
+    for day in range(days_total):
+        running += diff[day]
+        nightly.append(running)
+
+    series = {}
+    for granularity in granularities:
+        starts = period_starts(start_day, end_day, granularity)
+        offsets = [offset for offset, _ in starts]
+        bounds = offsets + [days_total]
+        days = [bounds[i + 1] - bounds[i] for i in range(len(offsets))]
+        room_nights = [sum(nightly[bounds[i]:bounds[i + 1]]) for i in range(len(offsets))]
+        stays = [sum(checkins[bounds[i]:bounds[i + 1]]) for i in range(len(offsets))]
+        rooms = [set() for _ in offsets]
+        for room_id, s, e in merged:
+            for index in range(bisect_right(offsets, s) - 1, bisect_right(offsets, e - 1)):
+                rooms[index].add(room_id)
+        series[granularity] = build_rows(granularity, starts, days, room_nights, stays,
+                                         [len(r) for r in rooms], available_rooms)
+    return series
@@ -0,0 +1,174 @@
+"""Background precomputation of dashboard metrics.
+
+A Scheduler runs each Job on its own cadence on a small worker pool inside
+the app process, and the jobs write their results to a SnapshotStore. Pages
+then read snapshots instead of querying, so page latency no longer depends
+on how expensive the underlying aggregation is.
+
+Each run is rescheduled interval * (1 +/- jitter) later, so jobs that share
+a cadence drift apart instead of hitting the database together. A failed run
+is retried after retry_delay, doubling per consecutive failure up to
+max_retry_delay (and never later than the normal interval).
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import random
+import threading
+import time
+
+
+class Snapshot:
+    __slots__ = ('value', 'version', 'computed_at', 'computed_monotonic')
+
+    def __init__(self, value, version):
+        self.value = value
+        self.version = version
+        self.computed_at = datetime.now()
+        self.computed_monotonic = time.monotonic()
+
+    def age(self):
+        return time.monotonic() - self.computed_monotonic
+
+
+class SnapshotStore:
+    def __init__(self):
+        self._snapshots = {}
+        self._lock = threading.Lock()
+
+    def put(self, key, value, version=None):
+        with self._lock:
+            self._snapshots[key] = Snapshot(value, version)
+
+    def get(self, key):
+        with self._lock:
+            return self._snapshots.get(key)
+
+    def clear(self):
+        with self._lock:
+            self._snapshots.clear()
+
+
+class Job:
+    def __init__(self, name, run, interval, jitter=0.1, retry_delay=5.0, max_retry_delay=900.0):
+        self.name = name
+        self.run = run
+        self.interval = interval
+        self.jitter = jitter
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.next_run = None
+        self.running = False
+        self.runs = 0
+        self.failures = 0  # consecutive
+        self.last_started = None
+        self.last_duration = None
+        self.last_success = None
+        self.last_error = None
+
+    def delay(self, succeeded):
+        if succeeded:
+            base = self.interval
+        else:
+            base = min(self.retry_delay * 2 ** (self.failures - 1), self.max_retry_delay, self.interval)
+        return base * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def overdue(self, now=None):
+        """True once the job has gone two intervals without a successful run."""
+        if self.last_success is None:
+            return True
+        return (now if now is not None else time.monotonic()) - self.last_success > 2 * self.interval
+
+    def status(self):
+        now = time.monotonic()
+        return {
+            'name': self.name,
+            'interval_seconds': self.interval,
+            'running': self.running,
+            'runs': self.runs,
+            'consecutive_failures': self.failures,
+            'last_started': self.last_started.isoformat(timespec='seconds') if self.last_started else None,
+            'last_duration_ms': round(self.last_duration * 1000, 1) if self.last_duration is not None else None,
+            'last_success_age_seconds': round(now - self.last_success, 1) if self.last_success is not None else None,
+            'next_run_in_seconds': round(max(self.next_run - now, 0), 1) if self.next_run is not None and not self.running else None,
+            'overdue': self.overdue(now),
+            'last_error': self.last_error
+        }
+
+
+class Scheduler:
+    def __init__(self, jobs, workers=2, startup_spread=2.0):
+        self.jobs = {job.name: job for job in jobs}
+        self.workers = workers
+        self.startup_spread = startup_spread
+        self._condition = threading.Condition()
+        self._thread = None
+        self._executor = None
+        self._stopping = False
+
+    def start(self):
+        """Start the scheduler thread; every job first runs within startup_spread seconds. Idempotent."""
+        with self._condition:
+            if self._thread is not None:
+                return
+            now = time.monotonic()
+            for job in self.jobs.values():
+                job.next_run = now + random.uniform(0, self.startup_spread)
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='precompute')
+            self._thread = threading.Thread(target=self._loop, name='precompute-scheduler', daemon=True)
+            self._thread.start()
+
+    @property
+    def started(self):
+        return self._thread is not None
+
+    def _loop(self):
+        with self._condition:
+            while not self._stopping:
+                now = time.monotonic()
+                for job in self.jobs.values():
+                    if not job.running and job.next_run <= now:
+                        job.running = True
+                        self._executor.submit(self._run, job)
+                waiting = [job.next_run for job in self.jobs.values() if not job.running]
+                self._condition.wait(timeout=max(min(waiting) - now, 0) if waiting else None)
+
+    def _run(self, job):
+        started = time.monotonic()
+        job.last_started = datetime.now()
+        error = None
+        try:
+            job.run()
+        except Exception as e:
+            # A background job must never take the scheduler down with it.
+            error = f"{type(e).__name__}: {e}"
+            print(f"Error running {job.name} precompute job: {error}")
+        with self._condition:
+            finished = time.monotonic()
+            job.running = False
+            job.runs += 1
+            job.last_duration = finished - started
+            if error is None:
+                job.failures = 0
+                job.last_success = finished
+                job.last_error = None
+            else:
+                job.failures += 1
+                job.last_error = error
+            job.next_run = finished + job.delay(error is None)
+            self._condition.notify()
+
+    def run_now(self, name):
+        with self._condition:
+            self.jobs[name].next_run = time.monotonic()
+            self._condition.notify()
+
+    def stop(self):
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def status(self):
+        with self._condition:
+            return [job.status() for job in self.jobs.values()]
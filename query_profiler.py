@@ -0,0 +1,313 @@
+"""Query profiling and Prometheus-style metrics.
+
+Pooled connections are opened with a ProfiledConnection factory whose cursors
+time every statement from execute() until its rows are exhausted or the
+cursor moves on. For each query the profiler records wall time (spent inside
+execute/fetch calls only), rows returned and SQLite VM steps. VM steps are
+counted with a progress handler that fires every step_interval instructions,
+so they are a close proxy for rows scanned, rounded to that interval. Slow
+queries also get their EXPLAIN QUERY PLAN.
+
+Recent queries are kept in a ring buffer, and query and HTTP request
+latencies feed histograms rendered in the Prometheus text format.
+"""
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+import sqlite3
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_PARAMS = 20
+PLAN_CACHE_SIZE = 256
+
+current_route = ContextVar('current_route', default=None)
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(names, values, extra=()):
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def render_samples(name, help_text, metric_type, label_names, samples):
+    """Prometheus text lines for (label values, value) samples gathered elsewhere."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+    for labels, value in samples:
+        lines.append(f"{name}{format_labels(label_names, labels)} {value}")
+    return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{format_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][index] += 1
+                    break
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series['counts']):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{format_labels(self.label_names, labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{self.name}_bucket{format_labels(self.label_names, labels, [('le', '+Inf')])} {series['count']}")
+                lines.append(f"{self.name}_sum{format_labels(self.label_names, labels)} {series['sum']}")
+                lines.append(f"{self.name}_count{format_labels(self.label_names, labels)} {series['count']}")
+        return lines
+
+
+class QueryRecord:
+    __slots__ = ('sql', 'params', 'route', 'started_at', 'seconds', 'rows', 'start_steps', 'error')
+
+    def __init__(self, sql, params, route, start_steps):
+        self.sql = sql
+        self.params = params
+        self.route = route
+        self.started_at = datetime.now().isoformat(timespec='milliseconds')
+        self.seconds = 0.0
+        self.rows = 0
+        self.start_steps = start_steps
+        self.error = None
+
+
+class ProfilingCursor(sqlite3.Cursor):
+    """Cursor that reports each statement to its connection's profiler once the statement is done."""
+
+    _record = None
+
+    def _begin(self, sql, parameters):
+        self._finish()
+        self._record = QueryRecord(sql, parameters, current_route.get(), self.connection.vm_steps)
+
+    def _finish(self):
+        record, self._record = self._record, None
+        if record is not None:
+            self.connection.profiler.finish(self.connection, record)
+
+    def _timed(self, method, *args):
+        record = self._record
+        if record is None:
+            return method(*args)
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        except sqlite3.Error as e:
+            record.error = str(e)
+            raise
+        finally:
+            record.seconds += time.perf_counter() - start
+
+    def execute(self, sql, parameters=()):
+        self._begin(sql, parameters)
+        try:
+            self._timed(super().execute, sql, parameters)
+        except sqlite3.Error:
+            self._finish()
+            raise
+        if self.description is None:
+            self._finish()
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        # No single parameter set to report or EXPLAIN with.
+        self._begin(sql, None)
+        try:
+            self._timed(super().executemany, sql, seq_of_parameters)
+        finally:
+            self._finish()
+        return self
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if row is None:
+            self._finish()
+        elif self._record is not None:
+            self._record.rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(super().fetchmany, self.arraysize if size is None else size)
+        if self._record is not None:
+            self._record.rows += len(rows)
+            if not rows:
+                self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        if self._record is not None:
+            self._record.rows += len(rows)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        try:
+            row = self._timed(super().__next__)
+        except StopIteration:
+            self._finish()
+            raise
+        if self._record is not None:
+            self._record.rows += 1
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """Connection whose cursors are profiled; bound to a profiler by QueryProfiler.connection_factory()."""
+
+    profiler = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.vm_steps = 0
+        if self.profiler.step_interval:
+            self.set_progress_handler(self._count_steps, self.profiler.step_interval)
+
+    def _count_steps(self):
+        self.vm_steps += self.profiler.step_interval
+        return 0
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or ProfilingCursor)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+class QueryProfiler:
+    def __init__(self, capacity=200, slow_seconds=0.1, step_interval=1000):
+        self.capacity = capacity
+        self.slow_seconds = slow_seconds
+        self.step_interval = step_interval
+        self._recent = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._plans = {}
+        self.query_seconds = Histogram('hotel_db_query_duration_seconds', 'SQLite query wall time', ('route',))
+        self.query_rows = Counter('hotel_db_query_rows_total', 'Rows returned by SQLite queries', ('route',))
+        self.query_steps = Counter('hotel_db_query_vm_steps_total', 'SQLite VM steps (approximate rows scanned)', ('route',))
+        self.query_errors = Counter('hotel_db_query_errors_total', 'SQLite queries that raised an error', ('route',))
+        self.slow_queries = Counter('hotel_db_slow_queries_total', 'Queries slower than the slow-query threshold', ('route',))
+        self.request_seconds = Histogram('hotel_http_request_duration_seconds', 'Flask request latency', ('route', 'method'))
+        self.requests = Counter('hotel_http_requests_total', 'Flask requests served', ('route', 'method', 'status'))
+
+    def connection_factory(self):
+        """A sqlite3.connect(factory=...) class whose connections report to this profiler."""
+        return type('ProfiledConnection', (ProfiledConnection,), {'profiler': self})
+
+    def explain(self, connection, sql, params):
+        plan = self._plans.get(sql)
+        if plan is None:
+            try:
+                cursor = sqlite3.Connection.cursor(connection)
+                cursor.row_factory = None
+                plan = [detail for _, _, _, detail in cursor.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()]
+                cursor.close()
+            except (sqlite3.Error, ValueError) as e:
+                plan = [f"EXPLAIN failed: {e}"]
+            with self._lock:
+                if len(self._plans) >= PLAN_CACHE_SIZE:
+                    self._plans.pop(next(iter(self._plans)))
+                self._plans[sql] = plan
+        return plan
+
+    def finish(self, connection, record):
+        steps = connection.vm_steps - record.start_steps
+        slow = record.seconds >= self.slow_seconds
+        explainable = slow and record.error is None and record.params is not None
+        if record.params is None:
+            params = []
+        elif isinstance(record.params, (list, tuple)):
+            params = record.params
+        else:
+            params = [record.params]
+        entry = {
+            'started_at': record.started_at,
+            'route': record.route,
+            'sql': ' '.join(record.sql.split()),
+            'params': [param if isinstance(param, (int, float, str)) or param is None else repr(param)
+                       for param in list(params)[:MAX_PARAMS]],
+            'duration_ms': round(record.seconds * 1000, 3),
+            'rows': record.rows,
+            'vm_steps': steps,
+            'slow': slow,
+            'error': record.error,
+            'plan': self.explain(connection, record.sql, record.params) if explainable else None,
+        }
+        with self._lock:
+            self._recent.append(entry)
+
+        labels = (record.route or '',)
+        self.query_seconds.observe(record.seconds, labels)
+        self.query_rows.inc(labels, record.rows)
+        self.query_steps.inc(labels, steps)
+        if record.error is not None:
+            self.query_errors.inc(labels)
+        if slow:
+            self.slow_queries.inc(labels)
+
+    def observe_request(self, route, method, status, seconds):
+        self.request_seconds.observe(seconds, (route, method))
+        self.requests.inc((route, method, str(status)))
+
+    def recent(self, limit=None, slow_only=False):
+        """Recorded queries, newest first."""
+        with self._lock:
+            entries = list(self._recent)
+        entries.reverse()
+        if slow_only:
+            entries = [entry for entry in entries if entry['slow']]
+        return entries[:limit] if limit else entries
+
+    def render(self):
+        lines = []
+        for metric in (self.request_seconds, self.requests, self.query_seconds, self.query_rows,
+                       self.query_steps, self.query_errors, self.slow_queries):
+            lines.extend(metric.render())
+        return lines
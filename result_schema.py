@@ -0,0 +1,104 @@
+"""Declarative result schemas with compiled row decoders.
+
+A metric declares its columns and their types once:
+
+    QUARTERLY_REVENUE = ResultSchema(
+        Column('revenue_year', int),
+        Column('revenue_quarter', int),
+        Column('total_revenue', float),
+        derived={'quarter': lambda row: f"{row['revenue_year']}-Q{row['revenue_quarter']}"},
+    )
+
+and schema.fetchall(cursor) decodes the result set in a single pass. The
+decoder is Python source generated for the column order of the query (the way
+collections.namedtuple builds its classes) and compiled once per order, so each
+row costs one dict display with inline conversions: no sqlite3.Row objects,
+no dict(row) copy and no second loop over the rows.
+
+Conversions keep the semantics of the old `int(x) if x else 0` loops: a NULL
+(or other falsy value) becomes the column's default. Columns declared with
+type None are passed through unchanged, NULL included.
+"""
+from dataclasses import dataclass
+import threading
+
+DEFAULTS = {int: 0, float: 0.0, str: ''}
+MISSING = object()
+
+
+@dataclass(frozen=True)
+class Column:
+    name: str
+    type: object = None
+    default: object = MISSING
+
+    def resolved_default(self):
+        if self.default is not MISSING:
+            return self.default
+        return DEFAULTS.get(self.type)
+
+
+class ResultSchema:
+    def __init__(self, *columns, derived=None):
+        self.columns = columns
+        self.derived = dict(derived or {})
+        self._decoders = {}
+        self._lock = threading.Lock()
+
+    def decoder(self, names):
+        """Return a function that turns a raw row tuple with these column names into a dict."""
+        names = tuple(names)
+        decode = self._decoders.get(names)
+        if decode is None:
+            with self._lock:
+                decode = self._decoders.get(names)
+                if decode is None:
+                    decode = self._decoders[names] = self._compile(names)
+        return decode
+
+    def _compile(self, names):
+        positions = {name: index for index, name in enumerate(names)}
+        missing = [column.name for column in self.columns if column.name not in positions]
+        if missing:
+            raise KeyError(f"query result has no column(s) {', '.join(missing)}")
+
+        namespace = {}
+        items = []
+        for number, column in enumerate(self.columns):
+            value = f"row[{positions[column.name]}]"
+            if column.type is None:
+                items.append(f"{column.name!r}: {value}")
+                continue
+            namespace[f"_type{number}"] = column.type
+            namespace[f"_default{number}"] = column.resolved_default()
+            items.append(f"{column.name!r}: _type{number}({value}) if {value} else _default{number}")
+
+        lines = ["def decode(row):", f"    record = {{{', '.join(items)}}}"]
+        for number, (name, compute) in enumerate(self.derived.items()):
+            namespace[f"_derived{number}"] = compute
+            lines.append(f"    record[{name!r}] = _derived{number}(record)")
+        lines.append("    return record")
+        exec('\n'.join(lines), namespace)
+        return namespace['decode']
+
+    def fetchall(self, cursor):
+        """Decode every remaining row of an executed cursor."""
+        decode = self.decoder(description[0] for description in cursor.description)
+        previous = cursor.row_factory
+        cursor.row_factory = None
+        try:
+            rows = cursor.fetchall()
+        finally:
+            cursor.row_factory = previous
+        return list(map(decode, rows))
+
+    def fetchone(self, cursor):
+        """Decode the next row of an executed cursor, or return None."""
+        decode = self.decoder(description[0] for description in cursor.description)
+        previous = cursor.row_factory
+        cursor.row_factory = None
+        try:
+            row = cursor.fetchone()
+        finally:
+            cursor.row_factory = previous
+        return decode(row) if row is not None else None
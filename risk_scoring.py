@@ -0,0 +1,496 @@
+"""Configurable customer risk scores with an incrementally maintained top K.
+
+Every party with a CustomerQualifications row is scored as
+
+    risk = sum(weight * signal)
+
+over signals that each run from 0 (no risk) to 100:
+
+    payment_promptness, past_history, cooperativeness, flexibility
+                     100 minus the qualification score
+    overdue_days     days the oldest open bill (not paid or cancelled) is
+                     past its due date, OVERDUE_DAYS_CAP days or more = 100
+    payment_latency  average days a payment arrived after its bill was due,
+                     PAYMENT_LATENCY_CAP days or more = 100
+    refund_rate      percentage of the party's deposits that were refunded
+
+DEFAULT_WEIGHTS are the 0.4/0.3/0.2/0.1 qualification weights the SQL query
+has always used, with the extra signals off, so the default ranking and
+scores are unchanged. RISK_WEIGHTS overrides any of them, e.g.
+"overdue_days=0.2,refund_rate=0.05". Filtered rankings still come from
+HIGH_RISK_CUSTOMERS_QUERY and use only the qualification weights.
+
+RiskIndex scores all parties in one batch: one SQL pass gathers each
+party's signals and NumPy combines them. It keeps only the K highest in a
+TopK heap and caches the K display rows in rank order, so a "top N" request
+is a list slice. Triggers created by `python risk_scoring.py install` log
+the party of every changed qualification, party, bill, payment, deposit or
+reservation row in risk_changes. refresh() rescores just those parties and
+moves them in or out of the heap. Installing them is a migration step, run
+once against the database; the app only checks for them at start-up.
+Without them, the whole index is rescored when the database changes. Either way it is rescored when the date changes, because
+overdue_days depends on it.
+
+Usage:
+    python risk_scoring.py install    # create risk_changes and its triggers
+    python risk_scoring.py check      # compare the index with the SQL ranking and a fresh rescore
+    python risk_scoring.py drop       # remove risk_changes and its triggers
+"""
+import argparse
+from datetime import date
+import heapq
+import json
+import os
+import sqlite3
+import sys
+import threading
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+QUALIFICATION_SIGNALS = ('payment_promptness', 'past_history', 'cooperativeness', 'flexibility')
+SIGNALS = QUALIFICATION_SIGNALS + ('overdue_days', 'payment_latency', 'refund_rate')
+DEFAULT_WEIGHTS = {
+    'payment_promptness': 0.4,
+    'past_history': 0.3,
+    'cooperativeness': 0.2,
+    'flexibility': 0.1,
+    'overdue_days': 0.0,
+    'payment_latency': 0.0,
+    'refund_rate': 0.0,
+}
+OVERDUE_DAYS_CAP = 90
+PAYMENT_LATENCY_CAP = 30
+CHANGE_LOG_RETAIN = 10000  # risk_changes rows kept; an index further behind rescores everything
+REFRESH_FRACTION = 0.1     # rescore everything when more than this share of parties changed
+
+PARTY_SET = "IN (SELECT value FROM json_each(:parties))"
+
+# One row per scored party. {party_filter} is the condition on billed_party_id
+# (PARTY_SET for a set of parties); signals are raw here and scaled in score().
+RISK_FEATURES_QUERY = """
+    WITH reservation_totals AS (
+        SELECT
+            billed_party_id,
+            COUNT(DISTINCT reservation_id) AS total_reservations,
+            MAX(check_in_date) AS last_visit_date
+        FROM Reservations
+        WHERE billed_party_id {party_filter}
+        GROUP BY billed_party_id
+    ),
+    bill_totals AS (
+        SELECT
+            billed_party_id,
+            SUM(CASE WHEN bill_status = 'overdue' THEN total_amount END) AS overdue_amount,
+            MAX(CASE WHEN bill_status NOT IN ('paid', 'cancelled') AND due_date < :as_of
+                     THEN julianday(:as_of) - julianday(due_date) END) AS overdue_days
+        FROM Bills
+        WHERE billed_party_id {party_filter}
+        GROUP BY billed_party_id
+    ),
+    payment_totals AS (
+        SELECT
+            b.billed_party_id,
+            AVG(MAX(julianday(p.payment_date) - julianday(b.due_date), 0)) AS payment_latency
+        FROM Payments p
+        JOIN Bills b ON b.bill_id = p.bill_id
+        WHERE b.billed_party_id {party_filter}
+        GROUP BY b.billed_party_id
+    ),
+    deposit_totals AS (
+        SELECT
+            res.billed_party_id,
+            SUM(d.refund_status = 'refunded') * 100.0 / COUNT(*) AS refund_rate
+        FROM Deposits d
+        JOIN Reservations res ON res.reservation_id = d.reservation_id
+        WHERE res.billed_party_id {party_filter}
+        GROUP BY res.billed_party_id
+    )
+    SELECT
+        cq.billed_party_id,
+        COALESCE(bp.first_name || ' ' || bp.last_name, bp.organization_name) AS customer_name,
+        bp.party_type,
+        cq.past_history_score,
+        cq.cooperativeness_score,
+        cq.flexibility_score,
+        cq.payment_promptness_score,
+        cq.overall_qualification_score,
+        COALESCE(rt.total_reservations, 0) AS total_reservations,
+        COALESCE(bt.overdue_amount, 0) AS overdue_amount,
+        rt.last_visit_date,
+        COALESCE(bt.overdue_days, 0) AS overdue_days,
+        COALESCE(pt.payment_latency, 0) AS payment_latency,
+        COALESCE(dt.refund_rate, 0) AS refund_rate
+    FROM CustomerQualifications cq
+    JOIN BilledParties bp ON cq.billed_party_id = bp.billed_party_id
+    LEFT JOIN reservation_totals rt ON rt.billed_party_id = cq.billed_party_id
+    LEFT JOIN bill_totals bt ON bt.billed_party_id = cq.billed_party_id
+    LEFT JOIN payment_totals pt ON pt.billed_party_id = cq.billed_party_id
+    LEFT JOIN deposit_totals dt ON dt.billed_party_id = cq.billed_party_id
+    WHERE cq.billed_party_id {party_filter}
+"""
+
+# Output columns of RiskIndex.top(), as in HIGH_RISK_CUSTOMERS_QUERY.
+COLUMNS = ('billed_party_id', 'customer_name', 'party_type', 'past_history_score', 'cooperativeness_score',
+           'flexibility_score', 'payment_promptness_score', 'overall_qualification_score', 'risk_score',
+           'total_reservations', 'overdue_amount', 'last_visit_date')
+
+# Tables whose rows feed a party's score -> SQL expression for that party's id.
+TRACKED_TABLES = {
+    'CustomerQualifications': '{r}.billed_party_id',
+    'BilledParties': '{r}.billed_party_id',
+    'Bills': '{r}.billed_party_id',
+    'Reservations': '{r}.billed_party_id',
+    'Payments': '(SELECT billed_party_id FROM Bills WHERE bill_id = {r}.bill_id)',
+    'Deposits': '(SELECT billed_party_id FROM Reservations WHERE reservation_id = {r}.reservation_id)',
+}
+
+
+def parse_weights(text):
+    """DEFAULT_WEIGHTS updated from a "signal=weight,..." string (empty for the defaults)."""
+    weights = dict(DEFAULT_WEIGHTS)
+    for item in filter(None, (part.strip() for part in (text or '').split(','))):
+        name, separator, value = item.partition('=')
+        name = name.strip()
+        if not separator or name not in weights:
+            raise ValueError(f"unknown risk signal in {item!r}; expected one of {', '.join(SIGNALS)}")
+        weights[name] = float(value)
+    return weights
+
+
+def configured_weights():
+    """The weights set by RISK_WEIGHTS, shared by the dashboard, the API and the exports."""
+    return parse_weights(os.getenv('RISK_WEIGHTS'))
+
+
+def risk_expression(weights, alias='cq'):
+    """The qualification part of the score as a SQL expression, for HIGH_RISK_CUSTOMERS_QUERY."""
+    return ' +\n         '.join(f"{weights[name]!r} * (100 - {alias}.{name}_score)" for name in QUALIFICATION_SIGNALS)
+
+
+def score(rows, weights):
+    """Risk score per feature row as a float64 array (NaN where a qualification score is NULL)."""
+    count = len(rows)
+
+    def column(index):
+        return np.fromiter((np.nan if row[index] is None else row[index] for row in rows), dtype=np.float64, count=count)
+
+    # Feature row positions of each signal (see RISK_FEATURES_QUERY).
+    signals = {
+        'payment_promptness': 100 - column(6),
+        'past_history': 100 - column(3),
+        'cooperativeness': 100 - column(4),
+        'flexibility': 100 - column(5),
+        'overdue_days': np.minimum(column(11), OVERDUE_DAYS_CAP) * (100.0 / OVERDUE_DAYS_CAP),
+        'payment_latency': np.minimum(column(12), PAYMENT_LATENCY_CAP) * (100.0 / PAYMENT_LATENCY_CAP),
+        'refund_rate': column(13),
+    }
+    risk = None
+    # Left to right in SIGNALS order, like the SQL expression, so default weights give the same floats.
+    for name in SIGNALS:
+        if weights[name] or name in QUALIFICATION_SIGNALS:
+            term = weights[name] * signals[name]
+            risk = term if risk is None else risk + term
+    return risk
+
+
+def rank_key(party_id, risk):
+    """Heap key: higher risk first, then lower party id; NULL risk ranks last (as in SQL)."""
+    return (float('-inf') if risk is None else risk, -party_id)
+
+
+def fetch_features(cursor, as_of, parties=None):
+    """RISK_FEATURES_QUERY rows as plain tuples, for every scored party or just `parties`."""
+    party_filter = PARTY_SET if parties is not None else "IS NOT NULL"
+    params = {'as_of': as_of.isoformat()}
+    if parties is not None:
+        params['parties'] = json.dumps(sorted(parties))
+    cursor.execute(RISK_FEATURES_QUERY.format(party_filter=party_filter), params)
+    previous = cursor.row_factory
+    cursor.row_factory = None
+    try:
+        return cursor.fetchall()
+    finally:
+        cursor.row_factory = previous
+
+
+def scored_rows(rows, weights):
+    """(party, risk or None, COLUMNS row) for each feature row."""
+    risks = score(rows, weights) if rows else []
+    for row, risk in zip(rows, risks):
+        risk = None if np.isnan(risk) else float(risk)
+        yield row[0], risk, row[:8] + (risk,) + row[8:11]
+
+
+def ranked_rows(cursor, weights, parties=None):
+    """COLUMNS rows for every scored party (or just `parties`), riskiest first, ranked as RiskIndex ranks them."""
+    scored = sorted(scored_rows(fetch_features(cursor, date.today(), parties), weights),
+                    key=lambda item: rank_key(item[0], item[1]), reverse=True)
+    return [row for _, _, row in scored]
+
+
+class TopK:
+    """The `capacity` largest keys of a changing {party: key} table, as a lazy min-heap.
+
+    Invariant: every party outside the heap has a key below `floor`, the key
+    of the last entry trimmed or the smallest key at the last rebuild. So an
+    updated key above the floor joins the heap, a member falling below it
+    leaves, and only a heap drained below the requested size needs a rebuild.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.members = {}  # party -> key
+        self.floor = None  # None: every party is a member
+        self._heap = []
+
+    def rebuild(self, keys):
+        """Take the `capacity` largest of a {party: key} table."""
+        self.members = dict(heapq.nlargest(self.capacity, keys.items(), key=lambda item: item[1]))
+        self.floor = min(self.members.values()) if len(keys) > len(self.members) else None
+        self._heap = [(key, party) for party, key in self.members.items()]
+        heapq.heapify(self._heap)
+
+    def update(self, party, key):
+        """Set or (with key None) remove a party's key."""
+        if key is None or (self.floor is not None and key < self.floor):
+            self.members.pop(party, None)
+            return
+        self.members[party] = key
+        heapq.heappush(self._heap, (key, party))
+        while len(self.members) > self.capacity:
+            trimmed, trimmed_party = heapq.heappop(self._heap)
+            if self.members.get(trimmed_party) == trimmed:
+                del self.members[trimmed_party]
+                self.floor = trimmed if self.floor is None else max(self.floor, trimmed)
+        if len(self._heap) > 4 * self.capacity:
+            # Drop entries left behind by updates.
+            self._heap = [(key, party) for party, key in self.members.items()]
+            heapq.heapify(self._heap)
+
+    def complete(self, n):
+        """True if the heap holds the true top n."""
+        return self.floor is None or len(self.members) >= n
+
+    def ranked(self):
+        return sorted(self.members, key=self.members.get, reverse=True)
+
+
+class RiskIndex:
+    """All parties' risk keys plus a TopK of the riskiest, refreshed from the database on demand."""
+
+    def __init__(self, weights=None, capacity=200, version=None):
+        if np is None:
+            raise RuntimeError("risk scoring needs NumPy")
+        self.weights = dict(weights or DEFAULT_WEIGHTS)
+        self.capacity = capacity
+        self.version = version  # callable returning a value that changes with the database
+        self.keys = {}          # party -> rank key
+        self.details = {}       # party -> output row (COLUMNS)
+        self.top_k = TopK(capacity)
+        self.as_of = None
+        self.seen_version = None
+        self.change_seq = None  # last risk_changes seq applied; None without the change log
+        self.full_rescores = 0
+        self.incremental_rescores = 0
+        self._rows = None       # cached output rows in rank order
+        self._lock = threading.Lock()
+
+    def _features(self, cursor, as_of, parties=None):
+        return fetch_features(cursor, as_of, parties)
+
+    def _apply(self, rows):
+        for party, risk, detail in scored_rows(rows, self.weights):
+            self.keys[party] = rank_key(party, risk)
+            self.details[party] = detail
+        return {row[0] for row in rows}
+
+    def rescore_all(self, cursor):
+        # Read everything before touching the index, so an interrupted query leaves it as it was.
+        as_of = date.today()
+        change_seq = latest_change(cursor)
+        seen_version = self.version() if self.version else None
+        rows = self._features(cursor, as_of)
+        self.as_of, self.change_seq, self.seen_version = as_of, change_seq, seen_version
+        self.keys, self.details = {}, {}
+        self._apply(rows)
+        self.top_k.rebuild(self.keys)
+        self._rows = None
+        self.full_rescores += 1
+
+    def rescore(self, cursor, parties):
+        """Rescore some parties and move them in or out of the top K."""
+        scored = self._apply(self._features(cursor, self.as_of, parties))
+        for party in parties:
+            if party not in scored:  # qualification or party row deleted
+                self.keys.pop(party, None)
+                self.details.pop(party, None)
+            self.top_k.update(party, self.keys.get(party))
+        self._rows = None
+        self.incremental_rescores += 1
+
+    def refresh(self, cursor):
+        """Bring the index up to date: apply logged changes, or rescore everything if that is not possible."""
+        if self.as_of != date.today():
+            self.rescore_all(cursor)
+        elif self.change_seq is None:
+            if self.version is None or self.version() != self.seen_version:
+                self.rescore_all(cursor)
+        else:
+            changes = read_changes(cursor, self.change_seq)
+            if changes is None or len(changes[1]) > max(len(self.keys) * REFRESH_FRACTION, self.capacity):
+                self.rescore_all(cursor)
+                return
+            seq, parties = changes
+            if parties:
+                self.rescore(cursor, parties)
+            self.change_seq = seq
+
+    def top(self, cursor, n):
+        """The n riskiest parties as COLUMNS tuples, highest risk first."""
+        with self._lock:
+            self.refresh(cursor)
+            if not self.top_k.complete(n):
+                self.top_k.rebuild(self.keys)
+                self._rows = None
+            if self._rows is None:
+                self._rows = [self.details[party] for party in self.top_k.ranked()]
+            return self._rows[:n]
+
+    def status(self):
+        return {
+            'weights': self.weights,
+            'capacity': self.capacity,
+            'parties': len(self.keys),
+            'as_of': self.as_of.isoformat() if self.as_of else None,
+            'change_log': self.change_seq is not None,
+            'full_rescores': self.full_rescores,
+            'incremental_rescores': self.incremental_rescores,
+        }
+
+
+def change_log_installed(cursor):
+    cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'risk_changes'")
+    return cursor.fetchone()[0] > 0
+
+
+def latest_change(cursor):
+    """Highest risk_changes seq (0 when empty), or None without the change log."""
+    if not change_log_installed(cursor):
+        return None
+    cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM risk_changes")
+    return cursor.fetchone()[0]
+
+
+def read_changes(cursor, after):
+    """(latest seq, {parties changed after seq `after`}), or None if entries after it were pruned."""
+    cursor.execute("SELECT COALESCE(MIN(seq), 0), COALESCE(MAX(seq), 0) FROM risk_changes")
+    first, last = cursor.fetchone()
+    if last <= after:
+        return after, set()
+    if first > after + 1:
+        return None
+    cursor.execute("SELECT DISTINCT billed_party_id FROM risk_changes WHERE seq > ? AND seq <= ?", (after, last))
+    return last, {row[0] for row in cursor.fetchall() if row[0] is not None}
+
+
+def create_triggers_sql(table, party):
+    name = f"risk_changes_{table.lower()}"
+    log = "INSERT INTO risk_changes (billed_party_id) VALUES ({0});"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {name}_ai AFTER INSERT ON {table} BEGIN\n"
+        f"    {log.format(party.format(r='NEW'))}\nEND",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_ad AFTER DELETE ON {table} BEGIN\n"
+        f"    {log.format(party.format(r='OLD'))}\nEND",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_au AFTER UPDATE ON {table} BEGIN\n"
+        f"    {log.format(party.format(r='OLD'))}\n    {log.format(party.format(r='NEW'))}\nEND",
+    ]
+
+
+def install(connection):
+    with connection:
+        connection.execute("CREATE TABLE IF NOT EXISTS risk_changes ("
+                           "seq INTEGER PRIMARY KEY AUTOINCREMENT, billed_party_id INTEGER)")
+        connection.execute(
+            "CREATE TRIGGER IF NOT EXISTS risk_changes_prune AFTER INSERT ON risk_changes BEGIN\n"
+            f"    DELETE FROM risk_changes WHERE seq <= NEW.seq - {CHANGE_LOG_RETAIN};\nEND")
+        for table, party in TRACKED_TABLES.items():
+            for statement in create_triggers_sql(table, party):
+                connection.execute(statement)
+
+
+def drop(connection):
+    with connection:
+        for table in TRACKED_TABLES:
+            for suffix in ('ai', 'ad', 'au'):
+                connection.execute(f"DROP TRIGGER IF EXISTS risk_changes_{table.lower()}_{suffix}")
+        connection.execute("DROP TRIGGER IF EXISTS risk_changes_prune")
+        connection.execute("DROP TABLE IF EXISTS risk_changes")
+
+
+def check(connection, weights=None, n=50):
+    """Return a list of (what, problem) pairs; an empty list means consistent.
+
+    The index's top n is compared with a freshly rescored index and, for the
+    default weights, with HIGH_RISK_CUSTOMERS_QUERY.
+    """
+    import customer_analytics
+    from rollups import results_match
+
+    weights = weights or DEFAULT_WEIGHTS
+    cursor = connection.cursor()
+    problems = []
+    index = RiskIndex(weights)
+    index.rescore_all(cursor)
+    ranked = [dict(zip(COLUMNS, row)) for row in index.top(cursor, n)]
+
+    # Rescoring every party one at a time must land on the same ranking.
+    incremental = RiskIndex(weights, capacity=n)
+    incremental.rescore_all(cursor)
+    parties = list(incremental.keys)
+    for start in range(0, len(parties), 500):
+        incremental.rescore(cursor, set(parties[start:start + 500]))
+    if incremental.top(cursor, n) != index.top(cursor, n):
+        problems.append(('top_k', 'incremental rescoring differs from a full rescore'))
+
+    if weights == DEFAULT_WEIGHTS:
+        cursor.execute(customer_analytics.high_risk_customers_query(), [n])
+        expected = [dict(zip(COLUMNS, row)) for row in cursor.fetchall()]
+        if not results_match(expected, ranked):
+            problems.append(('high_risk_customers', 'index ranking differs from HIGH_RISK_CUSTOMERS_QUERY'))
+    cursor.close()
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('command', choices=['install', 'check', 'drop'])
+    parser.add_argument('--db', default=None, help='SQLite database (default: DB_PATH)')
+    args = parser.parse_args(argv)
+
+    connection = sqlite3.connect(args.db or os.getenv('DB_PATH', 'last_resort_hotels.db'))
+    try:
+        if args.command == 'install':
+            install(connection)
+            print(f"Installed risk_changes triggers on {len(TRACKED_TABLES)} tables")
+        elif args.command == 'drop':
+            drop(connection)
+            print("Dropped risk_changes")
+        else:
+            if np is None:
+                print("Risk scoring needs NumPy")
+                return 1
+            problems = check(connection, configured_weights())
+            for name, problem in problems:
+                print(f"{name}: {problem}")
+            print('Risk index consistent' if not problems else f"{len(problems)} problem(s) found")
+            return 1 if problems else 0
+    finally:
+        connection.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
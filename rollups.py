@@ -0,0 +1,286 @@
+"""Materialized rollup tables kept current by triggers.
+
+Daily/quarterly revenue and monthly event counts are GROUP BY recomputations
+over history that never changes. Each rollup here is a small table keyed by
+period (plus whatever is needed for distinct counts) with additive measures
+and a row_count. AFTER INSERT/UPDATE/DELETE triggers on
+the source table apply each row change as a delta, so the app reads O(periods)
+rows instead of scanning the whole fact table. Total revenue, for any date
+range, reads the daily rollup; quarterly revenue and monthly event counts
+read their own.
+
+Usage:
+    python rollups.py install    # create rollup tables and triggers, then rebuild
+    python rollups.py rebuild    # recompute every rollup from the raw tables
+    python rollups.py check      # compare rollups against the raw queries
+    python rollups.py drop       # remove rollup tables and triggers
+"""
+import argparse
+from dataclasses import dataclass
+import os
+import sqlite3
+import sys
+from datetime import date, datetime
+
+from metric_filters import NO_FILTERS, MetricFilters
+
+
+@dataclass
+class Rollup:
+    name: str
+    source: str
+    keys: list
+    measures: list
+    where: str = '1'
+
+    def key_names(self):
+        return [name for name, _, _ in self.keys]
+
+    def measure_names(self):
+        return [name for name, _, _ in self.measures]
+
+    def key_exprs(self, row):
+        return [expr.format(r=row) for _, expr, _ in self.keys]
+
+    def measure_exprs(self, row):
+        return [expr.format(r=row) for _, expr, _ in self.measures]
+
+    def condition(self, row):
+        return self.where.format(r=row)
+
+
+# Key expressions use sentinels ('' / -1) instead of NULL so that the
+# composite primary key and ON CONFLICT upserts behave.
+ROLLUPS = [
+    Rollup(
+        name='rollup_revenue_daily',
+        source='charges',
+        keys=[
+            ('day', "COALESCE(DATE({r}.charge_date), '')", 'TEXT'),
+            ('charge_status', "COALESCE({r}.charge_status, '')", 'TEXT'),
+        ],
+        measures=[('amount', 'COALESCE({r}.amount, 0)', 'REAL')],
+    ),
+    Rollup(
+        name='rollup_revenue_quarterly',
+        source='charges',
+        keys=[
+            ('revenue_year', "COALESCE(CAST(strftime('%Y', {r}.charge_date) AS INTEGER), 0)", 'INTEGER'),
+            ('revenue_quarter', "COALESCE(CAST((CAST(strftime('%m', {r}.charge_date) AS INTEGER) - 1) / 3 + 1 AS INTEGER), 0)", 'INTEGER'),
+            ('charge_status', "COALESCE({r}.charge_status, '')", 'TEXT'),
+        ],
+        measures=[('amount', 'COALESCE({r}.amount, 0)', 'REAL')],
+    ),
+    Rollup(
+        name='rollup_events_monthly',
+        source='events',
+        keys=[
+            ('month', "COALESCE(strftime('%Y-%m', {r}.start_date), '')", 'TEXT'),
+            ('host_id', 'COALESCE({r}.host_id, -1)', 'INTEGER'),
+        ],
+        measures=[
+            ('estimated_attendance', 'COALESCE({r}.estimated_attendance, 0)', 'INTEGER'),
+            ('attendance_count', 'CASE WHEN {r}.estimated_attendance IS NULL THEN 0 ELSE 1 END', 'INTEGER'),
+        ],
+        where='{r}.start_date IS NOT NULL',
+    ),
+]
+
+# day_filter is a condition on the day key, which is '' for charges without a date.
+TOTAL_REVENUE_QUERY = """
+    SELECT SUM(amount) AS total_revenue
+    FROM rollup_revenue_daily
+    WHERE charge_status IN ('billed', 'paid') AND {day_filter}
+"""
+
+QUARTERLY_REVENUE_QUERY = """
+    SELECT
+        revenue_year,
+        revenue_quarter,
+        SUM(amount) AS total_revenue
+    FROM rollup_revenue_quarterly
+    WHERE charge_status = 'paid'
+    GROUP BY revenue_year, revenue_quarter
+    ORDER BY revenue_year, revenue_quarter
+"""
+
+EVENTS_MONTHLY_QUERY = """
+    SELECT
+        NULLIF(month, '') AS month,
+        SUM(row_count) AS total_events,
+        SUM(estimated_attendance) AS total_estimated_attendance,
+        SUM(estimated_attendance) * 1.0 / NULLIF(SUM(attendance_count), 0) AS avg_attendance_per_event,
+        COUNT(DISTINCT NULLIF(host_id, -1)) AS unique_hosts
+    FROM rollup_events_monthly
+    GROUP BY month
+    ORDER BY month
+"""
+
+
+def rollups_installed(cursor):
+    cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'rollup_meta'")
+    return cursor.fetchone()[0] > 0
+
+
+def create_table_sql(rollup):
+    columns = [f"{name} {sql_type} NOT NULL" for name, _, sql_type in rollup.keys]
+    columns += [f"{name} {sql_type} NOT NULL DEFAULT 0" for name, _, sql_type in rollup.measures]
+    columns.append("row_count INTEGER NOT NULL DEFAULT 0")
+    columns.append(f"PRIMARY KEY ({', '.join(rollup.key_names())})")
+    return f"CREATE TABLE IF NOT EXISTS {rollup.name} (\n    " + ',\n    '.join(columns) + "\n) WITHOUT ROWID"
+
+
+def add_row_sql(rollup, row):
+    columns = rollup.key_names() + rollup.measure_names() + ['row_count']
+    values = rollup.key_exprs(row) + rollup.measure_exprs(row) + ['1']
+    updates = [f"{name} = {name} + excluded.{name}" for name in rollup.measure_names() + ['row_count']]
+    return (f"INSERT INTO {rollup.name} ({', '.join(columns)}) "
+            f"SELECT {', '.join(values)} WHERE {rollup.condition(row)} "
+            f"ON CONFLICT ({', '.join(rollup.key_names())}) DO UPDATE SET {', '.join(updates)};")
+
+
+def remove_row_sql(rollup, row):
+    match = ' AND '.join(f"{name} = {expr}" for name, expr in zip(rollup.key_names(), rollup.key_exprs(row)))
+    updates = [f"{name} = {name} - {expr}" for name, expr in zip(rollup.measure_names(), rollup.measure_exprs(row))]
+    updates.append('row_count = row_count - 1')
+    return (f"UPDATE {rollup.name} SET {', '.join(updates)} WHERE {match} AND {rollup.condition(row)};\n"
+            f"    DELETE FROM {rollup.name} WHERE {match} AND row_count <= 0;")
+
+
+def create_triggers_sql(rollup):
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {rollup.name}_ai AFTER INSERT ON {rollup.source} BEGIN\n"
+        f"    {add_row_sql(rollup, 'NEW')}\nEND",
+        f"CREATE TRIGGER IF NOT EXISTS {rollup.name}_ad AFTER DELETE ON {rollup.source} BEGIN\n"
+        f"    {remove_row_sql(rollup, 'OLD')}\nEND",
+        f"CREATE TRIGGER IF NOT EXISTS {rollup.name}_au AFTER UPDATE ON {rollup.source} BEGIN\n"
+        f"    {remove_row_sql(rollup, 'OLD')}\n    {add_row_sql(rollup, 'NEW')}\nEND",
+    ]
+
+
+def fresh_rollup_sql(rollup):
+    """SELECT that computes the rollup's contents straight from the source table."""
+    keys = rollup.key_exprs(rollup.source)
+    aliased = [f"{expr} AS {name}" for name, expr in zip(rollup.key_names(), keys)]
+    measures = [f"SUM({expr}) AS {name}" for name, expr in zip(rollup.measure_names(), rollup.measure_exprs(rollup.source))]
+    return (f"SELECT {', '.join(aliased + measures + ['COUNT(*) AS row_count'])} "
+            f"FROM {rollup.source} WHERE {rollup.condition(rollup.source)} "
+            f"GROUP BY {', '.join(keys)}")
+
+
+def install(connection):
+    with connection:
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS rollup_meta (name TEXT PRIMARY KEY, source TEXT NOT NULL, rebuilt_at TEXT)"
+        )
+        for rollup in ROLLUPS:
+            connection.execute(create_table_sql(rollup))
+            for statement in create_triggers_sql(rollup):
+                connection.execute(statement)
+            connection.execute("INSERT OR IGNORE INTO rollup_meta (name, source) VALUES (?, ?)",
+                               (rollup.name, rollup.source))
+    rebuild(connection)
+
+
+def rebuild(connection):
+    rebuilt_at = datetime.now().isoformat(timespec='seconds')
+    with connection:
+        for rollup in ROLLUPS:
+            columns = rollup.key_names() + rollup.measure_names() + ['row_count']
+            connection.execute(f"DELETE FROM {rollup.name}")
+            connection.execute(f"INSERT INTO {rollup.name} ({', '.join(columns)}) {fresh_rollup_sql(rollup)}")
+            connection.execute("UPDATE rollup_meta SET rebuilt_at = ? WHERE name = ?", (rebuilt_at, rollup.name))
+
+
+def drop(connection):
+    with connection:
+        for rollup in ROLLUPS:
+            for suffix in ('ai', 'ad', 'au'):
+                connection.execute(f"DROP TRIGGER IF EXISTS {rollup.name}_{suffix}")
+            connection.execute(f"DROP TABLE IF EXISTS {rollup.name}")
+        connection.execute("DROP TABLE IF EXISTS rollup_meta")
+
+
+def check(connection):
+    """Return a list of (rollup, problem) pairs; an empty list means consistent.
+
+    Each rollup table is compared row by row against a fresh GROUP BY of its
+    source table, and the rollup-backed app queries are compared against the
+    raw ones.
+    """
+    problems = []
+    for rollup in ROLLUPS:
+        columns = rollup.key_names() + [f"ROUND({name}, 6)" for name in rollup.measure_names()] + ['row_count']
+        stored = f"SELECT {', '.join(columns)} FROM {rollup.name}"
+        fresh = f"SELECT {', '.join(columns)} FROM ({fresh_rollup_sql(rollup)})"
+        for label, query in (('stale or extra rows', f"{stored} EXCEPT {fresh}"),
+                             ('missing rows', f"{fresh} EXCEPT {stored}")):
+            count = connection.execute(f"SELECT COUNT(*) FROM ({query})").fetchone()[0]
+            if count:
+                problems.append((rollup.name, f"{count} {label}"))
+
+    import app
+
+    connection.row_factory = sqlite3.Row
+    cursor = connection.cursor()
+    for name in ('fetch_quarterly_revenue', 'fetch_event_count_by_month'):
+        fetch = getattr(app, name)
+        raw = fetch(cursor, use_rollups=False)
+        rolled = fetch(cursor, use_rollups=True)
+        if not results_match(raw, rolled):
+            problems.append((name, 'rollup result differs from raw query'))
+    for filters in (NO_FILTERS, MetricFilters(start=date(2024, 1, 1), end=date(2024, 7, 1))):
+        raw = app.fetch_total_revenue(cursor, filters, use_rollups=False)
+        rolled = app.fetch_total_revenue(cursor, filters, use_rollups=True)
+        if abs(raw - rolled) > 1e-6:
+            problems.append(('fetch_total_revenue', f"rollup total {rolled} differs from raw {raw} "
+                                                    f"for {filters.query_args() or 'no filters'}"))
+    cursor.close()
+    return problems
+
+
+def results_match(left, right):
+    if len(left) != len(right):
+        return False
+    for a, b in zip(left, right):
+        if a.keys() != b.keys():
+            return False
+        for key in a:
+            if isinstance(a[key], float) or isinstance(b[key], float):
+                if abs((a[key] or 0) - (b[key] or 0)) > 1e-6:
+                    return False
+            elif a[key] != b[key]:
+                return False
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('command', choices=['install', 'rebuild', 'check', 'drop'])
+    parser.add_argument('--db', default=None, help='SQLite database (default: DB_PATH)')
+    args = parser.parse_args(argv)
+
+    connection = sqlite3.connect(args.db or os.getenv('DB_PATH', 'last_resort_hotels.db'))
+    try:
+        if args.command == 'install':
+            install(connection)
+            print(f"Installed {len(ROLLUPS)} rollups")
+        elif args.command == 'rebuild':
+            rebuild(connection)
+            print(f"Rebuilt {len(ROLLUPS)} rollups")
+        elif args.command == 'drop':
+            drop(connection)
+            print("Dropped rollups")
+        else:
+            problems = check(connection)
+            for name, problem in problems:
+                print(f"{name}: {problem}")
+            print('Rollups consistent' if not problems else f"{len(problems)} problem(s) found")
+            return 1 if problems else 0
+    finally:
+        connection.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
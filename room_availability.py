@@ -0,0 +1,746 @@
+"""Room availability search: the free rooms that best fit a reservation's requirements.
+
+AvailabilityIndex holds three in-memory structures, rebuilt when the
+database changes:
+
+- attribute bitsets: one Python int per attribute (in service, sleeping,
+  meeting, suite, smoking, nonsmoking, pool, parking, accessible, each bed
+  type and size, each capacity, each floor), bit i standing for the i-th
+  room, so matching a requirement is a handful of ANDs;
+- a busy bitset per day, of the rooms booked that night, so the rooms free
+  for a stay are the complement of one OR per night. Days are kept up to
+  BUSY_NIGHTS past the horizon and filled by sweeping each booking's start
+  and end, so a far-future check-out costs one entry, not one per night;
+  the nights beyond are checked against the few bookings that reach them;
+- a per-room interval index (sorted check-in days with a running maximum of
+  check-out days), used to rank free rooms by how snugly the stay fits
+  between the room's neighbouring bookings.
+
+Bookings are RoomAssignments rows that were not transferred away and whose
+reservation is not cancelled. As in occupancy.py a stay takes the nights
+from the check-in date up to the check-out date; an assignment without a
+check-out time runs to its reservation's check_out_date, and one without
+either blocks the room from check-in on. Bookings that ended before the
+index's horizon (today in the app) are not loaded, and searches may not
+start before it.
+
+A requirement is a ReservationRequirements row:
+
+    room_type_preference  'sleeping' (also when NULL), 'meeting' or 'suite';
+                          a suite is a Suites room or a sleeping room that
+                          can also be used for meetings
+    number_of_guests      at most SleepingRooms.capacity (two per RoomBeds
+                          bed without a SleepingRooms row), or
+                          MeetingRooms.seating_capacity for meeting rooms;
+                          rooms with no capacity on record are not ruled out
+    smoking_preference    Floors.smoking_designation, with the SleepingRooms
+                          smoking_preference deciding on mixed floors
+    bed_type_preference   preferred: Beds.bed_type or bed_size
+    location_preference   free text; "pool" and "parking" are preferred,
+                          "handicap", "accessible" or "wheelchair" require a
+                          Wings.handicapped_access wing
+
+Requirements filter and preferences rank: rooms with the bed type come
+first, then the location preferences (and in a group block, the floors the
+block already uses), ties going to the smallest room that fits, then the
+snuggest fit between bookings, then the lowest rate. The search walks those
+tiers as bitsets and stops once it has N rooms, so only the first tiers are
+ranked room by room.
+
+assign_block() places a group of reservations together, most constrained
+first, each in the best room left by the ones before it. The plan is not
+written to the database; the CLI writes it with --write.
+
+Usage:
+    python room_availability.py search 2025-06-01 2025-06-04 [--guests 2] [--bed-type king] [--smoking nonsmoking]
+                                       [--room-type suite] [--location "near the pool"] [--limit 10]
+    python room_availability.py assign 101 102 103 [--write]    # place a block of reservations
+    python room_availability.py check                           # compare searches with SQL and a room-by-room scan
+"""
+import argparse
+from bisect import bisect_left, insort
+from collections import namedtuple
+from datetime import date, timedelta
+import json
+import os
+import random
+import sqlite3
+import sys
+import threading
+
+from occupancy import from_day, to_day
+
+ROOM_TYPES = ('sleeping', 'meeting', 'suite')
+SMOKING_PREFERENCES = ('no_preference', 'smoking', 'nonsmoking')
+OUT_OF_SERVICE = ('maintenance', 'renovation')
+BED_SLEEPS = 2
+LOCATION_KEYWORDS = (('pool', 'pool'), ('parking', 'parking'), ('handicap', 'accessible'),
+                     ('accessib', 'accessible'), ('wheelchair', 'accessible'))
+REQUIRED_FEATURES = ('accessible',)
+FIT_HORIZON = 14      # free nights on either side of a stay beyond this count the same
+OPEN_END = 10 ** 9    # check-out day of a booking with no check-out on record
+BUSY_NIGHTS = 3 * 366  # nights past the horizon (today without one) held as per-day bitsets
+CHECK_IN_TIME = '15:00:00'
+# The tables the index is built from; a write to any other leaves it current.
+SOURCE_TABLES = ('Rooms', 'Floors', 'Wings', 'SleepingRooms', 'MeetingRooms', 'Suites', 'RoomBeds', 'Beds',
+                 'RoomAssignments', 'Reservations')
+
+COLUMNS = ('room_id', 'room_number', 'floor_number', 'wing', 'capacity', 'beds', 'smoking',
+           'base_daily_rate', 'free_nights_before', 'free_nights_after')
+
+DAY = "CAST(julianday(DATE({})) - 2440587.5 AS INTEGER)"
+STAY_END = "COALESCE(ra.check_out_time, res.check_out_date)"
+
+ROOMS_QUERY = """
+    SELECT r.room_id, r.room_number, r.room_status, r.can_be_sleeping, r.can_be_meeting, r.base_daily_rate,
+           f.floor_id, f.floor_number, f.smoking_designation, w.wing_designation,
+           w.proximity_to_pool, w.proximity_to_parking, w.handicapped_access,
+           s.capacity, s.smoking_preference, m.seating_capacity,
+           r.room_id IN (SELECT CAST(room_id AS INTEGER) FROM Suites) AS is_suite
+    FROM Rooms r
+    LEFT JOIN Floors f ON r.floor_id = f.floor_id
+    LEFT JOIN Wings w ON f.wing_id = w.wing_id
+    LEFT JOIN SleepingRooms s ON s.room_id = r.room_id
+    LEFT JOIN MeetingRooms m ON m.room_id = r.room_id
+    ORDER BY r.room_id
+"""
+
+BEDS_QUERY = """
+    SELECT rb.room_id, b.bed_type, b.bed_size, rb.quantity
+    FROM RoomBeds rb
+    JOIN Beds b ON rb.bed_id = b.bed_id
+"""
+
+BOOKINGS_FROM = f"""
+    FROM RoomAssignments ra
+    LEFT JOIN Reservations res ON res.reservation_id = ra.reservation_id
+    WHERE ra.check_in_time IS NOT NULL
+      AND (ra.assignment_status IS NOT 'transferred' OR ra.check_out_time IS NOT NULL)
+      AND res.reservation_status IS NOT 'cancelled'
+"""
+
+BOOKINGS_QUERY = f"""
+    SELECT ra.room_id, {DAY.format('ra.check_in_time')}, {DAY.format(STAY_END)}
+    {BOOKINGS_FROM}
+      AND ({STAY_END} IS NULL OR {STAY_END} >= :since)
+"""
+
+# Rooms with a booking overlapping [:start, :end), straight from SQL; check() compares searches with it.
+BUSY_ROOMS_QUERY = f"""
+    SELECT DISTINCT ra.room_id
+    {BOOKINGS_FROM}
+      AND DATE(ra.check_in_time) < :end
+      AND ({STAY_END} IS NULL OR MAX(DATE({STAY_END}), DATE(ra.check_in_time, '+1 day')) > :start)
+"""
+
+BLOCK_QUERY = """
+    SELECT res.reservation_id, res.check_in_date, res.check_out_date, res.reservation_status,
+           rr.requirement_id, rr.number_of_guests, rr.bed_type_preference, rr.smoking_preference,
+           rr.location_preference, rr.room_type_preference,
+           EXISTS (SELECT 1 FROM RoomAssignments ra WHERE ra.reservation_id = res.reservation_id
+                   AND ra.assignment_status IS NOT 'transferred') AS assigned
+    FROM Reservations res
+    LEFT JOIN ReservationRequirements rr ON rr.reservation_id = res.reservation_id
+    WHERE res.reservation_id IN (SELECT value FROM json_each(?))
+    ORDER BY res.reservation_id, rr.requirement_id
+"""
+
+
+class Requirement(namedtuple('Requirement', 'guests bed_type smoking location room_type')):
+    """What one room must (and should) offer; the fields of a ReservationRequirements row."""
+
+    __slots__ = ()
+
+    def __new__(cls, guests=1, bed_type=None, smoking='no_preference', location=None, room_type=None):
+        guests = int(guests or 1)
+        smoking = smoking or 'no_preference'
+        room_type = room_type or 'sleeping'
+        if guests < 1:
+            raise ValueError(f"number of guests must be at least 1, got {guests}")
+        if smoking not in SMOKING_PREFERENCES:
+            raise ValueError(f"unknown smoking preference {smoking!r}; expected one of {', '.join(SMOKING_PREFERENCES)}")
+        if room_type not in ROOM_TYPES:
+            raise ValueError(f"unknown room type {room_type!r}; expected one of {', '.join(ROOM_TYPES)}")
+        return super().__new__(cls, guests, bed_type or None, smoking, location or None, room_type)
+
+    @property
+    def features(self):
+        """Location features named in location_preference, in LOCATION_KEYWORDS order."""
+        text = (self.location or '').lower()
+        features = []
+        for keyword, feature in LOCATION_KEYWORDS:
+            if keyword in text and feature not in features:
+                features.append(feature)
+        return features
+
+
+def stay_days(check_in, check_out):
+    """(first night, day after the last night) as occupancy day numbers; a same-day stay takes one night."""
+    start = to_day(date.fromisoformat(str(check_in)[:10]))
+    end = to_day(date.fromisoformat(str(check_out)[:10]))
+    return start, max(end, start + 1)
+
+
+def bitset(positions, size):
+    """Int with the bits at `positions` set."""
+    buffer = bytearray((size + 7) // 8)
+    for position in positions:
+        buffer[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def sweep(changes, size):
+    """{day: bitset} of the rooms booked each night, from {day: [(position, +1 / -1)]} booking starts and ends.
+
+    Each day between two changes shares the running bitset, so filling a
+    range of nights costs a dict entry per day and no bit operations.
+    """
+    busy, counts, mask = {}, [0] * size, 0
+    days = sorted(changes)
+    for day, next_day in zip(days, days[1:] + days[-1:]):
+        for position, delta in changes[day]:
+            counts[position] += delta
+            if counts[position]:
+                mask |= 1 << position
+            else:
+                mask &= ~(1 << position)
+        if mask:
+            for night in range(day, next_day):
+                busy[night] = mask
+    return busy
+
+
+def positions(mask):
+    """Positions of the set bits of `mask`, lowest first."""
+    bits = bin(mask)[:1:-1]
+    return [position for position, bit in enumerate(bits) if bit == '1']
+
+
+def smoking_status(designation, preference):
+    """Which of 'smoking'/'nonsmoking' guests may get in a room: the floor decides unless it is mixed."""
+    if designation in ('smoking', 'nonsmoking'):
+        return (designation,)
+    if preference in ('smoking', 'nonsmoking'):
+        return (preference,)
+    return ('smoking', 'nonsmoking')
+
+
+class CapacityLadder:
+    """Rooms grouped by capacity: at_least(n) for filtering, tiers(n) smallest fitting capacity first."""
+
+    def __init__(self, capacities, size):
+        by_capacity = {}
+        unknown = []
+        for position, capacity in enumerate(capacities):
+            if capacity is None:
+                unknown.append(position)
+            else:
+                by_capacity.setdefault(capacity, []).append(position)
+        self.levels = sorted(by_capacity)
+        self.masks = [bitset(by_capacity[level], size) for level in self.levels]
+        self.unknown = bitset(unknown, size)
+        self.suffix = [0] * (len(self.masks) + 1)
+        for i in range(len(self.masks) - 1, -1, -1):
+            self.suffix[i] = self.suffix[i + 1] | self.masks[i]
+
+    def at_least(self, guests):
+        return self.suffix[bisect_left(self.levels, guests)] | self.unknown
+
+    def tiers(self, guests):
+        yield from self.masks[bisect_left(self.levels, guests):]
+        yield self.unknown
+
+
+class AvailabilityIndex:
+    """Attribute and per-day busy bitsets plus a per-room interval index, rebuilt from the database on demand."""
+
+    def __init__(self, horizon=None, version=None):
+        self.horizon = horizon  # callable returning the first day searches may ask for, or None for all bookings
+        self.version = version  # callable returning a value that changes with the database
+        self.since = None
+        self.seen_version = None
+        self.built = False
+        self.rebuilds = 0
+        self.bookings = 0
+        self.rooms = []         # position -> room_id
+        self.position = {}      # room_id -> position
+        self.details = []       # position -> (room_number, floor_number, wing, beds, smoking, base_daily_rate)
+        self.floors = []        # position -> floor_id
+        self.masks = {}         # attribute -> bitset
+        self.floor_masks = {}   # floor_id -> bitset
+        self.sleeps = self.seats = None  # CapacityLadder of SleepingRooms/RoomBeds and of MeetingRooms capacity
+        self.capacities = []    # position -> (sleeps, seats)
+        self.busy = {}          # day -> bitset of rooms booked that night, for days before self.until
+        self.until = None       # first day not in self.busy
+        self.beyond = []        # (first day, end day, position) of the booked nights from self.until on
+        self.open_starts = []   # sorted check-in days of bookings with no check-out
+        self.open_reach = []    # bitset of the rooms they block, accumulated in the same order
+        self.starts, self.ends, self.reach = [], [], []  # position -> sorted check-ins, check-outs, running max
+        self._lock = threading.Lock()
+
+    def rebuild(self, cursor):
+        # Read everything before touching the index, so an interrupted query leaves it as it was.
+        since = self.horizon() if self.horizon else None
+        seen_version = self.version() if self.version else None
+        previous = cursor.row_factory
+        cursor.row_factory = None
+        try:
+            room_rows = cursor.execute(ROOMS_QUERY).fetchall()
+            bed_rows = cursor.execute(BEDS_QUERY).fetchall()
+            booking_rows = cursor.execute(BOOKINGS_QUERY, {'since': since.isoformat() if since else ''}).fetchall()
+        finally:
+            cursor.row_factory = previous
+        self._load_rooms(room_rows, bed_rows)
+        self._load_bookings(booking_rows, to_day(since) if since else None)
+        self.since, self.seen_version, self.built = since, seen_version, True
+        self.rebuilds += 1
+
+    def _load_rooms(self, room_rows, bed_rows):
+        beds = {}
+        for room_id, bed_type, bed_size, quantity in bed_rows:
+            beds.setdefault(room_id, []).append((bed_type, bed_size, quantity or 1))
+        self.rooms, self.position, self.details, self.floors = [], {}, [], []
+        attributes, sleeps, seats = {}, [], []
+        for (room_id, room_number, room_status, can_sleep, can_meet, rate, floor_id, floor_number, designation,
+             wing, pool, parking, accessible, capacity, preference, seating, is_suite) in room_rows:
+            if room_id in self.position:  # a duplicated SleepingRooms or MeetingRooms row
+                continue
+            position = len(self.rooms)
+            self.rooms.append(room_id)
+            self.position[room_id] = position
+            self.floors.append(floor_id)
+            room_beds = beds.get(room_id, [])
+            smoking = smoking_status(designation, preference)
+            names = set(smoking)
+            if room_status not in OUT_OF_SERVICE:
+                names.add('in_service')
+            if can_sleep:
+                names.add('sleeping')
+            if can_meet:
+                names.add('meeting')
+            if is_suite or (can_sleep and can_meet):
+                names.add('suite')
+            for feature, flag in (('pool', pool), ('parking', parking), ('accessible', accessible)):
+                if flag:
+                    names.add(feature)
+            for bed_type, bed_size, _ in room_beds:
+                names.update((f'bed:{bed_type}', f'bed:{bed_size}'))
+            for name in names:
+                attributes.setdefault(name, []).append(position)
+            if capacity is None and room_beds:
+                capacity = BED_SLEEPS * sum(quantity for _, _, quantity in room_beds)
+            sleeps.append(capacity)
+            seats.append(seating)
+            self.details.append((room_number, floor_number, wing,
+                                 ', '.join(f'{quantity} x {bed_type} {bed_size}' for bed_type, bed_size, quantity in room_beds),
+                                 '/'.join(smoking), rate))
+        size = len(self.rooms)
+        self.masks = {name: bitset(members, size) for name, members in attributes.items()}
+        floors = {}
+        for position, floor_id in enumerate(self.floors):
+            floors.setdefault(floor_id, []).append(position)
+        self.floor_masks = {floor_id: bitset(members, size) for floor_id, members in floors.items()}
+        self.sleeps, self.seats = CapacityLadder(sleeps, size), CapacityLadder(seats, size)
+        self.capacities = list(zip(sleeps, seats))
+
+    def _load_bookings(self, booking_rows, since_day):
+        size = len(self.rooms)
+        intervals = [[] for _ in range(size)]
+        changes = {}  # day -> [(position, +1 from that night on / -1)]
+        open_bookings = []
+        self.until = (to_day(date.today()) if since_day is None else since_day) + BUSY_NIGHTS
+        self.beyond = []
+        for room_id, start, end in booking_rows:
+            position = self.position.get(room_id)
+            if position is None or start is None:
+                continue
+            if end is None:
+                open_bookings.append((start, position))
+                end = OPEN_END
+            else:
+                end = max(end, start + 1)
+                first, last = (start if since_day is None else max(start, since_day)), min(end, self.until)
+                if first < last:
+                    changes.setdefault(first, []).append((position, 1))
+                    changes.setdefault(last, []).append((position, -1))
+                if end > self.until:
+                    self.beyond.append((max(start, self.until), end, position))
+            intervals[position].append((start, end))
+        self.busy = sweep(changes, size)
+        open_bookings.sort()
+        self.open_starts, self.open_reach, reach = [], [], 0
+        for start, position in open_bookings:
+            reach |= 1 << position
+            self.open_starts.append(start)
+            self.open_reach.append(reach)
+        self.starts, self.ends, self.reach = [], [], []
+        for room_intervals in intervals:
+            room_intervals.sort()
+            self.starts.append([start for start, _ in room_intervals])
+            self.ends.append([end for _, end in room_intervals])
+            self.reach.append([])
+            self._update_reach(len(self.starts) - 1, 0)
+        self.bookings = sum(len(room_intervals) for room_intervals in intervals)
+
+    def _update_reach(self, position, first):
+        ends, reach = self.ends[position], self.reach[position]
+        del reach[first:]
+        latest = reach[-1] if reach else None
+        for end in ends[first:]:
+            latest = end if latest is None else max(latest, end)
+            reach.append(latest)
+
+    def refresh(self, cursor):
+        """Rebuild if the database or the horizon changed since the last build."""
+        since = self.horizon() if self.horizon else None
+        if (not self.built or since != self.since
+                or (self.version is not None and self.version() != self.seen_version)):
+            self.rebuild(cursor)
+
+    def busy_between(self, start, end):
+        """Bitset of the rooms booked on any night in [start, end)."""
+        busy = 0
+        for day in range(start, min(end, self.until)):
+            busy |= self.busy.get(day, 0)
+        if end > self.until:
+            for first, last, position in self.beyond:
+                if first < end and last > start:
+                    busy |= 1 << position
+        i = bisect_left(self.open_starts, end)
+        if i:
+            busy |= self.open_reach[i - 1]
+        return busy
+
+    def matching(self, requirement):
+        """Bitset of the rooms meeting the requirement's hard constraints, booked or not."""
+        masks = self.masks
+        mask = masks.get('in_service', 0) & masks.get(requirement.room_type, 0)
+        if requirement.smoking != 'no_preference':
+            mask &= masks.get(requirement.smoking, 0)
+        for feature in requirement.features:
+            if feature in REQUIRED_FEATURES:
+                mask &= masks.get(feature, 0)
+        ladder = self.seats if requirement.room_type == 'meeting' else self.sleeps
+        return mask & ladder.at_least(requirement.guests)
+
+    def preferences(self, requirement):
+        """Preference bitsets, most important first."""
+        preferences = []
+        if requirement.bed_type:
+            preferences.append(self.masks.get(f'bed:{requirement.bed_type}', 0))
+        for feature in requirement.features:
+            if feature not in REQUIRED_FEATURES:
+                preferences.append(self.masks.get(feature, 0))
+        return preferences
+
+    def available(self, requirement, start, end):
+        """Bitset of the rooms meeting the requirement and free every night in [start, end)."""
+        if self.since is not None and start < to_day(self.since):
+            raise ValueError(f"{from_day(start)} is before the availability horizon {self.since}")
+        return self.matching(requirement) & ~self.busy_between(start, end)
+
+    def fit(self, position, start, end):
+        """Free nights (before, after) the stay in this room, None when nothing is booked on that side."""
+        starts, reach = self.starts[position], self.reach[position]
+        i = bisect_left(starts, end)
+        after = starts[i] - end if i < len(starts) else None
+        before = start - reach[i - 1] if i else None
+        return before, after
+
+    def rank_key(self, position, start, end):
+        before, after = self.fit(position, start, end)
+        snug = (FIT_HORIZON if before is None else min(before, FIT_HORIZON)) + \
+               (FIT_HORIZON if after is None else min(after, FIT_HORIZON))
+        rate = self.details[position][5]
+        return snug, rate if rate is not None else float('inf'), self.rooms[position]
+
+    def ranked(self, requirement, start, end, limit, prefer=()):
+        """Positions of the best `limit` free rooms, best first."""
+        free = self.available(requirement, start, end)
+        if not free or limit <= 0:
+            return []
+        preferences = self.preferences(requirement) + list(prefer)
+        ladder = self.seats if requirement.room_type == 'meeting' else self.sleeps
+        count = len(preferences)
+        ranked = []
+        # Tiers in order of which preferences they meet, the first preference as the most significant bit.
+        for wanted in range((1 << count) - 1, -1, -1):
+            tier = free
+            for i, mask in enumerate(preferences):
+                tier = tier & mask if wanted >> (count - 1 - i) & 1 else tier & ~mask
+            if not tier:
+                continue
+            for capacity_mask in ladder.tiers(requirement.guests):
+                members = tier & capacity_mask
+                if not members:
+                    continue
+                ranked.extend(sorted(positions(members), key=lambda position: self.rank_key(position, start, end)))
+                if len(ranked) >= limit:
+                    return ranked[:limit]
+        return ranked
+
+    def row(self, position, requirement, start, end):
+        room_number, floor_number, wing, beds, smoking, rate = self.details[position]
+        sleeps, seats = self.capacities[position]
+        before, after = self.fit(position, start, end)
+        return (self.rooms[position], room_number, floor_number, wing,
+                seats if requirement.room_type == 'meeting' else sleeps, beds, smoking, rate, before, after)
+
+    def search(self, cursor, requirement, check_in, check_out, limit=10):
+        """The best `limit` free rooms for the requirement as COLUMNS tuples, best first."""
+        start, end = stay_days(check_in, check_out)
+        with self._lock:
+            self.refresh(cursor)
+            return [self.row(position, requirement, start, end)
+                    for position in self.ranked(requirement, start, end, limit)]
+
+    def book(self, position, start, end):
+        insort(self.starts[position], start)
+        i = self.starts[position].index(start)
+        self.ends[position].insert(i, end)
+        self._update_reach(position, i)
+        bit = 1 << position
+        for day in range(start, min(end, self.until)):
+            self.busy[day] = self.busy.get(day, 0) | bit
+        if end > self.until:
+            self.beyond.append((max(start, self.until), end, position))
+
+    def release(self, position, start, end):
+        # Only undoes book(): the stay was free when booked, so no other booking shares its nights.
+        i = self.starts[position].index(start)
+        del self.starts[position][i], self.ends[position][i]
+        self._update_reach(position, i)
+        bit = ~(1 << position)
+        for day in range(start, min(end, self.until)):
+            self.busy[day] &= bit
+        if end > self.until:
+            self.beyond.remove((max(start, self.until), end, position))
+
+    def assign_block(self, cursor, requests):
+        """Place a group block: [(key, Requirement, check_in, check_out)] -> [(key, COLUMNS row or None)].
+
+        Requests are placed most constrained first (fewest candidate rooms,
+        then most guests, then longest stay), each in the best room left by
+        the ones before it, preferring floors the block already uses. The
+        result is in request order; None marks a request that could not be
+        placed. The index is left as it was.
+        """
+        with self._lock:
+            self.refresh(cursor)
+            stays = [stay_days(check_in, check_out) for _, _, check_in, check_out in requests]
+            order = sorted(range(len(requests)), key=lambda i: (
+                self.available(requests[i][1], *stays[i]).bit_count(), -requests[i][1].guests,
+                stays[i][0] - stays[i][1], i))
+            placed, booked, block_floors = {}, [], 0
+            try:
+                for i in order:
+                    requirement, (start, end) = requests[i][1], stays[i]
+                    best = self.ranked(requirement, start, end, 1, prefer=[block_floors] if block_floors else [])
+                    if not best:
+                        continue
+                    position = best[0]
+                    placed[i] = self.row(position, requirement, start, end)
+                    self.book(position, start, end)
+                    booked.append((position, start, end))
+                    block_floors |= self.floor_masks.get(self.floors[position], 0)
+            finally:
+                for position, start, end in reversed(booked):
+                    self.release(position, start, end)
+            return [(requests[i][0], placed.get(i)) for i in range(len(requests))]
+
+    def status(self):
+        return {
+            'rooms': len(self.rooms),
+            'bookings': self.bookings,
+            'since': self.since.isoformat() if self.since else None,
+            'days': len(self.busy),
+            'until': from_day(self.until).isoformat() if self.until is not None else None,
+            'bookings_beyond': len(self.beyond),
+            'rebuilds': self.rebuilds,
+        }
+
+
+def block_requests(cursor, reservation_ids):
+    """[((reservation_id, requirement_id), Requirement, check_in, check_out)] for a block of reservations.
+
+    Each ReservationRequirements row asks for one room; a reservation
+    without one asks for a single room for one guest. Unknown, cancelled
+    or already assigned reservations raise ValueError.
+    """
+    previous = cursor.row_factory
+    cursor.row_factory = None
+    try:
+        rows = cursor.execute(BLOCK_QUERY, [json.dumps(list(reservation_ids))]).fetchall()
+    finally:
+        cursor.row_factory = previous
+    missing = set(reservation_ids) - {row[0] for row in rows}
+    if missing:
+        raise ValueError(f"unknown reservation(s): {', '.join(str(r) for r in sorted(missing))}")
+    requests = []
+    for reservation_id, check_in, check_out, status, requirement_id, *fields, assigned in rows:
+        if status == 'cancelled':
+            raise ValueError(f"reservation {reservation_id} is cancelled")
+        if assigned:
+            raise ValueError(f"reservation {reservation_id} already has a room")
+        if not check_in or not check_out:
+            raise ValueError(f"reservation {reservation_id} has no check-in or check-out date")
+        requests.append(((reservation_id, requirement_id), Requirement(*fields), check_in, check_out))
+    return requests
+
+
+def write_assignments(connection, requests, plan):
+    """Insert an 'assigned' RoomAssignments row for every placed request; returns the number written."""
+    stays = {key: (requirement, check_in) for key, requirement, check_in, _ in requests}
+    with connection:
+        next_id = connection.execute("SELECT COALESCE(MAX(assignment_id), 0) + 1 FROM RoomAssignments").fetchone()[0]
+        written = 0
+        for (reservation_id, requirement_id), row in plan:
+            if row is None:
+                continue
+            requirement, check_in = stays[(reservation_id, requirement_id)]
+            connection.execute(
+                "INSERT INTO RoomAssignments (assignment_id, reservation_id, room_id, check_in_time, check_out_time, "
+                "actual_guests, early_extension_hours, late_extension_hours, extension_surcharge, assignment_status) "
+                "VALUES (?, ?, ?, ?, NULL, ?, 0, 0, 0, 'assigned')",
+                (next_id + written, reservation_id, row[0], f"{str(check_in)[:10]} {CHECK_IN_TIME}", requirement.guests))
+            written += 1
+    return written
+
+
+def requirement_from_args(args):
+    """Requirement from URL query arguments (guests, bed_type, smoking, location, room_type)."""
+    try:
+        guests = int(args.get('guests', 1))
+    except ValueError:
+        raise ValueError(f"guests must be a whole number, got {args.get('guests')!r}")
+    return Requirement(guests, args.get('bed_type'), args.get('smoking'), args.get('location'),
+                       args.get('room_type'))
+
+
+def check(connection, samples=200, seed=7):
+    """Return a list of (what, problem) pairs; an empty list means consistent.
+
+    For every ReservationRequirements row (or random requirements when there
+    are none) over its reservation's dates and a random date range, the
+    bitset search is compared with a room-by-room scan of the same rules
+    against the SQL list of booked rooms, with the interval index's view of
+    each room, and with a full sort of every candidate.
+    """
+    cursor = connection.cursor()
+    index = AvailabilityIndex()
+    index.rebuild(cursor)
+    rng = random.Random(seed)
+    cursor.execute("SELECT MIN(DATE(check_in_time)), MAX(DATE(check_in_time)) FROM RoomAssignments")
+    first, last = cursor.fetchone()
+    first = date.fromisoformat(first) if first else date.today()
+    span = max((date.fromisoformat(last) - first).days if last else 0, 1)
+    cursor.execute("SELECT rr.number_of_guests, rr.bed_type_preference, rr.smoking_preference, "
+                   "rr.location_preference, rr.room_type_preference, res.check_in_date, res.check_out_date "
+                   "FROM ReservationRequirements rr JOIN Reservations res ON res.reservation_id = rr.reservation_id "
+                   "WHERE res.check_in_date IS NOT NULL AND res.check_out_date IS NOT NULL")
+    cases = [(Requirement(*row[:5]), row[5], row[6]) for row in cursor.fetchall()]
+    while len(cases) < samples:
+        requirement = Requirement(rng.randint(1, 4), rng.choice([None, 'regular', 'queen', 'king']),
+                                  rng.choice(SMOKING_PREFERENCES), rng.choice([None, 'near the pool', 'accessible']),
+                                  rng.choice(ROOM_TYPES))
+        check_in = first + timedelta(days=rng.randrange(span))
+        cases.append((requirement, check_in, check_in + timedelta(days=rng.randint(1, 7))))
+    rng.shuffle(cases)
+    cases = cases[:samples]
+
+    problems = []
+    attributes = {name: set(positions(mask)) for name, mask in index.masks.items()}
+    for requirement, check_in, check_out in cases:
+        start, end = stay_days(check_in, check_out)
+        cursor.execute(BUSY_ROOMS_QUERY, {'start': from_day(start).isoformat(), 'end': from_day(end).isoformat()})
+        booked = {index.position[row[0]] for row in cursor.fetchall() if row[0] in index.position}
+        expected = set()
+        for position in range(len(index.rooms)):
+            sleeps, seats = index.capacities[position]
+            capacity = seats if requirement.room_type == 'meeting' else sleeps
+            wanted = ['in_service', requirement.room_type]
+            wanted += [requirement.smoking] if requirement.smoking != 'no_preference' else []
+            wanted += [feature for feature in requirement.features if feature in REQUIRED_FEATURES]
+            if (position not in booked and all(position in attributes.get(name, ()) for name in wanted)
+                    and (capacity is None or capacity >= requirement.guests)):
+                expected.add(position)
+        label = f"{requirement} {from_day(start)}..{from_day(end)}"
+        free = set(positions(index.available(requirement, start, end)))
+        if free != expected:
+            problems.append((label, f"{len(free)} rooms free, SQL and a room scan say {len(expected)}"))
+            continue
+        for position in range(len(index.rooms)):
+            starts, reach = index.starts[position], index.reach[position]
+            i = bisect_left(starts, end)
+            if (i == 0 or reach[i - 1] <= start) != (position not in booked):
+                problems.append((label, f"interval index disagrees with SQL for room {index.rooms[position]}"))
+                break
+        preferences = index.preferences(requirement)
+        ladder_capacity = 1 if requirement.room_type == 'meeting' else 0
+
+        def full_key(position):
+            capacity = index.capacities[position][ladder_capacity]
+            return (tuple(0 if mask >> position & 1 else 1 for mask in preferences),
+                    (0, capacity) if capacity is not None else (1, 0)) + index.rank_key(position, start, end)
+
+        limit = rng.choice([1, 5, 20])
+        if index.ranked(requirement, start, end, limit) != sorted(free, key=full_key)[:limit]:
+            problems.append((label, f"top {limit} differs from a full sort of the free rooms"))
+    cursor.close()
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('command', choices=['search', 'assign', 'check'])
+    parser.add_argument('arguments', nargs='*', help='search: check-in and check-out dates; assign: reservation ids')
+    parser.add_argument('--db', default=None, help='SQLite database (default: DB_PATH)')
+    parser.add_argument('--guests', type=int, default=1)
+    parser.add_argument('--bed-type', default=None)
+    parser.add_argument('--smoking', default='no_preference', choices=SMOKING_PREFERENCES)
+    parser.add_argument('--location', default=None)
+    parser.add_argument('--room-type', default='sleeping', choices=ROOM_TYPES)
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--write', action='store_true', help='assign: insert the plan into RoomAssignments')
+    args = parser.parse_args(argv)
+    if args.command == 'search' and len(args.arguments) != 2:
+        parser.error('search takes a check-in and a check-out date')
+    if args.command == 'assign' and not args.arguments:
+        parser.error('assign takes one or more reservation ids')
+
+    connection = sqlite3.connect(args.db or os.getenv('DB_PATH', 'last_resort_hotels.db'))
+    try:
+        cursor = connection.cursor()
+        if args.command == 'search':
+            check_in, check_out = args.arguments
+            requirement = Requirement(args.guests, args.bed_type, args.smoking, args.location, args.room_type)
+            index = AvailabilityIndex(horizon=lambda: date.fromisoformat(check_in))
+            rows = index.search(cursor, requirement, check_in, check_out, args.limit)
+            print('  '.join(COLUMNS))
+            for row in rows:
+                print('  '.join('' if value is None else str(value) for value in row))
+            print(f"{len(rows)} room(s)")
+        elif args.command == 'assign':
+            requests = block_requests(cursor, [int(value) for value in args.arguments])
+            since = min(date.fromisoformat(str(check_in)[:10]) for _, _, check_in, _ in requests)
+            plan = AvailabilityIndex(horizon=lambda: since).assign_block(cursor, requests)
+            for (reservation_id, _), row in plan:
+                print(f"reservation {reservation_id}: " + (f"room {row[0]} ({row[1]})" if row else 'no room available'))
+            if args.write:
+                print(f"Wrote {write_assignments(connection, requests, plan)} room assignment(s)")
+            return 0 if all(row for _, row in plan) else 1
+        else:
+            problems = check(connection)
+            for name, problem in problems:
+                print(f"{name}: {problem}")
+            print('Availability index consistent' if not problems else f"{len(problems)} problem(s) found")
+            return 1 if problems else 0
+    except ValueError as e:
+        parser.error(str(e))
+    finally:
+        connection.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,447 @@
+"""Generate a deterministic synthetic hotel database at production volume.
+
+Tables are created from the CREATE TABLE statements in the MySQL dump (the
+same translation migrate_schema.py uses), then filled with rows whose
+foreign keys all resolve. --rows sets the number of charges; reservations,
+room assignments, events and event rooms scale with it (see FACT_RATIOS),
+and the hotel gets enough rooms to run at roughly 70% occupancy.
+
+Stays are generated day by day, room by room, so ids follow check-in order
+as they would in a live system, rooms never hold two stays at once, and
+demand is seasonal (summer and weekends fill faster). Billed parties are
+drawn from a Pareto distribution, so a few customers carry most of the
+revenue. The same --seed always produces the same database.
+
+Usage:
+    python synthetic_data.py --rows 100000 --output synthetic_1e5.db
+    python synthetic_data.py --rows 10000000 --years 5 --output synthetic_1e7.db
+"""
+import argparse
+from datetime import date, datetime, timedelta
+import math
+import os
+import random
+import sqlite3
+import sys
+import time
+
+from mysql_dump import create_index_sql, create_table_sql, quote, read_tables
+from migrate_schema import DASHBOARD_INDEXES, DEFAULT_DUMP
+
+END_DATE = date(2025, 12, 1)
+
+# Row counts relative to --rows (the number of charges).
+FACT_RATIOS = {
+    'reservations': 0.4,
+    'events': 0.02,
+    'eventrooms': 0.1,
+    'bills': 0.05,
+    'billedparties': 0.01,
+    'guests': 0.01,
+    'hosts': 0.001,
+}
+
+MEAN_NIGHTS = 3.0
+MEAN_GAP_NIGHTS = 1.3
+CANCELLED_SHARE = 0.05
+ROOMS_PER_FLOOR = 20
+FLOORS_PER_WING = 10
+WINGS_PER_BUILDING = 4
+MEETING_ROOM_SHARE = 0.05
+RENOVATION_SHARE = 0.02
+
+SERVICE_TYPES = ['meal', 'phone', 'business_service', 'room_service', 'retail', 'health_club', 'other']
+INCIDENTAL_SERVICES = [('meal', 50), ('phone', 10), ('business_service', 5), ('retail', 15), ('health_club', 10), ('other', 10)]
+MEDIAN_AMOUNTS = {'meal': 45, 'phone': 8, 'business_service': 20, 'room_service': 150, 'retail': 35, 'health_club': 25, 'other': 60}
+MEAL_TYPES = [('breakfast', 30), ('lunch', 25), ('dinner', 30), ('snack', 5), ('bar', 10)]
+MEAL_LOCATIONS = [('restaurant', 70), ('room_service', 20), ('meeting_room', 10)]
+PARTY_TYPES = [('guest', 70), ('organization', 20), ('host', 5), ('external', 5)]
+EVENT_TYPES = ['Conference', 'Corporate', 'Wedding', 'Workshop', 'Banquet', 'Seminar', 'Reunion']
+TIME_SLOTS = ['breakfast', 'morning', 'lunch', 'afternoon', 'supper', 'evening', 'night']
+EATING_SLOTS = {'breakfast', 'lunch', 'supper'}
+FIRST_NAMES = ['James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda', 'David', 'Elizabeth',
+               'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Daniel', 'Karen']
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez',
+              'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Jackson', 'Martin']
+CITIES = [('New York', 'NY', '10001'), ('Los Angeles', 'CA', '90001'), ('Chicago', 'IL', '60601'),
+          ('Houston', 'TX', '77001'), ('Miami', 'FL', '33101'), ('Seattle', 'WA', '98101')]
+
+# Columns filled for each table; anything else in the dump schema is left NULL.
+COLUMNS = {
+    'buildings': ('building_id', 'building_name', 'address', 'city', 'state', 'zip_code', 'total_floors'),
+    'wings': ('wing_id', 'building_id', 'wing_designation', 'proximity_to_pool', 'proximity_to_parking', 'handicapped_access'),
+    'floors': ('floor_id', 'wing_id', 'floor_number', 'smoking_designation'),
+    'rooms': ('room_id', 'floor_id', 'room_number', 'base_daily_rate', 'room_status', 'can_be_sleeping',
+              'can_be_meeting', 'has_toilet_facilities', 'has_foldable_bed'),
+    'servicetypes': ('service_type_id', 'service_name', 'description'),
+    'billedparties': ('billed_party_id', 'party_type', 'first_name', 'last_name', 'organization_name',
+                      'contact_person_name', 'email', 'phone', 'address', 'city', 'state', 'zip_code'),
+    'customerqualifications': ('qualification_id', 'billed_party_id', 'past_history_score', 'cooperativeness_score',
+                               'flexibility_score', 'payment_promptness_score', 'overall_qualification_score',
+                               'last_updated'),
+    'guests': ('guest_id', 'first_name', 'last_name', 'email', 'phone', 'address', 'city', 'state', 'zip_code',
+               'pin_number', 'card_number', 'created_date'),
+    'hosts': ('host_id', 'first_name', 'last_name', 'email', 'phone', 'organization_name', 'address', 'city', 'state',
+              'zip_code'),
+    'reservations': ('reservation_id', 'reservation_date', 'check_in_date', 'check_out_date', 'reservation_status',
+                     'guest_id', 'host_id', 'billed_party_id', 'advance_deposit_required', 'deposit_amount'),
+    'roomassignments': ('assignment_id', 'reservation_id', 'room_id', 'check_in_time', 'check_out_time',
+                        'actual_guests', 'early_extension_hours', 'late_extension_hours', 'extension_surcharge',
+                        'assignment_status'),
+    'charges': ('charge_id', 'billed_party_id', 'service_type_id', 'room_assignment_id', 'event_id', 'charge_date',
+                'amount', 'description', 'charge_status'),
+    'mealcharges': ('meal_charge_id', 'charge_id', 'meal_type', 'location_type', 'room_id', 'number_of_guests'),
+    'events': ('event_id', 'event_name', 'host_id', 'billed_party_id', 'start_date', 'end_date', 'start_time',
+               'end_time', 'estimated_attendance', 'estimated_guests_staying', 'event_type'),
+    'eventrooms': ('event_room_id', 'event_id', 'room_id', 'usage_time_slot', 'usage_date', 'is_eating_usage',
+                   'actual_attendance'),
+    'bills': ('bill_id', 'billed_party_id', 'total_amount', 'bill_date', 'due_date', 'bill_status', 'payment_terms'),
+}
+
+
+class BatchWriter:
+    """Buffer rows per table and insert them with executemany in batches."""
+
+    def __init__(self, connection, batch_size=20000):
+        self.connection = connection
+        self.batch_size = batch_size
+        self.buffers = {}
+        self.counts = {}
+        self.statements = {}
+
+    def add(self, table, row):
+        buffer = self.buffers.setdefault(table, [])
+        buffer.append(row)
+        if len(buffer) >= self.batch_size:
+            self.flush(table)
+
+    def flush(self, table=None):
+        for name in [table] if table else list(self.buffers):
+            rows = self.buffers.get(name)
+            if not rows:
+                continue
+            if name not in self.statements:
+                columns = COLUMNS[name]
+                self.statements[name] = (f"INSERT INTO {quote(name)} ({', '.join(quote(c) for c in columns)}) "
+                                         f"VALUES ({', '.join('?' for _ in columns)})")
+            self.connection.executemany(self.statements[name], rows)
+            self.counts[name] = self.counts.get(name, 0) + len(rows)
+            rows.clear()
+
+
+class WeightedChoice:
+    def __init__(self, rng, pairs):
+        self.rng = rng
+        self.values = [value for value, _ in pairs]
+        self.cum_weights = []
+        total = 0
+        for _, weight in pairs:
+            total += weight
+            self.cum_weights.append(total)
+
+    def __call__(self):
+        return self.rng.choices(self.values, cum_weights=self.cum_weights)[0]
+
+
+def pareto_weights(count, alpha=1.16):
+    """Pairs (1-based id, weight) with a Pareto-like popularity (80/20 for alpha 1.16)."""
+    return [(index + 1, 1.0 / (index + 1) ** (1.0 / alpha)) for index in range(count)]
+
+
+def expected_floor(mean):
+    """E[int(X)] for X ~ Exponential(mean), i.e. the mean of the geometric draws below."""
+    return 1.0 / (math.exp(1.0 / mean) - 1.0)
+
+
+def seasonal_demand(day):
+    """Relative demand for check-ins on a date: summer peak and busier Fridays/Saturdays."""
+    season = 1.0 + 0.35 * math.cos((day.timetuple().tm_yday - 196) / 365.25 * 2 * math.pi)
+    return season * (1.25 if day.weekday() in (4, 5) else 1.0)
+
+
+def amount_for(rng, service):
+    return round(MEDIAN_AMOUNTS[service] * rng.lognormvariate(0, 0.5), 2)
+
+
+def charge_status(rng, charge_day, end):
+    age = (end - charge_day).days
+    roll = rng.random()
+    if age > 60:
+        return 'paid' if roll < 0.85 else 'billed' if roll < 0.93 else 'cancelled' if roll < 0.97 else 'pending'
+    return 'pending' if roll < 0.4 else 'billed' if roll < 0.8 else 'paid' if roll < 0.95 else 'cancelled'
+
+
+def person(rng, index):
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    city, state, zip_code = rng.choice(CITIES)
+    address = f"{rng.randint(1, 9999)} {rng.choice(LAST_NAMES)} {rng.choice(['St', 'Ave', 'Blvd', 'Rd'])}"
+    return (first, last, f"{first.lower()}.{last.lower()}{index}@example.com", f"555-{index % 10000:04d}",
+            address, city, state, zip_code)
+
+
+class Generator:
+    def __init__(self, writer, rows, years, seed):
+        self.writer = writer
+        self.rng = random.Random(seed)
+        self.rows = rows
+        self.end = END_DATE
+        self.start = END_DATE - timedelta(days=365 * years)
+        self.days = (self.end - self.start).days
+        self.target = {table: max(int(rows * ratio), 1) for table, ratio in FACT_RATIOS.items()}
+        self.charge_id = 0
+        self.meal_charge_id = 0
+
+    def generate(self):
+        self.hotel()
+        self.parties()
+        self.stays()
+        self.events()
+        self.bills()
+        self.writer.flush()
+
+    def hotel(self):
+        rng = self.rng
+        # A room's cycle is its stay, the gap before the next booking, and the
+        # days it waits for a guest when demand is low.
+        idle = sum(1.0 / self.acceptance(self.start + timedelta(days=offset)) - 1.0
+                   for offset in range(self.days)) / self.days
+        cycle = expected_floor(MEAN_NIGHTS) + 1 + expected_floor(MEAN_GAP_NIGHTS) + idle
+        stays = self.target['reservations'] * (1 - CANCELLED_SHARE)
+        room_count = math.ceil(stays * cycle / self.days)
+        room_count = max(int(room_count / (1 - MEETING_ROOM_SHARE)), 10)
+        floors = math.ceil(room_count / ROOMS_PER_FLOOR)
+        wings = math.ceil(floors / FLOORS_PER_WING)
+        buildings = math.ceil(wings / WINGS_PER_BUILDING)
+
+        for building_id in range(1, buildings + 1):
+            city, state, zip_code = CITIES[building_id % len(CITIES)]
+            self.writer.add('buildings', (building_id, f"Building {building_id}", f"{100 + building_id} Resort Boulevard",
+                                          city, state, zip_code, FLOORS_PER_WING))
+        for wing_id in range(1, wings + 1):
+            self.writer.add('wings', (wing_id, (wing_id - 1) // WINGS_PER_BUILDING + 1,
+                                      ['North', 'South', 'East', 'West'][(wing_id - 1) % 4],
+                                      rng.randint(0, 1), rng.randint(0, 1), 1))
+        for floor_id in range(1, floors + 1):
+            self.writer.add('floors', (floor_id, (floor_id - 1) // FLOORS_PER_WING + 1,
+                                       (floor_id - 1) % FLOORS_PER_WING + 1,
+                                       'smoking' if rng.random() < 0.1 else 'nonsmoking'))
+
+        self.sleeping_rooms, self.meeting_rooms, self.room_rates = [], [], {}
+        for room_id in range(1, room_count + 1):
+            floor_id = (room_id - 1) // ROOMS_PER_FLOOR + 1
+            meeting = rng.random() < MEETING_ROOM_SHARE
+            status = 'renovation' if rng.random() < RENOVATION_SHARE else 'available'
+            rate = round(rng.choice((120, 150, 180, 250, 400)) * (1.5 if meeting else 1.0), 2)
+            self.writer.add('rooms', (room_id, floor_id, f"{(floor_id - 1) % FLOORS_PER_WING + 1}{(room_id - 1) % ROOMS_PER_FLOOR + 1:02d}",
+                                      rate, status, 0 if meeting else 1, 1 if meeting else 0, 1, rng.randint(0, 1)))
+            if status != 'renovation':
+                (self.meeting_rooms if meeting else self.sleeping_rooms).append(room_id)
+            self.room_rates[room_id] = rate
+        if not self.meeting_rooms:
+            self.meeting_rooms = self.sleeping_rooms[:1]
+
+        for service_type_id, name in enumerate(SERVICE_TYPES, 1):
+            self.writer.add('servicetypes', (service_type_id, name, name.replace('_', ' ').capitalize()))
+        self.service_ids = {name: index for index, name in enumerate(SERVICE_TYPES, 1)}
+
+    def acceptance(self, day):
+        return min(seasonal_demand(day) / 1.6, 1.0)
+
+    def parties(self):
+        rng = self.rng
+        party_type = WeightedChoice(rng, PARTY_TYPES)
+        for party_id in range(1, self.target['billedparties'] + 1):
+            kind = party_type()
+            first, last, email, phone, address, city, state, zip_code = person(rng, party_id)
+            organization = f"{last} {rng.choice(['Holdings', 'Group', 'Partners', 'Inc.'])}" if kind == 'organization' else None
+            self.writer.add('billedparties', (party_id, kind, None if organization else first, None if organization else last,
+                                              organization, f"{first} {last}", email, phone, address, city, state, zip_code))
+            scores = [min(max(int(rng.gauss(75, 15)), 0), 100) for _ in range(4)]
+            self.writer.add('customerqualifications', (party_id, party_id, *scores, round(sum(scores) / 4, 2),
+                                                       (self.end - timedelta(days=rng.randint(0, 180))).isoformat()))
+        for guest_id in range(1, self.target['guests'] + 1):
+            first, last, email, phone, address, city, state, zip_code = person(rng, guest_id)
+            created = self.start + timedelta(days=rng.randrange(self.days))
+            self.writer.add('guests', (guest_id, first, last, email, phone, address, city, state, zip_code,
+                                       f"{rng.randrange(10000):04d}", f"CARD{guest_id:08d}", created.isoformat()))
+        for host_id in range(1, self.target['hosts'] + 1):
+            first, last, email, phone, address, city, state, zip_code = person(rng, host_id)
+            self.writer.add('hosts', (host_id, first, last, email, phone, f"{last} Events", address, city, state, zip_code))
+        self.pick_party = WeightedChoice(rng, pareto_weights(self.target['billedparties']))
+        self.pick_guest = WeightedChoice(rng, pareto_weights(self.target['guests']))
+        self.pick_host = WeightedChoice(rng, pareto_weights(self.target['hosts']))
+
+    def add_charge(self, party_id, service, charge_day, amount, description, assignment_id=None, event_id=None):
+        self.charge_id += 1
+        moment = datetime.combine(charge_day, datetime.min.time()) + timedelta(minutes=self.rng.randint(7 * 60, 23 * 60))
+        self.writer.add('charges', (self.charge_id, party_id, self.service_ids[service], assignment_id, event_id,
+                                    moment.isoformat(sep=' '), amount, description,
+                                    charge_status(self.rng, charge_day, self.end)))
+        return self.charge_id
+
+    def stays(self):
+        """Walk the calendar, checking a new stay into each room as it frees up."""
+        rng = self.rng
+        service = WeightedChoice(rng, INCIDENTAL_SERVICES)
+        meal_type = WeightedChoice(rng, MEAL_TYPES)
+        meal_location = WeightedChoice(rng, MEAL_LOCATIONS)
+        stays_expected = self.target['reservations'] * (1 - CANCELLED_SHARE)
+        stay_charges = self.rows - self.target['events']
+        incidentals = max(stay_charges / max(stays_expected, 1) - 1, 0)
+
+        free_on = {}
+        for room_id in self.sleeping_rooms:
+            free_on.setdefault(rng.randrange(4), []).append(room_id)
+
+        reservation_id = assignment_id = 0
+        for offset in range(self.days):
+            day = self.start + timedelta(days=offset)
+            acceptance = self.acceptance(day)
+            for room_id in free_on.pop(offset, []):
+                if rng.random() > acceptance:
+                    free_on.setdefault(offset + 1, []).append(room_id)
+                    continue
+                nights = min(int(rng.expovariate(1 / MEAN_NIGHTS)) + 1, 21)
+                check_out = day + timedelta(days=nights)
+                party_id, guest_id = self.pick_party(), self.pick_guest()
+                host_id = self.pick_host() if rng.random() < 0.1 else None
+
+                if rng.random() < CANCELLED_SHARE / (1 - CANCELLED_SHARE):
+                    reservation_id += 1
+                    self.writer.add('reservations', (reservation_id, (day - timedelta(days=rng.randint(1, 90))).isoformat(),
+                                                     day.isoformat(), check_out.isoformat(), 'cancelled',
+                                                     guest_id, host_id, self.pick_party(), 0, 0.0))
+
+                reservation_id += 1
+                assignment_id += 1
+                open_stay = check_out > self.end
+                status = 'checked_in' if open_stay else 'checked_out'
+                rate = self.room_rates[room_id]
+                deposit = rng.random() < 0.6
+                self.writer.add('reservations', (reservation_id, (day - timedelta(days=int(rng.expovariate(1 / 30)))).isoformat(),
+                                                 day.isoformat(), check_out.isoformat(), status, guest_id, host_id, party_id,
+                                                 int(deposit), rate if deposit else 0.0))
+                self.writer.add('roomassignments', (assignment_id, reservation_id, room_id,
+                                                    f"{day.isoformat()} {rng.randint(13, 22):02d}:00:00",
+                                                    None if open_stay else f"{check_out.isoformat()} {rng.randint(7, 11):02d}:00:00",
+                                                    rng.randint(1, 4), 0.0, 0.0, 0.0, status))
+
+                charge_day = min(check_out, self.end)
+                self.add_charge(party_id, 'room_service', charge_day, round(rate * nights, 2),
+                                f"Room charge - {nights} night{'s' if nights > 1 else ''}", assignment_id=assignment_id)
+                extra = round(rng.expovariate(1 / incidentals)) if incidentals else 0
+                for _ in range(extra):
+                    kind = service()
+                    spent_on = day + timedelta(days=rng.randrange(nights))
+                    if spent_on >= self.end:
+                        continue
+                    charge_id = self.add_charge(party_id, kind, spent_on, amount_for(rng, kind),
+                                                kind.replace('_', ' ').capitalize(), assignment_id=assignment_id)
+                    if kind == 'meal':
+                        self.meal_charge_id += 1
+                        self.writer.add('mealcharges', (self.meal_charge_id, charge_id, meal_type(), meal_location(),
+                                                        room_id, rng.randint(1, 4)))
+
+                gap = int(rng.expovariate(1 / MEAN_GAP_NIGHTS))
+                free_on.setdefault(offset + nights + gap, []).append(room_id)
+
+    def events(self):
+        rng = self.rng
+        count = self.target['events']
+        rooms_per_event_day = max(self.target['eventrooms'] / count, 1)
+        start_days = sorted(rng.randrange(self.days) for _ in range(count))
+        event_room_id = 0
+        for event_id, offset in enumerate(start_days, 1):
+            start_day = self.start + timedelta(days=offset)
+            length = min(int(rng.expovariate(1 / 1.5)) + 1, 5)
+            end_day = min(start_day + timedelta(days=length - 1), self.end - timedelta(days=1))
+            attendance = min(int(rng.lognormvariate(math.log(80), 0.8)) + 5, 2000)
+            host_id, party_id = self.pick_host(), self.pick_party()
+            start_hour = rng.choice((8, 9, 10, 13, 17, 18))
+            kind = rng.choice(EVENT_TYPES)
+            self.writer.add('events', (event_id, f"{kind} {event_id}", host_id, party_id, start_day.isoformat(),
+                                       end_day.isoformat(), f"{start_hour:02d}:00:00",
+                                       f"{min(start_hour + rng.randint(3, 9), 23):02d}:00:00", attendance,
+                                       int(attendance * rng.uniform(0, 0.5)), kind))
+            event_days = (end_day - start_day).days + 1
+            for day_index in range(event_days):
+                usage_day = start_day + timedelta(days=day_index)
+                slots = sorted(rng.sample(TIME_SLOTS, min(max(int(rooms_per_event_day / event_days), 1), len(TIME_SLOTS))),
+                               key=TIME_SLOTS.index)
+                for slot in slots:
+                    event_room_id += 1
+                    self.writer.add('eventrooms', (event_room_id, event_id, rng.choice(self.meeting_rooms), slot,
+                                                   usage_day.isoformat(), int(slot in EATING_SLOTS),
+                                                   max(int(attendance * rng.uniform(0.6, 1.05)), 0)))
+            self.add_charge(party_id, 'other', end_day, round(attendance * rng.uniform(20, 60) * event_days, 2),
+                            f"Event package - {kind}", event_id=event_id)
+
+    def bills(self):
+        rng = self.rng
+        count = self.target['bills']
+        for bill_id, offset in enumerate(sorted(rng.randrange(self.days) for _ in range(count)), 1):
+            bill_day = self.start + timedelta(days=offset)
+            terms = rng.choice((7, 15, 30))
+            due_day = bill_day + timedelta(days=terms)
+            if due_day >= self.end:
+                status = rng.choice(('pending', 'sent', 'sent'))
+            else:
+                roll = rng.random()
+                status = 'paid' if roll < 0.85 else 'overdue' if roll < 0.96 else 'cancelled'
+            self.writer.add('bills', (bill_id, self.pick_party(), round(rng.lognormvariate(math.log(600), 0.9), 2),
+                                      bill_day.isoformat(), due_day.isoformat(), status, f"Net {terms} days"))
+
+
+def generate(output_path, rows, years=3, seed=42, dump_path=DEFAULT_DUMP, indexes=True, batch_size=20000):
+    """Write a synthetic database to output_path and return {table: row count}."""
+    tables = read_tables(dump_path)
+    if os.path.exists(output_path):
+        os.remove(output_path)
+
+    connection = sqlite3.connect(output_path)
+    try:
+        connection.execute("PRAGMA journal_mode = OFF")
+        connection.execute("PRAGMA synchronous = OFF")
+        with connection:
+            for table in tables.values():
+                connection.execute(create_table_sql(table))
+            writer = BatchWriter(connection, batch_size)
+            Generator(writer, rows, years, seed).generate()
+        if indexes:
+            with connection:
+                for table in tables.values():
+                    for statement in create_index_sql(table):
+                        connection.execute(statement)
+                for name, table, columns in DASHBOARD_INDEXES:
+                    connection.execute(
+                        f"CREATE INDEX IF NOT EXISTS {quote(name)} ON {quote(table)} "
+                        f"({', '.join(quote(c) for c in columns)})"
+                    )
+            connection.execute("ANALYZE")
+        connection.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        connection.close()
+    return writer.counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, default=100000, help='number of charges; other tables scale with it')
+    parser.add_argument('--years', type=int, default=3, help='years of history ending at ' + END_DATE.isoformat())
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--dump', default=DEFAULT_DUMP, help='mysqldump file with the reference schema')
+    parser.add_argument('--output', default=None, help='database to write (default: synthetic_<rows>.db)')
+    parser.add_argument('--no-indexes', action='store_true', help='leave out secondary indexes, like the bundled database')
+    args = parser.parse_args(argv)
+
+    output_path = args.output or f"synthetic_{args.rows}.db"
+    started = time.perf_counter()
+    counts = generate(output_path, args.rows, args.years, args.seed, args.dump, indexes=not args.no_indexes)
+    for table, count in sorted(counts.items()):
+        print(f"{table:>24}: {count:,}")
+    print(f"Wrote {output_path} in {time.perf_counter() - started:.1f} s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())